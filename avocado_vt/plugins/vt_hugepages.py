@@ -0,0 +1,28 @@
+import logging
+import os
+import sys
+
+from avocado.core.plugin_interfaces import JobPostTests as Post
+from avocado.utils.stacktrace import log_exc_info
+
+from virttest import test_setup, utils_resources
+
+
+class VTHugePagePool(Post):
+
+    name = "vt-hugepage-pool"
+    description = "Avocado-VT hugepage pool release at the end of the job"
+
+    def __init__(self, **kwargs):
+        self.log = logging.getLogger("avocado.app")
+
+    def post_tests(self, job):
+        try:
+            pool = test_setup.HugePagePool()
+            if not os.path.exists(pool.state_file):
+                return
+            with utils_resources.host_lock("hugepages"):
+                pool.release()
+        except Exception as detail:
+            self.log.error("Failure releasing the hugepage pool: %s", detail)
+            log_exc_info(sys.exc_info(), self.log.name)
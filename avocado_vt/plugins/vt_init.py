@@ -138,6 +138,19 @@ if hasattr(plugin_interfaces, "Init"):
                 help_msg=help_msg,
             )
 
+            help_msg = (
+                "Store the params shared by the tests of a reference once "
+                "in a file and only keep the per test params in the "
+                "runnables. The runner must be able to read the VT tmp dir."
+            )
+            settings.register_option(
+                section,
+                key="compact_runnables",
+                key_type=bool,
+                default=False,
+                help_msg=help_msg,
+            )
+
             # [vt.setup] section
             section = "vt.setup"
 
@@ -332,6 +345,40 @@ if hasattr(plugin_interfaces, "Init"):
                 default=False,
             )
 
+            # [vt.parallel] section
+            section = "vt.parallel"
+
+            help_msg = (
+                "Allow running VT tests with max-parallel-tasks > 1. Every "
+                "test then gets its own env file and waits until the host "
+                "resources it declares (vcpus, memory, hugepages) are free"
+            )
+            settings.register_option(
+                section, "enabled", help_msg=help_msg, key_type=bool, default=False
+            )
+
+            help_msg = "Number of host cpus shared by the parallel tests (0 = all)"
+            settings.register_option(
+                section, "cpus", help_msg=help_msg, key_type=int, default=0
+            )
+
+            help_msg = "Host memory in MB shared by the parallel tests (0 = all)"
+            settings.register_option(
+                section, "mem", help_msg=help_msg, key_type=int, default=0
+            )
+
+            help_msg = (
+                "Time in seconds a test waits for its resources before "
+                "being interrupted"
+            )
+            settings.register_option(
+                section,
+                "acquire_timeout",
+                help_msg=help_msg,
+                key_type=int,
+                default=3600,
+            )
+
             # [vt.filter] section
             help_msg = (
                 "Allows to selectively skip certain default filters. "
@@ -4,7 +4,11 @@ from avocado.core.plugin_interfaces import Discoverer, Resolver
 from avocado.core.resolver import ReferenceResolution, ReferenceResolutionResult
 from avocado.core.settings import settings
 
+from virttest import data_dir
+from virttest.compat import get_opt
+
 from ..discovery import DiscoveryMixIn
+from ..utils import compact_vt_params
 
 try:
     from avocado.core.nrunner import Runnable
@@ -13,12 +17,26 @@ except ImportError:
 
 
 class VTResolverUtils(DiscoveryMixIn):
+
+    #: Parser with the base cartesian config, shared by all the references
+    _base_parser = None
+
     def __init__(self, config):
         self.config = config or settings.as_dict()
 
-    def _parameters_to_runnable(self, params):
+    def _get_base_parser(self):
+        """
+        Parses the base cartesian config only once per resolver
+
+        :return: a copy of the parsed base config, ready to be filtered
+        """
+        if self._base_parser is None:
+            self._base_parser = self._get_parser()
+            self._save_parser_cartesian_config(self._base_parser)
+        return self._base_parser.copy()
+
+    def _parameters_to_vt_params(self, params):
         params = self.convert_parameters(params)
-        uri = params.get("name")
         vt_params = params.get("vt_params")
 
         # Flatten the vt_params, discarding the attributes that are not
@@ -27,26 +45,27 @@ class VTResolverUtils(DiscoveryMixIn):
             if key in vt_params:
                 del vt_params[key]
 
-        return Runnable("avocado-vt", uri, **vt_params)
+        return params.get("name"), vt_params
 
     def _get_reference_resolution(self, reference):
-        cartesian_parser = self._get_parser()
-        self._save_parser_cartesian_config(cartesian_parser)
+        cartesian_parser = self._get_base_parser()
 
         if reference != "":
             cartesian_parser.only_filter(reference)
 
+        tests = [self._parameters_to_vt_params(d) for d in cartesian_parser.get_dicts()]
+        params_list = [vt_params for _, vt_params in tests]
+        if get_opt(self.config, "vt.compact_runnables"):
+            params_list = compact_vt_params(params_list, data_dir.get_tmp_dir())
         runnables = [
-            self._parameters_to_runnable(d) for d in cartesian_parser.get_dicts()
+            Runnable("avocado-vt", uri, **vt_params)
+            for (uri, _), vt_params in zip(tests, params_list)
         ]
         if runnables:
-            if (
-                self.config.get(
-                    "run.max_parallel_tasks",
-                    self.config.get("nrunner.max_parallel_tasks", 1),
-                )
-                != 1
-            ):
+            if self.config.get(
+                "run.max_parallel_tasks",
+                self.config.get("nrunner.max_parallel_tasks", 1),
+            ) != 1 and not self.config.get("vt.parallel.enabled", False):
                 if (
                     self.config.get(
                         "run.spawner", self.config.get("nrunner.spawner", "process")
@@ -56,7 +75,8 @@ class VTResolverUtils(DiscoveryMixIn):
                     warnings.warn(
                         "The VT NextRunner can be run only "
                         "with max-parallel-tasks set to 1 with a process "
-                        "spawner, did you forget to use an LXC spawner?"
+                        "spawner, did you forget to use an LXC spawner "
+                        "or to enable vt.parallel?"
                     )
             return ReferenceResolution(
                 reference, ReferenceResolutionResult.SUCCESS, runnables
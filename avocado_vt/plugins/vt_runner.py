@@ -1,5 +1,7 @@
 import multiprocessing
+import multiprocessing.connection
 import os
+import threading
 import time
 import traceback
 
@@ -8,12 +10,14 @@ from avocado.core.test_id import TestID
 from avocado.utils import astring
 
 from avocado_vt import test
+from avocado_vt.utils import expand_vt_params
+from virttest import data_dir, utils_misc, utils_resources
 
 # Compatibility with avocado 92.0 LTS version, this can be removed when
 # the 92.0 support will be dropped.
 try:
     from avocado.core.nrunner import (
-        RUNNER_RUN_CHECK_INTERVAL,
+        RUNNER_RUN_STATUS_INTERVAL,
         BaseRunner,
         BaseRunnerApp,
     )
@@ -23,18 +27,75 @@ try:
     LTS = True
 except ImportError:
     from avocado.core.nrunner.app import BaseRunnerApp
-    from avocado.core.nrunner.runner import RUNNER_RUN_CHECK_INTERVAL, BaseRunner
+    from avocado.core.nrunner.runner import RUNNER_RUN_STATUS_INTERVAL, BaseRunner
     from avocado.core.utils import messages
 
     LTS = False
 
 
+def get_max_parallel_tasks(config):
+    """
+    Get the number of tasks the tests are executed with in parallel
+
+    :param config: avocado configuration
+    :type config: dict
+    """
+    return int(
+        config.get(
+            "run.max_parallel_tasks",
+            config.get("nrunner.max_parallel_tasks", 1),
+        )
+    )
+
+
+def is_parallel_run(config):
+    """
+    Whether the tests are executed with more than one parallel task
+
+    :param config: avocado configuration
+    :type config: dict
+    """
+    return get_max_parallel_tasks(config) != 1
+
+
+#: Size of the data sent in a single message when transferring the logdir
+LOG_TRANSFER_CHUNK_SIZE = 200000
+
+
+class MessageWriter(object):
+    """
+    Write end of the pipe the test process sends its messages through
+
+    It provides the put() of the queue used by the avocado messages, and
+    keeps the messages sent by different threads of the test apart.
+    """
+
+    def __init__(self, connection):
+        """
+        :param connection: Write end of a `multiprocessing.Pipe`
+        """
+        self._connection = connection
+        self._lock = threading.Lock()
+
+    def put(self, message):
+        with self._lock:
+            self._connection.send(message)
+
+
 class VirtTest(test.VirtTest):
     def __init__(self, queue, runnable):
         self.queue = queue
         base_logdir = getattr(runnable, "output_dir", None)
-        vt_params = runnable.kwargs
+        vt_params = expand_vt_params(runnable.kwargs)
         vt_params["job_env_cleanup"] = "no"
+        self._parallel = is_parallel_run(runnable.config)
+        if self._parallel:
+            # Concurrent tests must not share the env file with the VMs
+            # of each other
+            instance = utils_misc.generate_random_string(8)
+            self._resource_owner = "%s-%s" % (runnable.uri, instance)
+            vt_params["env"] = "env-%s" % instance
+            self._env_filename = os.path.join(data_dir.get_tmp_dir(), vt_params["env"])
         kwargs = {
             "name": TestID(1, runnable.uri),
             "config": runnable.config,
@@ -46,7 +107,12 @@ class VirtTest(test.VirtTest):
     def _save_log_dir(self):
         """
         Sends the content of vt logdir to avocado logdir
+
+        This is only needed when the runner couldn't write the logs directly
+        into the task output dir and used a temporary logdir instead.
         """
+        start = time.monotonic()
+        total_files = total_size = 0
         for root, _, files in os.walk(self.logdir, topdown=False):
             basedir = os.path.relpath(root, start=self.logdir)
             for file in files:
@@ -56,18 +122,52 @@ class VirtTest(test.VirtTest):
                     while True:
                         # Read data in manageable chunks rather than
                         # all at once.
-                        in_data = f.read(200000)
+                        in_data = f.read(LOG_TRANSFER_CHUNK_SIZE)
                         if not in_data:
                             break
+                        total_size += len(in_data)
                         self.queue.put(messages.FileMessage.get(in_data, base_path))
+                total_files += 1
+        self.queue.put(
+            messages.LogMessage.get(
+                "Transferred %d log files (%d bytes) in %.2f s\n"
+                % (total_files, total_size, time.monotonic() - start)
+            )
+        )
+
+    def _acquire_resources(self):
+        """
+        Waits until the host resources declared by the test are available
+        """
+        capacity = utils_resources.get_host_capacity(
+            self._config.get("vt.parallel.cpus", 0),
+            self._config.get("vt.parallel.mem", 0),
+        )
+        request = utils_resources.ResourceRequest.from_params(self.params)
+        self.log.debug("Requesting %s from %s", request, capacity)
+        pool = utils_resources.ResourcePool(capacity)
+        pool.acquire(
+            self._resource_owner,
+            request,
+            self._config.get("vt.parallel.acquire_timeout", 3600),
+        )
+        # Namespace of the MAC addresses, tap devices and ports of the test
+        slot = pool.get_slot(self._resource_owner)
+        slots = max(get_max_parallel_tasks(self._config), slot + 1)
+        self.params["resource_slot"] = str(slot)
+        self.params["resource_slots"] = str(slots)
+        return pool
 
     def runTest(self):
         status = "PASS"
         fail_reason = ""
         fail_class = ""
         traceback_log = ""
+        resource_pool = None
         try:
             messages.start_logging(self._config, self.queue)
+            if self._parallel:
+                resource_pool = self._acquire_resources()
             self.setUp()
             if isinstance(self.__status, Exception):
                 # pylint doesn't know much about flow-control
@@ -95,6 +195,11 @@ class VirtTest(test.VirtTest):
                 )
             self.queue.put(messages.StderrMessage.get(traceback_log))
         finally:
+            if self._parallel:
+                # Nothing else uses the env file of this test
+                test.cleanup_env(self._env_filename, self.env_version)
+            if resource_pool is not None:
+                resource_pool.release(self._resource_owner)
             self.queue.put(messages.WhiteboardMessage.get(self.whiteboard))
             if "avocado_test_" in self.logdir:
                 self._save_log_dir()
@@ -133,6 +238,12 @@ class VTTestRunner(BaseRunner):
         "core.show",
         "job.output.loglevel",
         "job.run.store_logging_stream",
+        "run.max_parallel_tasks",
+        "nrunner.max_parallel_tasks",
+        "vt.parallel.enabled",
+        "vt.parallel.cpus",
+        "vt.parallel.mem",
+        "vt.parallel.acquire_timeout",
     ]
 
     DEFAULT_TIMEOUT = 86400
@@ -142,35 +253,69 @@ class VTTestRunner(BaseRunner):
             self.runnable = runnable
 
         yield messages.StartedMessage.get()
-        if (
-            self.runnable.config.get(
-                "run.max_parallel_tasks",
-                self.runnable.config.get("nrunner.max_parallel_tasks", 1),
-            )
-            != 1
+        if is_parallel_run(self.runnable.config) and not self.runnable.config.get(
+            "vt.parallel.enabled", False
         ):
             yield messages.FinishedMessage.get(
-                "cancel", fail_reason="parallel run is not" " allowed for vt tests"
+                "cancel",
+                fail_reason="parallel run is not allowed for vt tests "
+                "unless vt.parallel.enabled is set",
             )
         else:
             try:
-                queue = multiprocessing.SimpleQueue()
-                vt_test = VirtTest(queue, self.runnable)
+                reader, writer = multiprocessing.Pipe(duplex=False)
+                vt_test = VirtTest(MessageWriter(writer), self.runnable)
                 process = multiprocessing.Process(target=vt_test.runTest)
                 process.start()
-                while True:
-                    time.sleep(RUNNER_RUN_CHECK_INTERVAL)
-                    if queue.empty():
-                        yield messages.RunningMessage.get()
-                    else:
-                        message = queue.get()
-                        yield message
-                        if message.get("status") == "finished":
-                            break
+                # Only the test process writes, the reader gets EOF once
+                # it's gone
+                writer.close()
+                for message in self._wait_messages(reader, process):
+                    yield message
             except Exception:
                 yield messages.StderrMessage.get(traceback.format_exc())
                 yield messages.FinishedMessage.get("error")
 
+    @staticmethod
+    def _wait_messages(reader, process):
+        """
+        Relays the messages of the test process until it finishes
+
+        Rather than polling for messages, this blocks until either a message
+        arrives or the test process exits, and it only reports the test as
+        running once per status interval.
+
+        :param reader: read end of the pipe of the test process messages
+        :type reader: multiprocessing.connection.Connection
+        :param process: the test process
+        :type process: multiprocessing.Process
+        """
+        waitables = [reader, process.sentinel]
+        while True:
+            ready = multiprocessing.connection.wait(
+                waitables, RUNNER_RUN_STATUS_INTERVAL
+            )
+            if not ready:
+                yield messages.RunningMessage.get()
+                continue
+            message = None
+            if reader.poll():
+                try:
+                    message = reader.recv()
+                except EOFError:
+                    pass
+            if message is not None:
+                yield message
+                if message.get("status") == "finished":
+                    break
+            else:
+                yield messages.StderrMessage.get(
+                    "Test process exited with code %s without finishing "
+                    "the test\n" % process.exitcode
+                )
+                yield messages.FinishedMessage.get("error")
+                break
+
 
 class RunnerApp(BaseRunnerApp):
     PROG_NAME = "avocado-runner-avocado-vt"
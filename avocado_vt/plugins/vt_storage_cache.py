@@ -0,0 +1,29 @@
+import logging
+import os
+import sys
+
+from avocado.core.plugin_interfaces import JobPostTests as Post
+from avocado.utils.stacktrace import log_exc_info
+
+from virttest import utils_resources
+from virttest.test_setup.storage import StorageFixtureCache
+
+
+class VTStorageFixtureCache(Post):
+
+    name = "vt-storage-fixture-cache"
+    description = "Avocado-VT cached storage fixtures teardown at the end of the job"
+
+    def __init__(self, **kwargs):
+        self.log = logging.getLogger("avocado.app")
+
+    def post_tests(self, job):
+        try:
+            cache = StorageFixtureCache()
+            if not os.path.exists(cache.state_file):
+                return
+            with utils_resources.host_lock("storage"):
+                cache.release()
+        except Exception as detail:
+            self.log.error("Failure tearing down the storage fixtures: %s", detail)
+            log_exc_info(sys.exc_info(), self.log.name)
@@ -221,6 +221,13 @@ class VirtTest(test.Test, utils.TestUtils):
         if self.__status != "PASS":
             raise self.__status  # pylint: disable=E0702
 
+    def _log_background_error(self, event):
+        """Log a background error as soon as it's reported."""
+        error = event.data
+        if isinstance(error, tuple):
+            error = error[1]
+        self.log.error("Background error reported: %s", error)
+
     def _runTest(self):
         params = self.params
         if params.get("test_pre_hook"):
@@ -273,6 +280,11 @@ class VirtTest(test.Test, utils.TestUtils):
 
         test_passed = False
         t_type = None
+        # Log the background errors when they happen, they only fail the
+        # test once verified
+        subscription = self.background_errors.subscribe(
+            error_event.ERROR, self._log_background_error
+        )
 
         try:
             try:
@@ -320,6 +332,10 @@ class VirtTest(test.Test, utils.TestUtils):
                     try:
                         params["test_passed"] = str(test_passed)
                         env_process.postprocess(self, params, env)
+                        if test_passed and self.background_errors.wait_any(0):
+                            # Failures reported while tearing down, e.g.
+                            # by a VM exiting with an error
+                            self.verify_background_errors()
                     except:  # nopep8 Old-style exceptions are not inherited from Exception()
                         if not (
                             self._config.get("vt.omit_data_loss")
@@ -334,6 +350,7 @@ class VirtTest(test.Test, utils.TestUtils):
                                 sys.exc_info()[1],
                             )
                 finally:
+                    self.background_errors.unsubscribe(subscription)
                     if (
                         self._safe_env_save(env)
                         or params.get("env_cleanup", "no") == "yes"
@@ -12,6 +12,9 @@
 # Copyright: Red Hat Inc. 2020
 # Author: Cleber Rosa <crosa@redhat.com>
 
+import functools
+import hashlib
+import json
 import logging
 import os
 import pickle
@@ -21,11 +24,14 @@ import traceback
 from avocado.core import exceptions
 from avocado.utils import genio, stacktrace
 
-from virttest import asset, bootstrap, data_dir
+from virttest import asset, bootstrap, data_dir, error_event
 from virttest._wrappers import import_module
 
 BG_ERR_FILE = "background-error.log"
 
+#: Key of the compacted vt_params pointing to the file with the shared params
+VT_PARAMS_BASE_KEY = "_vt_params_base"
+
 
 def insert_dirs_to_path(dirs):
     """Insert directories into the Python path.
@@ -125,6 +131,68 @@ def find_test_modules(test_types, subtest_dirs):
     return test_modules
 
 
+def compact_vt_params(params_list, base_dir):
+    """Split a list of vt_params into shared and per test params.
+
+    The params all the dicts have in common are stored once in a JSON file
+    in base_dir (named after its content, so identical bases are shared),
+    and each dict is replaced by its delta against the shared params plus a
+    reference to that file.  :func:`expand_vt_params` does the reverse.
+
+    :param params_list: vt_params of the tests
+    :type params_list: list of dict
+    :param base_dir: directory to write the shared params to
+    :type base_dir: str
+    :return: the compacted vt_params, in the same order
+    :rtype: list of dict
+    """
+    if len(params_list) < 2:
+        return params_list
+    base = dict(params_list[0])
+    for params in params_list[1:]:
+        for key in list(base):
+            if key not in params or params[key] != base[key]:
+                del base[key]
+    if not base:
+        return params_list
+    content = json.dumps(base, sort_keys=True)
+    base_path = os.path.join(
+        base_dir,
+        "vt_params-%s.json" % hashlib.sha1(content.encode()).hexdigest(),
+    )
+    if not os.path.exists(base_path):
+        with open(base_path, "w") as base_file:
+            base_file.write(content)
+    compacted = []
+    for params in params_list:
+        delta = dict((key, value) for key, value in params.items() if key not in base)
+        delta[VT_PARAMS_BASE_KEY] = base_path
+        compacted.append(delta)
+    return compacted
+
+
+@functools.lru_cache(maxsize=8)
+def _load_vt_params_base(base_path):
+    with open(base_path, "r") as base_file:
+        return json.load(base_file)
+
+
+def expand_vt_params(params):
+    """Rebuild the vt_params compacted by :func:`compact_vt_params`.
+
+    :param params: vt_params, compacted or not
+    :type params: dict
+    :return: the full vt_params
+    :rtype: dict
+    """
+    if VT_PARAMS_BASE_KEY not in params:
+        return params
+    params = dict(params)
+    full_params = dict(_load_vt_params_base(params.pop(VT_PARAMS_BASE_KEY)))
+    full_params.update(params)
+    return full_params
+
+
 class TestUtils:
 
     BG_ERR_FILE = "background-error.log"
@@ -191,13 +259,18 @@ class TestUtils:
         error the test.
         """
         err_file_path = os.path.join(self.logdir, BG_ERR_FILE)
-        bg_errors = self.background_errors.get_all()
+        bg_errors = self.background_errors.get_all(error_event.ERROR)
         error_messages = []
         for index, error in enumerate(bg_errors):
-            error_messages.append(
-                "- ERROR #%d -\n%s"
-                % (index, "".join(traceback.format_exception(*error)))
-            )
+            if isinstance(error, tuple):
+                error = "".join(traceback.format_exception(*error))
+            error_messages.append("- ERROR #%d -\n%s" % (index, error))
+        dropped = self.background_errors.dropped[error_event.ERROR]
+        if dropped:
+            # The bus was full, count them as errors nevertheless
+            error_messages.append("- %d more errors were dropped -" % dropped)
+            bg_errors.extend([None] * dropped)
+            self.background_errors.dropped[error_event.ERROR] = 0
         if error_messages:
             error_messages.insert(0, "BACKGROUND ERROR LIST:")
             genio.write_file(err_file_path, "\n".join(error_messages))
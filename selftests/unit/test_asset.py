@@ -0,0 +1,220 @@
+#!/usr/bin/python
+
+import hashlib
+import lzma
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http import server
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import asset
+
+
+class RangeRequestHandler(server.SimpleHTTPRequestHandler):
+    """
+    Serve files of the current directory, supporting single byte ranges
+    """
+
+    def send_head(self):
+        path = self.translate_path(self.path.replace("slow", "image"))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        size = os.path.getsize(path)
+        last_modified = self.date_time_string(int(os.path.getmtime(path)))
+        start, end = 0, size
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        self.server.requests.append((self.command, match and match.group(0)))
+        if match and int(match.group(1)) >= size:
+            self.send_error(416)
+            return None
+        if match and if_range in (None, last_modified):
+            start = int(match.group(1))
+            if match.group(2):
+                end = int(match.group(2)) + 1
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end - 1, size))
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        data = open(path, "rb")
+        data.seek(start)
+        self.range_end = end - start
+        return data
+
+    def copyfile(self, source, outputfile):
+        if self.path != "/slow":
+            outputfile.write(source.read(self.range_end))
+            return
+        # the first range is slow, the others fail
+        if source.tell():
+            return
+        try:
+            for _ in range(0, self.range_end, 64 * 1024):
+                outputfile.write(source.read(64 * 1024))
+                time.sleep(0.1)
+        except ConnectionError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.srcdir = os.path.join(self.tmpdir, "src")
+        os.mkdir(self.srcdir)
+        self.data = os.urandom(256 * 1024) * 12 + b"end"
+        with open(os.path.join(self.srcdir, "image"), "wb") as image:
+            image.write(self.data)
+        with open(os.path.join(self.srcdir, "image.xz"), "wb") as image:
+            image.write(lzma.compress(self.data))
+
+        handler = lambda *args: RangeRequestHandler(*args, directory=self.srcdir)
+        self.server = server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.requests = []
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        self.url = "http://127.0.0.1:%s/" % self.server.server_port
+        self.destination = os.path.join(self.tmpdir, "image")
+        self.min_range_size = asset.DOWNLOAD_MIN_RANGE_SIZE
+        asset.DOWNLOAD_MIN_RANGE_SIZE = 1024 * 1024
+
+    def tearDown(self):
+        asset.DOWNLOAD_MIN_RANGE_SIZE = self.min_range_size
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def _check_destination(self, sha1):
+        with open(self.destination, "rb") as destination:
+            self.assertEqual(destination.read(), self.data)
+        self.assertEqual(sha1, hashlib.sha1(self.data).hexdigest())
+        self.assertFalse(os.path.exists(self.destination + ".part"))
+
+    def test_download(self):
+        sha1 = asset.download_url(self.url + "image", self.destination)
+        self._check_destination(sha1)
+
+    def test_resume(self):
+        with open(self.destination + ".part", "wb") as part:
+            part.write(self.data[:1000])
+        sha1 = asset.download_url(self.url + "image", self.destination)
+        self._check_destination(sha1)
+
+    def _write_part(self, data, validator=None):
+        with open(self.destination + ".part", "wb") as part:
+            part.write(data)
+        if validator is None:
+            validator = server.BaseHTTPRequestHandler.date_time_string(
+                None, int(os.path.getmtime(os.path.join(self.srcdir, "image")))
+            )
+        with open(self.destination + ".part.validator", "w") as part:
+            part.write(validator)
+
+    def test_resume_changed(self):
+        # the part file of a previous version of the image
+        self._write_part(b"x" * 1000, "Thu, 01 Jan 1970 00:00:00 GMT")
+        sha1 = asset.download_url(self.url + "image", self.destination)
+        self._check_destination(sha1)
+        self.assertEqual(self.server.requests[-1], ("GET", None))
+        self.assertFalse(os.path.exists(self.destination + ".part.validator"))
+
+    def test_resume_complete(self):
+        self._write_part(self.data)
+        sha1 = asset.download_url(self.url + "image", self.destination)
+        self._check_destination(sha1)
+        self.assertEqual(self.server.requests, [("HEAD", None)])
+
+    def test_parallel_failure(self):
+        self.chunk_size = asset.DOWNLOAD_CHUNK_SIZE
+        asset.DOWNLOAD_CHUNK_SIZE = 64 * 1024
+        self.addCleanup(setattr, asset, "DOWNLOAD_CHUNK_SIZE", self.chunk_size)
+        start = time.time()
+        self.assertRaises(
+            IOError,
+            asset.download_url,
+            self.url + "slow",
+            self.destination,
+            connections=3,
+        )
+        # the slow first range was cancelled by the failing ones
+        self.assertLess(time.time() - start, 1)
+        self.assertLess(os.path.getsize(self.destination + ".part"), 1024 * 1024)
+
+    def test_corrupted(self):
+        with open(os.path.join(self.srcdir, "image.sha1"), "w") as sha1_file:
+            sha1_file.write("%s  image\n" % ("0" * 40))
+        asset_info = {
+            "url": self.url + "image",
+            "sha1_url": self.url + "image.sha1",
+            "title": "image",
+            "destination": self.destination,
+            "destination_uncompressed": None,
+            "uncompress_cmd": None,
+        }
+        self.assertRaises(IOError, asset.download_file, asset_info)
+        self.assertFalse(os.path.exists(self.destination))
+
+    def test_parallel(self):
+        received = []
+        sha1 = asset.download_url(
+            self.url + "image",
+            self.destination,
+            connections=3,
+            data_callback=received.append,
+        )
+        self._check_destination(sha1)
+        self.assertEqual(b"".join(received), self.data)
+        self.assertFalse(os.path.exists(self.destination + ".part.ranges"))
+
+    def test_uncompress_on_the_fly(self):
+        asset_info = {
+            "url": self.url + "image.xz",
+            "title": "image",
+            "destination": self.destination + ".xz",
+            "destination_uncompressed": self.destination,
+            "uncompress_cmd": None,
+        }
+        sha1, uncompressed = asset._download_asset_file(asset_info, connections=2)
+        self.assertTrue(uncompressed)
+        with open(self.destination, "rb") as destination:
+            self.assertEqual(destination.read(), self.data)
+        with open(self.destination + ".xz", "rb") as compressed:
+            self.assertEqual(sha1, hashlib.sha1(compressed.read()).hexdigest())
+
+
+class StreamDecompressorTest(unittest.TestCase):
+    def test_concatenated_streams(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            destination = os.path.join(tmpdir, "data")
+            decompressor = asset._StreamDecompressor("xz", destination, False)
+            compressed = lzma.compress(b"first ") + lzma.compress(b"second")
+            for i in range(0, len(compressed), 7):
+                decompressor.write(compressed[i : i + 7])
+            decompressor.close()
+            with open(destination, "rb") as data:
+                self.assertEqual(data.read(), b"first second")
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1374,6 +1374,23 @@ class CartesianConfigTest(unittest.TestCase):
             "testcfg.huge/test1.cfg", "testcfg.huge/test1.cfg.repr.gz"
         )
 
+    def testCopy(self):
+        configpath = os.path.join(testdatadir, "testcfg.huge/test1.cfg")
+        base = cartesian_config.Parser(configpath)
+        for variant in ("tcp", "mig_online..rdma", "early_boot_vm"):
+            fresh = cartesian_config.Parser(configpath)
+            fresh.only_filter(variant)
+            copied = base.copy()
+            copied.only_filter(variant)
+            reference = list(fresh.get_dicts())
+            self.assertTrue(reference)
+            self._checkDictionaries(copied, reference)
+            self.assertEqual(copied.only_filters, ["only %s" % variant])
+        self.assertEqual(base.only_filters, [])
+        self._checkDictionaries(
+            base, list(cartesian_config.Parser(configpath).get_dicts())
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
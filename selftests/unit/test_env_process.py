@@ -1,12 +1,23 @@
+import multiprocessing
+import os
 import re
+import shutil
 import sys
+import tempfile
+import threading
 
 if sys.version_info[:2] == (2, 6):
     import unittest2 as unittest
 else:
     import unittest
 
-from virttest.env_process import QEMU_VERSION_RE
+from virttest import env_process, utils_params, video_maker
+from virttest.env_process import (
+    QEMU_VERSION_RE,
+    _get_image_groups,
+    _get_image_workers,
+)
+from virttest.unittest_utils import mock
 
 
 class QEMUVersion(unittest.TestCase):
@@ -34,3 +45,157 @@ class QEMUVersion(unittest.TestCase):
         for version, expected in list(versions_expected.items()):
             match = re.match(QEMU_VERSION_RE, version)
             self.assertEqual(match.groups(), expected)
+
+
+class ImageGroups(unittest.TestCase):
+    def test_groups(self):
+        params = utils_params.Params(
+            {
+                "images": "image1 sn1 stg stg_alias data",
+                "image_name": "images/base",
+                "image_name_sn1": "images/sn1",
+                "image_chain_sn1": "image1 sn1",
+                "image_name_stg": "images/stg",
+                "image_name_stg_alias": "images/stg",
+                "image_name_data": "images/data",
+            }
+        )
+        images = params.objects("images")
+        groups = _get_image_groups(images, params)
+        self.assertEqual(groups, [["image1", "sn1"], ["stg", "stg_alias"], ["data"]])
+        self.assertEqual(
+            _get_image_workers(params, images, groups),
+            min(3, 2 * multiprocessing.cpu_count()),
+        )
+        params["storage_type_data"] = "lvm"
+        self.assertEqual(_get_image_workers(params, images, groups), 1)
+        params["image_process_workers"] = "2"
+        self.assertEqual(_get_image_workers(params, images, groups), 2)
+
+    def test_check_in_parallel(self):
+        params = utils_params.Params(
+            {
+                "images": "image1 sn1 stg data",
+                "image_name": "images/base",
+                "image_name_sn1": "images/sn1",
+                "image_chain_sn1": "image1 sn1",
+                "image_name_stg": "images/stg",
+                "image_name_data": "images/data",
+                "image_process_workers": "3",
+            }
+        )
+        # one check per group at the same time, the serial checks would
+        # break the barrier
+        barrier = threading.Barrier(3, timeout=10)
+        checked = []
+
+        def _check_image(test, params, image_name, vm_process_status=None):
+            if image_name != "sn1":
+                barrier.wait()
+            checked.append(image_name)
+
+        god = mock.mock_god()
+        god.stub_with(env_process, "check_image", _check_image)
+        try:
+            env_process.process(
+                None,
+                params,
+                {},
+                lambda *args: None,
+                lambda *args: None,
+                vm_first=True,
+            )
+        finally:
+            god.unstub_all()
+        self.assertEqual(sorted(checked), ["data", "image1", "sn1", "stg"])
+        # the images of a chain are checked one after the other
+        self.assertLess(checked.index("image1"), checked.index("sn1"))
+
+
+class FakeStreamEncoder(object):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.frames = []
+        self.finished = False
+
+    def add_frame(self, image):
+        if self.fail:
+            raise RuntimeError("encoding failed")
+        self.frames.append(image)
+
+    def finish(self, timeout=60):
+        self.finished = True
+
+
+class FakeVideoMaker(object):
+    def __init__(self):
+        self.encoded = []
+
+    def has_element(self, kind):
+        return True
+
+    def encode(self, input_dir, output_file):
+        self.encoded.append(input_dir)
+
+
+class FakeTest(object):
+    def __init__(self, debugdir):
+        self.debugdir = debugdir
+        self.iteration = 1
+
+
+class ScreendumpVideos(unittest.TestCase):
+    def setUp(self):
+        self.god = mock.mock_god()
+        self.tmpdir = tempfile.mkdtemp()
+        self.stream_encoders = {}
+        self.god.stub_with(
+            video_maker,
+            "get_stream_encoder",
+            lambda output_dir: (self.stream_encoders[output_dir], output_dir),
+        )
+        self.video = FakeVideoMaker()
+        self.god.stub_with(video_maker, "get_video_maker_klass", lambda: self.video)
+        self.god.stub_with(env_process, "_encoding_screendump_dirs", set())
+        self.god.stub_with(env_process, "_encoded_screendump_dirs", set())
+
+    def tearDown(self):
+        self.god.unstub_all()
+        shutil.rmtree(self.tmpdir)
+
+    def _screendump_dir(self, name):
+        screendump_dir = os.path.join(self.tmpdir, "screendumps_%s_100_iter1" % name)
+        os.mkdir(screendump_dir)
+        open(os.path.join(screendump_dir, "0001.jpg"), "w").close()
+        return screendump_dir
+
+    def test_encode_while_taken(self):
+        streamed = self._screendump_dir("vm1")
+        failed = self._screendump_dir("vm2")
+        self.stream_encoders[streamed] = FakeStreamEncoder()
+        self.stream_encoders[failed] = FakeStreamEncoder(fail=True)
+        encoders = {}
+        for image in ("frame1", "frame2"):
+            env_process._encode_video_frame(encoders, streamed, image)
+            env_process._encode_video_frame(encoders, failed, image)
+        self.assertEqual(self.stream_encoders[streamed].frames, ["frame1", "frame2"])
+        # the failed encoder isn't used anymore
+        self.assertIsNone(encoders[failed])
+        self.assertEqual(env_process._encoding_screendump_dirs, set([streamed]))
+        env_process._finish_videos(encoders)
+        self.assertTrue(self.stream_encoders[streamed].finished)
+        self.assertEqual(encoders, {})
+        self.assertEqual(env_process._encoded_screendump_dirs, set([streamed]))
+
+        # postprocess encodes only the video which failed from the files
+        env_process._encode_screendump_videos(FakeTest(self.tmpdir), {})
+        self.assertEqual(self.video.encoded, [failed])
+        self.assertEqual(env_process._encoded_screendump_dirs, set())
+
+    def test_unfinished(self):
+        screendump_dir = self._screendump_dir("vm1")
+        self.stream_encoders[screendump_dir] = FakeStreamEncoder()
+        env_process._encode_video_frame({}, screendump_dir, "frame1")
+        # the screendump thread is still finishing the video
+        env_process._encode_screendump_videos(FakeTest(self.tmpdir), {})
+        self.assertEqual(self.video.encoded, [])
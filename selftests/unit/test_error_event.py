@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from six.moves import queue
+
+from virttest import error_event
+
+
+class EventBusTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = error_event.EventBus(maxsize=3)
+
+    def test_get(self):
+        self.bus.put("error1")
+        self.bus.put("note", topic=error_event.INFO)
+        self.assertEqual(len(self.bus), 2)
+        self.assertEqual(self.bus.get(), "error1")
+        event = self.bus.get_event()
+        self.assertEqual((event.topic, event.data), (error_event.INFO, "note"))
+        self.assertFalse(event.fatal)
+        self.assertRaises(queue.Empty, self.bus.get, False)
+        self.assertRaises(queue.Empty, self.bus.get, True, 0.05)
+
+    def test_topics(self):
+        self.bus.put("error1")
+        self.bus.put("warning1", topic=error_event.WARNING)
+        self.bus.put("error2")
+        self.assertEqual(self.bus.get_all(error_event.ERROR), ["error1", "error2"])
+        self.assertEqual(self.bus.get_all(), ["warning1"])
+        self.assertRaises(
+            error_event.UnknownTopicError, self.bus.put, "x", topic="stress"
+        )
+        self.bus.add_topic("stress", fatal=True)
+        self.bus.put("x", topic="stress")
+        self.assertTrue(self.bus.fatal.is_set())
+
+    def test_drop(self):
+        for index in range(5):
+            self.bus.put("error%d" % index)
+        self.assertFalse(self.bus.put("info", topic=error_event.INFO))
+        self.assertEqual(self.bus.dropped[error_event.ERROR], 2)
+        self.assertEqual(self.bus.dropped[error_event.INFO], 1)
+        self.assertEqual(self.bus.get_all(), ["error0", "error1", "error2"])
+        self.bus.clear()
+        self.assertEqual(sum(self.bus.dropped.values()), 0)
+
+    def test_evict_non_fatal(self):
+        self.bus.put("note1", topic=error_event.INFO)
+        self.bus.put("warning1", topic=error_event.WARNING)
+        self.bus.put("note2", topic=error_event.INFO)
+        self.assertTrue(self.bus.put("error1"))
+        self.assertTrue(self.bus.put("error2"))
+        self.assertTrue(self.bus.put("note3", topic=error_event.INFO))
+        self.assertEqual(self.bus.dropped[error_event.INFO], 2)
+        self.assertEqual(self.bus.dropped[error_event.WARNING], 1)
+        self.assertEqual(self.bus.get_all(), ["error1", "error2", "note3"])
+
+    def test_dropped_fatal(self):
+        for index in range(4):
+            self.bus.put("error%d" % index)
+        self.assertEqual(len(self.bus.get_all()), 3)
+        # the failure which was dropped isn't forgotten
+        self.assertTrue(self.bus.fatal.is_set())
+        self.assertTrue(self.bus.wait_any(0))
+        self.bus.clear()
+        self.assertFalse(self.bus.fatal.is_set())
+
+    def test_put_wait_for_room(self):
+        for index in range(3):
+            self.bus.put(index)
+        timer = threading.Timer(0.1, self.bus.get)
+        timer.start()
+        self.assertTrue(self.bus.put(3, timeout=5))
+        timer.join()
+        self.assertEqual(self.bus.get_all(), [1, 2, 3])
+
+    def test_wait_any(self):
+        self.bus.put("note", topic=error_event.INFO)
+        self.assertFalse(self.bus.wait_any(0.05))
+        self.assertTrue(self.bus.wait_any(0, topics=[error_event.INFO]))
+        timer = threading.Timer(0.1, self.bus.put, ("error",))
+        start = time.time()
+        timer.start()
+        self.assertTrue(self.bus.wait_any(10))
+        self.assertLess(time.time() - start, 5)
+        timer.join()
+        self.bus.get(topic=error_event.ERROR)
+        self.assertFalse(self.bus.fatal.is_set())
+
+    def test_subscribe(self):
+        events = []
+        done = threading.Event()
+
+        def _callback(event):
+            events.append(event.data)
+            if event.data == "error2":
+                done.set()
+
+        def _broken(event):
+            raise RuntimeError("broken callback")
+
+        self.bus.subscribe(None, _broken)
+        token = self.bus.subscribe(error_event.ERROR, _callback)
+        self.bus.put("error1")
+        self.bus.put("note", topic=error_event.INFO)
+        self.bus.put("error2")
+        self.assertTrue(done.wait(5))
+        self.assertEqual(events, ["error1", "error2"])
+        # subscribers don't consume the events
+        self.assertEqual(len(self.bus), 3)
+        self.bus.unsubscribe(token)
+        self.bus.get_all()
+        self.bus.put("error3")
+        self.bus._dispatch_queue.join()
+        self.assertEqual(events, ["error1", "error2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+
+import base64
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import guest_agent
+
+
+class FakeAgent(threading.Thread):
+    """
+    Minimal guest agent serving the guest-file-* commands from a dict.
+    """
+
+    def __init__(self, sock, files):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sock = sock
+        self.files = files
+        self.handles = {}
+        self.opened = 0
+        self.max_in_flight = 0
+
+    def execute(self, cmd, args):
+        if cmd == "guest-file-open":
+            self.opened += 1
+            handle = self.opened
+            path = args["path"]
+            if "w" in args.get("mode", "r"):
+                self.files[path] = b""
+            elif path not in self.files:
+                return {"error": {"class": "GenericError", "desc": "No such file"}}
+            self.handles[handle] = [path, 0]
+            return {"return": handle}
+        path, pos = self.handles[args["handle"]]
+        if cmd == "guest-file-write":
+            data = base64.b64decode(args["buf-b64"])
+            self.files[path] += data
+            return {"return": {"count": len(data), "eof": False}}
+        if cmd == "guest-file-read":
+            data = self.files[path][pos : pos + args.get("count", 4096)]
+            self.handles[args["handle"]][1] += len(data)
+            eof = self.handles[args["handle"]][1] >= len(self.files[path])
+            return {
+                "return": {
+                    "count": len(data),
+                    "buf-b64": base64.b64encode(data).decode(),
+                    "eof": eof,
+                }
+            }
+        if cmd == "guest-file-close":
+            del self.handles[args["handle"]]
+        return {"return": {}}
+
+    def run(self):
+        buf = b""
+        while True:
+            data = self.sock.recv(65536)
+            if not data:
+                break
+            buf += data
+            lines = buf.split(b"\n")
+            buf = lines.pop()
+            self.max_in_flight = max(self.max_in_flight, len(lines))
+            for line in lines:
+                cmd = json.loads(line)
+                resp = self.execute(cmd["execute"], cmd.get("arguments", {}))
+                self.sock.sendall(json.dumps(resp).encode() + b"\n")
+
+
+class CopyFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        host_sock, agent_sock = socket.socketpair()
+        self.files = {}
+        self.fake = FakeAgent(agent_sock, self.files)
+        self.fake.start()
+        self.agent = guest_agent.QemuAgent.__new__(guest_agent.QemuAgent)
+        self.agent.name = "qga0"
+        self.agent.debug_log = False
+        self.agent._socket = host_sock
+        self.agent._lock = threading.RLock()
+        self.agent._log_lock = threading.RLock()
+        self.agent.open_log_files = {}
+        self.agent._server_closed = False
+        self.agent._supported_cmds = [None]
+        self.agent._log_lines = lambda log_str: None
+        self.src = os.path.join(self.tmpdir, "src")
+        self.data = os.urandom(300 * 1024 + 17)
+        with open(self.src, "wb") as src:
+            src.write(self.data)
+
+    def tearDown(self):
+        self.agent._socket.close()
+        self.fake.join(5)
+        shutil.rmtree(self.tmpdir)
+
+    def test_copy_to_guest(self):
+        result = self.agent.copy_to_guest(
+            self.src, "/tmp/dst", chunk_size=16 * 1024, depth=4, verify=False
+        )
+        self.assertEqual(self.files["/tmp/dst"], self.data)
+        self.assertEqual(result["size"], len(self.data))
+        self.assertEqual(result["checksum"], hashlib.sha256(self.data).hexdigest())
+        self.assertGreater(self.fake.max_in_flight, 1)
+
+    def test_copy_from_guest(self):
+        self.files["/tmp/src"] = self.data
+        dst = os.path.join(self.tmpdir, "dst")
+        result = self.agent.copy_from_guest(
+            "/tmp/src", dst, chunk_size=10000, depth=3, verify=False
+        )
+        with open(dst, "rb") as dst_file:
+            self.assertEqual(dst_file.read(), self.data)
+        self.assertEqual(result["size"], len(self.data))
+        self.assertEqual(result["checksum"], hashlib.sha256(self.data).hexdigest())
+        # The channel is still in sync after the pipelined reads
+        self.assertEqual(self.agent.guest_file_open("/tmp/src"), 2)
+
+    def test_copy_from_missing(self):
+        dst = os.path.join(self.tmpdir, "dst")
+        self.assertRaises(
+            guest_agent.VAgentCmdError,
+            self.agent.copy_from_guest,
+            "/tmp/missing",
+            dst,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
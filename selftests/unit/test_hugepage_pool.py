@@ -0,0 +1,113 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado.core import exceptions
+
+from virttest import test_setup
+
+
+class FakeHugePageConfig(object):
+    """
+    Hugepages configuration using a plain file as nr_hugepages file
+    """
+
+    def __init__(self, pages_file, target_hugepages):
+        self.pages_file = pages_file
+        self.target_hugepages = target_hugepages
+        self.hugepage_path = os.path.join(os.path.dirname(pages_file), "mnt")
+        self.suggest_mem = None
+        self.compacted = 0
+        self.session = None
+
+    def get_target_pages_files(self):
+        return {self.pages_file: self.target_hugepages}
+
+    def compact_memory(self):
+        self.compacted += 1
+
+    def mount_hugepage_fs(self):
+        pass
+
+
+class HugePagePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pages_file = os.path.join(self.tmpdir, "nr_hugepages")
+        self._set_pages(0)
+        self.pool = test_setup.HugePagePool(os.path.join(self.tmpdir, "pool.json"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _set_pages(self, pages):
+        with open(self.pages_file, "w") as pages_fd:
+            pages_fd.write(str(pages))
+
+    def _get_pages(self):
+        with open(self.pages_file) as pages_fd:
+            return int(pages_fd.read())
+
+    def test_grow_and_reuse(self):
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 512))
+        self.assertEqual(self._get_pages(), 512)
+        self.pool.unreserve()
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 256))
+        self.assertEqual(self._get_pages(), 512)
+        self.pool.unreserve()
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 1024))
+        self.assertEqual(self._get_pages(), 1024)
+        self.pool.unreserve()
+        stats = self.pool._load()["stats"]
+        self.assertEqual(stats["grown"], 2)
+        self.assertEqual(stats["reused"], 1)
+        self.pool.release()
+        self.assertEqual(self._get_pages(), 0)
+        self.assertFalse(os.path.exists(self.pool.state_file))
+
+    def test_concurrent_reservations(self):
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 512), owner=1)
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 256))
+        self.assertEqual(self._get_pages(), 768)
+        self.pool.unreserve()
+        self.assertEqual(list(self.pool._load()["reservations"]), ["1"])
+
+    def test_deferred_release(self):
+        # a test of another job still holds a reservation
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 512), owner=os.getppid())
+        self.pool.reserve(FakeHugePageConfig(self.pages_file, 256))
+        self.pool.unreserve()
+        self.assertFalse(self.pool.release())
+        self.assertEqual(self._get_pages(), 768)
+        self.pool.unreserve(owner=os.getppid())
+        self.assertEqual(self._get_pages(), 0)
+        self.assertFalse(os.path.exists(self.pool.state_file))
+
+    def test_remote(self):
+        config = FakeHugePageConfig(self.pages_file, 512)
+        config.session = object()
+        self.assertRaises(ValueError, self.pool.reserve, config)
+        self.assertEqual(self._get_pages(), 0)
+
+    def test_shortfall(self):
+        config = FakeHugePageConfig(self.pages_file, 512)
+        # the kernel only gives 100 pages
+        self.pool._write_pages = lambda path, pages: self._set_pages(min(pages, 100))
+        self.assertRaises(exceptions.TestSetupFail, self.pool.reserve, config)
+        self.assertEqual(config.compacted, 1)
+        state = self.pool._load()
+        self.assertEqual(state["stats"]["shortfalls"], 1)
+        self.assertEqual(state["reservations"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/python
+
+import logging
+import os
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import ip_sniffing
+
+TRANSACTIONS = 10000
+
+# What tcpdump -vvv prints for a DHCP ACK, as read by TcpdumpSniffer
+TCPDUMP_ACK = """\
+IP (tos 0x10, ttl 128, id 0, offset 0, flags [none], proto UDP (17), length 328)
+    192.168.122.1.67 > %(ip)s.68: [udp sum ok] BOOTP/DHCP, Reply, length 300, xid 0x1a2b3c4d, Flags [none] (0x0000)
+\t  Your-IP %(ip)s
+\t  Server-IP 192.168.122.1
+\t  Client-Ethernet-Address %(mac)s
+\t  Vendor-rfc1048 Extensions
+\t    Magic Cookie 0x63825363
+\t    DHCP-Message (53), length 1: ACK
+\t    Server-ID (54), length 4: 192.168.122.1
+\t    Lease-Time (51), length 4: 3600
+\t    Subnet-Mask (1), length 4: 255.255.255.0
+\t    BR (28), length 4: 192.168.122.255
+\t    Default-Gateway (3), length 4: 192.168.122.1
+\t    Domain-Name-Server (6), length 4: 192.168.122.1
+\t    END (255), length 0"""
+
+
+def _mac(index):
+    return "52:54:00:%02x:%02x:%02x" % (index >> 16, (index >> 8) & 0xFF, index & 0xFF)
+
+
+def _ip(index):
+    return "10.%d.%d.%d" % (index >> 16, (index >> 8) & 0xFF, index & 0xFF)
+
+
+def build_dhcp_ack(mac, ipaddr, msg_type=5):
+    bootp = struct.pack(
+        "!BBBBIHH4s4s4s4s",
+        2,
+        1,
+        6,
+        0,
+        0x1A2B3C4D,
+        0,
+        0,
+        b"\0" * 4,
+        socket.inet_aton(ipaddr),
+        socket.inet_aton("192.168.122.1"),
+        b"\0" * 4,
+    )
+    bootp += bytes(bytearray(int(b, 16) for b in mac.split(":"))).ljust(16, b"\0")
+    bootp += b"\0" * 192 + b"\x63\x82\x53\x63"
+    bootp += struct.pack("!BBB", 53, 1, msg_type) + b"\x36\x04\xc0\xa8\x7a\x01\xff"
+    udp = struct.pack("!HHHH", 67, 68, 8 + len(bootp), 0) + bootp
+    ip = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0x10,
+        20 + len(udp),
+        0,
+        0,
+        128,
+        17,
+        0,
+        socket.inet_aton("192.168.122.1"),
+        socket.inet_aton(ipaddr),
+    )
+    return ip + udp
+
+
+def build_dhcp6_reply(mac, ipaddr):
+    duid = struct.pack("!HH", 3, 1) + bytes(
+        bytearray(int(b, 16) for b in mac.split(":"))
+    )
+    iaaddr = socket.inet_pton(socket.AF_INET6, ipaddr) + struct.pack("!II", 3600, 7200)
+    ia_na = struct.pack("!III", 1, 0, 0) + struct.pack("!HH", 5, len(iaaddr)) + iaaddr
+    dhcp6 = b"\x07\x00\x00\x01"
+    dhcp6 += struct.pack("!HH", 1, len(duid)) + duid
+    dhcp6 += struct.pack("!HH", 3, len(ia_na)) + ia_na
+    udp = struct.pack("!HHHH", 547, 546, 8 + len(dhcp6), 0) + dhcp6
+    ip = struct.pack("!IHBB", 0x60000000, len(udp), 17, 64)
+    ip += socket.inet_pton(socket.AF_INET6, "fe80::1")
+    ip += socket.inet_pton(socket.AF_INET6, "fe80::5054:ff:fe00:1")
+    return ip + udp
+
+
+def write_pcap(filename, packets):
+    """Write the packets as ethernet frames in a pcap file."""
+    with open(filename, "wb") as pcap:
+        pcap.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for packet in packets:
+            ethertype = 0x86DD if packet[0] >> 4 == 6 else 0x0800
+            frame = b"\xff" * 6 + b"\x52\x54\x00\x00\x00\x01"
+            frame += struct.pack("!H", ethertype) + packet
+            pcap.write(struct.pack("<IIII", 0, 0, len(frame), len(frame)) + frame)
+
+
+class PacketSnifferTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ip_sniffing.AddrCache()
+        self.sniffer = ip_sniffing.PacketSniffer(
+            self.cache, os.path.join(self.tmpdir, "ip-sniffer.log")
+        )
+        self.log_line = ip_sniffing.log_line
+        ip_sniffing.log_line = lambda *args: None
+
+    def tearDown(self):
+        ip_sniffing.log_line = self.log_line
+        shutil.rmtree(self.tmpdir)
+
+    def test_dhcp_ack(self):
+        self.assertTrue(
+            self.sniffer.handle_packet(build_dhcp_ack(_mac(1), "192.168.122.10"))
+        )
+        self.assertEqual(self.cache[_mac(1)], "192.168.122.10")
+
+    def test_dhcp_offer(self):
+        self.assertFalse(
+            self.sniffer.handle_packet(build_dhcp_ack(_mac(1), "192.168.122.10", 2))
+        )
+        self.assertIsNone(self.cache[_mac(1)])
+
+    def test_dhcp6_reply(self):
+        packet = build_dhcp6_reply(_mac(2), "2001:DB8::10")
+        self.assertTrue(self.sniffer.handle_packet(packet))
+        self.assertEqual(self.cache["%s_6" % _mac(2)], "2001:db8::10")
+
+    def test_truncated(self):
+        packet = build_dhcp_ack(_mac(1), "192.168.122.10")
+        for length in (0, 10, 30, 100, 270):
+            self.assertFalse(self.sniffer.handle_packet(packet[:length]))
+
+    def test_replay(self):
+        pcap_file = os.path.join(self.tmpdir, "dhcp.pcap")
+        packets = []
+        for index in range(TRANSACTIONS):
+            packets.append(build_dhcp_ack(_mac(index), _ip(index)))
+        packets.append(build_dhcp6_reply(_mac(1), "2001:db8::1"))
+        write_pcap(pcap_file, packets)
+
+        start = time.time()
+        self.assertEqual(self.sniffer.replay(pcap_file), TRANSACTIONS + 1)
+        elapsed = time.time() - start
+        self.assertEqual(self.cache[_mac(TRANSACTIONS - 1)], _ip(TRANSACTIONS - 1))
+
+        # the same transactions as dissected by tcpdump
+        tcpdump = ip_sniffing.TcpdumpSniffer(ip_sniffing.AddrCache(), None)
+        lines = []
+        for index in range(TRANSACTIONS):
+            text = TCPDUMP_ACK % {"mac": _mac(index), "ip": _ip(index)}
+            lines.extend(text.splitlines())
+        start = time.time()
+        for line in lines:
+            tcpdump._output_handler(line)
+        tcpdump_elapsed = time.time() - start
+        logging.info(
+            "%d DHCP transactions: %.3fs replayed, %.3fs parsed from tcpdump",
+            TRANSACTIONS,
+            elapsed,
+            tcpdump_elapsed,
+        )
+        # the timings are informative only, they depend on the host load
+        for index in range(TRANSACTIONS):
+            self.assertEqual(self.cache[_mac(index)], tcpdump._cache[_mac(index)])
+        self.assertEqual(tcpdump._cache[_mac(TRANSACTIONS - 1)], _ip(TRANSACTIONS - 1))
+
+    @unittest.skipUnless(
+        ip_sniffing.PacketSniffer.is_supported(), "Needs packet socket access"
+    )
+    def test_sniff(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sniffer.start()
+        try:
+            self.assertTrue(self.sniffer.is_alive())
+            packet = build_dhcp_ack(_mac(3), "127.0.0.1")
+            # send the BOOTP payload to the DHCP client port over loopback
+            sock.sendto(packet[28:], ("127.0.0.1", 68))
+            for _ in range(50):
+                if self.cache[_mac(3)]:
+                    break
+                time.sleep(0.1)
+        finally:
+            sock.close()
+            self.sniffer.stop()
+        self.assertFalse(self.sniffer.is_alive())
+        self.assertEqual(self.cache[_mac(3)], "127.0.0.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ This is a unittest for qemu_qtree library.
 :author: Lukas Doktor <ldoktor@redhat.com>
 :copyright: 2012 Red Hat, Inc.
 """
+
 __author__ = """Lukas Doktor (ldoktor@redhat.com)"""
 
 import os
@@ -189,6 +190,113 @@ params = ParamsDict(
 )
 
 
+def qom_model():
+    """QOM tree of the VM from the qtree_header + dev_* 'info qtree' above"""
+    sysbus = "/machine/unattached/sysbus"
+    anon = "/machine/peripheral-anon"
+    model = {
+        "/machine": {"type": "pc-i440fx-2.0"},
+        "/machine/unattached": {"type": "container"},
+        "/machine/peripheral": {"type": "container"},
+        anon: {"type": "container"},
+        sysbus: {"type": "System", "hotplug-handler": None},
+        "/machine/unattached/device[0]": {
+            "type": "piix3-ide",
+            "parent_bus": sysbus,
+            "addr": 11,
+            "legacy-addr": "01.1",
+            "romfile": None,
+            "rombar": 1,
+            "multifunction": False,
+        },
+        "/machine/unattached/device[0]/ide.0": {
+            "type": "IDE",
+            "hotplug-handler": None,
+        },
+        "/machine/unattached/device[1]": {
+            "type": "ide-hd",
+            "parent_bus": "/machine/unattached/device[0]/ide.0",
+            "drive": "ide0-hd0",
+            "ver": "1.0.50",
+            "unit": 0,
+        },
+        "/machine/peripheral/usb1": {
+            "type": "ich9-usb-uhci1",
+            "parent_bus": sysbus,
+            "masterbus": None,
+        },
+        "/machine/peripheral/usb1/usb1.0": {"type": "USB", "hotplug-handler": None},
+        anon
+        + "/device[0]": {
+            "type": "usb-hub",
+            "parent_bus": "/machine/peripheral/usb1/usb1.0",
+        },
+        "/machine/peripheral/usb-tablet1": {
+            "type": "usb-tablet",
+            "parent_bus": "/machine/peripheral/usb1/usb1.0",
+        },
+        anon
+        + "/device[1]": {
+            "type": "usb-storage",
+            "parent_bus": "/machine/peripheral/usb1/usb1.0",
+            "drive": "",
+            "removable": False,
+        },
+        anon + "/device[1]/scsi.0": {"type": "SCSI", "hotplug-handler": None},
+        anon
+        + "/device[2]": {
+            "type": "scsi-disk",
+            "parent_bus": anon + "/device[1]/scsi.0",
+            "drive": "usb2.6",
+            "lun": 0,
+        },
+        "/machine/unattached/device[3]": {
+            "type": "fw_cfg",
+            "parent_bus": sysbus,
+            "ctl_iobase": 0x510,
+        },
+    }
+    return model
+
+
+class FakeQOMMonitor(object):
+    """QMP monitor answering qom-list and qom-get from a dict QOM model"""
+
+    def __init__(self, model):
+        self.model = model
+        self.batches = 0
+        self.device_generation = 0
+
+    def _qom_list(self, path):
+        if path not in self.model:
+            return {"error": {"class": "DeviceNotFound"}}
+        props = []
+        for name, value in self.model[path].items():
+            if name in ("parent_bus", "hotplug-handler"):
+                props.append({"name": name, "type": "link<qdev>"})
+            elif name != "type":
+                props.append({"name": name, "type": "str"})
+        props.append({"name": "type", "type": "string"})
+        for child in self.model:
+            parent, name = child.rsplit("/", 1)
+            if parent == path:
+                child_type = self.model[child].get("type", "object")
+                props.append({"name": name, "type": "child<%s>" % child_type})
+        props.append({"name": "mr", "type": "child<qemu:memory-region>"})
+        return {"return": props}
+
+    def cmd_batch(self, cmds, timeout=None, debug=True):
+        self.batches += 1
+        responses = []
+        for cmd, args in cmds:
+            if cmd == "qom-list":
+                responses.append(self._qom_list(args["path"]))
+            else:
+                value = self.model[args["path"]][args["property"]]
+                responses.append({"return": value})
+        return responses
+
+
 class QtreeContainerTest(unittest.TestCase):
     """QtreeContainer tests"""
 
@@ -255,6 +363,77 @@ class QtreeContainerTest(unittest.TestCase):
         info = combine(qtree_header, "Very_bad_line", 1)
         self.assertRaises(ValueError, qtree.parse_info_qtree, info)
 
+    def test_qom(self):
+        """QOM built qtree matches the 'info qtree' one"""
+        info = qtree_header
+        info = combine(info, dev_ide_disk, 1)
+        info = combine(info, dev_usb_disk, 1)
+        info = combine(info, dev_dummy_mmio, 1)
+        info += "\n"
+        text = qemu_qtree.QtreeContainer()
+        text.parse_info_qtree(info)
+        qom = qemu_qtree.QtreeContainer()
+        qom.parse_qom(FakeQOMMonitor(qom_model()))
+
+        def _summary(nodes):
+            return sorted(
+                (
+                    type(node).__name__,
+                    node.get_qtree().get("type"),
+                    node.get_qtree().get("id"),
+                    node.get_qtree().get("drive"),
+                )
+                for node in nodes
+            )
+
+        self.assertEqual(_summary(qom.get_nodes()), _summary(text.get_nodes()))
+        root = qom.get_qtree()
+        self.assertEqual(root.get_qtree()["id"], "main-system-bus")
+        self.assertEqual(len(root.get_children()), 3)
+        ide_hd = [
+            node for node in qom.get_nodes() if node.get_qtree()["type"] == "ide-hd"
+        ][0]
+        self.assertEqual(ide_hd.get_qtree()["ver"], '"1.0.50"')
+        self.assertEqual(ide_hd.get_parent().get_qtree()["id"], "ide.0")
+        piix = ide_hd.get_parent().get_parent()
+        self.assertEqual(piix.get_qtree()["addr"], "01.1")
+        self.assertEqual(piix.get_qtree()["multifunction"], "off")
+        self.assertEqual(piix.get_qtree()["romfile"], "<null>")
+
+    def test_qom_cache(self):
+        """QOM data is reused until a device is hotplugged"""
+        model = qom_model()
+        monitor = FakeQOMMonitor(model)
+        qtree = qemu_qtree.QtreeContainer()
+        qtree.parse_qom(monitor)
+        walked = monitor.batches
+        qtree.parse_qom(monitor)
+        # Only the peripheral listing was re-read
+        self.assertEqual(monitor.batches, walked + 1)
+        self.assertEqual(len(qtree.get_nodes()), 12)
+
+        model["/machine/peripheral/hotplug1"] = {
+            "type": "usb-tablet",
+            "parent_bus": "/machine/peripheral/usb1/usb1.0",
+        }
+        monitor.batches = 0
+        qtree.parse_qom(monitor)
+        self.assertEqual(monitor.batches, walked)
+        self.assertEqual(len(qtree.get_nodes()), 13)
+
+        # Replaced by a device of another type with the same id
+        model["/machine/peripheral/hotplug1"]["type"] = "usb-kbd"
+        qtree.parse_qom(monitor)
+        types = [node.get_qtree().get("type") for node in qtree.get_nodes()]
+        self.assertIn("usb-kbd", types)
+        # Unplugged and plugged again with the same id and type
+        model["/machine/peripheral/hotplug1"]["type"] = "usb-tablet"
+        qtree.parse_qom(monitor)
+        monitor.batches = 0
+        monitor.device_generation = 2
+        qtree.parse_qom(monitor)
+        self.assertEqual(monitor.batches, walked)
+
 
 class QtreeDiskContainerTest(unittest.TestCase):
     """QtreeDiskContainer tests"""
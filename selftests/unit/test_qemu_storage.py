@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import qemu_storage
+
+FAKE_QEMU_IMG = """#!/bin/sh
+echo "$@" >> %s
+echo "usage: qemu-img $1 [-U] filename"
+"""
+
+
+class QemuImgHelpTextTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.calls_file = os.path.join(self.tmpdir, "calls")
+        self.image_cmd = os.path.join(self.tmpdir, "qemu-img")
+        self._write_binary()
+
+    def tearDown(self):
+        qemu_storage._qemu_img_help_cache.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _write_binary(self, status=0):
+        with open(self.image_cmd, "w") as binary:
+            binary.write(FAKE_QEMU_IMG % self.calls_file)
+            binary.write("exit %d\n" % status)
+        os.chmod(self.image_cmd, 0o755)
+
+    def _calls(self):
+        with open(self.calls_file) as calls:
+            return calls.read().splitlines()
+
+    def test_cached(self):
+        for _ in range(3):
+            self.assertEqual(
+                qemu_storage.get_qemu_img_help_text(self.image_cmd, "info"),
+                "usage: qemu-img info [-U] filename\n",
+            )
+            qemu_storage.get_qemu_img_help_text(self.image_cmd, "check")
+        self.assertEqual(self._calls(), ["info -h", "check -h"])
+
+    def test_binary_updated(self):
+        qemu_storage.get_qemu_img_help_text(self.image_cmd, "info")
+        mtime = os.stat(self.image_cmd).st_mtime + 1
+        os.utime(self.image_cmd, (time.time(), mtime))
+        qemu_storage.get_qemu_img_help_text(self.image_cmd, "info")
+        self.assertEqual(self._calls(), ["info -h", "info -h"])
+
+    def test_cache_dir(self):
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        help_text = qemu_storage.get_qemu_img_help_text(
+            self.image_cmd, "info", cache_dir
+        )
+        # as seen by another process
+        qemu_storage._qemu_img_help_cache.clear()
+        self.assertEqual(
+            qemu_storage.get_qemu_img_help_text(self.image_cmd, "info", cache_dir),
+            help_text,
+        )
+        self.assertEqual(self._calls(), ["info -h"])
+
+    def test_failure_not_cached(self):
+        self._write_binary(status=1)
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        for _ in range(2):
+            self.assertEqual(
+                qemu_storage.get_qemu_img_help_text(self.image_cmd, "info", cache_dir),
+                "usage: qemu-img info [-U] filename\n",
+            )
+        self.assertEqual(self._calls(), ["info -h", "info -h"])
+        self.assertFalse(os.path.exists(cache_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
 #!/usr/bin/python
 
 import os
+import shutil
+import socket
 import sys
+import tempfile
+import threading
 import unittest
 
 # simple magic for using scripts within a source tree
@@ -10,6 +14,7 @@ if os.path.isdir(os.path.join(basedir, "virttest")):
     sys.path.append(basedir)
 
 from virttest import data_dir, remote
+from virttest.unittest_utils import mock
 
 
 class RemoteFileTest(unittest.TestCase):
@@ -93,5 +98,63 @@ class RemoteFileTest(unittest.TestCase):
         self.assertEqual(test_data, self.default_data)
 
 
+class ProbeSSHServerTest(unittest.TestCase):
+    def _serve(self, banner):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+
+        def accept():
+            conn, _ = server.accept()
+            if banner:
+                conn.sendall(banner)
+            conn.close()
+            server.close()
+
+        threading.Thread(target=accept, daemon=True).start()
+        return server.getsockname()[1]
+
+    def test_banner(self):
+        port = self._serve(b"SSH-2.0-OpenSSH_8.7\r\n")
+        self.assertTrue(remote.probe_ssh_server("127.0.0.1", port))
+
+    def test_no_banner(self):
+        port = self._serve(b"")
+        self.assertFalse(remote.probe_ssh_server("127.0.0.1", port))
+
+    def test_refused(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        self.assertFalse(remote.probe_ssh_server("127.0.0.1", port))
+
+
+class SSHMuxTest(unittest.TestCase):
+    def setUp(self):
+        self.god = mock.mock_god()
+        self.cmds = []
+        self.god.stub_with(
+            remote.process, "run", lambda cmd, **kwargs: self.cmds.append(cmd)
+        )
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.god.unstub_all()
+        shutil.rmtree(self.tmpdir)
+
+    def test_close(self):
+        control_dir = os.path.join(self.tmpdir, "mux")
+        self.assertIn(control_dir, remote.get_ssh_mux_options(control_dir))
+        open(os.path.join(control_dir, "0123abcd"), "w").close()
+        remote.close_ssh_mux(control_dir)
+        self.assertFalse(os.path.exists(control_dir))
+        self.assertEqual(len(self.cmds), 1)
+        self.assertIn("ControlPath=%s/0123abcd -O exit" % control_dir, self.cmds[0])
+        # nothing to close
+        remote.close_ssh_mux(control_dir)
+        self.assertEqual(len(self.cmds), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
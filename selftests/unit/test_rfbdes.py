@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+import logging
+import os
+import random
+import sys
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import RFBDes
+
+
+def reverse_bits(data):
+    return bytes(int("{:08b}".format(b)[::-1], 2) for b in bytearray(data))
+
+
+class ReferenceDes(RFBDes.Des):
+    """
+    The former per bit implementation, working on lists of bits
+    """
+
+    def create_Kn(self):
+        key = []
+        for c in self.getKey():
+            key += [(ord(c) >> (7 - i)) & 1 for i in range(8)]
+        key = self.get_sub_list(self.PC1, key)
+        left, right = key[:28], key[28:]
+        self.bit_Kn = []
+        for rotations in self.left_rotations:
+            left = left[rotations:] + left[:rotations]
+            right = right[rotations:] + right[:rotations]
+            self.bit_Kn.append(self.get_sub_list(self.PC2, left + right))
+
+    def f(self, right, subkey):
+        bits = [x ^ y for x, y in zip(self.get_sub_list(self.E, right), subkey)]
+        out = []
+        for j in range(8):
+            b = bits[j * 6 : j * 6 + 6]
+            m = (b[0] << 1) + b[5]
+            n = (b[1] << 3) + (b[2] << 2) + (b[3] << 1) + b[4]
+            v = self.sbox[j][(m << 4) + n]
+            out += [(v >> 3) & 1, (v >> 2) & 1, (v >> 1) & 1, v & 1]
+        return self.get_sub_list(self.P, out)
+
+    def crypt_block(self, block, crypt_type=0):
+        bits = [(block >> (63 - i)) & 1 for i in range(64)]
+        bits = self.get_sub_list(self.IP, bits)
+        left, right = bits[:32], bits[32:]
+        subkeys = self.bit_Kn if crypt_type == 0 else self.bit_Kn[::-1]
+        for subkey in subkeys:
+            f = self.f(right, subkey)
+            left, right = right, [x ^ y for x, y in zip(left, f)]
+        result = 0
+        for bit in self.get_sub_list(self.FP, right + left):
+            result = (result << 1) | bit
+        return result
+
+
+class DesTest(unittest.TestCase):
+    # (key, plaintext, ciphertext) of the usual DES examples, the RFB
+    # variant reverses the bits of each key byte
+    VECTORS = [
+        ("133457799BBCDFF1", "0123456789ABCDEF", "85E813540F0AB405"),
+        ("0E329232EA6D0D73", "8787878787878787", "0000000000000000"),
+        ("0123456789ABCDEF", "4E6F772069732074", "3FA40E8A984D4815"),
+    ]
+
+    def _get_des(self, cls, key):
+        des = cls(key)
+        des.use_cryptography = False
+        des._cipher = None
+        return des
+
+    def test_vectors(self):
+        for key, plain, cipher in self.VECTORS:
+            des = self._get_des(RFBDes.Des, reverse_bits(bytes.fromhex(key)))
+            self.assertEqual(des.crypt(bytes.fromhex(plain)).hex().upper(), cipher)
+            self.assertEqual(des.crypt(bytes.fromhex(cipher), 1).hex().upper(), plain)
+
+    def test_reference(self):
+        rand = random.Random(0)
+        for _ in range(50):
+            key = "".join(chr(rand.randrange(256)) for _ in range(rand.randrange(9)))
+            data = "".join(chr(rand.randrange(256)) for _ in range(16))
+            des = self._get_des(RFBDes.Des, key)
+            ref = self._get_des(ReferenceDes, key)
+            self.assertEqual(des.crypt(data), ref.crypt(data))
+            self.assertEqual(des.crypt(data, 1), ref.crypt(data, 1))
+            bits = [(ord(data[i // 8]) >> (7 - i % 8)) & 1 for i in range(64)]
+            self.assertEqual(des.des_crypt(bits), ref.des_crypt(bits))
+
+    def test_vnc_challenge(self):
+        # str in, str out, as used for the VNC authentication challenge
+        challenge = "".join(chr(c) for c in range(240, 256))
+        response = RFBDes.Des("password").crypt(challenge)
+        self.assertIsInstance(response, str)
+        self.assertEqual(len(response), 16)
+        self.assertEqual(RFBDes.Des("password").crypt(response, 1), challenge)
+        self.assertRaises(ValueError, RFBDes.Des("password").crypt, "short")
+
+    @unittest.skipIf(RFBDes.TripleDES is None, "cryptography not installed")
+    def test_cryptography(self):
+        data = bytes(bytearray(range(64)))
+        des = RFBDes.Des(b"secret")
+        self.assertEqual(
+            des.crypt(data), self._get_des(RFBDes.Des, b"secret").crypt(data)
+        )
+
+    def test_benchmark(self):
+        data = bytes(bytearray(range(16)))
+        timings = {}
+        responses = {}
+        for cls in (ReferenceDes, RFBDes.Des):
+            responses[cls.__name__] = []
+            start = time.time()
+            for _ in range(100):
+                response = self._get_des(cls, "password").crypt(data)
+                responses[cls.__name__].append(response)
+            timings[cls.__name__] = (time.time() - start) / 100
+        logging.info(
+            "VNC authentication: %.1fus per bit, %.1fus table driven",
+            timings["ReferenceDes"] * 1e6,
+            timings["Des"] * 1e6,
+        )
+        # the timings are informative only, they depend on the host load
+        self.assertEqual(responses["Des"], responses["ReferenceDes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
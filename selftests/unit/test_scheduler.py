@@ -0,0 +1,136 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import scheduler
+from virttest.utils_resources import ResourceRequest
+
+
+def two_nodes():
+    return [
+        scheduler.HostNode(0, range(0, 4), 4096, 4096),
+        scheduler.HostNode(1, range(4, 8), 4096, 4096),
+    ]
+
+
+class HostNodesTest(unittest.TestCase):
+    def test_sysfs(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for node_id, cpulist in ((0, "0-3,8\n"), (1, "4-7\n")):
+                node_dir = os.path.join(tmpdir, "node%d" % node_id)
+                os.makedirs(node_dir)
+                with open(os.path.join(node_dir, "cpulist"), "w") as cpus:
+                    cpus.write(cpulist)
+                with open(os.path.join(node_dir, "meminfo"), "w") as meminfo:
+                    meminfo.write("Node %d MemTotal:  8388608 kB\n" % node_id)
+                for size, pages in (("2048kB", 512 * node_id), ("1048576kB", 1)):
+                    pages_dir = os.path.join(node_dir, "hugepages", "hugepages-" + size)
+                    os.makedirs(pages_dir)
+                    with open(os.path.join(pages_dir, "nr_hugepages"), "w") as nr:
+                        nr.write("%d\n" % pages)
+            nodes = scheduler.get_host_nodes(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual([node.node_id for node in nodes], [0, 1])
+        self.assertEqual(nodes[0].cpu_ids, [0, 1, 2, 3, 8])
+        self.assertEqual(nodes[0].capacity, ResourceRequest(5, 8192, 1024))
+        self.assertEqual(nodes[1].capacity, ResourceRequest(4, 8192, 2048))
+
+    def test_no_numa(self):
+        nodes = scheduler.get_host_nodes("/nonexistent")
+        self.assertEqual(len(nodes), 1)
+        self.assertGreater(nodes[0].capacity.cpus, 0)
+
+
+class ResourceSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.resources = scheduler.ResourceScheduler(two_nodes(), ["0000:01:00.0"])
+
+    def test_pack(self):
+        first = self.resources.place("test1", ResourceRequest(2, 1024))
+        self.assertEqual(first.node_ids, [0])
+        self.assertEqual(first.cpu_ids, [0, 1])
+        self.assertEqual(
+            first.get_params(), {"host_cpus": "0,1", "host_numa_nodes": "0"}
+        )
+        # The fullest node which has room is used
+        second = self.resources.place("test2", ResourceRequest(2, 1024))
+        self.assertEqual(second.node_ids, [0])
+        self.assertEqual(second.cpu_ids, [2, 3])
+        third = self.resources.place("test3", ResourceRequest(4, 1024))
+        self.assertEqual(third.node_ids, [1])
+        self.assertIsNone(self.resources.place("test4", ResourceRequest(1, 512)))
+        self.resources.release("test2")
+        self.assertEqual(
+            self.resources.place("test4", ResourceRequest(1, 512)).cpu_ids, [2]
+        )
+
+    def test_spread(self):
+        self.resources.place("test1", ResourceRequest(2, 1024))
+        placement = self.resources.place("test2", ResourceRequest(5, 2048))
+        self.assertEqual(placement.node_ids, [0, 1])
+        self.assertEqual(placement.cpu_ids, [2, 4, 5, 6, 7])
+        self.assertIsNone(self.resources.place("test3", ResourceRequest(2, 128)))
+
+    def test_oversized(self):
+        placement = self.resources.place("test1", ResourceRequest(16, 1024))
+        self.assertEqual(len(placement.cpu_ids), 8)
+        self.assertIsNone(self.resources.place("test2", ResourceRequest(1, 128)))
+        self.resources.release("test1")
+        self.assertEqual(self.resources.utilization()["cpus"], 0.0)
+
+    def test_devices(self):
+        device = ResourceRequest(1, 128, devices=["0000:01:00.0"])
+        self.assertTrue(self.resources.place("test1", device))
+        self.assertIsNone(self.resources.place("test2", device))
+        self.assertFalse(self.resources.fits(device))
+        self.assertTrue(self.resources.fits(device, ignore=["test1"]))
+        other = ResourceRequest(1, 128, devices=["0000:02:00.0"])
+        self.assertIsNone(self.resources.place("test3", other))
+
+    def test_hugepages(self):
+        nodes = [scheduler.HostNode(0, range(0, 4), 4096, 0)] + two_nodes()[1:]
+        resources = scheduler.ResourceScheduler(nodes)
+        # only the node with allocated hugepages has room
+        placement = resources.place("test1", ResourceRequest(1, 1024, 1024))
+        self.assertEqual(placement.node_ids, [1])
+
+    def test_utilization(self):
+        self.resources.place("test1", ResourceRequest(2, 2048, 1024))
+        metrics = self.resources.utilization()
+        self.assertEqual(metrics["cpus"], 0.25)
+        self.assertEqual(metrics["mem"], 0.25)
+        self.assertEqual(metrics["hugepage_mem"], 0.125)
+        self.assertEqual(metrics["nodes"][0]["cpus"], 0.5)
+        self.assertEqual(metrics["nodes"][1]["cpus"], 0.0)
+        self.assertEqual(metrics["tests"], 1)
+
+    def test_test_request(self):
+        self.assertEqual(
+            scheduler.get_test_request({"used_cpus": "2", "used_mem": "256"}),
+            ResourceRequest(2, 256),
+        )
+        request = scheduler.get_test_request(
+            {
+                "vms": "vm1",
+                "smp": "2",
+                "mem": "1024",
+                "vm_hostdevs": "hostdev1",
+                "vm_hostdev_host_hostdev1": "0000:01:00.0",
+            }
+        )
+        self.assertEqual(request, ResourceRequest(2, 1024, devices=["0000:01:00.0"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado.core import exceptions
+
+from virttest import utils_params, utils_resources
+from virttest.test_setup import storage
+
+
+class LogicalVolume(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeLVM(object):
+    def __init__(self, params, existing):
+        self.params = params
+        self.existing = existing
+        self.trash = []
+        self.removed = []
+
+    def get_vol(self, name, vtype):
+        return LogicalVolume(name) if (vtype, name) in self.existing else None
+
+    def setup(self):
+        lv = ("lvs", self.params["lv_name"])
+        if lv not in self.existing:
+            self.existing.add(lv)
+            self.trash.append(LogicalVolume(lv[1]))
+        return "/dev/vg/%s" % lv[1]
+
+    def cleanup(self):
+        for vol in self.trash:
+            self.existing.discard(("lvs", vol.name))
+            self.removed.append(vol.name)
+
+
+class FakeLVMdev(object):
+    existing = set()
+    instances = []
+
+    def __init__(self, params, root_dir, tag):
+        self.lvmdevice = FakeLVM(params, self.existing)
+        self.instances.append(self)
+
+    def setup(self):
+        return self.lvmdevice.setup()
+
+    def cleanup(self):
+        self.lvmdevice.cleanup()
+
+
+class FakeEnv(dict):
+    def register_lvmdev(self, name, lvmdev):
+        self[name] = lvmdev
+
+    def get_lvmdev(self, name):
+        return self[name]
+
+    def unregister_lvmdev(self, name):
+        del self[name]
+
+
+class StorageFixtureCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.lock_dir = utils_resources.get_lock_dir
+        utils_resources.get_lock_dir = lambda: self.tmpdir
+        self.lvmdev = storage.LVMdev
+        storage.LVMdev = FakeLVMdev
+        FakeLVMdev.existing = set()
+        FakeLVMdev.instances = []
+        self.reset = storage.StorageFixtureCache.reset_device
+        self.resets = []
+        storage.StorageFixtureCache.reset_device = (
+            lambda cache, device, mode: self.resets.append((device, mode))
+        )
+
+    def tearDown(self):
+        storage.StorageFixtureCache.reset_device = self.reset
+        storage.LVMdev = self.lvmdev
+        utils_resources.get_lock_dir = self.lock_dir
+        shutil.rmtree(self.tmpdir)
+
+    def _get_config(self, lv_name):
+        params = utils_params.Params(
+            {
+                "storage_type": "lvm",
+                "storage_fixture_cache": "yes",
+                "storage_fixture_timeout": "0.1",
+                "main_vm": "vm1",
+                "lv_name": lv_name,
+                "image_size": "1G",
+                "remote_pwd": "secret",
+            }
+        )
+        return storage.StorageConfig(None, params, FakeEnv())
+
+    def _run_test(self, lv_name):
+        config = self._get_config(lv_name)
+        config.setup()
+        config.cleanup()
+        return config.params
+
+    def test_reuse_and_release(self):
+        params = self._run_test("lv1")
+        self.assertEqual(params["image_name"], "/dev/vg/lv1")
+        self._run_test("lv1")
+        self._run_test("lv2")
+        # cleanup of the tests kept the volumes, the second test reset lv1
+        self.assertEqual(FakeLVMdev.existing, set([("lvs", "lv1"), ("lvs", "lv2")]))
+        self.assertEqual(self.resets, [("/dev/vg/lv1", "discard")])
+
+        cache = storage.StorageFixtureCache()
+        self.assertTrue(os.path.exists(cache.state_file))
+        state = cache._load()
+        self.assertEqual(sorted(f["uses"] for f in state.values()), [1, 2])
+        cache.release()
+        self.assertEqual(FakeLVMdev.existing, set())
+        self.assertFalse(os.path.exists(cache.state_file))
+
+    def test_in_use(self):
+        config = self._get_config("lv1")
+        config.setup()
+        cache = storage.StorageFixtureCache()
+        key = cache.get_key(self._get_config("lv1").params)
+        self.assertEqual(cache.get_holders(key), [os.getpid()])
+        # the device of a running test is neither reset nor shared
+        cache.unregister(key)
+        cache.register(key, config.params, 0, holder=os.getppid())
+        self.assertRaises(exceptions.TestSetupFail, self._run_test, "lv1")
+        self.assertEqual(self.resets, [])
+        # the holders which are gone are forgotten
+        cache.unregister(key, os.getppid())
+        cache.register(key, config.params, 0, holder=2**22 + 1)
+        self._run_test("lv1")
+        self.assertEqual(self.resets, [("/dev/vg/lv1", "discard")])
+        self.assertEqual(cache.get_holders(key), [])
+
+    def test_state_file(self):
+        self._run_test("lv1")
+        cache = storage.StorageFixtureCache()
+        self.assertEqual(os.stat(cache.state_file).st_mode & 0o777, 0o600)
+        (fixture,) = cache._load().values()
+        self.assertEqual(fixture["params"]["lv_name"], "lv1")
+        self.assertNotIn("remote_pwd", fixture["params"])
+        self.assertNotIn("main_vm", fixture["params"])
+
+    def test_key(self):
+        params = {"storage_type": "lvm", "lv_name": "lv1", "mem": "1024"}
+        key = storage.StorageFixtureCache.get_key(params)
+        params["mem"] = "2048"
+        self.assertEqual(storage.StorageFixtureCache.get_key(params), key)
+        params["lv_name"] = "lv2"
+        self.assertNotEqual(storage.StorageFixtureCache.get_key(params), key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import syslog_server
+
+CLIENTS = 20
+MESSAGES = 2000
+
+
+class SyslogFramerTest(unittest.TestCase):
+    def test_octet_counting(self):
+        framer = syslog_server.SyslogFramer()
+        stream = b"13 <6>kernel: a\n12 <6>kernel: b"
+        messages = []
+        for index in range(len(stream)):
+            messages.extend(framer.feed(stream[index : index + 1]))
+        self.assertEqual(messages, [b"<6>kernel: a\n", b"<6>kernel: b"])
+        self.assertEqual(framer.close(), [])
+
+    def test_non_transparent(self):
+        framer = syslog_server.SyslogFramer()
+        self.assertEqual(framer.feed(b"<6>a\n<6>b\0<6"), [b"<6>a", b"<6>b"])
+        self.assertEqual(framer.feed(b">c\n\n8 <6>d 123"), [b"<6>c", b"<6>d 123"])
+        self.assertEqual(framer.feed(b"<6>e"), [])
+        self.assertEqual(framer.close(), [b"<6>e"])
+
+
+class SyslogServerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.terminate = threading.Event()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        self.server = threading.Thread(
+            target=syslog_server.syslog_server,
+            args=("127.0.0.1", self.port, True, self.terminate.is_set, self.tmpdir),
+        )
+        self.server.start()
+        time.sleep(0.2)
+
+    def tearDown(self):
+        self.terminate.set()
+        self.server.join()
+        shutil.rmtree(self.tmpdir)
+
+    def _send(self, count):
+        sock = socket.create_connection(("127.0.0.1", self.port))
+        data = []
+        for index in range(count):
+            message = b"<4>kernel: message %d" % index
+            data.append(b"%d %s" % (len(message), message))
+        sock.sendall(b"".join(data))
+        sock.close()
+
+    def test_load(self):
+        # an idle client must not block the others
+        idle = socket.create_connection(("127.0.0.1", self.port))
+        clients = [
+            threading.Thread(target=self._send, args=(MESSAGES,))
+            for _ in range(CLIENTS)
+        ]
+        start = time.time()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        filename = os.path.join(self.tmpdir, "syslog-127.0.0.1.log")
+        expected = CLIENTS * MESSAGES
+
+        def _count():
+            if not os.path.exists(filename):
+                return 0
+            with open(filename) as log_file:
+                return sum(1 for _ in log_file)
+
+        while _count() < expected and time.time() - start < 30:
+            time.sleep(0.05)
+        idle.close()
+        self.assertEqual(_count(), expected)
+        with open(filename) as log_file:
+            self.assertEqual(
+                log_file.readline(),
+                "[AutotestSyslog (kern.warning)] kernel: message 0\n",
+            )
+
+    def test_close_with_clients(self):
+        # the server and writer threads
+        threads = threading.active_count() - 2
+        client = socket.create_connection(("127.0.0.1", self.port))
+        client.sendall(b"<4>kernel: last message\n")
+        time.sleep(0.2)
+        self.terminate.set()
+        self.server.join(10)
+        self.assertFalse(self.server.is_alive())
+        # the handler of the connected client is gone with the server
+        self.assertEqual(threading.active_count(), threads)
+        client.close()
+        with open(os.path.join(self.tmpdir, "syslog-127.0.0.1.log")) as log_file:
+            self.assertEqual(
+                log_file.read(),
+                "[AutotestSyslog (kern.warning)] kernel: last message\n",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import utils_build_cache, utils_params
+
+
+class FakeGuest(object):
+    """
+    Guest file system kept in a dict, with just enough of a shell.
+    """
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.cmds = []
+
+    def cmd_status(self, cmd):
+        self.cmds.append(cmd)
+        return 0
+
+    def cmd_status_output(self, cmd):
+        self.cmds.append(cmd)
+        if cmd.startswith("which "):
+            name = cmd.split()[1]
+            for path in self.files:
+                if os.path.basename(path) == name:
+                    return 0, path + "\n"
+            return 1, ""
+        if cmd.endswith("--version 2>&1"):
+            return 0, "tool 1.2.3\n"
+        return 1, ""
+
+    def push(self, local_path, guest_path):
+        with open(local_path, "rb") as local:
+            self.files[guest_path] = local.read()
+
+    def pull(self, guest_path, local_path):
+        with open(local_path, "wb") as local:
+            local.write(self.files[guest_path])
+
+
+class BuildCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = utils_build_cache.BuildCache(os.path.join(self.tmpdir, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_hash_source(self):
+        src = os.path.join(self.tmpdir, "src")
+        os.makedirs(os.path.join(src, ".git"))
+        with open(os.path.join(src, "main.c"), "w") as source:
+            source.write("int main() { return 0; }")
+        digest = utils_build_cache.hash_source(src)
+        with open(os.path.join(src, ".git", "index"), "w") as index:
+            index.write("changed")
+        self.assertEqual(utils_build_cache.hash_source(src), digest)
+        with open(os.path.join(src, "main.c"), "a") as source:
+            source.write("\n")
+        self.assertNotEqual(utils_build_cache.hash_source(src), digest)
+
+    def test_get_key(self):
+        key = self.cache.get_key("netperf", "abc", "x86_64-fedora-40", "-O2")
+        self.assertEqual(
+            key, self.cache.get_key("netperf", "abc", "x86_64-fedora-40", "-O2")
+        )
+        self.assertNotEqual(
+            key, self.cache.get_key("netperf", "abc", "aarch64-fedora-40", "-O2")
+        )
+        self.assertNotEqual(
+            key, self.cache.get_key("netperf", "abc", "x86_64-fedora-40")
+        )
+
+    def test_store_install(self):
+        key = self.cache.get_key("tool", "abc", "x86_64")
+        builder = FakeGuest({"/usr/local/bin/tool": b"\x7fELF"})
+        guest = FakeGuest()
+        self.assertIsNone(self.cache.install(key, guest.push, guest.cmd_status))
+        self.cache.store(key, "tool", builder.pull, ["/usr/local/bin/tool"])
+        self.assertEqual(
+            self.cache.install(key, guest.push, guest.cmd_status),
+            ["/usr/local/bin/tool"],
+        )
+        self.assertEqual(guest.files, builder.files)
+        self.assertIn("chmod 755 /usr/local/bin/tool", guest.cmds)
+
+    def test_store_failure(self):
+        key = self.cache.get_key("tool", "abc", "x86_64")
+        builder = FakeGuest()
+        self.cache.store(key, "tool", builder.pull, ["/usr/local/bin/tool"])
+        self.assertIsNone(self.cache.lookup(key))
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.cache._get_entry_dir(key))), []
+        )
+
+    def test_find_tool(self):
+        guest = FakeGuest({"/usr/bin/tool": b""})
+        self.assertEqual(
+            utils_build_cache.find_tool(guest.cmd_status_output, "tool"),
+            "/usr/bin/tool",
+        )
+        self.assertEqual(
+            utils_build_cache.find_tool(guest.cmd_status_output, "tool", "1.2.3"),
+            "/usr/bin/tool",
+        )
+        self.assertIsNone(
+            utils_build_cache.find_tool(guest.cmd_status_output, "tool", "2.0")
+        )
+        self.assertIsNone(utils_build_cache.find_tool(guest.cmd_status_output, "other"))
+
+    def test_get_build_cache(self):
+        params = utils_params.Params({})
+        self.assertIsNone(utils_build_cache.get_build_cache(params))
+        params["guest_tool_build_cache"] = "yes"
+        params["guest_tool_build_cache_dir"] = self.tmpdir
+        self.assertEqual(
+            utils_build_cache.get_build_cache(params).cache_dir, self.tmpdir
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,7 @@ import os
 import sys
 import unittest
 
-from avocado.utils import path
+from avocado.utils import path, process
 
 # simple magic for using scripts within a source tree
 basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -78,5 +78,113 @@ class SlotsCheckTest(unittest.TestCase):
             logging.warning("Command guestfish not present, skipping " "unittest...")
 
 
+class FakeGuestfishPersistent(object):
+    instances = []
+
+    def __init__(self):
+        self.commands = []
+        self.closed = False
+        self.ignore_status = True
+        self.instances.append(self)
+
+    def set_ignore_status(self, ignore_status):
+        self.ignore_status = bool(ignore_status)
+
+    def _result(self, cmd, stdout=""):
+        self.commands.append(cmd)
+        return process.CmdResult(cmd, stdout, "", 0)
+
+    def add_drive_opts(self, filename, readonly=False):
+        return self._result("add-drive-opts %s readonly:%s" % (filename, readonly))
+
+    def run(self):
+        return self._result("launch")
+
+    def inspect_os(self):
+        return self._result("inspect-os", "/dev/sda2\n")
+
+    def inspect_get_mountpoints(self, root):
+        return self._result("inspect-get-mountpoints", "/boot: /dev/sda1\n/: %s" % root)
+
+    def mount(self, device, mountpoint):
+        return self._result("mount %s %s" % (device, mountpoint))
+
+    def mount_ro(self, device, mountpoint):
+        return self._result("mount-ro %s %s" % (device, mountpoint))
+
+    def ping_daemon(self):
+        return self._result("ping-daemon")
+
+    def close_session(self):
+        self.closed = True
+
+
+class GuestfishPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.orig_class = lgf.GuestfishPersistent
+        lgf.GuestfishPersistent = FakeGuestfishPersistent
+        FakeGuestfishPersistent.instances = []
+        self.pool = lgf.GuestfishPool()
+
+    def tearDown(self):
+        lgf.GuestfishPersistent = self.orig_class
+
+    def test_reuse(self):
+        gf = self.pool.get("/tmp/a.img", readonly=True)
+        self.assertIs(self.pool.get(["/tmp/a.img"], readonly=True), gf)
+        self.assertEqual(
+            gf.commands[:5],
+            [
+                "add-drive-opts /tmp/a.img readonly:True",
+                "launch",
+                "inspect-os",
+                "inspect-get-mountpoints",
+                "mount-ro /dev/sda2 /",
+            ],
+        )
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["launches"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_mode_and_conflicts(self):
+        ro_a = self.pool.get("/tmp/a.img", readonly=True)
+        ro_b = self.pool.get("/tmp/b.img", readonly=True)
+        rw_a = self.pool.get("/tmp/a.img")
+        self.assertIsNot(ro_a, rw_a)
+        self.assertTrue(ro_a.closed)
+        self.assertFalse(ro_b.closed)
+        self.assertIn("mount /dev/sda2 /", rw_a.commands)
+
+    def test_ignore_status(self):
+        with self.pool.session("/tmp/a.img", True, ignore_status=True) as gf:
+            self.assertTrue(gf.ignore_status)
+        self.assertFalse(gf.ignore_status)
+        gf.set_ignore_status(True)
+        self.assertFalse(self.pool.get("/tmp/a.img", readonly=True).ignore_status)
+
+    def test_invalidate(self):
+        gf_a = self.pool.get("/tmp/a.img", readonly=True)
+        gf_ab = self.pool.get(["/tmp/a.img", "/tmp/b.img"], readonly=True)
+        gf_c = self.pool.get("/tmp/c.img", readonly=True)
+        self.pool.invalidate("/tmp/b.img")
+        self.assertFalse(gf_a.closed)
+        self.assertTrue(gf_ab.closed)
+        self.assertIsNot(self.pool.get(["/tmp/a.img", "/tmp/b.img"], True), gf_ab)
+        self.pool.close()
+        self.assertTrue(gf_a.closed and gf_c.closed)
+        self.assertEqual(self.pool.get_stats()["invalidations"], 1)
+
+    def test_invalidate_pool_of_process(self):
+        # no pool is created for nothing
+        lgf.invalidate_guestfish_pool()
+        self.assertIsNone(lgf._guestfish_pool)
+        gf = lgf.get_guestfish_pool().get("/tmp/a.img", readonly=True)
+        try:
+            lgf.invalidate_guestfish_pool()
+            self.assertTrue(gf.closed)
+        finally:
+            lgf.close_guestfish_pool()
+
+
 if __name__ == "__main__":
     unittest.main()
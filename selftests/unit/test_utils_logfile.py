@@ -0,0 +1,178 @@
+#!/usr/bin/python
+
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import utils_logfile
+
+
+class ReferenceLogger(object):
+    """
+    The former log_line(): a locked, flushed write per line
+    """
+
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.files = {}
+        self.lock = threading.RLock()
+
+    def log_line(self, filename, line):
+        with self.lock:
+            timestr = time.strftime("%Y-%m-%d %H:%M:%S")
+            log_file = os.path.realpath(os.path.join(self.log_dir, filename))
+            if log_file not in self.files:
+                self.files[log_file] = open(log_file, "a")
+            self.files[log_file].write("%s: %s\n" % (timestr, line))
+            self.files[log_file].flush()
+
+    def close(self):
+        for log_fd in self.files.values():
+            log_fd.close()
+
+
+def _log_in_child(filename):
+    utils_logfile.log_line(filename, "child")
+
+
+class LogLineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log_file_dir = utils_logfile.get_log_file_dir()
+        utils_logfile.set_log_file_dir(self.tmpdir)
+
+    def tearDown(self):
+        utils_logfile.close_log_file()
+        utils_logfile.set_log_file_dir(self.log_file_dir)
+        shutil.rmtree(self.tmpdir)
+
+    def _read_lines(self, filename):
+        with open(os.path.join(self.tmpdir, filename)) as log_file:
+            return [line.split(": ", 1)[1].rstrip("\n") for line in log_file]
+
+    def test_flush(self):
+        utils_logfile.log_line("test.log", "first")
+        utils_logfile.log_line("test.log", "second")
+        utils_logfile.flush_log_file()
+        self.assertEqual(self._read_lines("test.log"), ["first", "second"])
+        self.assertEqual(
+            utils_logfile.get_match_count(
+                os.path.join(self.tmpdir, "test.log"), "second"
+            ),
+            1,
+        )
+
+    def test_close(self):
+        utils_logfile.log_line("test.log", "line")
+        utils_logfile.close_log_file("test.log")
+        self.assertEqual(self._read_lines("test.log"), ["line"])
+        # reopened on the next line
+        utils_logfile.log_line("test.log", "another line")
+        utils_logfile.close_log_file()
+        self.assertEqual(self._read_lines("test.log"), ["line", "another line"])
+
+    def test_concurrent_sources(self):
+        def log_lines(source):
+            for i in range(500):
+                utils_logfile.log_line(
+                    "source-%d.log" % (source % 4), "%d %d" % (source, i)
+                )
+
+        threads = [threading.Thread(target=log_lines, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        utils_logfile.close_log_file()
+
+        for log_index in range(4):
+            lines = self._read_lines("source-%d.log" % log_index)
+            self.assertEqual(len(lines), 4 * 500)
+            for source in range(log_index, 16, 4):
+                source_lines = [
+                    line for line in lines if line.startswith("%d " % source)
+                ]
+                self.assertEqual(
+                    source_lines, ["%d %d" % (source, i) for i in range(500)]
+                )
+
+    def test_reader_not_delayed(self):
+        flush_interval = utils_logfile.FLUSH_INTERVAL
+        # a writer waiting for the periodic flush would miss the deadline
+        utils_logfile.FLUSH_INTERVAL = 60
+        try:
+            time.sleep(2 * flush_interval)
+            utils_logfile.log_line("serial.log", "login:")
+            start = time.time()
+            while time.time() - start < 30 and not self._read_lines("serial.log"):
+                time.sleep(0.001)
+        finally:
+            utils_logfile.FLUSH_INTERVAL = flush_interval
+        self.assertEqual(self._read_lines("serial.log"), ["login:"])
+
+    def test_fork(self):
+        utils_logfile.log_line("test.log", "parent")
+        process = multiprocessing.get_context("fork").Process(
+            target=_log_in_child, args=("test.log",)
+        )
+        process.start()
+        process.join(10)
+        utils_logfile.close_log_file()
+        # the parent's line is neither lost nor written twice
+        self.assertEqual(sorted(self._read_lines("test.log")), ["child", "parent"])
+
+    def test_benchmark(self):
+        def log_lines(log_func, source):
+            for i in range(2000):
+                log_func("source-%d.log" % (source % 4), "line %d of %d" % (i, source))
+
+        rates = {}
+        contents = {}
+        for name in ("reference", "log_line"):
+            log_dir = os.path.join(self.tmpdir, name)
+            os.mkdir(log_dir)
+            if name == "reference":
+                reference = ReferenceLogger(log_dir)
+                log_func = reference.log_line
+            else:
+                utils_logfile.set_log_file_dir(log_dir)
+                log_func = utils_logfile.log_line
+            threads = [
+                threading.Thread(target=log_lines, args=(log_func, i))
+                for i in range(16)
+            ]
+            start = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            utils_logfile.flush_log_file()
+            rates[name] = 16 * 2000 / (time.time() - start)
+            contents[name] = {}
+            for log_index in range(4):
+                filename = os.path.join(name, "source-%d.log" % log_index)
+                contents[name][log_index] = sorted(self._read_lines(filename))
+        reference.close()
+        logging.info(
+            "16 sources logging to 4 files: %d lines/s, %d lines/s locked "
+            "and flushed per line",
+            rates["log_line"],
+            rates["reference"],
+        )
+        # the rates are informative only, they depend on the host load
+        self.assertEqual(contents["log_line"], contents["reference"])
+
+
+if __name__ == "__main__":
+    unittest.main()
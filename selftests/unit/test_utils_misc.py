@@ -1,9 +1,14 @@
 #!/usr/bin/python
 
+import hashlib
 import os
+import shutil
 import sys
 import tempfile
+import threading
+import time
 import unittest
+import zlib
 
 from avocado.utils import process
 
@@ -265,5 +270,163 @@ class TestNumaNode(unittest.TestCase):
         os.unlink(self.online_nodes_path)
 
 
+class TestWaitFor(unittest.TestCase):
+    def setUp(self):
+        utils_misc.clear_wait_stats()
+
+    def test_timeout(self):
+        self.assertIsNone(utils_misc.wait_for(lambda: False, 0.3, step=0.1))
+        stats = list(utils_misc.get_wait_stats().values())
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]["calls"], 1)
+        self.assertEqual(stats[0]["timeouts"], 1)
+        self.assertGreaterEqual(stats[0]["attempts"], 3)
+
+    def test_backoff(self):
+        attempts = []
+        utils_misc.wait_for(lambda: attempts.append(1), 1.2, step=0.1, max_step=0.4)
+        # 0.1 + 0.2 + 0.4 + 0.4 ... instead of one attempt every 0.1s
+        self.assertLess(len(attempts), 6)
+
+    def test_wake_on_event(self):
+        event = threading.Event()
+        timer = threading.Timer(0.1, event.set)
+        timer.start()
+        start = time.time()
+        self.assertTrue(utils_misc.wait_for(event.is_set, 10, step=5, wake_on=[event]))
+        self.assertLess(time.time() - start, 4)
+
+    def test_wake_on_fd(self):
+        read_fd, write_fd = os.pipe()
+        try:
+            timer = threading.Timer(0.1, os.write, (write_fd, b"x"))
+            timer.start()
+            start = time.time()
+            func = lambda: os.read(read_fd, 1) if timer.finished.is_set() else None
+            self.assertEqual(
+                utils_misc.wait_for(func, 10, step=5, wake_on=[read_fd]), b"x"
+            )
+            self.assertLess(time.time() - start, 4)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_wake_on_path(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "ready")
+            timer = threading.Timer(0.1, lambda: open(path, "w").close())
+            timer.start()
+            start = time.time()
+            self.assertTrue(
+                utils_misc.wait_for(
+                    lambda: os.path.exists(path), 10, step=5, wake_on=[path]
+                )
+            )
+            self.assertLess(time.time() - start, 4)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_wake_on_path_only(self):
+        tmpdir = tempfile.mkdtemp()
+        attempts = []
+        try:
+            path = os.path.join(tmpdir, "ready")
+            other = os.path.join(tmpdir, "other")
+            timer = threading.Timer(0.1, lambda: open(other, "w").close())
+            timer.start()
+            utils_misc.wait_for(lambda: attempts.append(1), 0.5, step=5, wake_on=[path])
+            timer.join()
+        finally:
+            shutil.rmtree(tmpdir)
+        # the other files of the directory don't wake it up
+        self.assertEqual(len(attempts), 1)
+
+    def test_wake_on_path_changed_by_func(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "ready")
+
+            def _func():
+                if os.path.exists(path):
+                    return True
+                open(path, "w").close()
+
+            start = time.time()
+            self.assertTrue(utils_misc.wait_for(_func, 10, step=5, wake_on=[path]))
+            self.assertLess(time.time() - start, 4)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_lock_file_keeps_content(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "lock")
+            with open(path, "w") as lock:
+                lock.write("owner\n")
+            utils_misc.unlock_file(utils_misc.lock_file(path))
+            with open(path) as lock:
+                self.assertEqual(lock.read(), "owner\n")
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestDataFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "data")
+        # Not a multiple of the chunk size on purpose
+        self.size = 3 * 1024 * 1024 + 5
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_generate(self):
+        seed, digest = utils_misc.generate_data_file(self.path, self.size, 42)
+        self.assertEqual(seed, 42)
+        self.assertEqual(os.path.getsize(self.path), self.size)
+        with open(self.path, "rb") as data_file:
+            data = data_file.read()
+        self.assertEqual(hashlib.md5(data).hexdigest(), digest)
+        # Pseudo-random data must not compress
+        self.assertGreater(len(zlib.compress(data[: 1024 * 1024])), 1000 * 1024)
+        path = os.path.join(self.tmpdir, "again")
+        self.assertEqual(
+            utils_misc.generate_data_file(path, self.size, 42), (42, digest)
+        )
+        self.assertNotEqual(
+            utils_misc.generate_data_file(path, self.size, 43)[1], digest
+        )
+
+    def test_zero(self):
+        _, digest = utils_misc.generate_data_file(self.path, self.size, pattern="zero")
+        self.assertEqual(digest, hashlib.md5(bytes(self.size)).hexdigest())
+        self.assertEqual(os.path.getsize(self.path), self.size)
+
+    def test_verify(self):
+        seed, digest = utils_misc.generate_data_file(self.path, self.size)
+        self.assertEqual(
+            utils_misc.verify_data_file(self.path, self.size, seed), (digest, None)
+        )
+        with open(self.path, "r+b") as data_file:
+            data_file.seek(2 * 1024 * 1024 + 3)
+            data_file.write(b"corrupted")
+        self.assertEqual(
+            utils_misc.verify_data_file(self.path, self.size, seed)[1],
+            2 * 1024 * 1024 + 3,
+        )
+
+    def test_verify_size(self):
+        seed, _ = utils_misc.generate_data_file(self.path, self.size)
+        self.assertEqual(
+            utils_misc.verify_data_file(self.path, self.size + 1, seed)[1],
+            self.size,
+        )
+        self.assertEqual(
+            utils_misc.verify_data_file(self.path, self.size - 1, seed)[1],
+            self.size - 1,
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/python
+
+import os
+import sys
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import utils_netperf
+
+KEYVAL_OUTPUT = """\
+netperf -H 192.168.122.10 -P 0 -D 1 -- -k THROUGHPUT,THROUGHPUT_UNITS
+Interim result: 9012.34 10^6bits/s over 1.000 seconds ending at 1697.001
+Interim result: 9100.00 10^6bits/s over 1.001 seconds ending at 1698.002
+THROUGHPUT=9056.17
+THROUGHPUT_UNITS=10^6bits/s
+THROUGHPUT=8000.5
+THROUGHPUT_UNITS=10^6bits/s
+[root@localhost ~]# """
+
+CSV_OUTPUT = """\
+Throughput,Throughput Units,Mean Latency Microseconds
+9056.17,10^6bits/s,12.50
+8000.50,10^6bits/s,14.00
+"""
+
+
+class NetperfResultTest(unittest.TestCase):
+    def _feed_in_chunks(self, result, output, size):
+        for index in range(0, len(output), size):
+            result.feed(output[index : index + size])
+        result.close()
+
+    def test_keyval(self):
+        interims = []
+        result = utils_netperf.NetperfResult(interim_callback=interims.append)
+        self._feed_in_chunks(result, KEYVAL_OUTPUT, 7)
+        self.assertEqual(
+            result.records,
+            [
+                {"THROUGHPUT": 9056.17, "THROUGHPUT_UNITS": "10^6bits/s"},
+                {"THROUGHPUT": 8000.5, "THROUGHPUT_UNITS": "10^6bits/s"},
+            ],
+        )
+        self.assertEqual(result.values("THROUGHPUT"), [9056.17, 8000.5])
+        self.assertEqual(interims, result.interims)
+        self.assertEqual(interims[1], (9100.0, "10^6bits/s", 1.001, 1698.002))
+
+    def test_interim_before_close(self):
+        result = utils_netperf.NetperfResult()
+        result.feed(KEYVAL_OUTPUT[:150])
+        self.assertEqual(len(result.interims), 1)
+        self.assertEqual(result.records, [])
+
+    def test_csv(self):
+        selectors = ["THROUGHPUT", "THROUGHPUT_UNITS", "MEAN_LATENCY"]
+        result = utils_netperf.NetperfResult(selectors)
+        self._feed_in_chunks(result, CSV_OUTPUT, 5)
+        self.assertEqual(result.values("MEAN_LATENCY"), [12.5, 14.0])
+        self.assertEqual(result.records[0]["THROUGHPUT_UNITS"], "10^6bits/s")
+
+
+class FakeSession(object):
+    """Shell session echoing the command and printing the output in chunks"""
+
+    prompt = r"^root@.*[\#\$]\s*$|"
+
+    def __init__(self, output, chunk_size=5):
+        self.output = output
+        self.chunk_size = chunk_size
+        self.chunks = []
+
+    def sendline(self, cmd):
+        data = cmd + "\n" + self.output + "__NETPERF_DONE_0\n[root@host ~]# "
+        self.chunks = [
+            data[index : index + self.chunk_size]
+            for index in range(0, len(data), self.chunk_size)
+        ]
+
+    def read_nonblocking(self, internal_timeout=None, timeout=None):
+        return self.chunks.pop(0) if self.chunks else ""
+
+
+class StreamCmdTest(unittest.TestCase):
+    def test_default_prompt(self):
+        output = KEYVAL_OUTPUT.split("\n", 1)[1].rsplit("\n", 1)[0] + "\n"
+        client = utils_netperf.NetperfClient.__new__(utils_netperf.NetperfClient)
+        client.client = "ssh"
+        # The marker is split across reads with the small chunks
+        for chunk_size in (5, 4096):
+            client.session = FakeSession(output, chunk_size)
+            result = utils_netperf.NetperfResult()
+            streamed = client._stream_cmd("netperf -H 192.168.1.10", result.feed, 10)
+            result.close()
+            self.assertTrue(streamed.endswith(output))
+            self.assertNotIn("__NETPERF_DONE_0", streamed)
+            self.assertEqual(result.values("THROUGHPUT"), [9056.17, 8000.5])
+            self.assertEqual(len(result.interims), 2)
+
+
+class ResultStatsTest(unittest.TestCase):
+    def test_summary(self):
+        stats = utils_netperf.ResultStats([10, 20, 30, 40])
+        summary = stats.summary()
+        self.assertEqual(summary["count"], 4)
+        self.assertAlmostEqual(summary["mean"], 25.0)
+        self.assertAlmostEqual(summary["sum"], 100.0)
+        self.assertAlmostEqual(summary["stdev"], 12.9099444874)
+        self.assertAlmostEqual(summary["cv"], 0.5163977795)
+        self.assertAlmostEqual(summary["p50"], 25.0)
+        self.assertAlmostEqual(summary["p90"], 37.0)
+        self.assertEqual((summary["min"], summary["max"]), (10.0, 40.0))
+
+    def test_empty(self):
+        summary = utils_netperf.ResultStats().summary()
+        self.assertEqual(summary["count"], 0)
+        self.assertEqual(summary["cv"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 #!/usr/bin/python
 
+import logging
 import os
 import sys
+import time
 import unittest
 from collections import OrderedDict
 
@@ -69,6 +71,19 @@ CORRECT_RESULT_MAPPING = {
 }
 
 
+def reference_object_params(params, obj_name):
+    """
+    The former Params.object_params(), copying and scanning all the params
+    """
+    suffix = "_" + obj_name
+    new_dict = utils_params.Params(params.data)
+    for key in list(new_dict.keys()):
+        if key.endswith(suffix):
+            new_key = key.split(suffix)[0]
+            new_dict[new_key] = new_dict[key]
+    return new_dict
+
+
 class TestParams(unittest.TestCase):
     def setUp(self):
         self.params = utils_params.Params(BASE_DICT)
@@ -82,6 +97,69 @@ class TestParams(unittest.TestCase):
                 self.params.object_params(key), CORRECT_RESULT_MAPPING[key]
             )
 
+    def testObjectParamsIsolation(self):
+        stg_params = self.params.object_params("stg")
+        stg_params["image_size"] = "1G"
+        del stg_params["image_name_stg"]
+        self.params["image_raw_device"] = "yes"
+        self.assertEqual(stg_params["image_size"], "1G")
+        self.assertEqual(stg_params["image_raw_device"], "no")
+        self.assertNotIn("image_name_stg", stg_params)
+        self.assertEqual(self.params["image_size"], "10G")
+        self.assertEqual(self.params["image_name_stg"], "enospc")
+        self.assertEqual(self.params.object_params("stg")["image_raw_device"], "yes")
+
+    def testObjectParamsInvalidation(self):
+        self.assertEqual(self.params.object_params("stg")["image_size"], "10G")
+        self.params["image_size_stg"] = "1G"
+        self.assertEqual(self.params.object_params("stg")["image_size"], "1G")
+
+    def testObjectParamsNested(self):
+        self.params["image_size_stg_vm1"] = "1G"
+        vm_params = self.params.object_params("vm1")
+        stg_params = vm_params.object_params("stg")
+        self.assertEqual(stg_params["image_size"], "1G")
+        self.assertEqual(stg_params["image_name"], "enospc")
+        self.assertEqual(self.params.object_params("stg")["image_size"], "10G")
+
+    def test_benchmark(self):
+        images = ["image%d" % index for index in range(64)]
+        data = {"images": " ".join(images)}
+        for image in images:
+            for index in range(48):
+                data["image_option%d_%s" % (index, image)] = image
+        params = utils_params.Params(data)
+        self.assertGreater(len(params), 3000)
+
+        def build(object_params):
+            values = []
+            start = time.time()
+            for _ in range(10):
+                for image in params.objects("images"):
+                    image_params = object_params(params, image)
+                    values.append(
+                        [image_params["image_option%d" % index] for index in range(6)]
+                    )
+            duration = time.time() - start
+            images_params = [
+                dict(object_params(params, image)) for image in params.objects("images")
+            ]
+            return duration, values, images_params
+
+        reference, reference_values, reference_params = build(reference_object_params)
+        duration, values, images_params = build(utils_params.Params.object_params)
+        logging.info(
+            "object_params() of 64 images over %d keys, 10 times: %.3fs, "
+            "%.3fs copying and scanning the params",
+            len(params),
+            duration,
+            reference,
+        )
+        # the durations are informative only, they depend on the host load
+        self.assertEqual(values, reference_values)
+        self.assertEqual(values[0], ["image0"] * 6)
+        self.assertEqual(images_params, reference_params)
+
     def testGetItemMissing(self):
         try:
             self.params["bogus"]
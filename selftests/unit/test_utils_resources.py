@@ -0,0 +1,117 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import utils_params, utils_resources
+
+
+class ResourceRequestTest(unittest.TestCase):
+    def test_from_params(self):
+        params = utils_params.Params(
+            {
+                "vms": "vm1 vm2",
+                "smp": "2",
+                "mem": "1024",
+                "smp_vm2": "4",
+                "hugepage_vm2": "yes",
+            }
+        )
+        request = utils_resources.ResourceRequest.from_params(params)
+        self.assertEqual(request, utils_resources.ResourceRequest(6, 2048, 1024))
+
+    def test_from_params_explicit(self):
+        params = utils_params.Params(
+            {"vms": "vm1", "smp": "2", "mem": "1024", "resource_cpus": "1"}
+        )
+        request = utils_resources.ResourceRequest.from_params(params)
+        self.assertEqual(request, utils_resources.ResourceRequest(1, 1024, 0))
+
+    def test_compare(self):
+        small = utils_resources.ResourceRequest(1, 512, 0)
+        big = utils_resources.ResourceRequest(2, 1024, 512)
+        self.assertTrue(small <= big)
+        self.assertFalse(big <= small)
+        self.assertEqual(small + small, utils_resources.ResourceRequest(2, 1024, 0))
+
+    def test_port_range(self):
+        params = {"resource_slot": "1", "resource_slots": "4"}
+        self.assertEqual(
+            utils_resources.get_port_range(params, 5000, 5900), (5225, 5450)
+        )
+        self.assertEqual(utils_resources.get_port_range({}, 5000, 5900), (5000, 5900))
+        params = {"resource_slot": "1", "resource_slots": "200"}
+        self.assertEqual(
+            utils_resources.get_port_range(params, 8000, 8100), (8000, 8100)
+        )
+
+
+class ResourcePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.lock_dir = utils_resources.get_lock_dir
+        utils_resources.get_lock_dir = lambda: self.tmpdir
+        capacity = utils_resources.ResourceRequest(4, 4096, 2048)
+        self.pool = utils_resources.ResourcePool(capacity)
+
+    def tearDown(self):
+        utils_resources.get_lock_dir = self.lock_dir
+        shutil.rmtree(self.tmpdir)
+
+    def test_acquire_release(self):
+        request = utils_resources.ResourceRequest(2, 2048, 0)
+        self.assertTrue(self.pool.try_acquire("test1", request))
+        self.assertTrue(self.pool.try_acquire("test2", request))
+        self.assertFalse(self.pool.try_acquire("test3", request))
+        self.assertEqual(self.pool.used(), utils_resources.ResourceRequest(4, 4096, 0))
+        self.pool.release("test1")
+        self.assertTrue(self.pool.try_acquire("test3", request))
+
+    def test_devices(self):
+        request = utils_resources.ResourceRequest(1, 128, devices=["0000:01:00.0"])
+        self.assertTrue(self.pool.try_acquire("test1", request))
+        self.assertFalse(self.pool.try_acquire("test2", request))
+        self.assertEqual(self.pool.used().devices, ["0000:01:00.0"])
+        self.pool.release("test1")
+        self.assertTrue(self.pool.try_acquire("test2", request))
+
+    def test_oversized_request(self):
+        request = utils_resources.ResourceRequest(8, 1024, 0)
+        self.assertTrue(self.pool.try_acquire("test1", request))
+        self.assertFalse(self.pool.try_acquire("test2", request))
+
+    def test_slots(self):
+        request = utils_resources.ResourceRequest(1, 512, 0)
+        for owner in ("test1", "test2", "test3"):
+            self.assertTrue(self.pool.try_acquire(owner, request))
+        self.assertEqual(self.pool.get_slot("test2"), 1)
+        self.pool.release("test2")
+        self.assertIsNone(self.pool.get_slot("test2"))
+        # the slot of a finished test is reused
+        self.assertTrue(self.pool.try_acquire("test4", request))
+        self.assertEqual(self.pool.get_slot("test4"), 1)
+        self.assertEqual(self.pool.get_slot("test3"), 2)
+
+    def test_acquire_timeout(self):
+        request = utils_resources.ResourceRequest(4, 1024, 0)
+        self.pool.acquire("test1", request)
+        self.assertRaises(
+            utils_resources.ResourceUnavailableError,
+            self.pool.acquire,
+            "test2",
+            request,
+            0.2,
+            0.1,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado.core import exceptions
+
+from virttest import utils_test
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.alive = True
+        self.cmds = []
+
+    def cmd_status_output(self, cmd, timeout=None):
+        self.cmds.append(cmd)
+        if cmd == "hang":
+            raise RuntimeError("timed out")
+        time.sleep(0.01)
+        return 0, "%s done\n" % cmd
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.alive = False
+
+
+class FakeVM(object):
+    def __init__(self):
+        self.name = "vm1"
+        self.params = {"guest_session_pool_size": "2"}
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def wait_for_login(self, timeout=None):
+        with self.lock:
+            self.sessions.append(FakeSession())
+            return self.sessions[-1]
+
+
+class GuestSessionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.vm = FakeVM()
+        self.pool = utils_test.get_guest_session_pool(self.vm)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_jobs(self):
+        jobs = [self.pool.submit_cmd("job %d" % index) for index in range(20)]
+        for job in jobs:
+            self.assertTrue(job.join(10))
+        self.assertEqual(jobs[3].status, 0)
+        self.assertEqual(jobs[3].output, "job 3 done\n")
+        self.assertIsNotNone(jobs[3].duration)
+        # Two logins for all the jobs, run on both sessions
+        self.assertEqual(len(self.vm.sessions), 2)
+        self.assertEqual(sum(len(s.cmds) for s in self.vm.sessions), 20)
+        self.assertIs(utils_test.get_guest_session_pool(self.vm), self.pool)
+
+    def test_function(self):
+        def _fail():
+            raise ValueError("failed")
+
+        job = self.pool.submit(_fail)
+        self.assertRaises(ValueError, job.join, 10)
+        self.assertTrue(self.pool.submit(lambda x: x * 2, 21).join(10))
+        job = self.pool.submit(lambda x: x * 2, 21)
+        job.join(10)
+        self.assertEqual(job.status, 42)
+        self.assertFalse(job.is_alive())
+
+    def test_relogin(self):
+        session = self.pool.acquire()
+        session.close()
+        self.pool.release(session)
+        self.pool.acquire()
+        session = self.pool.acquire()
+        self.assertTrue(session.is_alive())
+        self.assertEqual(len(self.vm.sessions), 3)
+        self.assertRaises(exceptions.TestError, self.pool.acquire, 0.1)
+        self.pool.release(session)
+
+    def test_broken_session(self):
+        job = self.pool.submit_cmd("hang")
+        self.assertRaises(RuntimeError, job.join, 10)
+        (broken,) = [s for s in self.vm.sessions if "hang" in s.cmds]
+        self.assertFalse(broken.is_alive())
+        session = self.pool.acquire()
+        self.assertRaises(RuntimeError, session.cmd_status_output, "hang")
+        self.pool.release(session, broken=True)
+        self.assertFalse(session.is_alive())
+        for _ in range(2):
+            self.assertTrue(self.pool.acquire().is_alive())
+        self.assertEqual(len(self.vm.sessions), 4)
+
+    def test_close_sessions_in_use(self):
+        session = self.pool.acquire()
+        self.pool.close()
+        self.assertFalse(session.is_alive())
+
+    def test_vm_gone(self):
+        vm = FakeVM()
+        pool = utils_test.get_guest_session_pool(vm)
+        self.assertEqual(pool.run("cmd"), (0, "cmd done\n"))
+        sessions = vm.sessions
+        del vm
+        self.assertTrue(pool.closed)
+        self.assertIsNone(pool.vm)
+        self.assertFalse(any(s.is_alive() for s in sessions))
+
+    def test_close_all(self):
+        utils_test.close_guest_session_pools()
+        self.assertTrue(self.pool.closed)
+
+    def test_close(self):
+        self.assertEqual(self.pool.run("last"), (0, "last done\n"))
+        self.pool.close()
+        self.assertFalse(any(s.is_alive() for s in self.vm.sessions))
+        self.assertRaises(exceptions.TestError, self.pool.acquire)
+        pool = utils_test.get_guest_session_pool(self.vm)
+        self.assertIsNot(pool, self.pool)
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/python
+
+import os
+import sys
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import video_maker
+from virttest.unittest_utils import mock
+
+
+class FakeGst(object):
+    """
+    The part of the gobject gstreamer bindings used by GiStreamEncoder
+    """
+
+    SECOND = 1000000000
+
+    class Format(object):
+        TIME = "time"
+
+    class State(object):
+        PLAYING = "playing"
+        NULL = "null"
+
+    class MessageType(object):
+        EOS = 1
+        ERROR = 2
+
+    class Message(object):
+        def __init__(self, msg_type, error=None):
+            self.type = msg_type
+            self.error = error
+
+        def parse_error(self):
+            return self.error, "debug info"
+
+    class Buffer(object):
+        def __init__(self, data):
+            self.data = data
+            self.pts = self.duration = None
+
+        @classmethod
+        def new_wrapped(cls, data):
+            return cls(data)
+
+    class Bus(object):
+        def __init__(self):
+            self.messages = []
+
+        def timed_pop_filtered(self, timeout, message_types):
+            return self.messages.pop(0) if self.messages else None
+
+    class Element(object):
+        def __init__(self, name, pipelines):
+            self.name = name
+            self.pipelines = pipelines
+            self.properties = {}
+            self.buffers = []
+            self.fail = None
+
+        def set_property(self, name, value):
+            self.properties[name] = value
+
+        def link(self, element):
+            pass
+
+        def emit(self, signal, *args):
+            if self.fail:
+                raise self.fail
+            if signal == "push-buffer":
+                self.buffers.append(args[0])
+            elif signal == "end-of-stream":
+                self.pipelines[-1].bus.messages.append(
+                    FakeGst.Message(FakeGst.MessageType.EOS)
+                )
+
+    class Pipeline(object):
+        def __init__(self):
+            self.bus = FakeGst.Bus()
+            self.elements = []
+            self.states = []
+
+        def add(self, element):
+            self.elements.append(element)
+
+        def set_state(self, state):
+            self.states.append(state)
+
+        def get_bus(self):
+            return self.bus
+
+    def __init__(self):
+        gst = self
+        self.pipelines = []
+        self.initialized = False
+
+        class ElementFactory(object):
+            @staticmethod
+            def find(kind):
+                return True
+
+            @staticmethod
+            def make(name, alias):
+                return FakeGst.Element(name, gst.pipelines)
+
+        class Pipeline(FakeGst.Pipeline):
+            def __init__(self):
+                super(Pipeline, self).__init__()
+                gst.pipelines.append(self)
+
+        self.ElementFactory = ElementFactory
+        self.Pipeline = Pipeline
+
+    def init(self, args):
+        self.initialized = True
+
+    @staticmethod
+    def caps_from_string(caps):
+        return caps
+
+
+class FakeImage(object):
+    def __init__(self, size):
+        self.size = size
+
+    def convert(self, mode):
+        return self
+
+    def tobytes(self):
+        return b"\0" * (self.size[0] * self.size[1] * 4)
+
+
+class GiStreamEncoderTest(unittest.TestCase):
+    def setUp(self):
+        self.god = mock.mock_god()
+        self.gst = FakeGst()
+        self.god.stub_with(video_maker, "Gst", self.gst)
+        self.god.stub_with(video_maker, "GI_GSTREAMER_INSTALLED", True)
+        self.god.stub_with(video_maker, "PIL_INSTALLED", True)
+        self.encoder = video_maker.GiStreamEncoder("/tmp/video.webm", framerate=4)
+
+    def tearDown(self):
+        self.god.unstub_all()
+
+    def test_add_frame_and_finish(self):
+        self.encoder.add_frame(FakeImage((800, 600)))
+        self.encoder.add_frame(FakeImage((800, 600)))
+        self.encoder.add_frame(FakeImage((320, 200)))
+        (pipeline,) = self.gst.pipelines
+        source = pipeline.elements[0]
+        self.assertEqual(source.name, "appsrc")
+        self.assertEqual(pipeline.elements[4].name, "vp8enc")
+        self.assertEqual(
+            pipeline.elements[-1].properties["location"], "/tmp/video.webm"
+        )
+        # the small frame is scaled to the size of the video
+        self.assertEqual(self.encoder.size, (800, 600))
+        self.assertIn("width=320, height=200", source.properties["caps"])
+        self.assertEqual(
+            [buf.pts for buf in source.buffers],
+            [0, FakeGst.SECOND // 4, FakeGst.SECOND // 2],
+        )
+        self.encoder.finish()
+        self.assertEqual(pipeline.states, [FakeGst.State.PLAYING, FakeGst.State.NULL])
+        self.assertEqual(self.encoder.frames, 3)
+        self.assertRaises(ValueError, self.encoder.add_frame, FakeImage((800, 600)))
+        # finishing twice is harmless
+        self.encoder.finish()
+
+    def test_bus_error(self):
+        self.encoder.add_frame(FakeImage((800, 600)))
+        (pipeline,) = self.gst.pipelines
+        pipeline.bus.messages.append(
+            FakeGst.Message(FakeGst.MessageType.ERROR, "encoder broken")
+        )
+        self.assertRaises(
+            video_maker.EncodingError, self.encoder.add_frame, FakeImage((800, 600))
+        )
+        self.assertEqual(pipeline.states[-1], FakeGst.State.NULL)
+        self.assertIsNone(self.encoder.pipeline)
+
+    def test_push_failure(self):
+        self.encoder.add_frame(FakeImage((800, 600)))
+        (pipeline,) = self.gst.pipelines
+        pipeline.elements[0].fail = RuntimeError("not negotiated")
+        self.assertRaises(RuntimeError, self.encoder.add_frame, FakeImage((800, 600)))
+        self.assertEqual(pipeline.states[-1], FakeGst.State.NULL)
+        self.assertRaises(ValueError, self.encoder.add_frame, FakeImage((800, 600)))
+
+    def test_finish_timeout(self):
+        self.encoder.add_frame(FakeImage((800, 600)))
+        (pipeline,) = self.gst.pipelines
+        pipeline.elements[0].emit = lambda signal, *args: None
+        self.assertRaises(video_maker.EncodingError, self.encoder.finish, 1)
+        self.assertEqual(pipeline.states[-1], FakeGst.State.NULL)
+
+
+if __name__ == "__main__":
+    unittest.main()
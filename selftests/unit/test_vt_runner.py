@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import unittest
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado_vt.plugins import vt_runner
+
+
+def run_test(queue, count, finish=True):
+    for index in range(count):
+        queue.put({"status": "running", "index": index})
+    if finish:
+        queue.put({"status": "finished", "result": "pass"})
+
+
+def reference_wait_messages(queue, process):
+    """
+    The former relay, polling the queue of the test process
+    """
+    while True:
+        time.sleep(0.01)
+        while not queue.empty():
+            message = queue.get()
+            yield message
+            if message.get("status") == "finished":
+                return
+        if not process.is_alive() and queue.empty():
+            return
+
+
+def start_test(count, finish=True):
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=run_test, args=(vt_runner.MessageWriter(writer), count, finish)
+    )
+    process.start()
+    writer.close()
+    return reader, process
+
+
+class WaitMessagesTest(unittest.TestCase):
+    def test_relay(self):
+        reader, process = start_test(1000)
+        relayed = list(vt_runner.VTTestRunner._wait_messages(reader, process))
+        process.join()
+        self.assertEqual(len(relayed), 1001)
+        self.assertEqual(relayed[999]["index"], 999)
+        self.assertEqual(relayed[-1]["status"], "finished")
+
+    def test_process_died(self):
+        reader, process = start_test(2, finish=False)
+        relayed = list(vt_runner.VTTestRunner._wait_messages(reader, process))
+        process.join()
+        self.assertEqual([m.get("index") for m in relayed[:2]], [0, 1])
+        self.assertEqual(relayed[-1]["status"], "finished")
+        self.assertEqual(relayed[-1]["result"], "error")
+
+    def test_benchmark(self):
+        def run_tests(start, wait_messages):
+            relayed = []
+            begin = time.time()
+            for _ in range(20):
+                queue, process = start()
+                # without the running messages sent by the relay itself
+                relayed.append(
+                    [
+                        message
+                        for message in wait_messages(queue, process)
+                        if "index" in message or message["status"] == "finished"
+                    ]
+                )
+                process.join()
+            return (time.time() - begin) / 20, relayed
+
+        def start_reference():
+            queue = multiprocessing.SimpleQueue()
+            process = multiprocessing.Process(target=run_test, args=(queue, 20))
+            process.start()
+            return queue, process
+
+        reference, expected = run_tests(start_reference, reference_wait_messages)
+        duration, relayed = run_tests(
+            lambda: start_test(20), vt_runner.VTTestRunner._wait_messages
+        )
+        logging.info(
+            "Per test overhead: %.4fs, %.4fs polling the queue", duration, reference
+        )
+        # the timings are informative only, they depend on the host load
+        self.assertEqual(relayed, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
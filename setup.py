@@ -55,6 +55,9 @@ if __name__ == "__main__":
             ],
             "avocado.plugins.result_events": [
                 "vt-joblock = avocado_vt.plugins.vt_joblock:VTJobLock",
+                "vt-hugepage-pool = avocado_vt.plugins.vt_hugepages:VTHugePagePool",
+                "vt-storage-fixture-cache = "
+                "avocado_vt.plugins.vt_storage_cache:VTStorageFixtureCache",
             ],
             "avocado.plugins.init": [
                 "vt-init = avocado_vt.plugins.vt_init:VtInit",
@@ -1,4 +1,48 @@
-from virttest import utils_misc
+try:
+    # cryptography >= 43 keeps the legacy ciphers apart
+    from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+except ImportError:
+    try:
+        from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+    except ImportError:
+        TripleDES = None
+if TripleDES is not None:
+    from cryptography.hazmat.primitives.ciphers import Cipher, modes
+
+
+def _permutation_tables(table, in_bits):
+    """
+    Get the byte indexed lookup tables of a bit permutation.
+
+    The permutation of an in_bits integer is the OR of the values looked up
+    for each of its bytes, most significant byte first, see _permute().
+
+    :param table: Index of the input bit of each output bit, bit 0 being
+                  the most significant one, as in the DES tables.
+    :param in_bits: Number of bits of the input.
+    """
+    out_bits = len(table)
+    bit_values = [0] * in_bits
+    for out_pos, in_pos in enumerate(table):
+        bit_values[in_pos] |= 1 << (out_bits - 1 - out_pos)
+    tables = []
+    for byte in range(in_bits // 8):
+        lookup = [0] * 256
+        for value in range(1, 256):
+            lowest = value & -value
+            in_pos = byte * 8 + 8 - lowest.bit_length()
+            lookup[value] = lookup[value & (value - 1)] | bit_values[in_pos]
+        tables.append(lookup)
+    return tables
+
+
+def _permute(value, tables, in_bits):
+    result = 0
+    shift = in_bits - 8
+    for lookup in tables:
+        result |= lookup[(value >> shift) & 0xFF]
+        shift -= 8
+    return result
 
 
 class Des(object):
@@ -887,19 +931,55 @@ class Des(object):
         24,
     ]
 
+    # Lookup tables built from the tables above by _build_tables()
+    _tables = None
+
+    #: Use the DES implementation of the cryptography package when installed
+    use_cryptography = TripleDES is not None
+
+    @classmethod
+    def _build_tables(cls):
+        """
+        Precompute the lookup tables working on 32/64 bit integers.
+
+        The S-boxes are merged with the P permutation of their output, so
+        each round of the Feistel function is 4 lookups for the expansion
+        and 8 lookups for the substitution and permutation.
+        """
+        p_tables = _permutation_tables(cls.P, 32)
+        sp = []
+        for j in range(8):
+            sp_j = []
+            for six_bits in range(64):
+                row = ((six_bits & 0x20) >> 4) | (six_bits & 1)
+                col = (six_bits >> 1) & 0xF
+                value = cls.sbox[j][(row << 4) + col] << (28 - 4 * j)
+                sp_j.append(_permute(value, p_tables, 32))
+            sp.append(sp_j)
+        cls._tables = {
+            "PC1": _permutation_tables(cls.PC1, 64),
+            "PC2": _permutation_tables(cls.PC2, 56),
+            "IP": _permutation_tables(cls.IP, 64),
+            "FP": _permutation_tables(cls.FP, 64),
+            "E": _permutation_tables(cls.E, 32),
+            "SP": sp,
+        }
+        return cls._tables
+
     # Initialisation
     def __init__(self, key):
         """
         Initialize the instance.
 
-        :param key: Original used in DES.
+        :param key: Original used in DES, str or bytes.
         """
         if len(key) != 8:
-            key = (key + "\0" * 8)[:8]
+            padding = b"\0" * 8 if isinstance(key, bytes) else "\0" * 8
+            key = (key + padding)[:8]
 
-        self.L = []
-        self.R = []
-        self.Kn = [[0] * 48] * 16  # 16 48-bit keys (K1 - K16)
+        self.tables = self._tables or self._build_tables()
+        self.Kn = [0] * 16  # 16 48-bit keys (K1 - K16)
+        self._cipher = None
 
         self.setKey(key)
 
@@ -919,17 +999,19 @@ class Des(object):
 
         :param key: Original used in DES.
         """
-        newkey = []
-        for ki in range(len(key)):
-            bsrc = ord(key[ki])
+        if not isinstance(key, bytes):
+            key = bytearray(ord(c) for c in key)
+        newkey = bytearray()
+        for bsrc in bytearray(key):
             btgt = 0
             for i in range(8):
                 if bsrc & (1 << i):
                     btgt = btgt | (1 << 7 - i)
-
-            newkey.append(chr(btgt))
-        self.key = newkey
+            newkey.append(btgt)
+        self.key = [chr(b) for b in newkey]
         self.create_Kn()
+        if self.use_cryptography:
+            self._cipher = Cipher(TripleDES(bytes(newkey)), modes.ECB())
 
     def get_sub_list(self, table, block):
         """
@@ -945,130 +1027,95 @@ class Des(object):
 
     def create_Kn(self):
         """
-        Create the 16 subkeys,from K[0] to K[15], from the given key
+        Create the 16 48-bit subkeys,from K[0] to K[15], from the given key
         """
-        key = self.get_sub_list(self.PC1, utils_misc.string_to_bitlist(self.getKey()))
-        self.L = key[:28]
-        self.R = key[28:]
+        key = 0
+        for c in self.getKey():
+            key = (key << 8) | ord(c)
+        key = _permute(key, self.tables["PC1"], 64)
+        left = key >> 28
+        right = key & 0xFFFFFFF
         for i in range(16):
             # Perform circular left shifts
-            for j in range(self.left_rotations[i]):
-                self.L.append(self.L[0])
-                del self.L[0]
-                self.R.append(self.R[0])
-                del self.R[0]
+            shift = self.left_rotations[i]
+            left = ((left << shift) | (left >> (28 - shift))) & 0xFFFFFFF
+            right = ((right << shift) | (right >> (28 - shift))) & 0xFFFFFFF
             # Create one of the 16 subkeys through pc2 permutation
-            self.Kn[i] = self.get_sub_list(self.PC2, self.L + self.R)
+            self.Kn[i] = _permute((left << 28) | right, self.tables["PC2"], 56)
 
-    def f(self, K):
+    def crypt_block(self, block, crypt_type=0):
         """
-        The Feistel function (F-function) of DES, operates on half a block
-        (32 bits) at a time and consists of four stages:
-        1. Expansion
-        2. Key mixing
-        3. Substitution
-        4. Permutation
+        Crypt a 64-bit block.
 
-        :param K: One of sixteen 48-bit subkeys are derived from the main key.
+        :param block: Block as integer, the first byte being the most
+                      significant one.
+        :param crypt_type: crypt type. 0 means encrypt, and 1 means decrypt.
         """
-        # Expansion:
-        # The 32-bit half-block is expanded to 48 bits using E.
-        self.R = self.get_sub_list(self.E, self.R)
-
-        # Key mixing: The result is combined with a subkey using an XOR
-        # operation. Sixteen 48-bit subkeys are derived from the main key.
-        self.R = list(map(lambda x, y: x ^ y, self.R, K))
-
-        # The block is divided into eight 6-bit pieces
-        B = [
-            self.R[:6],
-            self.R[6:12],
-            self.R[12:18],
-            self.R[18:24],
-            self.R[24:30],
-            self.R[30:36],
-            self.R[36:42],
-            self.R[42:],
-        ]
-
-        # Substitution:
-        Bn = [0] * 32
-        pos = 0
-        for j in range(8):
-            # Work out the offsets
-            m = (B[j][0] << 1) + B[j][5]
-            n = (B[j][1] << 3) + (B[j][2] << 2) + (B[j][3] << 1) + B[j][4]
-
-            # Find the permutation value
-            v = self.sbox[j][(m << 4) + n]
-
-            # Turn value into bits, add it to result: Bn
-            Bn[pos] = (v & 8) >> 3
-            Bn[pos + 1] = (v & 4) >> 2
-            Bn[pos + 2] = (v & 2) >> 1
-            Bn[pos + 3] = v & 1
-
-            pos += 4
-
-        # Permutation:
-        # Bn are rearranged according to a fixed permutation, the P-box.
-        self.R = self.get_sub_list(self.P, Bn)
+        e0, e1, e2, e3 = self.tables["E"]
+        sp0, sp1, sp2, sp3, sp4, sp5, sp6, sp7 = self.tables["SP"]
+        block = _permute(block, self.tables["IP"], 64)
+        left = block >> 32
+        right = block & 0xFFFFFFFF
+        subkeys = self.Kn if crypt_type == 0 else reversed(self.Kn)
+        for subkey in subkeys:
+            # Feistel function: expansion, key mixing, substitution and
+            # permutation
+            e = (
+                e0[right >> 24]
+                | e1[(right >> 16) & 0xFF]
+                | e2[(right >> 8) & 0xFF]
+                | e3[right & 0xFF]
+            ) ^ subkey
+            f = (
+                sp0[e >> 42]
+                | sp1[(e >> 36) & 0x3F]
+                | sp2[(e >> 30) & 0x3F]
+                | sp3[(e >> 24) & 0x3F]
+                | sp4[(e >> 18) & 0x3F]
+                | sp5[(e >> 12) & 0x3F]
+                | sp6[(e >> 6) & 0x3F]
+                | sp7[e & 0x3F]
+            )
+            left, right = right, left ^ f
+        # Final permutation of R[16]L[16]
+        return _permute((right << 32) | left, self.tables["FP"], 64)
 
     def des_crypt(self, data, crypt_type=0):
         """
         Crypt the block of data through DES bit-manipulation
 
-        :param data: data need to crypt.
+        :param data: bit list of the block need to crypt.
         :param crypt_type: crypt type. 0 means encrypt, and 1 means decrypt.
         """
-        # Get new block by using Ip.
-        block = self.get_sub_list(self.IP, data)
-        self.L = block[:32]
-        self.R = block[32:]
-
-        if crypt_type == 0:
-            des_i = 0
-            des_adj = 1
-        else:
-            des_i = 15
-            des_adj = -1
-
-        i = 0
-        while i < 16:
-            tempR = self.R
-            self.f(self.Kn[des_i])
-
-            # Xor with L[i - 1]
-            self.R = list(map(lambda x, y: x ^ y, self.R, self.L))
-            # Optimization: This now replaces the below commented code
-            self.L = tempR
-
-            i += 1
-            des_i += des_adj
-
-        # Final permutation of R[16]L[16]
-        final = self.get_sub_list(self.FP, self.R + self.L)
-        return final
+        block = 0
+        for bit in data:
+            block = (block << 1) | bit
+        block = self.crypt_block(block, crypt_type)
+        return [(block >> (63 - i)) & 1 for i in range(64)]
 
     def crypt(self, data, crypt_type=0):
         """
-        Crypt the data in blocks, running it through des_crypt()
+        Crypt the data in blocks of 8 bytes.
 
-        :param data: Data to be encrypted/decrypted.
+        :param data: Data to be encrypted/decrypted, str or bytes.
         :param crypt_type: crypt type. 0 means encrypt, and 1 means decrypt.
+        :return: The crypted data, of the same type as data.
         """
-
-        # Split the data into list, crypting each one separately
-        i = 0
-        result = []
-        while i < len(data):
-            # Test code for caching encryption results
-            block = utils_misc.string_to_bitlist(data[i : i + 8])
-            pro_block = self.des_crypt(block, crypt_type)
-
-            # Add the resulting block to our list
-            result.append(utils_misc.bitlist_to_string(pro_block))
-            i += 8
-
-        # Return the full encrypted/decrypted string
-        return "".join(result)
+        is_bytes = isinstance(data, bytes)
+        if not is_bytes:
+            data = data.encode("latin-1")
+        if len(data) % 8:
+            raise ValueError("DES crypts blocks of 8 bytes, got %s bytes" % len(data))
+        if self._cipher is not None:
+            if crypt_type == 0:
+                context = self._cipher.encryptor()
+            else:
+                context = self._cipher.decryptor()
+            result = context.update(data) + context.finalize()
+        else:
+            result = bytearray()
+            for i in range(0, len(data), 8):
+                block = int.from_bytes(data[i : i + 8], "big")
+                result += self.crypt_block(block, crypt_type).to_bytes(8, "big")
+            result = bytes(result)
+        return result if is_bytes else result.decode("latin-1")
@@ -1,11 +1,20 @@
+import bz2
 import configparser
 import glob
+import hashlib
 import logging
+import lzma
 import os
 import re
 import shutil
-
-from avocado.utils import astring, crypto, download, genio, git, process
+import subprocess
+import threading
+import time
+import zlib
+
+from avocado.utils import astring, crypto, download, genio, git, output
+from avocado.utils import path as utils_path
+from avocado.utils import process
 from six import StringIO, string_types
 from six.moves import urllib
 
@@ -429,12 +438,403 @@ def get_asset_info(asset, ini_dir=None, section=None):
     return asset_info
 
 
+#: Amount of data read at a time while downloading
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+#: Smallest range downloaded by one of the parallel connections
+DOWNLOAD_MIN_RANGE_SIZE = 16 * 1024 * 1024
+
+
+class _StreamDecompressor(object):
+    """
+    Decompress data fed piece by piece into a file.
+
+    An external decoder is used when available, the multi-threaded ones
+    first, otherwise the Python modules do the job.
+    """
+
+    DECODERS = {
+        "gz": (["pigz", "-dc"], ["gzip", "-dc"]),
+        "xz": (["xz", "-T0", "-dc"],),
+        "bz2": (["lbzip2", "-dc"], ["pbzip2", "-dc"], ["bzip2", "-dc"]),
+        "zst": (["zstd", "-T0", "-dc"],),
+    }
+    MODULE_DECODERS = {
+        "gz": lambda: zlib.decompressobj(zlib.MAX_WBITS | 32),
+        "xz": lzma.LZMADecompressor,
+        "bz2": bz2.BZ2Decompressor,
+    }
+
+    def __init__(self, compression, destination, external=True):
+        """
+        :param compression: Compressed file extension, e.g. 'xz'
+        :param destination: Path of the decompressed file
+        :param external: Whether to use the external decoders if available
+        """
+        self.destination = destination
+        self._part_file = destination + ".part"
+        self._output = open(self._part_file, "wb")
+        self._process = None
+        self._decompressor = None
+        for cmd in self.DECODERS.get(compression, ()) if external else ():
+            try:
+                cmd = [utils_path.find_command(cmd[0])] + cmd[1:]
+            except utils_path.CmdNotFoundError:
+                continue
+            LOG.debug("Decompressing to %s with %s", destination, " ".join(cmd))
+            self._process = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=self._output
+            )
+            return
+        self._new_decompressor = self.MODULE_DECODERS[compression]
+        self._decompressor = self._new_decompressor()
+
+    @classmethod
+    def is_supported(cls, compression):
+        return compression in cls.MODULE_DECODERS or any(
+            utils_path.find_command(cmd[0], False)
+            for cmd in cls.DECODERS.get(compression, ())
+        )
+
+    def write(self, data):
+        if self._process is not None:
+            self._process.stdin.write(data)
+            return
+        while data:
+            self._output.write(self._decompressor.decompress(data))
+            data = b""
+            if self._decompressor.eof:
+                # concatenated streams, e.g. from parallel compressors
+                data = self._decompressor.unused_data
+                self._decompressor = self._new_decompressor()
+
+    def close(self):
+        """
+        Finish the decompression and move the file to its destination.
+        """
+        if self._process is not None:
+            self._process.stdin.close()
+            if self._process.wait():
+                self.abort()
+                raise IOError(
+                    "Decompression of %s failed with exit status %s"
+                    % (self.destination, self._process.returncode)
+                )
+        self._output.close()
+        os.rename(self._part_file, self.destination)
+
+    def abort(self):
+        """
+        Stop the decompression and remove the partial file.
+        """
+        if self._process is not None:
+            if not self._process.stdin.closed:
+                self._process.stdin.close()
+            self._process.kill()
+            self._process.wait()
+        self._output.close()
+        if os.path.exists(self._part_file):
+            os.unlink(self._part_file)
+
+
+def _open_url(url, start=None, end=None, method=None, validator=None):
+    request = urllib.request.Request(url, method=method)
+    if start:
+        if end is None:
+            request.add_header("Range", "bytes=%d-" % start)
+        else:
+            request.add_header("Range", "bytes=%d-%d" % (start, end - 1))
+    elif end is not None:
+        request.add_header("Range", "bytes=0-%d" % (end - 1))
+    if validator and request.has_header("Range"):
+        # the whole new content is sent if it changed
+        request.add_header("If-Range", validator)
+    return urllib.request.urlopen(request, timeout=60)
+
+
+def _get_url_info(url):
+    """
+    Get the size of an url, whether ranges of it can be downloaded and
+    the validator identifying its current content.
+
+    :return: tuple (size or None, ranges supported, strong ETag or
+             Last-Modified date or None)
+    """
+    try:
+        with _open_url(url, method="HEAD") as response:
+            size = response.headers.get("Content-Length")
+            ranges = response.headers.get("Accept-Ranges", "") == "bytes"
+            validator = response.headers.get("ETag")
+            if validator is None or validator.startswith("W/"):
+                # weak ETags can't be used with If-Range
+                validator = response.headers.get("Last-Modified")
+    except Exception as details:
+        LOG.debug("Unable to get the size of %s: %s", url, details)
+        return None, False, None
+    return (int(size) if size is not None else None), ranges, validator
+
+
+def _download_ranges(url, part_file, start, size, connections, progress, validator):
+    """
+    Download [start, size) of url into part_file with parallel connections.
+
+    The first failing range cancels the others.
+
+    :param progress: Callback called with the end of the downloaded data
+                     written contiguously from start, after each chunk
+    :param validator: Validator of the content, see _get_url_info()
+    """
+    range_size = -(-(size - start) // connections)
+    ranges = [
+        [offset, offset, min(offset + range_size, size)]
+        for offset in range(start, size, range_size)
+    ]
+    lock = threading.Lock()
+    cancel = threading.Event()
+    errors = []
+
+    def _download_range(current_range):
+        try:
+            fd = os.open(part_file, os.O_WRONLY)
+            try:
+                with _open_url(
+                    url, current_range[1], current_range[2], validator=validator
+                ) as response:
+                    if response.status != 206:
+                        raise IOError("%s doesn't support ranges or changed" % url)
+                    while current_range[1] < current_range[2]:
+                        if cancel.is_set():
+                            return
+                        data = response.read(DOWNLOAD_CHUNK_SIZE)
+                        if not data:
+                            raise IOError("Download of %s interrupted" % url)
+                        os.pwrite(fd, data, current_range[1])
+                        with lock:
+                            current_range[1] += len(data)
+            finally:
+                os.close(fd)
+        except Exception as details:
+            errors.append(details)
+            cancel.set()
+
+    threads = [
+        threading.Thread(target=_download_range, args=(current_range,))
+        for current_range in ranges
+    ]
+    for thread in threads:
+        thread.start()
+    contiguous = start
+    try:
+        while contiguous < size:
+            cancel.wait(0.05)
+            if errors:
+                break
+            with lock:
+                for _, offset, end in ranges:
+                    contiguous = offset
+                    if offset < end:
+                        break
+            progress(contiguous)
+    finally:
+        cancel.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+
+def download_url(url, destination, title="", connections=1, data_callback=None):
+    """
+    Download an HTTP(S) url, resuming a previously interrupted download.
+
+    The data is downloaded to 'destination.part', which is renamed to
+    destination once complete, so that a later call continues where it
+    stopped.  The ETag or Last-Modified date of the url is kept next to it,
+    the download is only resumed when the content of the url is the same.
+    The SHA1 sum is computed while downloading.
+
+    :param url: HTTP(S) URL to download
+    :param destination: Path of the downloaded file
+    :param title: Title of the progress bar
+    :param connections: Number of parallel connections downloading ranges
+                        of the file, if the server supports ranges
+    :param data_callback: Function called with the downloaded data, in order
+    :return: SHA1 sum of the downloaded file
+    """
+    part_file = destination + ".part"
+    ranges_marker = part_file + ".ranges"
+    validator_file = part_file + ".validator"
+    if os.path.exists(ranges_marker):
+        # Interrupted parallel download, the part file has holes
+        os.unlink(ranges_marker)
+        if os.path.exists(part_file):
+            os.unlink(part_file)
+    offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    size, ranges, validator = _get_url_info(url)
+    previous_validator = None
+    if os.path.exists(validator_file):
+        with open(validator_file, "r") as validator_fd:
+            previous_validator = validator_fd.read()
+    if (
+        not ranges
+        or size is None
+        or offset > size
+        or validator is None
+        or validator != previous_validator
+    ):
+        # Only the data of the same content can be resumed
+        offset = 0
+    if validator is not None:
+        with open(validator_file, "w") as validator_fd:
+            validator_fd.write(validator)
+    elif os.path.exists(validator_file):
+        os.unlink(validator_file)
+
+    sha1 = hashlib.sha1()
+    with open(part_file, "r+b" if offset else "wb") as part:
+        part.truncate(offset)
+
+    def _feed(data):
+        sha1.update(data)
+        if data_callback is not None:
+            data_callback(data)
+
+    # The data already downloaded is read once
+    with open(part_file, "rb") as part:
+        for data in iter(lambda: part.read(DOWNLOAD_CHUNK_SIZE), b""):
+            _feed(data)
+    if offset:
+        LOG.info("Resuming the download of %s at %s bytes", url, offset)
+
+    LOG.info(
+        "Downloading %s, %s to %s",
+        url,
+        output.display_data_size(size) if size is not None else "unknown size",
+        os.path.dirname(destination),
+    )
+    progress_bar = output.ProgressBar(maximum=size or 1, title=title)
+    progress_bar.update_amount(offset)
+    start_time = time.time()
+
+    if ranges and size is not None:
+        connections = min(
+            connections, max((size - offset) // DOWNLOAD_MIN_RANGE_SIZE, 1)
+        )
+    else:
+        connections = 1
+    if offset and offset == size:
+        # Interrupted after the last byte, before the rename
+        LOG.info("Download of %s already complete", url)
+    elif connections > 1:
+        open(ranges_marker, "w").close()
+        position = [offset]
+        # unbuffered, not to keep reading the not yet downloaded holes
+        with open(part_file, "rb", buffering=0) as part:
+
+            def _progress(contiguous):
+                # hash and pass on the data as soon as it's contiguous
+                part.seek(position[0])
+                while position[0] < contiguous:
+                    data = part.read(min(DOWNLOAD_CHUNK_SIZE, contiguous - position[0]))
+                    _feed(data)
+                    position[0] += len(data)
+                progress_bar.update_amount(contiguous)
+
+            try:
+                _download_ranges(
+                    url, part_file, offset, size, connections, _progress, validator
+                )
+            finally:
+                # Keep only the contiguous data for a later resume
+                os.truncate(part_file, position[0])
+                os.unlink(ranges_marker)
+    else:
+        with open(part_file, "ab") as part:
+            with _open_url(url, offset, validator=validator) as response:
+                if offset and response.status != 206:
+                    os.unlink(part_file)
+                    raise IOError("Unable to resume the download of %s" % url)
+                while True:
+                    data = response.read(DOWNLOAD_CHUNK_SIZE)
+                    if not data:
+                        break
+                    part.write(data)
+                    _feed(data)
+                    progress_bar.append_amount(len(data))
+        if size is not None and os.path.getsize(part_file) != size:
+            raise IOError("Download of %s interrupted" % url)
+
+    progress_bar.update_amount(size or 1)
+    elapsed = max(time.time() - start_time, 0.001)
+    LOG.info(
+        "Downloaded %s in %.1fs (%s/s)",
+        url,
+        elapsed,
+        output.display_data_size((os.path.getsize(part_file) - offset) / elapsed),
+    )
+    os.rename(part_file, destination)
+    if os.path.exists(validator_file):
+        os.unlink(validator_file)
+    return sha1.hexdigest()
+
+
+def _update_backup(destination_uncompressed):
+    backup_file = destination_uncompressed + ".backup"
+    if os.path.isfile(backup_file):
+        LOG.debug("Copying %s -> %s", destination_uncompressed, backup_file)
+        shutil.copy(destination_uncompressed, backup_file)
+
+
+def _download_asset_file(asset_info, connections=1):
+    """
+    Download the file of an asset, uncompressing it on the fly if possible.
+
+    :param asset_info: Dictionary returned by get_asset_info
+    :param connections: Number of parallel connections, see download_url()
+    :return: tuple (SHA1 sum of the downloaded file, or None if unknown,
+             whether destination_uncompressed was written)
+    """
+    url = asset_info["url"]
+    destination = asset_info["destination"]
+    title = asset_info["title"]
+    if urllib.parse.urlparse(url).scheme not in ("http", "https"):
+        download.url_download_interactive(url, destination, title)
+        return None, False
+
+    decompressor = None
+    destination_uncompressed = asset_info.get("destination_uncompressed")
+    match = re.match(r".*\.(gz|xz|bz2|zst)$", destination)
+    if (
+        destination_uncompressed is not None
+        and asset_info.get("uncompress_cmd") is None
+        and match
+        and _StreamDecompressor.is_supported(match.group(1))
+    ):
+        decompressor = _StreamDecompressor(match.group(1), destination_uncompressed)
+    try:
+        sha1 = download_url(
+            url,
+            destination,
+            title,
+            connections,
+            decompressor.write if decompressor else None,
+        )
+        if decompressor is not None:
+            decompressor.close()
+    except BaseException:
+        if decompressor is not None:
+            decompressor.abort()
+        raise
+    if decompressor is not None:
+        _update_backup(destination_uncompressed)
+    return sha1, decompressor is not None
+
+
 def uncompress_asset(asset_info, force=False):
     destination = asset_info["destination"]
     uncompress_cmd = asset_info["uncompress_cmd"]
     destination_uncompressed = asset_info["destination_uncompressed"]
 
-    archive_re = re.compile(r".*\.(gz|xz|7z|bz2)$")
+    archive_re = re.compile(r".*\.(gz|xz|7z|bz2|zst)$")
     if destination_uncompressed is not None:
         if uncompress_cmd is None:
             match = archive_re.match(destination)
@@ -454,6 +854,11 @@ def uncompress_asset(asset_info, force=False):
                         destination,
                         destination_uncompressed,
                     )
+                elif match.group(1) == "zst":
+                    uncompress_cmd = "zstd -dc %s > %s" % (
+                        destination,
+                        destination_uncompressed,
+                    )
                 elif match.group(1) == "7z":
                     uncompress_cmd = "7za -y e %s" % destination
         else:
@@ -467,24 +872,26 @@ def uncompress_asset(asset_info, force=False):
             os.chdir(os.path.dirname(destination_uncompressed))
             LOG.debug("Uncompressing %s -> %s", destination, destination_uncompressed)
             process.run(uncompress_cmd, shell=True)
-            backup_file = destination_uncompressed + ".backup"
-            if os.path.isfile(backup_file):
-                LOG.debug("Copying %s -> %s", destination_uncompressed, backup_file)
-                shutil.copy(destination_uncompressed, backup_file)
+            _update_backup(destination_uncompressed)
 
 
-def download_file(asset_info, interactive=False, force=False):
+def download_file(asset_info, interactive=False, force=False, connections=1):
     """
     Verifies if file that can be find on url is on destination with right hash.
 
     This function will verify the SHA1 hash of the file. If the file
     appears to be missing or corrupted, let the user know.
 
+    HTTP(S) downloads are resumed if interrupted, hashed and uncompressed
+    while downloading.
+
     :param asset_info: Dictionary returned by get_asset_info
+    :param connections: Number of parallel connections of HTTP(S) downloads
     """
     file_ok = False
     problems_ignored = False
     had_to_download = False
+    uncompressed = False
     sha1 = None
 
     url = asset_info["url"]
@@ -516,12 +923,21 @@ def download_file(asset_info, interactive=False, force=False):
             answer = "y"
         if answer == "y":
             try:
-                download.url_download_interactive(
-                    url, destination, "Downloading %s" % title
+                sha1_download, uncompressed = _download_asset_file(
+                    dict(asset_info, title="Downloading %s" % title), connections
                 )
                 had_to_download = True
             except Exception as download_failure:
                 LOG.error("Check your internet connection: %s", download_failure)
+            else:
+                if sha1 is not None and sha1_download not in (None, sha1):
+                    LOG.error("Actual SHA1 sum: %s", sha1_download)
+                    os.unlink(destination)
+                    if uncompressed:
+                        os.unlink(asset_info["destination_uncompressed"])
+                    raise IOError(
+                        "File %s downloaded from %s is corrupted" % (destination, url)
+                    )
         else:
             LOG.warning("Missing file %s", destination)
     else:
@@ -546,18 +962,22 @@ def download_file(asset_info, interactive=False, force=False):
                 if answer == "y":
                     LOG.info("Updating image to the latest available...")
                     while not file_ok:
+                        sha1_post_download = None
                         try:
-                            download.url_download_interactive(url, destination, title)
+                            sha1_post_download, uncompressed = _download_asset_file(
+                                asset_info, connections
+                            )
                         except Exception as download_failure:
                             LOG.error(
                                 "Check your internet connection: %s", download_failure
                             )
-                        sha1_post_download = crypto.hash_file(
-                            destination, algorithm="sha1"
-                        )
+                        if sha1_post_download is None:
+                            sha1_post_download = crypto.hash_file(
+                                destination, algorithm="sha1"
+                            )
                         had_to_download = True
                         if sha1_post_download != sha1:
-                            LOG.error("Actual SHA1 sum: %s", actual_sha1)
+                            LOG.error("Actual SHA1 sum: %s", sha1_post_download)
                             if interactive:
                                 answer = genio.ask(
                                     "The file downloaded %s is "
@@ -585,10 +1005,13 @@ def download_file(asset_info, interactive=False, force=False):
         if not problems_ignored:
             LOG.info("%s present, with proper checksum", destination)
 
+    if uncompressed:
+        # already uncompressed while downloading
+        force = had_to_download = False
     uncompress_asset(asset_info=asset_info, force=force or had_to_download)
 
 
-def download_asset(asset, interactive=True, restore_image=False):
+def download_asset(asset, interactive=True, restore_image=False, connections=1):
     """
     Download an asset defined on an asset file.
 
@@ -616,7 +1039,13 @@ def download_asset(asset, interactive=True, restore_image=False):
     :param interactive: Whether to ask the user before downloading the file.
     :param restore_image: If the asset is a compressed image, we can uncompress
                           in order to restore the image.
+    :param connections: Number of parallel connections of HTTP(S) downloads
     """
     asset_info = get_asset_info(asset)
 
-    download_file(asset_info=asset_info, interactive=interactive, force=restore_image)
+    download_file(
+        asset_info=asset_info,
+        interactive=interactive,
+        force=restore_image,
+        connections=connections,
+    )
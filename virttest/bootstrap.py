@@ -99,7 +99,10 @@ def get_guest_os_info_list(test_name, guest_os):
     for params in dicts:
         image_name = params.get("image_name", "image").split("/")[-1]
         shortname = params.get("shortname", guest_os)
-        os_info_list.append({"asset": image_name, "variant": shortname})
+        connections = int(params.get("asset_download_connections", 1))
+        os_info_list.append(
+            {"asset": image_name, "variant": shortname, "connections": connections}
+        )
 
     if not os_info_list:
         LOG.error(
@@ -1014,7 +1017,10 @@ def bootstrap(options, interactive=False):
                 os_asset = os_info["asset"]
                 try:
                     asset.download_asset(
-                        os_asset, interactive=interactive, restore_image=True
+                        os_asset,
+                        interactive=interactive,
+                        restore_image=True,
+                        connections=os_info["connections"],
                     )
                 except AssertionError:
                     pass  # Not all files are managed via asset
@@ -133,6 +133,7 @@ The base of the definitions come verbatim as follows:
 """
 
 import collections
+import copy
 import logging
 import optparse
 import os
@@ -1502,6 +1503,28 @@ class Parser(object):
         # Parent generator will reset this flag
         self.parent_generator = True
 
+    def copy(self):
+        """
+        Get a parser sharing the tree parsed so far.
+
+        Statements applied to the copy (filters, assignments, strings) only
+        extend its own top level node, so the same parsed configuration can
+        be filtered in different ways without parsing the files again.
+
+        :return: A new Parser instance.
+        """
+        parser = copy.copy(self)
+        parser.node = copy.copy(self.node)
+        parser.node.content = list(self.node.content)
+        parser.node.children = list(self.node.children)
+        parser.node.labels = set(self.node.labels)
+        parser.node.failed_cases = collections.deque(self.node.failed_cases)
+        parser.only_filters = list(self.only_filters)
+        parser.no_filters = list(self.no_filters)
+        parser.assignments = list(self.assignments)
+        parser.parent_generator = True
+        return parser
+
     def _debug(self, s, *args):
         if self.debug:
             LOG.debug(s, *args)
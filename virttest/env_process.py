@@ -18,12 +18,13 @@ from avocado.utils import archive
 from avocado.utils import cpu as cpu_utils
 from avocado.utils import crypto
 from avocado.utils import process as a_process
-from six.moves import xrange
+from six.moves import queue, xrange
 
 from virttest import (
     cpu,
     data_dir,
     error_context,
+    error_event,
     ppm_utils,
     qemu_monitor,
     qemu_storage,
@@ -88,6 +89,12 @@ except ImportError:
 
 _screendump_thread = None
 _screendump_thread_termination_event = None
+# Ends the sleep of the screendump thread before the next screendumps
+_screendump_thread_wakeup = None
+# Screendump dirs whose video is being, or was, encoded while the
+# screendumps were taken
+_encoding_screendump_dirs = set()
+_encoded_screendump_dirs = set()
 
 _vm_info_thread = None
 _vm_info_thread_termination_event = None
@@ -736,15 +743,17 @@ def process_command(test, params, env, command, command_timeout, command_noncrit
 
 class _CreateImages(threading.Thread):
     """
-    Thread which creates images. In case of failure it stores the exception
-    in self.exc_info
+    Thread which processes the groups of images taken from a queue. In case
+    of failure it stores the exception in self.exc_info
     """
 
-    def __init__(self, image_func, test, images, params, exit_event, vm_process_status):
+    def __init__(
+        self, image_func, test, image_groups, params, exit_event, vm_process_status
+    ):
         threading.Thread.__init__(self)
         self.image_func = image_func
         self.test = test
-        self.images = images
+        self.image_groups = image_groups
         self.params = params
         self.exit_event = exit_event
         self.exc_info = None
@@ -752,19 +761,109 @@ class _CreateImages(threading.Thread):
 
     def run(self):
         try:
-            _process_images_serial(
-                self.image_func,
-                self.test,
-                self.images,
-                self.params,
-                self.exit_event,
-                self.vm_process_status,
-            )
+            while not self.exit_event.is_set():
+                try:
+                    images = self.image_groups.get_nowait()
+                except queue.Empty:
+                    break
+                _process_images_serial(
+                    self.image_func,
+                    self.test,
+                    images,
+                    self.params,
+                    self.exit_event,
+                    self.vm_process_status,
+                )
         except Exception:
             self.exc_info = sys.exc_info()
             self.exit_event.set()
 
 
+# Maximum number of images processed at the same time per storage type,
+# images on host block devices shared by the test (iscsi, lvm) are processed
+# one by one, network storage is not loaded too much
+_IMAGE_WORKERS_LIMITS = {
+    "ceph": 2,
+    "curl": 2,
+    "glusterfs-direct": 2,
+    "iscsi": 1,
+    "iscsi-direct": 2,
+    "lvm": 1,
+    "nbd": 2,
+    "nfs": 2,
+}
+_IMAGE_WORKERS_LIMIT_DEFAULT = 4
+
+
+def _get_image_groups(images, params):
+    """
+    Group the images sharing the same underlying file.
+
+    The images with the same filename, or in the same image_chain, end up
+    in the same group, keeping the order of images, so that they are never
+    processed at the same time.
+
+    :param images: List of images (usually params.objects("images"))
+    :param params: A dict containing all VM and image parameters.
+    :return: List of lists of images
+    """
+    group_of = {}
+    groups = []
+    for image_name in images:
+        image_params = params.object_params(image_name)
+        try:
+            filename = storage.get_image_filename(image_params, data_dir.get_data_dir())
+        except Exception:
+            filename = image_params.get("image_name")
+        keys = [("image", image_name), ("file", filename)]
+        keys.extend(("image", name) for name in image_params.objects("image_chain"))
+        group_ids = set(group_of[key] for key in keys if key in group_of)
+        if not group_ids:
+            group_id = len(groups)
+            groups.append([image_name])
+        else:
+            # merge the groups linked by this image
+            group_id = min(group_ids)
+            for other_id in sorted(group_ids - {group_id}):
+                groups[group_id].extend(groups[other_id])
+                groups[other_id] = []
+                for key, value in group_of.items():
+                    if value == other_id:
+                        group_of[key] = group_id
+            groups[group_id].append(image_name)
+        for key in keys:
+            group_of[key] = group_id
+    return [
+        [image_name for image_name in images if image_name in group]
+        for group in groups
+        if group
+    ]
+
+
+def _get_image_workers(params, images, groups):
+    """
+    Get the number of images to process at the same time.
+
+    The 'image_process_workers' param sets it, otherwise it is the number of
+    image groups, bounded by the storage types of the images.
+
+    :param params: A dict containing all VM and image parameters.
+    :param images: List of images
+    :param groups: Groups of images, see _get_image_groups()
+    """
+    workers = params.get_numeric("image_process_workers", 0)
+    if workers <= 0:
+        workers = min(
+            _IMAGE_WORKERS_LIMITS.get(
+                params.object_params(image_name).get("storage_type"),
+                _IMAGE_WORKERS_LIMIT_DEFAULT,
+            )
+            for image_name in images
+        )
+        workers = min(workers, 2 * multiprocessing.cpu_count())
+    return max(min(workers, len(groups)), 1)
+
+
 def process_images(image_func, test, params, vm_process_status=None):
     """
     Wrapper which chooses the best way to process images.
@@ -775,15 +874,25 @@ def process_images(image_func, test, params, vm_process_status=None):
     :param vm_process_status: (optional) vm process status like running, dead
                               or None for no vm exist.
     """
+    # The images may be changed, or opened by qemu-img for writing
+    utils_libguestfs.invalidate_guestfish_pool()
     images = params.objects("images")
-    if len(images) > 20:  # Lets do it in parallel
-        _process_images_parallel(
-            image_func, test, params, vm_process_status=vm_process_status
-        )
-    else:
-        _process_images_serial(
-            image_func, test, images, params, vm_process_status=vm_process_status
-        )
+    if len(images) > 1:
+        image_groups = _get_image_groups(images, params)
+        workers = _get_image_workers(params, images, image_groups)
+        if workers > 1:  # Lets do it in parallel
+            _process_images_parallel(
+                image_func,
+                test,
+                params,
+                vm_process_status=vm_process_status,
+                image_groups=image_groups,
+                workers=workers,
+            )
+            return
+    _process_images_serial(
+        image_func, test, images, params, vm_process_status=vm_process_status
+    )
 
 
 def process_fs_sources(fs_source_func, test, params, vm_process_status=None):
@@ -816,29 +925,57 @@ def _process_images_serial(
     """
     for image_name in images:
         image_params = params.object_params(image_name)
+        start_time = time.time()
         image_func(test, image_params, image_name, vm_process_status)
+        LOG.debug(
+            "%s of image '%s' took %.2fs",
+            getattr(image_func, "__name__", "Processing"),
+            image_name,
+            time.time() - start_time,
+        )
         if exit_event and exit_event.is_set():
             LOG.error("Received exit_event, stop processing of images.")
             break
 
 
-def _process_images_parallel(image_func, test, params, vm_process_status=None):
+def _process_images_parallel(
+    image_func, test, params, vm_process_status=None, image_groups=None, workers=None
+):
     """
     The same as _process_images but in parallel.
+
+    The images sharing the same underlying file are processed by the same
+    thread, one after the other.
+
     :param image_func: Process function
     :param test: An Autotest test object.
     :param params: A dict containing all VM and image parameters.
     :param vm_process_status: (optional) vm process status like running, dead
                               or None for no vm exist.
+    :param image_groups: (optional) groups of images, see _get_image_groups()
+    :param workers: (optional) number of threads, see _get_image_workers()
     """
     images = params.objects("images")
-    no_threads = min(len(images) // 5, 2 * multiprocessing.cpu_count())
+    if image_groups is None:
+        image_groups = _get_image_groups(images, params)
+    if workers is None:
+        workers = _get_image_workers(params, images, image_groups)
+    LOG.debug(
+        "Processing %d images (%d groups) with %d threads",
+        len(images),
+        len(image_groups),
+        workers,
+    )
+    groups_queue = queue.Queue()
+    for group in image_groups:
+        groups_queue.put(group)
     exit_event = threading.Event()
     threads = []
-    for i in xrange(no_threads):
-        imgs = images[i::no_threads]
+    for i in xrange(workers):
         threads.append(
-            _CreateImages(image_func, test, imgs, params, exit_event, vm_process_status)
+            _CreateImages(
+                image_func, test, groups_queue, params, exit_event, vm_process_status
+            )
         )
         threads[-1].start()
 
@@ -944,20 +1081,12 @@ def process(
                     unpause_vm = True
                     vm_params["skip_cluster_leak_warn"] = "yes"
                 try:
-                    images = params.objects("images")
-                    _process_images_serial(
-                        check_image,
-                        test,
-                        images,
-                        vm_params,
-                        vm_process_status=vm_process_status,
-                    )
+                    process_images(check_image, test, vm_params, vm_process_status)
                 finally:
                     if unpause_vm:
                         vm.resume()
         else:
-            images = params.objects("images")
-            _process_images_serial(check_image, test, images, params)
+            process_images(check_image, test, params)
 
     # preprocess
     if not vm_first:
@@ -1155,7 +1284,9 @@ def preprocess(test, params, env):
     # Start the screendump thread
     if params.get("take_regular_screendumps") == "yes":
         global _screendump_thread, _screendump_thread_termination_event
+        global _screendump_thread_wakeup
         _screendump_thread_termination_event = threading.Event()
+        _screendump_thread_wakeup = threading.Event()
         _screendump_thread = threading.Thread(
             target=_take_screendumps, name="ScreenDump", args=(test, params, env)
         )
@@ -1280,6 +1411,11 @@ def postprocess(test, params, env):
             )
             LOG.error(details)
 
+    # Flush and release the images held by the guestfish appliances
+    utils_libguestfs.close_guestfish_pool()
+    # Log out of the guests before the VMs are possibly destroyed
+    utils_test.close_guest_session_pools()
+
     if (
         params.get("verify_guest_dmesg", "yes") == "yes"
         and params.get("start_vm", "no") == "yes"
@@ -1364,35 +1500,13 @@ def postprocess(test, params, env):
     global _screendump_thread, _screendump_thread_termination_event
     if _screendump_thread is not None:
         _screendump_thread_termination_event.set()
-        _screendump_thread.join(30)
+        _screendump_thread_wakeup.set()
+        # Give the thread the time to finish the videos being encoded
+        _screendump_thread.join(30 + float(params.get("encode_video_timeout", 60)))
         _screendump_thread = None
 
     # Encode an HTML 5 compatible video from the screenshots produced
-    dir_rex = "(screendump\S*_[0-9]+_iter%s)" % test.iteration
-    for screendump_dir in re.findall(dir_rex, str(os.listdir(test.debugdir))):
-        screendump_dir = os.path.join(test.debugdir, screendump_dir)
-        if params.get("encode_video_files", "yes") == "yes" and glob.glob(
-            "%s/*" % screendump_dir
-        ):
-            try:
-                # Loading video_maker at the top level is causing
-                # gst to be loaded at the top level, generating
-                # side effects in the loader plugins. So, let's
-                # move the import to the precise place where it's
-                # needed.
-                from . import video_maker
-
-                video = video_maker.get_video_maker_klass()
-                if video.has_element("vp8enc") and video.has_element("webmmux"):
-                    video_file = "%s.webm" % screendump_dir
-                else:
-                    video_file = "%s.ogg" % screendump_dir
-                video_file = os.path.join(test.debugdir, video_file)
-                LOG.debug("Encoding video file %s", video_file)
-                video.encode(screendump_dir, video_file)
-
-            except Exception as detail:
-                LOG.info("Video creation failed for %s: %s", screendump_dir, detail)
+    _encode_screendump_videos(test, params)
 
     # Warn about corrupt PPM files
     screendump_temp_dir = params.get("screendump_temp_dir")
@@ -1537,6 +1651,12 @@ def postprocess(test, params, env):
 
     err += "\n".join(_setup_manager.do_cleanup())
 
+    if params.get("log_wait_stats", "no") == "yes":
+        utils_misc.log_wait_stats(
+            params.get_numeric("log_wait_stats_limit", 10), log=LOG.info
+        )
+    utils_misc.clear_wait_stats()
+
     if err:
         raise RuntimeError("Failures occurred while postprocess:\n%s" % err)
 
@@ -1552,6 +1672,90 @@ def postprocess_on_error(test, params, env):
     params.update(params.object_params("on_error"))
 
 
+def _encode_screendump_videos(test, params):
+    """
+    Encode the videos of the screendump dirs of the test iteration.
+
+    The videos already encoded while the screendumps were taken are skipped.
+    """
+    dir_rex = "(screendump\S*_[0-9]+_iter%s)" % test.iteration
+    for screendump_dir in re.findall(dir_rex, str(os.listdir(test.debugdir))):
+        screendump_dir = os.path.join(test.debugdir, screendump_dir)
+        if screendump_dir in _encoded_screendump_dirs:
+            _encoded_screendump_dirs.discard(screendump_dir)
+            continue
+        if screendump_dir in _encoding_screendump_dirs:
+            # Don't write the video the screendump thread still encodes
+            LOG.info("Video of %s not finished in time", screendump_dir)
+            continue
+        if params.get("encode_video_files", "yes") == "yes" and glob.glob(
+            "%s/*" % screendump_dir
+        ):
+            try:
+                # Loading video_maker at the top level is causing
+                # gst to be loaded at the top level, generating
+                # side effects in the loader plugins. So, let's
+                # move the import to the precise place where it's
+                # needed.
+                from . import video_maker
+
+                video = video_maker.get_video_maker_klass()
+                if video.has_element("vp8enc") and video.has_element("webmmux"):
+                    video_file = "%s.webm" % screendump_dir
+                else:
+                    video_file = "%s.ogg" % screendump_dir
+                video_file = os.path.join(test.debugdir, video_file)
+                LOG.debug("Encoding video file %s", video_file)
+                video.encode(screendump_dir, video_file)
+
+            except Exception as detail:
+                LOG.info("Video creation failed for %s: %s", screendump_dir, detail)
+
+
+def _encode_video_frame(encoders, screendump_dir, image):
+    """
+    Add a screendump to the video of its directory, encoded as it grows.
+
+    :param encoders: Dict of the video encoders by screendump dir.
+    """
+    if screendump_dir not in encoders:
+        # See the import of video_maker in postprocess()
+        from . import video_maker
+
+        encoders[screendump_dir] = video_maker.get_stream_encoder(screendump_dir)[0]
+        if encoders[screendump_dir] is not None:
+            _encoding_screendump_dirs.add(screendump_dir)
+    encoder = encoders[screendump_dir]
+    if encoder is None:
+        return
+    try:
+        encoder.add_frame(image)
+    except Exception as detail:
+        # The video will be encoded from the files by postprocess()
+        LOG.info("Video encoding failed for %s: %s", screendump_dir, detail)
+        encoders[screendump_dir] = None
+        _encoding_screendump_dirs.discard(screendump_dir)
+
+
+def _finish_videos(encoders, timeout=60):
+    """
+    Finish the videos encoded by _encode_video_frame().
+
+    :param timeout: Time to wait for the encoding of each video.
+    """
+    for screendump_dir, encoder in encoders.items():
+        if encoder is None:
+            continue
+        try:
+            encoder.finish(timeout)
+            _encoded_screendump_dirs.add(screendump_dir)
+        except Exception as detail:
+            LOG.info("Video encoding failed for %s: %s", screendump_dir, detail)
+        finally:
+            _encoding_screendump_dirs.discard(screendump_dir)
+    encoders.clear()
+
+
 def _take_screendumps(test, params, env):
     global _screendump_thread_termination_event
     temp_dir = test.debugdir
@@ -1568,10 +1772,23 @@ def _take_screendumps(test, params, env):
     quality = int(params.get("screendump_quality", 30))
     inactivity_treshold = float(params.get("inactivity_treshold", 1800))
     inactivity_watcher = params.get("inactivity_watcher", "log")
+    encode_video = (
+        params.get("encode_video_files", "yes") == "yes"
+        and params.get("encode_video_incremental", "yes") == "yes"
+    )
+    encode_video_timeout = float(params.get("encode_video_timeout", 60))
 
     cache = {}
     counter = {}
     inactivity = {}
+    encoders = {}
+
+    # Take the screendumps at once on a background error, the screen at the
+    # time of the failure is the interesting one
+    wakeup = _screendump_thread_wakeup
+    subscription = test.background_errors.subscribe(
+        error_event.ERROR, lambda event: wakeup.set()
+    )
 
     while True:
         for vm in env.get_all_vms():
@@ -1639,6 +1856,8 @@ def _take_screendumps(test, params, env):
                     image = PIL.Image.open(temp_filename)
                     image = ppm_utils.add_timestamp(image, timestamp)
                     image.save(screendump_filename, format="JPEG", quality=quality)
+                    if encode_video:
+                        _encode_video_frame(encoders, screendump_dir, image)
                 except (IOError, OSError) as error_detail:
                     LOG.warning(
                         "VM '%s' failed to produce a " "screendump: %s",
@@ -1656,10 +1875,13 @@ def _take_screendumps(test, params, env):
             if _screendump_thread_termination_event.is_set():
                 _screendump_thread_termination_event = None
                 break
-            _screendump_thread_termination_event.wait(delay)
+            wakeup.wait(delay)
+            wakeup.clear()
         else:
             # Exit event was deleted, exit this thread
             break
+    test.background_errors.unsubscribe(subscription)
+    _finish_videos(encoders, encode_video_timeout)
 
 
 def store_vm_info(vm, log_filename, info_cmd="registers", append=False, vmtype="qemu"):
@@ -4,49 +4,264 @@ This aims to share error event bus with asynchronous tasks launched by
 avocado-vt, so that those tasks that have no reference to test could error the
 test.
 
+Events are published on typed topics. Events of the fatal topics (ERROR by
+default) wake up :meth:`EventBus.wait_any` at once. The bus is bounded: when
+it's full the oldest non-fatal event makes room for the new one, and once
+only fatal events are left the new events are dropped and counted per topic
+instead of blocking the background thread which reports them.
+
 IMPORTANT: only for internal use inside avocado-vt.
 """
 
+import collections
+import logging
+import threading
+import time
+
 from six.moves import queue
 
+LOG = logging.getLogger("avocado." + __name__)
+
+# Topics known by every bus, and whether their events are fatal
+ERROR = "error"
+WARNING = "warning"
+INFO = "info"
+DEFAULT_TOPICS = {ERROR: True, WARNING: False, INFO: False}
+
+# Default capacity of the bus
+MAX_EVENTS = 1000
+
+
+class UnknownTopicError(ValueError):
+    """Event published on a topic which was never added to the bus."""
+
+    pass
+
+
+Event = collections.namedtuple("Event", ["topic", "data", "fatal", "timestamp"])
+
 
 class EventBus(object):
     """Event Bus."""
 
-    def __init__(self):
-        """Create the error event bus with queue.Queue."""
-        self.error_events = queue.Queue()
+    def __init__(self, maxsize=MAX_EVENTS):
+        """
+        Create the error event bus.
 
-    def put(self, event, block=True, timeout=None):
-        """Put an event into the event bus."""
-        self.error_events.put(event, block, timeout)
+        :param maxsize: Number of events kept until they are consumed, the
+                        ones past that are dropped. 0 means unbounded.
+        """
+        self.maxsize = maxsize
+        self.topics = dict(DEFAULT_TOPICS)
+        # Number of dropped events per topic
+        self.dropped = collections.Counter()
+        # Set while there's a fatal event in the bus, or after a fatal event
+        # was dropped, usable as a wake_on source of utils_misc.wait_for
+        self.fatal = threading.Event()
+        self._dropped_fatal = 0
+        self._events = collections.deque()
+        self._cond = threading.Condition()
+        self._subscribers = {}
+        self._dispatch_queue = None
+        self._dispatcher = None
 
-    def get(self, block=True, timeout=None):
-        """Remove and return an event from the event bus."""
-        try:
-            return self.error_events.get(block, timeout)
-        except queue.Empty:
-            raise
+    def add_topic(self, topic, fatal=False):
+        """
+        Add a topic events can be published on.
+
+        :param topic: Name of the topic.
+        :param fatal: Whether the events of the topic are fatal.
+        """
+        self.topics[topic] = fatal
+
+    def put(self, event, block=True, timeout=None, topic=ERROR, fatal=None):
+        """
+        Put an event into the event bus.
+
+        When the bus is full the oldest non-fatal event is dropped to make
+        room.  If all of them are fatal, the room is awaited up to timeout
+        seconds when block is True and a timeout is given, then the event
+        is dropped.  The dropped events are counted in :attr:`dropped`.
+
+        :param event: Event data, e.g. the sys.exc_info() of an error.
+        :param topic: Topic of the event.
+        :param fatal: Override of the fatality of the topic.
+        :return: True when the event was queued.
+        """
+        if topic not in self.topics:
+            raise UnknownTopicError("Unknown event topic '%s'" % topic)
+        if fatal is None:
+            fatal = self.topics[topic]
+        record = Event(topic, event, fatal, time.time())
+        with self._cond:
+            if self.maxsize and len(self._events) >= self.maxsize:
+                self._evict()
+                if len(self._events) >= self.maxsize and block and timeout:
+                    self._cond.wait_for(
+                        lambda: len(self._events) < self.maxsize, timeout
+                    )
+                if len(self._events) >= self.maxsize:
+                    self.dropped[topic] += 1
+                    if fatal:
+                        # a dropped failure must still fail the test
+                        self._dropped_fatal += 1
+                        self.fatal.set()
+                    self._dispatch(record)
+                    return False
+            self._events.append(record)
+            if fatal:
+                self.fatal.set()
+            self._cond.notify_all()
+            self._dispatch(record)
+        return True
+
+    def _evict(self):
+        """Drop the oldest non-fatal event, if any."""
+        for index, record in enumerate(self._events):
+            if not record.fatal:
+                del self._events[index]
+                self.dropped[record.topic] += 1
+                return
+
+    def _pop(self, topic=None):
+        """Remove and return the first event of the topic, None if none."""
+        for index, record in enumerate(self._events):
+            if topic is None or record.topic == topic:
+                del self._events[index]
+                break
         else:
-            self.error_events.task_done()
+            return None
+        if not self._dropped_fatal and not any(event.fatal for event in self._events):
+            self.fatal.clear()
+        self._cond.notify_all()
+        return record
+
+    def get_event(self, block=True, timeout=None, topic=None):
+        """
+        Remove and return an event from the event bus, with its topic.
+
+        :param topic: Only get the events of this topic.
+        :return: :class:`Event`.
+        :raise queue.Empty: When there's no event.
+        """
+        with self._cond:
+            record = self._pop(topic)
+            if record is None and block:
+                self._cond.wait_for(
+                    lambda: any(
+                        topic is None or event.topic == topic for event in self._events
+                    ),
+                    timeout,
+                )
+                record = self._pop(topic)
+        if record is None:
+            raise queue.Empty
+        return record
+
+    def get(self, block=True, timeout=None, topic=None):
+        """Remove and return an event from the event bus."""
+        return self.get_event(block, timeout, topic).data
 
     def __len__(self):
         """Return the event count."""
-        return self.error_events.qsize()
+        return len(self._events)
 
-    def get_all(self):
+    def get_all(self, topic=None):
         """Remove and return a list of all events from the event bus."""
         error_events = []
-        while len(self):
-            try:
-                error_events.append(self.get(block=False))
-            except queue.Empty:
-                pass
+        with self._cond:
+            while True:
+                record = self._pop(topic)
+                if record is None:
+                    break
+                error_events.append(record.data)
         return error_events
 
     def clear(self):
         """Clear all events in the event bus."""
-        self.get_all()
+        with self._cond:
+            self.get_all()
+            self.dropped.clear()
+            self._dropped_fatal = 0
+            self.fatal.clear()
+
+    def wait_any(self, timeout=None, topics=None):
+        """
+        Wait for a fatal event, or for any event of the given topics.
+
+        Returns as soon as such event is published, without polling.
+
+        :param timeout: Time to wait, forever when None.
+        :param topics: Topics to wait for instead of the fatal events.
+        :return: True when there's such event in the bus.
+        """
+        if topics is None:
+            return self.fatal.wait(timeout)
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: any(event.topic in topics for event in self._events),
+                timeout,
+            )
+
+    def subscribe(self, topic, callback):
+        """
+        Call callback(event) for every event published on the topic.
+
+        All the callbacks are called from a single dispatcher thread, in
+        the order the events were published, so they must not block. The
+        events stay in the bus for :meth:`get` and :meth:`get_all`.
+
+        :param topic: Topic to subscribe to, None for all of them.
+        :param callback: Function called with the :class:`Event`.
+        :return: Token to be given to :meth:`unsubscribe`.
+        """
+        if topic is not None and topic not in self.topics:
+            raise UnknownTopicError("Unknown event topic '%s'" % topic)
+        with self._cond:
+            token = object()
+            self._subscribers[token] = (topic, callback)
+            if self._dispatcher is None:
+                self._dispatch_queue = queue.Queue(self.maxsize)
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop, name="EventBusDispatcher"
+                )
+                self._dispatcher.daemon = True
+                self._dispatcher.start()
+        return token
+
+    def unsubscribe(self, token):
+        """Stop calling the callback registered by :meth:`subscribe`."""
+        with self._cond:
+            self._subscribers.pop(token, None)
+
+    def _dispatch(self, record):
+        if not self._subscribers:
+            return
+        try:
+            self._dispatch_queue.put_nowait(record)
+        except queue.Full:
+            self.dropped["dispatch"] += 1
+
+    def _dispatch_loop(self):
+        while True:
+            record = self._dispatch_queue.get()
+            with self._cond:
+                callbacks = [
+                    callback
+                    for topic, callback in self._subscribers.values()
+                    if topic is None or topic == record.topic
+                ]
+            for callback in callbacks:
+                try:
+                    callback(record)
+                except Exception as details:
+                    LOG.warning(
+                        "Event callback %s failed on %s event: %s",
+                        callback,
+                        record.topic,
+                        details,
+                    )
+            self._dispatch_queue.task_done()
 
 
 error_events_bus = EventBus()
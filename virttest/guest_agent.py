@@ -5,16 +5,18 @@ Interfaces to the virt agent.
 """
 
 import base64
+import hashlib
 import json
 import logging
 import random
+import re
 import socket
 import time
 
 import six
 from avocado.utils import process
 
-from virttest import error_context
+from virttest import error_context, utils_misc
 from virttest.qemu_monitor import Monitor, MonitorError
 
 LOG = logging.getLogger("avocado." + __name__)
@@ -95,6 +97,10 @@ class VAgentSuspendUnknownModeError(VAgentSuspendError):
         return "Not supported suspend mode '%s'" % self.mode
 
 
+class VAgentFileTransferError(VAgentError):
+    pass
+
+
 class VAgentFreezeStatusError(VAgentError):
     def __init__(self, vm_name, status, expected):
         VAgentError.__init__(self)
@@ -121,6 +127,12 @@ class QemuAgent(Monitor):
     PROMPT_TIMEOUT = 20
     FSFREEZE_TIMEOUT = 90
 
+    # Bytes of file content carried by a single guest-file-read/write
+    FILE_CHUNK_SIZE = 1024 * 1024
+    # Number of guest-file-read/write commands in flight while copying
+    FILE_PIPELINE_DEPTH = 4
+    FILE_RECV_SIZE = 256 * 1024
+
     SERIAL_TYPE_VIRTIO = "virtio"
     SERIAL_TYPE_ISA = "isa"
     SUPPORTED_SERIAL_TYPE = [SERIAL_TYPE_VIRTIO, SERIAL_TYPE_ISA]
@@ -816,14 +828,16 @@ class QemuAgent(Monitor):
         Write to guest file.
 
         :param handle: file handle returned by guest-file-open.
-        :param content: content to write.
+        :param content: content to write, str or bytes.
         :param count: optional bytes to write (actual bytes, after
                base64-decode),default is all content in buf-b64 buffer
                after base64 decoding
         :return: a dict with count and eof.
         """
         cmd = "guest-file-write"
-        con_encode = base64.b64encode(content.encode()).decode()
+        if not isinstance(content, bytes):
+            content = content.encode()
+        con_encode = base64.b64encode(content).decode()
         return self._cmd_args_update(
             cmd, handle=handle, buf_b64=con_encode, count=count
         )
@@ -864,6 +878,299 @@ class QemuAgent(Monitor):
         cmd = "guest-file-seek"
         return self._cmd_args_update(cmd, handle=handle, offset=offset, whence=whence)
 
+    def _send_file_cmd(self, cmd, handle, buf_b64=None, count=None):
+        """
+        Send a guest-file-read/write command without waiting for its response.
+
+        The command is encoded by hand so the base64 payload goes to the
+        socket as it is, instead of being decoded to str, escaped by
+        json.dumps and encoded back to bytes.
+
+        :param cmd: "guest-file-read" or "guest-file-write".
+        :param handle: file handle returned by guest-file-open.
+        :param buf_b64: base64 encoded bytes to write.
+        :param count: bytes to read.
+        """
+        head = '{"execute": "%s", "arguments": {"handle": %d' % (cmd, handle)
+        if count is not None:
+            head += ', "count": %d' % count
+        try:
+            if buf_b64 is None:
+                self._socket.sendall(head.encode() + b"}}\n")
+            else:
+                self._socket.sendall(head.encode() + b', "buf-b64": "')
+                self._socket.sendall(buf_b64)
+                self._socket.sendall(b'"}}\n')
+        except socket.error as e:
+            raise VAgentSocketError("Could not send %s command" % cmd, e)
+        if buf_b64 is None:
+            self._log_lines(head + "}}")
+        else:
+            self._log_lines(head + ', "buf-b64": <%d bytes>}}' % len(buf_b64))
+
+    def _get_file_response(self, buf, timeout):
+        """
+        Read the next response of a pipelined guest-file-read/write command.
+
+        Unlike _read_objects(), only complete lines are decoded, once, so big
+        guest-file-read responses don't get parsed over and over while they
+        are being received.
+
+        :param buf: bytearray holding the received but unprocessed data.
+        :param timeout: Time duration to wait for the response.
+        :return: The response dict.
+        :raise VAgentProtocolError: Raised if no response is received.
+        """
+        end_time = time.time() + timeout
+        while True:
+            pos = buf.find(b"\n")
+            if pos >= 0:
+                line = bytes(buf[:pos]).lstrip(b"\xff").strip()
+                del buf[: pos + 1]
+                if not line:
+                    continue
+                obj = json.loads(line)
+                if isinstance(obj, dict) and ("return" in obj or "error" in obj):
+                    if "error" in obj:
+                        self._log_lines(line.decode(errors="replace"))
+                    return obj
+                continue
+            if not self._data_available(end_time - time.time()):
+                raise VAgentProtocolError(
+                    "No response to guest file command within %ss" % timeout
+                )
+            try:
+                data = self._socket.recv(self.FILE_RECV_SIZE)
+            except socket.error as e:
+                raise VAgentSocketError("Could not receive data from agent", e)
+            if not data:
+                self._server_closed = True
+                raise VAgentProtocolError("Guest agent closed the connection")
+            buf += data
+
+    def _pipeline_file_cmds(self, send_next, handle_response, depth, timeout):
+        """
+        Keep up to depth guest file commands in flight.
+
+        The guest agent answers the commands in order, so responses are
+        matched to the commands by counting.  On the first error no more
+        commands are sent, but the pending responses are still consumed to
+        keep the channel in sync.
+
+        :param send_next: Callable sending the next command, returning False
+                          when there is nothing more to send.
+        :param handle_response: Callable processing a command's "return"
+                                value, returning False to stop sending.
+        :param depth: Maximal number of commands in flight.
+        :param timeout: Time duration to wait for each response.
+        :raise VAgentCmdError: Raised if any of the commands failed.
+        """
+        if not self._acquire_lock():
+            raise VAgentLockError("Could not acquire exclusive lock for file copy")
+        try:
+            self._read_objects()
+            buf = bytearray()
+            in_flight = 0
+            sending = True
+            error = None
+            while True:
+                while sending and in_flight < depth:
+                    sending = send_next()
+                    if sending:
+                        in_flight += 1
+                if not in_flight:
+                    break
+                resp = self._get_file_response(buf, timeout)
+                in_flight -= 1
+                if "error" in resp:
+                    error = error or resp["error"]
+                    sending = False
+                elif error is None and not handle_response(resp["return"]):
+                    sending = False
+        finally:
+            self._lock.release()
+        if error is not None:
+            raise VAgentCmdError("guest-file-read/write", None, error)
+
+    def guest_file_checksum(self, path, timeout=CMD_TIMEOUT):
+        """
+        Get the sha256 checksum of a guest file by running a command in it.
+
+        :param path: full path to the file in the guest.
+        :param timeout: Time duration to wait for the command to finish.
+        :return: the hex digest, None if the guest can't compute it.
+        """
+        try:
+            self.check_has_command("guest-exec")
+            osinfo = {}
+            if "guest-get-osinfo" in self._supported_cmds:
+                osinfo = self.get_osinfo() or {}
+        except VAgentCmdNotSupportedError:
+            return None
+        if osinfo.get("id") == "mswindows":
+            cmd, args = "certutil", ["-hashfile", path, "SHA256"]
+        else:
+            cmd, args = "sha256sum", [path]
+        try:
+            pid = self.guest_exec(cmd, arg=args, capture_output=True)["pid"]
+        except VAgentCmdError as e:
+            LOG.warning("Could not compute checksum of %s in guest: %s", path, e)
+            return None
+
+        def exited():
+            status = self.guest_exec_status(pid)
+            return status if status.get("exited") else None
+
+        status = utils_misc.wait_for(exited, timeout, step=0.1) or {}
+        if not status.get("exited") or status.get("exitcode"):
+            LOG.warning("Could not compute checksum of %s in guest: %s", path, status)
+            return None
+        out = base64.b64decode(status.get("out-data", "")).decode(errors="replace")
+        # sha256sum prints "<digest>  <path>", certutil prints the digest on
+        # its own line, with spaces between the bytes on older versions.
+        for line in out.splitlines():
+            words = line.split()
+            for candidate in words[:1] + ["".join(words)]:
+                if re.match(r"^[0-9a-fA-F]{64}$", candidate):
+                    return candidate.lower()
+        return None
+
+    def _report_file_copy(self, direction, src, dst, size, elapsed, checksum):
+        throughput = size / elapsed / 1024 / 1024 if elapsed else 0.0
+        LOG.info(
+            "Copied %s bytes %s guest (%s -> %s) in %.2fs, %.2f MB/s",
+            size,
+            direction,
+            src,
+            dst,
+            elapsed,
+            throughput,
+        )
+        return {
+            "size": size,
+            "elapsed": elapsed,
+            "throughput": throughput,
+            "checksum": checksum,
+        }
+
+    def _verify_file_copy(self, guest_path, checksum, verify):
+        if not verify:
+            return
+        guest_checksum = self.guest_file_checksum(guest_path)
+        if guest_checksum is None:
+            LOG.warning("Skipping checksum verification of %s", guest_path)
+        elif guest_checksum != checksum:
+            raise VAgentFileTransferError(
+                "Checksum mismatch of %s: %s in guest, %s on host"
+                % (guest_path, guest_checksum, checksum)
+            )
+
+    def copy_to_guest(
+        self, src, dst, chunk_size=None, depth=None, verify=True, timeout=CMD_TIMEOUT
+    ):
+        """
+        Copy a host file into the guest through the guest agent.
+
+        Several guest-file-write commands are kept in flight, so the copy
+        isn't bound by the round trip time of the agent channel.  The sha256
+        checksum is computed while the file is sent.
+
+        :param src: path of the host file.
+        :param dst: full path of the destination file in the guest.
+        :param chunk_size: bytes sent per command, FILE_CHUNK_SIZE by default.
+        :param depth: commands in flight, FILE_PIPELINE_DEPTH by default.
+        :param verify: compare the checksum of the file in the guest too.
+        :param timeout: Time duration to wait for each response.
+        :return: a dict with size, elapsed, throughput (MB/s) and checksum.
+        :raise VAgentFileTransferError: Raised if the copy is incomplete or
+                                        the checksums differ.
+        """
+        chunk_size = chunk_size or self.FILE_CHUNK_SIZE
+        depth = depth or self.FILE_PIPELINE_DEPTH
+        self.check_has_command("guest-file-write")
+        digest = hashlib.sha256()
+        sent = [0]
+        written = [0]
+        start = time.time()
+        handle = self.guest_file_open(dst, mode="wb")
+        try:
+            with open(src, "rb") as src_file:
+
+                def send_next():
+                    chunk = src_file.read(chunk_size)
+                    if not chunk:
+                        return False
+                    digest.update(chunk)
+                    sent[0] += len(chunk)
+                    self._send_file_cmd(
+                        "guest-file-write", handle, base64.b64encode(chunk)
+                    )
+                    return True
+
+                def handle_response(ret):
+                    written[0] += ret["count"]
+                    return True
+
+                self._pipeline_file_cmds(send_next, handle_response, depth, timeout)
+            self.guest_file_flush(handle)
+        finally:
+            self.guest_file_close(handle)
+        elapsed = time.time() - start
+        if written[0] != sent[0]:
+            raise VAgentFileTransferError(
+                "Wrote %s of %s bytes to %s" % (written[0], sent[0], dst)
+            )
+        checksum = digest.hexdigest()
+        self._verify_file_copy(dst, checksum, verify)
+        return self._report_file_copy("to", src, dst, sent[0], elapsed, checksum)
+
+    def copy_from_guest(
+        self, src, dst, chunk_size=None, depth=None, verify=True, timeout=CMD_TIMEOUT
+    ):
+        """
+        Copy a guest file to the host through the guest agent.
+
+        Several guest-file-read commands are kept in flight and the sha256
+        checksum is computed while the file is received.
+
+        :param src: full path of the file in the guest.
+        :param dst: path of the host destination file.
+        :param chunk_size: bytes read per command, FILE_CHUNK_SIZE by default.
+        :param depth: commands in flight, FILE_PIPELINE_DEPTH by default.
+        :param verify: compare the checksum of the file in the guest too.
+        :param timeout: Time duration to wait for each response.
+        :return: a dict with size, elapsed, throughput (MB/s) and checksum.
+        :raise VAgentFileTransferError: Raised if the checksums differ.
+        """
+        chunk_size = chunk_size or self.FILE_CHUNK_SIZE
+        depth = depth or self.FILE_PIPELINE_DEPTH
+        self.check_has_command("guest-file-read")
+        digest = hashlib.sha256()
+        received = [0]
+        start = time.time()
+        handle = self.guest_file_open(src, mode="rb")
+        try:
+            with open(dst, "wb") as dst_file:
+
+                def send_next():
+                    self._send_file_cmd("guest-file-read", handle, count=chunk_size)
+                    return True
+
+                def handle_response(ret):
+                    data = base64.b64decode(ret["buf-b64"])
+                    digest.update(data)
+                    dst_file.write(data)
+                    received[0] += len(data)
+                    return not ret.get("eof")
+
+                self._pipeline_file_cmds(send_next, handle_response, depth, timeout)
+        finally:
+            self.guest_file_close(handle)
+        elapsed = time.time() - start
+        checksum = digest.hexdigest()
+        self._verify_file_copy(src, checksum, verify)
+        return self._report_file_copy("from", src, dst, received[0], elapsed, checksum)
+
     def guest_exec(
         self, path, arg=None, env=None, input_data=None, capture_output=None
     ):
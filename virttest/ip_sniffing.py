@@ -2,8 +2,11 @@
 IP sniffing facilities
 """
 
+import ctypes
 import logging
 import re
+import socket
+import struct
 import threading
 
 try:
@@ -288,6 +291,250 @@ class TcpdumpSniffer(Sniffer):
             return True
 
 
+def _dhcp_options(data, offset):
+    """
+    Iterate over the (code, value) of the DHCP options starting at offset.
+    """
+    while offset < len(data):
+        code = data[offset]
+        if code == 255:
+            return
+        if code == 0:
+            offset += 1
+            continue
+        length = data[offset + 1] if offset + 1 < len(data) else 0
+        yield code, data[offset + 2 : offset + 2 + length]
+        offset += 2 + length
+
+
+def _dhcp6_options(data):
+    """
+    Iterate over the (code, value) of the DHCPv6 options in data.
+    """
+    offset = 0
+    while offset + 4 <= len(data):
+        code, length = struct.unpack_from("!HH", data, offset)
+        yield code, data[offset + 4 : offset + 4 + length]
+        offset += 4 + length
+
+
+class PacketSniffer(Sniffer):
+    """
+    In process sniffer reading the DHCP/DHCPv6 replies from a packet socket.
+
+    A classic BPF filter attached to an `AF_PACKET` socket lets only the
+    replies to the DHCP (port 68) and DHCPv6 (port 546) clients through, and
+    the DHCP ACK and DHCPv6 REPLY headers are parsed directly into the
+    address cache, with no external dissector in between.  It can only sniff
+    on the local host, so the external sniffers are used for remote ones.
+    """
+
+    command = "AF_PACKET"
+    #: Receive the packets of all the protocols (ETH_P_ALL)
+    ETH_P_ALL = 0x0003
+    SO_ATTACH_FILTER = 26
+    #: Classic BPF program run on the network header of the cooked packets,
+    #: accepting UDP packets to port 68 over IPv4 (no fragments) and to port
+    #: 546 over IPv6 (no extension headers), as (code, jt, jf, k)
+    BPF_FILTER = (
+        (0x30, 0, 0, 0),  # ldb [0]
+        (0x54, 0, 0, 0xF0),  # and #0xf0, the IP version
+        (0x15, 0, 7, 0x40),  # jeq #0x40, else check IPv6
+        (0x30, 0, 0, 9),  # ldb [9], the IPv4 protocol
+        (0x15, 0, 11, 17),  # jeq UDP, else drop
+        (0x28, 0, 0, 6),  # ldh [6], the fragment offset
+        (0x45, 9, 0, 0x1FFF),  # jset #0x1fff, drop fragments
+        (0xB1, 0, 0, 0),  # ldxb 4*([0]&0xf), the IPv4 header length
+        (0x48, 0, 0, 2),  # ldh [x+2], the UDP destination port
+        (0x15, 5, 6, 68),  # jeq #68, accept else drop
+        (0x15, 0, 5, 0x60),  # jeq #0x60, else drop
+        (0x30, 0, 0, 6),  # ldb [6], the IPv6 next header
+        (0x15, 0, 3, 17),  # jeq UDP, else drop
+        (0x28, 0, 0, 42),  # ldh [42], the UDP destination port
+        (0x15, 0, 1, 546),  # jeq #546, accept else drop
+        (0x06, 0, 0, 0x40000),  # accept
+        (0x06, 0, 0, 0),  # drop
+    )
+    #: Link types of the pcap files and the length of their link headers
+    _PCAP_LINK_HEADERS = {1: 14, 101: 0, 113: 16}
+
+    def __init__(self, addr_cache, log_file, remote_opts=None):
+        super(PacketSniffer, self).__init__(addr_cache, log_file, remote_opts)
+        self._socket = None
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def is_supported(cls, session=None):
+        if session or not hasattr(socket, "AF_PACKET"):
+            return False
+        try:
+            cls._open_socket().close()
+        except (OSError, socket.error) as details:
+            LOG.debug("Can't sniff with a packet socket: %s", details)
+            return False
+        return True
+
+    @classmethod
+    def _open_socket(cls):
+        # SOCK_DGRAM strips the link headers, so the filter and the parser
+        # see the network header first whatever the interface is
+        sock = socket.socket(
+            socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(cls.ETH_P_ALL)
+        )
+        program = b"".join(struct.pack("HBBI", *insn) for insn in cls.BPF_FILTER)
+        buf = ctypes.create_string_buffer(program)
+        fprog = struct.pack("HL", len(cls.BPF_FILTER), ctypes.addressof(buf))
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, cls.SO_ATTACH_FILTER, fprog)
+        except (OSError, socket.error) as details:
+            # the packets are checked by the parser anyway
+            LOG.warning("Can't attach the BPF filter to the sniffer: %s", details)
+        return sock
+
+    def _update_cache(self, hwaddr, ipaddr, msg):
+        self._cache[hwaddr] = ipaddr
+        try:
+            log_line(self._logfile, "%s %s %s" % (msg, hwaddr, ipaddr))
+        except Exception as e:
+            LOG.warning("Can't log ip sniffer output: '%s'", e)
+
+    def _handle_dhcp(self, data):
+        # BootP/DHCP (RFC 951/2131), a BOOTREPLY with an ethernet chaddr
+        if len(data) < 240 or data[0] != 2 or data[1] != 1 or data[2] != 6:
+            return False
+        if data[236:240] != b"\x63\x82\x53\x63":
+            return False
+        yiaddr = data[16:20]
+        if yiaddr == b"\x00\x00\x00\x00":
+            # the reply to an INFORM
+            return False
+        for code, value in _dhcp_options(data, 240):
+            if code == 53:
+                if value != b"\x05":
+                    return False
+                hwaddr = ":".join("%02x" % b for b in bytearray(data[28:34]))
+                self._update_cache(hwaddr, socket.inet_ntoa(yiaddr), "DHCP ACK")
+                return True
+        return False
+
+    def _handle_dhcp6(self, data):
+        # DHCPv6 (RFC 3315), a REPLY with the client DUID and an IA address
+        if len(data) < 4 or data[0] != 7:
+            return False
+        hwaddr = ipaddr = None
+        for code, value in _dhcp6_options(data[4:]):
+            if code == 1 and len(value) >= 6:
+                # the link layer address ends the DUID-LL/DUID-LLT
+                hwaddr = ":".join("%02x" % b for b in bytearray(value[-6:]))
+            elif code in (3, 4) and ipaddr is None:
+                # IA_NA has iaid, T1 and T2 before its options, IA_TA iaid
+                start = 12 if code == 3 else 4
+                for sub_code, sub_value in _dhcp6_options(value[start:]):
+                    if sub_code == 5 and len(sub_value) >= 16:
+                        ipaddr = socket.inet_ntop(socket.AF_INET6, sub_value[:16])
+                        break
+        if hwaddr and ipaddr:
+            self._update_cache("%s_6" % hwaddr, ipaddr, "DHCPv6 REPLY")
+            return True
+        return False
+
+    def handle_packet(self, data):
+        """
+        Update the address cache with the DHCP/DHCPv6 reply in a packet.
+
+        :param data: The packet, starting at the IP header
+        :return: True if the packet updated the cache
+        """
+        data = bytearray(data)
+        if len(data) < 20:
+            return False
+        version = data[0] >> 4
+        if version == 4:
+            offset = (data[0] & 0x0F) * 4
+            if data[9] != 17 or struct.unpack_from("!H", data, 6)[0] & 0x1FFF:
+                return False
+            if struct.unpack_from("!H", data, offset + 2)[0] != 68:
+                return False
+            return self._handle_dhcp(data[offset + 8 :])
+        if version == 6 and len(data) >= 48:
+            if data[6] != 17 or struct.unpack_from("!H", data, 42)[0] != 546:
+                return False
+            return self._handle_dhcp6(data[48:])
+        return False
+
+    def replay(self, pcap_file):
+        """
+        Feed the packets of a pcap file to the sniffer.
+
+        :param pcap_file: Path of a pcap file captured on an ethernet, raw IP
+                          or 'any' (linux cooked) interface
+        :return: Number of packets which updated the address cache
+        """
+        updates = 0
+        with open(pcap_file, "rb") as pcap:
+            header = pcap.read(24)
+            magic = struct.unpack("<I", header[:4])[0]
+            if magic in (0xA1B2C3D4, 0xA1B23C4D):
+                endian = "<"
+            elif magic in (0xD4C3B2A1, 0x4D3CB2A1):
+                endian = ">"
+            else:
+                raise ValueError("%s is not a pcap file" % pcap_file)
+            link_type = struct.unpack(endian + "I", header[20:24])[0]
+            if link_type not in self._PCAP_LINK_HEADERS:
+                raise ValueError("Unsupported pcap link type %s" % link_type)
+            link_len = self._PCAP_LINK_HEADERS[link_type]
+            while True:
+                record = pcap.read(16)
+                if len(record) < 16:
+                    break
+                caplen = struct.unpack(endian + "I", record[8:12])[0]
+                packet = pcap.read(caplen)
+                offset = link_len
+                # 802.1Q tagged ethernet frames
+                if link_type == 1 and packet[12:14] == b"\x81\x00":
+                    offset += 4
+                if self.handle_packet(packet[offset:]):
+                    updates += 1
+        return updates
+
+    def _sniff(self, sock):
+        while not self._stop_event.is_set():
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                continue
+            except (OSError, socket.error) as details:
+                if not self._stop_event.is_set():
+                    LOG.error("IP sniffer (%s) failed: %s", self.command, details)
+                return
+            try:
+                self.handle_packet(data)
+            except (IndexError, struct.error, ValueError):
+                # Ignore problematical packets
+                pass
+
+    def _start(self):
+        self._socket = self._open_socket()
+        self._socket.settimeout(0.5)
+        self._stop_event.clear()
+        self._process = threading.Thread(
+            target=self._sniff, args=(self._socket,), name="ip-sniffer"
+        )
+        self._process.daemon = True
+        self._process.start()
+
+    def stop(self):
+        """Stop sniffing."""
+        self._stop_event.set()
+        if self._process:
+            self._process.join()
+            self._process = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+
 class TSharkSniffer(Sniffer):
     """
     TShark sniffer base class.
@@ -388,4 +635,4 @@ class TShark3ToLatest(TSharkSniffer):
 
 
 #: All the defined sniffers
-Sniffers = (TShark3ToLatest, TShark1To2, TcpdumpSniffer)
+Sniffers = (PacketSniffer, TShark3ToLatest, TShark1To2, TcpdumpSniffer)
@@ -29,9 +29,11 @@ from virttest import (
     libvirt_xml,
     storage,
     test_setup,
+    utils_libguestfs,
     utils_logfile,
     utils_misc,
     utils_package,
+    utils_resources,
     utils_selinux,
     virsh,
     virt_vm,
@@ -2057,6 +2059,8 @@ class VM(virt_vm.BaseVM):
         """
         error_context.context("creating '%s'" % self.name)
         self.destroy(free_mac_addresses=False)
+        # The guestfish appliances would keep qemu from locking the images
+        utils_libguestfs.invalidate_guestfish_pool()
         if name is not None:
             self.name = name
         if params is not None:
@@ -2125,7 +2129,8 @@ class VM(virt_vm.BaseVM):
         try:
             # Handle port redirections
             redir_names = params.objects("redirs")
-            host_ports = utils_misc.find_free_ports(5000, 5899, len(redir_names))
+            ports = utils_resources.get_port_range(params, 5000, 5899)
+            host_ports = utils_misc.find_free_ports(*ports, len(redir_names))
             self.redirs = {}
             for i in range(len(redir_names)):
                 redir_params = params.object_params(redir_names[i])
@@ -2143,12 +2148,14 @@ class VM(virt_vm.BaseVM):
                     self.vnc_port = None
                     self.vnc_autoport = True
                 else:
-                    self.vnc_port = utils_misc.find_free_port(5900, 6100)
+                    ports = utils_resources.get_port_range(params, 5900, 6100)
+                    self.vnc_port = utils_misc.find_free_port(*ports)
                     self.vnc_autoport = False
 
             # Find available spice port, if needed
             if params.get("spice"):
-                self.spice_port = utils_misc.find_free_port(8000, 8100)
+                ports = utils_resources.get_port_range(params, 8000, 8100)
+                self.spice_port = utils_misc.find_free_port(*ports)
 
             # Find random UUID if specified 'uuid = random' in config file
             if params.get("uuid") == "random":
@@ -2395,6 +2402,7 @@ class VM(virt_vm.BaseVM):
             virsh.destroy(self.name, destroy_opt, uri=self.connect_uri)
 
         finally:
+            self.close_ssh_mux()
             self.cleanup_serial_console()
         if free_mac_addresses:
             if self.is_persistent():
@@ -2697,6 +2705,8 @@ class VM(virt_vm.BaseVM):
         ):
             raise virt_vm.VMRebootError("Guest refuses to go down")
         session.close()
+        # The connections to the guest went down with it
+        self.close_ssh_mux()
 
         error_context.context("logging in after reboot", LOG.info)
         if serial:
@@ -2716,6 +2726,8 @@ class VM(virt_vm.BaseVM):
         self.uuid = uid_result.stdout_text.strip()
 
         LOG.debug("Starting vm '%s'", self.name)
+        # The guestfish appliances would keep qemu from locking the images
+        utils_libguestfs.invalidate_guestfish_pool()
         result = virsh.start(self.name, uri=self.connect_uri)
         if not result.exit_status:
             # Wait for the domain to be created
@@ -397,6 +397,15 @@ class Monitor(object):
             time.sleep(0.05)
         return False
 
+    def fileno(self):
+        """
+        Return the monitor socket file descriptor.
+
+        It becomes readable when the monitor has data (e.g. QMP events), so
+        the monitor can be passed to select() or utils_misc.wait_for(wake_on).
+        """
+        return self._socket.fileno()
+
     def _data_available(self, timeout=DATA_AVAILABLE_TIMEOUT):
         if self._server_closed:
             return False
@@ -1804,6 +1813,9 @@ class QMPMonitor(Monitor):
             self.protocol = "qmp"
             self._greeting = None
             self._events = []
+            # Bumped on every device_add and DEVICE_DELETED event, so that
+            # the cached QOM tree of qemu_qtree is dropped on hotplug
+            self.device_generation = 0
             self._supported_hmp_cmds = []
 
             # Make sure json is available
@@ -1889,7 +1901,11 @@ class QMPMonitor(Monitor):
             except Exception:
                 pass
         # Keep track of asynchronous events
-        self._events += [obj for obj in objs if "event" in obj]
+        events = [obj for obj in objs if "event" in obj]
+        self._events += events
+        self.device_generation += sum(
+            1 for event in events if event["event"] == "DEVICE_DELETED"
+        )
         return objs
 
     def _send(self, data, fds=None):
@@ -2073,6 +2089,8 @@ class QMPMonitor(Monitor):
             if debug:
                 LOG.debug("Send command: %s" % cmdobj)
             self._send(msg, fds)
+            if cmd == "device_add":
+                self.device_generation += 1
             # Read response
             r = self._get_response(q_id, timeout)
             if r is None:
@@ -2155,6 +2173,65 @@ class QMPMonitor(Monitor):
         """
         return self.cmd_obj(self._build_cmd(cmd, args, q_id), timeout)
 
+    def cmd_batch(self, cmds, timeout=CMD_TIMEOUT, debug=True):
+        """
+        Send several QMP commands at once and wait for all their responses.
+
+        The commands are written in one go and the responses are matched by
+        their ids, so the whole batch costs a single round trip.
+        Unlike cmd(), return the raw response dicts without performing any
+        checks on them.
+
+        :param cmds: List of (cmd, args) tuples, args may be None
+        :param timeout: Time duration to wait for all the responses
+        :param debug: Whether to print the commands being sent
+        :return: List of the responses, in the order of cmds
+        :raise MonitorLockError: Raised if the lock cannot be acquired
+        :raise MonitorSocketError: Raised if a socket error occurs
+        :raise MonitorProtocolError: Raised if some responses are missing
+        """
+        if not cmds:
+            return []
+        if not self._acquire_lock():
+            raise MonitorLockError(
+                "Could not acquire exclusive lock to send a batch of "
+                "%d QMP commands" % len(cmds)
+            )
+
+        try:
+            self._read_objects()
+            q_ids = [utils_misc.generate_random_string(8) for _ in cmds]
+            data = b"\n".join(
+                json.dumps(self._build_cmd(cmd, args, q_id)).encode()
+                for (cmd, args), q_id in zip(cmds, q_ids)
+            )
+            if debug:
+                LOG.debug(
+                    "Send a batch of %d commands: %s",
+                    len(cmds),
+                    ", ".join(sorted(set(cmd for cmd, _ in cmds))),
+                )
+            self._send(data)
+            pending = set(q_ids)
+            responses = {}
+            end_time = time.time() + timeout
+            while pending and self._data_available(end_time - time.time()):
+                for obj in self._read_objects():
+                    if not isinstance(obj, dict) or obj.get("id") not in pending:
+                        continue
+                    if "return" in obj or "error" in obj:
+                        pending.discard(obj["id"])
+                        responses[obj["id"]] = obj
+            if pending:
+                raise MonitorProtocolError(
+                    "Received no response to %d of the %d commands of the "
+                    "batch" % (len(pending), len(cmds))
+                )
+            return [responses[q_id] for q_id in q_ids]
+
+        finally:
+            self._lock.release()
+
     def verify_responsive(self):
         """
         Make sure the monitor is responsive by sending a command.
@@ -3022,6 +3099,19 @@ class QMPMonitor(Monitor):
         args = {"path": path, "property": qproperty, "value": qvalue}
         return self.cmd(cmd, args)
 
+    def qom_list(self, path):
+        """
+        Get output of cmd "qom-list".
+
+        :param path: QOM object path.
+
+        :return: list of the properties of the object, dicts with the
+                 'name' and the 'type' of the property.
+        """
+        cmd = "qom-list"
+        self.verify_supported_cmd(cmd)
+        return self.cmd(cmd, {"path": path})
+
     def qom_get(self, path, qproperty):
         """
         Get output of cmd "qom-get".
@@ -9,6 +9,7 @@ import json
 import logging
 import os
 import re
+import weakref
 
 import six
 from six.moves import xrange
@@ -25,6 +26,23 @@ _RE_CLASS = re.compile(
     "(\w{4}:\w{4}) \(sub (\w{4}:\w{4})\)"
 )
 
+# QOM children which are never qdev devices nor buses, not worth walking
+_QOM_SKIP_CHILDREN = ("child<qemu:memory-region>", "child<irq>")
+# QOM properties of the devices and buses not shown in 'info qtree'
+_QOM_SKIP_PROPS = (
+    "type",
+    "parent_bus",
+    "realized",
+    "hotpluggable",
+    "hotplugged",
+    "hotplug-handler",
+)
+# Properties printed without quotes by 'info qtree'
+_QOM_UNQUOTED_PROPS = ("drive", "netdev", "chardev", "iothread", "memdev")
+# Raw QOM data of the monitors (see QtreeContainer.parse_qom) kept until the
+# next hotplug
+_QOM_CACHE = weakref.WeakKeyDictionary()
+
 
 class IncompatibleTypeError(TypeError):
     def __init__(self, prop, desired_type, value):
@@ -238,6 +256,42 @@ class QtreeDisk(QtreeDev):
         return re.sub("['\"]", "", self.qtree.get("drive"))
 
 
+def _hook_usb2_disk(node):
+    """
+    usb2 disk - from point of qtree - is scsi disk inside the
+    usb-storage device.
+    """
+    # We're looking for scsi disk with grand-grand parent of
+    # usb storage type
+    if not isinstance(node, QtreeDisk):
+        return  # Not a disk
+    if not node.get_qtree().get("type").startswith("scsi"):
+        return  # Not scsi disk
+    if not (node.get_parent() and node.get_parent().get_parent()):
+        return  # Doesn't have grand-grand parent
+    if not (node.get_parent().get_parent().get_qtree().get("type") == "usb-storage"):
+        return  # grand-grand parent is not usb-storage
+    # This disk is not scsi disk, it's virtual usb-storage drive
+    node.update_qtree_prop("type", "usb2")
+
+
+def _format_qom_value(prop, value):
+    """
+    Format a QOM property value the way 'info qtree' prints it
+    """
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    if value is None:
+        return "<null>"
+    if isinstance(value, six.string_types):
+        if prop in _QOM_UNQUOTED_PROPS:
+            return value or "<null>"
+        return '"%s"' % value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
 class QtreeContainer(object):
     """Container for Qtree"""
 
@@ -273,26 +327,6 @@ class QtreeContainer(object):
                 new.add_child(child)
             return new
 
-        def _hook_usb2_disk(node):
-            """
-            usb2 disk - from point of qtree - is scsi disk inside the
-            usb-storage device.
-            """
-            # We're looking for scsi disk with grand-grand parent of
-            # usb storage type
-            if not isinstance(node, QtreeDisk):
-                return  # Not a disk
-            if not node.get_qtree().get("type").startswith("scsi"):
-                return  # Not scsi disk
-            if not (node.get_parent() and node.get_parent().get_parent()):
-                return  # Doesn't have grand-grand parent
-            if not (
-                node.get_parent().get_parent().get_qtree().get("type") == "usb-storage"
-            ):
-                return  # grand-grand parent is not usb-storage
-            # This disk is not scsi disk, it's virtual usb-storage drive
-            node.update_qtree_prop("type", "usb2")
-
         info = info.split("\n")
         current = None
         offset = 0
@@ -385,6 +419,172 @@ class QtreeContainer(object):
         for i in xrange(len(self.nodes)):
             _hook_usb2_disk(self.nodes[i])
 
+    @staticmethod
+    def _walk_qom(monitor, timeout):
+        """
+        Walk the QOM composition tree level by level.
+
+        Every level costs one batch of 'qom-list' commands, then the values
+        of the properties of all the devices and buses are read by a single
+        batch of 'qom-get' commands.
+
+        :return: Dict of QOM path to a dict of its property values, for the
+                 qdev devices and buses only
+        """
+        objects = {}
+        frontier = ["/machine"]
+        while frontier:
+            responses = monitor.cmd_batch(
+                [("qom-list", {"path": path}) for path in frontier],
+                timeout,
+                debug=False,
+            )
+            next_frontier = []
+            for path, response in zip(frontier, responses):
+                props = response.get("return")
+                if props is None:
+                    continue
+                objects[path] = props
+                for prop in props:
+                    if prop["type"].startswith("child<") and (
+                        prop["type"] not in _QOM_SKIP_CHILDREN
+                    ):
+                        next_frontier.append("%s/%s" % (path, prop["name"]))
+            frontier = next_frontier
+
+        gets = []
+        for path, props in objects.items():
+            names = [prop["name"] for prop in props]
+            # qdev devices sit on a parent bus, buses have a hotplug handler
+            if "parent_bus" not in names and "hotplug-handler" not in names:
+                continue
+            for prop in props:
+                if prop["type"].startswith("child<"):
+                    continue
+                if prop["type"].startswith("link<") and prop["name"] != "parent_bus":
+                    continue
+                gets.append((path, prop["name"]))
+        responses = monitor.cmd_batch(
+            [("qom-get", {"path": path, "property": name}) for path, name in gets],
+            timeout,
+            debug=False,
+        )
+        values = {}
+        for (path, name), response in zip(gets, responses):
+            # Some properties can't be read, just like in 'info qtree'
+            if "return" in response:
+                values.setdefault(path, {})[name] = response["return"]
+        return values
+
+    @staticmethod
+    def _qom_generation(monitor, timeout):
+        """
+        Get the identity of the devices added by the user.
+
+        The devices are identified by their id and type, together with the
+        hotplug generation of the monitor, so that a device unplugged and
+        plugged again with the same id and type changes it as well.
+        """
+        responses = monitor.cmd_batch(
+            [
+                ("qom-list", {"path": "/machine/peripheral"}),
+                ("qom-list", {"path": "/machine/peripheral-anon"}),
+            ],
+            timeout,
+            debug=False,
+        )
+        devices = tuple(
+            tuple(
+                sorted(
+                    (prop["name"], prop["type"]) for prop in response.get("return", [])
+                )
+            )
+            for response in responses
+        )
+        return getattr(monitor, "device_generation", 0), devices
+
+    def parse_qom(self, monitor, timeout=60):
+        """
+        Builds the qtree by walking the QOM tree through the QMP monitor.
+
+        Creates the same nodes as :meth:`parse_info_qtree` from the qdev
+        devices and buses and their properties, without parsing the human
+        monitor output.  The QOM data is cached per monitor until a device
+        is hotplugged or unplugged.
+
+        :param monitor: QMP monitor of the VM
+        :type monitor: :class:`virttest.qemu_monitor.QMPMonitor`
+        :param timeout: Time to wait for every batch of QMP commands
+        """
+        generation = self._qom_generation(monitor, timeout)
+        cached = _QOM_CACHE.get(monitor)
+        if cached and cached[0] == generation:
+            values = cached[1]
+        else:
+            values = self._walk_qom(monitor, timeout)
+            _QOM_CACHE[monitor] = (generation, values)
+
+        # Create the nodes, their type is known from the properties
+        nodes = {}
+        for path, props in values.items():
+            if "parent_bus" in props:
+                qtree = {"type": props["type"]}
+                if path.startswith("/machine/peripheral/"):
+                    qtree["id"] = path.rsplit("/", 1)[1]
+                legacy = dict(
+                    (name[7:], value)
+                    for name, value in props.items()
+                    if name.startswith("legacy-")
+                )
+                for name, value in props.items():
+                    if name in _QOM_SKIP_PROPS or name.startswith("legacy-"):
+                        continue
+                    if name in legacy:
+                        qtree[name] = legacy[name]
+                    else:
+                        qtree[name] = _format_qom_value(name, value)
+                node = QtreeDev()
+            else:
+                if props.get("type") == "System":
+                    name = "main-system-bus"
+                else:
+                    name = path.rsplit("/", 1)[1]
+                qtree = {"id": name, "type": props.get("type")}
+                node = QtreeBus()
+            node.set_qtree(qtree)
+            node = node.guess_type()()
+            node.set_qtree(qtree)
+            nodes[path] = node
+
+        # Link the devices to their buses and the buses to their devices
+        root = None
+        for path in sorted(nodes):
+            node = nodes[path]
+            if isinstance(node, QtreeDev):
+                parent = nodes.get(values[path]["parent_bus"])
+            else:
+                parent = nodes.get(path.rsplit("/", 1)[0])
+            if parent is None:
+                if isinstance(node, QtreeBus) and node.get_qtree()["type"] == "System":
+                    root = node
+                continue
+            node.set_parent(parent)
+            parent.add_child(node)
+        if root is None:
+            raise ValueError("QOM tree has no main-system-bus")
+
+        # Flat list of the nodes, children first, the root last
+        self.nodes = []
+
+        def _append(node):
+            for child in node.get_children():
+                _append(child)
+            self.nodes.append(node)
+
+        _append(root)
+        for node in self.nodes:
+            _hook_usb2_disk(node)
+
 
 class QtreeDisksContainer(object):
     """
@@ -7,6 +7,7 @@ This exports:
 """
 
 import collections
+import hashlib
 import json
 import logging
 import os
@@ -36,6 +37,74 @@ from virttest.utils_version import VersionInterval
 
 LOG = logging.getLogger("avocado." + __name__)
 
+# qemu-img help texts per (binary path, binary mtime, command)
+_qemu_img_help_cache = {}
+
+
+def get_qemu_img_help_text(image_cmd, cmd="", cache_dir=None):
+    """
+    Get the help text of a qemu-img command, running it only once.
+
+    The help texts are cached for the whole process per qemu-img binary,
+    an updated binary (new mtime) gets new help texts.  A failed or empty
+    help is not cached, so that it's retried next time.
+
+    :param image_cmd: Path of the qemu-img binary
+    :param cmd: The qemu-img subcommand name (e.g. 'info'), empty for the
+                global help
+    :param cache_dir: Directory also caching the help texts on disk, to
+                      share them between processes (e.g. the tests of a job)
+    :return: Standard output of '<image_cmd> <cmd> -h', even if it failed
+    """
+    try:
+        mtime = os.stat(image_cmd).st_mtime
+    except OSError:
+        mtime = None
+    key = (image_cmd, mtime, cmd)
+    help_text = _qemu_img_help_cache.get(key)
+    if help_text is not None:
+        return help_text
+
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir,
+            "qemu-img-help-%s.txt" % hashlib.sha1(repr(key).encode()).hexdigest(),
+        )
+        if os.path.isfile(cache_file):
+            with open(cache_file, "r") as cache_fd:
+                help_text = cache_fd.read()
+            _qemu_img_help_cache[key] = help_text
+            return help_text
+
+    result = process.run(
+        cmd=f"{image_cmd} {cmd} -h",
+        ignore_status=True,
+        shell=True,
+        verbose=False,
+    )
+    help_text = result.stdout_text
+    if result.exit_status != 0 or not help_text.strip():
+        LOG.debug(
+            "Not caching the help of '%s %s', exit status %s",
+            image_cmd,
+            cmd,
+            result.exit_status,
+        )
+        return help_text
+    _qemu_img_help_cache[key] = help_text
+    if cache_file:
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            tmp_file = "%s.%s" % (cache_file, os.getpid())
+            with open(tmp_file, "w") as cache_fd:
+                cache_fd.write(help_text)
+            os.rename(tmp_file, cache_file)
+        except OSError as details:
+            LOG.warning("Unable to cache the qemu-img help text: %s", details)
+    return help_text
+
 
 def filename_to_file_opts(filename):
     """Convert filename into file opts, used by both qemu-img and qemu-kvm"""
@@ -842,6 +911,10 @@ class QemuImg(storage.QemuImg):
         """
         Retrieve help text for qemu-img commands.
 
+        The help texts are cached per qemu-img binary, see
+        :func:`get_qemu_img_help_text`, and on disk as well when the
+        'qemu_img_help_cache_dir' param is set.
+
         :param cmd: The qemu-img subcommand name (e.g., 'info', 'check', 'compare', 'convert').
                    If empty string (default), runs 'qemu-img -h' for global help.
         :type cmd: str
@@ -850,17 +923,10 @@ class QemuImg(storage.QemuImg):
         :note: Returns stdout even if the command fails, allowing callers to handle
                parsing and error detection as needed
         """
-        cmd_help = f"{self.image_cmd} {cmd} -h"
-
-        result = process.run(
-            cmd=cmd_help,
-            ignore_status=True,
-            shell=True,
-            verbose=False,
+        return get_qemu_img_help_text(
+            self.image_cmd, cmd, self.params.get("qemu_img_help_cache_dir")
         )
 
-        return result.stdout_text
-
     def _get_cmd_cap_force_share(self, cmd):
         """
         Check if a qemu-img command supports the force-share capability
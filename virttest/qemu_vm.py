@@ -39,10 +39,12 @@ from virttest import (
     qemu_virtio_port,
     storage,
     test_setup,
+    utils_libguestfs,
     utils_logfile,
     utils_misc,
     utils_net,
     utils_qemu,
+    utils_resources,
     utils_vdpa,
     utils_vsock,
     virt_vm,
@@ -605,7 +607,8 @@ class VM(virt_vm.BaseVM):
             monitor_id = "qmp_id_%s" % monitor_name
             if backend == "tcp_socket":
                 host = chardev_params.get("chardev_host", "127.0.0.1")
-                port = str(utils_misc.find_free_ports(5000, 6000, 1, host)[0])
+                ports = utils_resources.get_port_range(params, 5000, 6000)
+                port = str(utils_misc.find_free_ports(*ports, 1, host)[0])
                 chardev_params["chardev_host"] = host
                 chardev_params["chardev_port"] = port
                 params["chardev_host_%s" % monitor_name] = host
@@ -1257,7 +1260,11 @@ class VM(virt_vm.BaseVM):
             if optget("spice_port") == "generate":
                 # FIXME: This makes the "needs_restart" to always re-create the
                 # machine.
-                s_port = str(utils_misc.find_free_port(*port_range))
+                s_port = str(
+                    utils_misc.find_free_port(
+                        *utils_resources.get_port_range(params, *port_range)
+                    )
+                )
                 spice_options["spice_port"] = s_port
                 spice_opts.append("port=%s" % s_port)
             # spice_port = no: spice_port value is not present on qemu cmdline
@@ -1291,7 +1298,11 @@ class VM(virt_vm.BaseVM):
             if optget("spice_ssl") == "yes":
                 # SSL only part
                 if optget("spice_tls_port") == "generate":
-                    t_port = str(utils_misc.find_free_port(*tls_port_range))
+                    t_port = str(
+                        utils_misc.find_free_port(
+                            *utils_resources.get_port_range(params, *tls_port_range)
+                        )
+                    )
                     spice_options["spice_tls_port"] = t_port
                     spice_opts.append("tls-port=%s" % t_port)
                 # spice_tls_port = no: spice_port value is not present on qemu
@@ -1834,6 +1845,11 @@ class VM(virt_vm.BaseVM):
             else:
                 n = numa_node - 1
                 cmd += "numactl -m %s " % n
+        # Pin qemu to the host cpus and NUMA nodes handed out to the test
+        if params.get("host_cpus"):
+            cmd += "numactl --physcpubind=%s " % params.get("host_cpus")
+            if params.get("host_numa_nodes") and not params.get("numa_node"):
+                cmd += "--membind=%s " % params.get("host_numa_nodes")
 
         # Start constructing devices representation
         devices = qcontainer.DevContainer(
@@ -2460,7 +2476,8 @@ class VM(virt_vm.BaseVM):
         if serials:
             self.serial_session_device = serials[0]
             host = params.get("chardev_host", "127.0.0.1")
-            free_ports = utils_misc.find_free_ports(5000, 5899, len(serials), host)
+            ports = utils_resources.get_port_range(params, 5000, 5899)
+            free_ports = utils_misc.find_free_ports(*ports, len(serials), host)
             reg_count = 0
         for index, serial in enumerate(serials):
             serial_params = params.object_params(serial)
@@ -3525,6 +3542,8 @@ class VM(virt_vm.BaseVM):
         :raise PrivateBridgeError: If fail to bring the private bridge
         """
         error_context.context("creating '%s'" % self.name)
+        # The guestfish appliances would keep qemu from locking the images
+        utils_libguestfs.invalidate_guestfish_pool()
 
         if name is not None:
             self.name = name
@@ -3602,7 +3621,8 @@ class VM(virt_vm.BaseVM):
         try:
             # Handle port redirections
             redir_names = params.objects("redirs")
-            host_ports = utils_misc.find_free_ports(5000, 5899, len(redir_names))
+            ports = utils_resources.get_port_range(params, 5000, 5899)
+            host_ports = utils_misc.find_free_ports(*ports, len(redir_names))
 
             old_redirs = {}
             if self.redirs:
@@ -3735,7 +3755,8 @@ class VM(virt_vm.BaseVM):
 
             # Find available VNC port, if needed
             if params.get("display") == "vnc":
-                self.vnc_port = utils_misc.find_free_port(5900, 6900, sequent=True)
+                ports = utils_resources.get_port_range(params, 5900, 6900)
+                self.vnc_port = utils_misc.find_free_port(*ports, sequent=True)
 
             # Find random UUID if specified 'uuid = random' in config file
             if params.get("uuid") == "random":
@@ -3789,7 +3810,9 @@ class VM(virt_vm.BaseVM):
 
             # Add migration parameters if required
             if migration_mode in ["tcp", "rdma", "x-rdma"]:
-                self.migration_port = utils_misc.find_free_port(5200, 5899)
+                self.migration_port = utils_misc.find_free_port(
+                    *utils_resources.get_port_range(params, 5200, 5899)
+                )
                 incoming_val = (
                     " -incoming " + migration_mode + ":0:%d" % self.migration_port
                 )
@@ -3808,7 +3831,9 @@ class VM(virt_vm.BaseVM):
                 qemu_command += incoming_val
             elif migration_mode == "exec":
                 if migration_exec_cmd is None:
-                    self.migration_port = utils_misc.find_free_port(5200, 5899)
+                    self.migration_port = utils_misc.find_free_port(
+                        *utils_resources.get_port_range(params, 5200, 5899)
+                    )
                     # check whether ip version supported by nc
                     if (
                         process.system(
@@ -4242,6 +4267,7 @@ class VM(virt_vm.BaseVM):
                     "VM %s (PID %s) is a zombie!", self.name, self.process.get_pid()
                 )
         finally:
+            self.close_ssh_mux()
             self._stop_daemons()
             self._cleanup(free_mac_addresses)
 
@@ -5165,7 +5191,7 @@ class VM(virt_vm.BaseVM):
         if protocol == "fd":
             # Check if descriptors aren't None for local migration.
             if local and (fd_dst is None or fd_src is None):
-                (fd_dst, fd_src) = os.pipe()
+                fd_dst, fd_src = os.pipe()
 
             mig_fd_name = "migfd_%d_%d" % (fd_src, time.time())
             self.send_fd(fd_src, mig_fd_name)
@@ -5649,6 +5675,8 @@ class VM(virt_vm.BaseVM):
         finally:
             if session:
                 session.close()
+        # The connections to the guest went down with it
+        self.close_ssh_mux()
         if isinstance(self.monitor, qemu_monitor.QMPMonitor):
             self.monitor.clear_event("RESET")
         shutdown_dur = int(time.time() - start_time)
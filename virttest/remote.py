@@ -7,7 +7,9 @@ from __future__ import division
 import logging
 import os
 import re
+import shlex
 import shutil
+import socket
 import tempfile
 import time
 
@@ -150,6 +152,209 @@ def run_remote_cmd(cmd, params, remote_runner=None, ignore_status=True):
         raise exceptions.TestFail("Failed to run '%s' on remote: %s" % (cmd, cmderr))
 
 
+def get_ssh_mux_options(control_dir, persist=60):
+    """
+    Get the ssh options sharing one connection per remote host.
+
+    The first ssh/scp process connecting to a host becomes the master of
+    an OpenSSH ControlMaster connection, the following ones reuse it without
+    a new TCP handshake, key exchange and authentication.
+
+    :param control_dir: Directory to keep the control sockets in
+    :param persist: Time (seconds) the idle master connection is kept
+    :return: ssh command line options
+    """
+    if not os.path.isdir(control_dir):
+        os.makedirs(control_dir, mode=0o700)
+    return (
+        "-o ControlMaster=auto -o ControlPath=%s -o ControlPersist=%s "
+        "-o ServerAliveInterval=5 -o ServerAliveCountMax=3"
+        % (os.path.join(control_dir, "%C"), persist)
+    )
+
+
+def close_ssh_mux(control_dir):
+    """
+    Stop the master connections of the control sockets of a directory.
+
+    The directory is removed as well, so the next connection starts a new
+    master, e.g. after the guest rebooted.
+
+    :param control_dir: Directory of the control sockets, see
+                        :func:`get_ssh_mux_options`
+    """
+    if not os.path.isdir(control_dir):
+        return
+    for name in os.listdir(control_dir):
+        control_path = os.path.join(control_dir, name)
+        # The host is not used, the master is found through ControlPath
+        process.run(
+            "ssh -o ControlPath=%s -O exit mux" % shlex.quote(control_path),
+            ignore_status=True,
+            verbose=False,
+            timeout=10,
+        )
+    shutil.rmtree(control_dir, ignore_errors=True)
+
+
+def probe_ssh_server(host, port, timeout=1.0):
+    """
+    Check whether a ssh server accepts connections, without logging in.
+
+    :param host: Hostname or IP address
+    :param port: Port to connect to
+    :param timeout: Time (seconds) to wait for the connection and banner
+    :return: True if the ssh banner was received, None if the connection was
+             accepted but no banner arrived in time, False if the connection
+             failed
+    """
+    try:
+        sock = socket.create_connection((host, int(port)), timeout)
+    except (socket.error, ValueError):
+        return False
+    try:
+        banner = sock.recv(256)
+    except socket.timeout:
+        return None
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    if b"SSH-" in banner:
+        return True
+    return False if not banner else None
+
+
+def _scp_command(ssh_options, port, source, destination, directory=True, limit=""):
+    command = "scp"
+    if directory:
+        command += " -r"
+    if limit:
+        limit = "-l %s" % limit
+    return (
+        r"%s %s -v -o UserKnownHostsFile=/dev/null "
+        r"-o StrictHostKeyChecking=no "
+        r"-o PreferredAuthentications=password %s -P %s %s %s"
+        % (command, ssh_options, limit, port, source, destination)
+    )
+
+
+def copy_files_to(
+    address,
+    client,
+    username,
+    password,
+    port,
+    local_path,
+    remote_path,
+    directory=True,
+    limit="",
+    log_filename=None,
+    log_function=None,
+    verbose=False,
+    timeout=600,
+    interface=None,
+    filesize=None,
+    ssh_options="",
+):
+    """
+    Copy files to a remote host (guest) using the selected client.
+
+    Same as :func:`aexpect.remote.copy_files_to`, but scp transfers can
+    reuse a multiplexed connection.
+
+    :param ssh_options: Additional ssh options for scp, e.g. the ones from
+                        :func:`get_ssh_mux_options`
+    """
+    if client != "scp" or not ssh_options:
+        return aexpect.remote.copy_files_to(
+            address,
+            client,
+            username,
+            password,
+            port,
+            local_path,
+            remote_path,
+            directory,
+            limit,
+            log_filename,
+            log_function,
+            verbose,
+            timeout,
+            interface,
+            filesize,
+        )
+    if interface:
+        address = "%s%%%s" % (address, interface)
+    command = _scp_command(
+        ssh_options,
+        port,
+        quote_path(local_path),
+        r"%s@\[%s\]:%s" % (username, address, shlex.quote(remote_path)),
+        directory,
+        limit,
+    )
+    remote_copy(command, [password], log_filename, log_function, timeout)
+
+
+def copy_files_from(
+    address,
+    client,
+    username,
+    password,
+    port,
+    remote_path,
+    local_path,
+    directory=True,
+    limit="",
+    log_filename=None,
+    log_function=None,
+    verbose=False,
+    timeout=600,
+    interface=None,
+    filesize=None,
+    ssh_options="",
+):
+    """
+    Copy files from a remote host (guest) using the selected client.
+
+    Same as :func:`aexpect.remote.copy_files_from`, but scp transfers can
+    reuse a multiplexed connection.
+
+    :param ssh_options: Additional ssh options for scp, e.g. the ones from
+                        :func:`get_ssh_mux_options`
+    """
+    if client != "scp" or not ssh_options:
+        return aexpect.remote.copy_files_from(
+            address,
+            client,
+            username,
+            password,
+            port,
+            remote_path,
+            local_path,
+            directory,
+            limit,
+            log_filename,
+            log_function,
+            verbose,
+            timeout,
+            interface,
+            filesize,
+        )
+    if interface:
+        address = "%s%%%s" % (address, interface)
+    command = _scp_command(
+        ssh_options,
+        port,
+        r"%s@\[%s\]:%s" % (username, address, quote_path(remote_path)),
+        shlex.quote(local_path),
+        directory,
+        limit,
+    )
+    remote_copy(command, [password], log_filename, log_function, timeout)
+
+
 class Remote_Package(object):
     def __init__(self, address, client, username, password, port, remote_path):
         """
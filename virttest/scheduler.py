@@ -1,9 +1,379 @@
+"""
+Scheduling of tests sharing a host, by the resources they declare.
+
+:class:`ResourceScheduler` packs the resource requests of the tests
+(:class:`virttest.utils_resources.ResourceRequest`, read from their params)
+onto the NUMA nodes and the devices of the host, and reports the
+utilization of the host.  :class:`scheduler` runs tests in parallel worker
+pipelines with it, the host cpus and NUMA nodes handed out to a test are
+given to its VMs as the 'host_cpus' and 'host_numa_nodes' params.
+"""
+
+import glob
+import logging
 import os
+import re
 import select
 
 import aexpect
+from avocado.utils import memory
+
+from virttest import utils_env, utils_params, utils_resources, virt_vm
+
+LOG = logging.getLogger("avocado." + __name__)
 
-from virttest import utils_env, virt_vm
+NODE_SYS_PATH = "/sys/devices/system/node"
+
+
+class HostNode(object):
+    """
+    Resources of a host NUMA node.
+    """
+
+    def __init__(self, node_id, cpu_ids, mem, hugepage_mem=0):
+        """
+        :param node_id: Id of the NUMA node
+        :param cpu_ids: Ids of the host cpus of the node
+        :param mem: Memory of the node in MB
+        :param hugepage_mem: Memory of the hugepages allocated on the node
+                             in MB
+        """
+        self.node_id = node_id
+        self.cpu_ids = list(cpu_ids)
+        self.capacity = utils_resources.ResourceRequest(
+            len(self.cpu_ids), mem, hugepage_mem
+        )
+        self.used = utils_resources.ResourceRequest()
+        self.free_cpu_ids = list(self.cpu_ids)
+
+    def free(self):
+        """
+        Get the resources of the node which are not handed out.
+
+        :rtype: :class:`virttest.utils_resources.ResourceRequest`
+        """
+        return utils_resources.ResourceRequest(
+            self.capacity.cpus - self.used.cpus,
+            self.capacity.mem - self.used.mem,
+            self.capacity.hugepage_mem - self.used.hugepage_mem,
+        )
+
+    def __repr__(self):
+        return "<HostNode %s capacity=%s used=%s>" % (
+            self.node_id,
+            self.capacity,
+            self.used,
+        )
+
+
+def _parse_cpulist(cpulist):
+    cpu_ids = []
+    for start, end in re.findall(r"(\d+)(?:-(\d+))?", cpulist):
+        cpu_ids.extend(range(int(start), int(end or start) + 1))
+    return cpu_ids
+
+
+def _get_node_hugepage_mem(node_dir):
+    """Get the memory of the hugepages of all sizes of a node in MB."""
+    hugepage_mem = 0
+    for pages_dir in glob.glob(os.path.join(node_dir, "hugepages", "hugepages-*kB")):
+        page_size = int(os.path.basename(pages_dir)[10:-2])
+        try:
+            with open(os.path.join(pages_dir, "nr_hugepages")) as nr_hugepages:
+                hugepage_mem += int(nr_hugepages.read()) * page_size
+        except (IOError, ValueError):
+            continue
+    return hugepage_mem // 1024
+
+
+def get_host_nodes(sys_path=NODE_SYS_PATH):
+    """
+    Get the NUMA nodes of the host with cpus, memory and hugepages.
+
+    A single node with the whole host is returned when there is no NUMA
+    information.
+
+    :param sys_path: sysfs directory of the NUMA nodes
+    :return: List of :class:`HostNode`
+    """
+    nodes = []
+    for node_dir in sorted(glob.glob(os.path.join(sys_path, "node[0-9]*"))):
+        node_id = int(os.path.basename(node_dir)[4:])
+        try:
+            with open(os.path.join(node_dir, "cpulist")) as cpulist:
+                cpu_ids = _parse_cpulist(cpulist.read())
+            with open(os.path.join(node_dir, "meminfo")) as meminfo:
+                mem = re.search(r"MemTotal:\s+(\d+)", meminfo.read())
+        except IOError:
+            continue
+        if cpu_ids and mem:
+            nodes.append(
+                HostNode(
+                    node_id,
+                    cpu_ids,
+                    int(mem.group(1)) // 1024,
+                    _get_node_hugepage_mem(node_dir),
+                )
+            )
+    if not nodes:
+        capacity = utils_resources.get_host_capacity()
+        hugepage_mem = memory.get_num_huge_pages() * memory.get_huge_page_size()
+        nodes.append(
+            HostNode(0, range(capacity.cpus), capacity.mem, hugepage_mem // 1024)
+        )
+    return nodes
+
+
+class Placement(object):
+    """
+    Resources handed out to a test by :class:`ResourceScheduler`.
+    """
+
+    def __init__(self, owner, request, node_requests, cpu_ids):
+        """
+        :param owner: Name of the test
+        :param request: Resources requested by the test
+        :param node_requests: Dict of the resources taken from every node
+        :param cpu_ids: Host cpus assigned to the test
+        """
+        self.owner = owner
+        self.request = request
+        self.node_requests = node_requests
+        self.cpu_ids = cpu_ids
+
+    @property
+    def node_ids(self):
+        """Ids of the NUMA nodes the test runs on."""
+        return sorted(self.node_requests)
+
+    def get_params(self):
+        """
+        Get the params pinning the VMs of the test to its resources.
+
+        :return: Dict with the 'host_cpus' and 'host_numa_nodes' lists
+        """
+        return {
+            "host_cpus": ",".join(str(cpu_id) for cpu_id in self.cpu_ids),
+            "host_numa_nodes": ",".join(str(node_id) for node_id in self.node_ids),
+        }
+
+    def __repr__(self):
+        return "<Placement %s nodes=%s cpus=%s>" % (
+            self.owner,
+            self.node_ids,
+            self.cpu_ids,
+        )
+
+
+class ResourceScheduler(object):
+    """
+    Packs the resource requests of tests onto the host NUMA nodes.
+
+    A request is placed on a single node when one has room for it, the
+    fullest one, so that the big holes are kept for the big requests.
+    Otherwise it's spread over the fewest nodes.  Host devices are handed
+    out exclusively.  Like in :class:`virttest.utils_resources.ResourcePool`,
+    a request bigger than the whole host is placed once the host is idle.
+    """
+
+    def __init__(self, nodes=None, devices=None):
+        """
+        :param nodes: List of :class:`HostNode`, the host ones by default
+        :param devices: Host devices which can be handed out, any when None
+        """
+        self.nodes = nodes if nodes is not None else get_host_nodes()
+        self.devices = None if devices is None else sorted(devices)
+        self.placements = {}
+
+    def capacity(self):
+        """
+        Get the resources of the whole host.
+
+        :rtype: :class:`virttest.utils_resources.ResourceRequest`
+        """
+        total = utils_resources.ResourceRequest(devices=self.devices)
+        for node in self.nodes:
+            total += node.capacity
+        return total
+
+    def used(self, ignore=()):
+        """
+        Get the resources handed out.
+
+        :param ignore: Owners whose resources are considered free
+        :rtype: :class:`virttest.utils_resources.ResourceRequest`
+        """
+        used = utils_resources.ResourceRequest()
+        for owner, placement in self.placements.items():
+            if owner not in ignore:
+                used += placement.request
+        return used
+
+    def fits(self, request, ignore=()):
+        """
+        Check whether the request could be placed.
+
+        :param request: Resources of the test
+        :param ignore: Owners whose resources are considered free
+        """
+        used = self.used(ignore)
+        if not request.devices_fit(
+            utils_resources.ResourceRequest(devices=self.devices)
+        ) or set(request.devices) & set(used.devices):
+            return False
+        if not any(p for o, p in self.placements.items() if o not in ignore):
+            # An idle host runs even the oversized requests
+            return True
+        capacity = self.capacity()
+        capacity.devices = None
+        return used + request <= capacity
+
+    def _split(self, request):
+        """
+        Get the resources to take from each node for the request.
+
+        :return: Dict of node id to resources, None when nothing fits
+        """
+        free = dict((node.node_id, node.free()) for node in self.nodes)
+        request = utils_resources.ResourceRequest(
+            request.cpus, request.mem, request.hugepage_mem
+        )
+        fitting = [node_id for node_id in free if request <= free[node_id]]
+        if fitting:
+            # Best fit: the node with the least room left
+            node_id = min(
+                fitting, key=lambda n: (free[n].cpus, free[n].mem, free[n].hugepage_mem)
+            )
+            return {node_id: request}
+        # Spread over the nodes with the most room first
+        split = {}
+        remaining = request
+        for node_id in sorted(free, key=lambda n: (-free[n].mem, -free[n].cpus)):
+            node_free = free[node_id]
+            part = utils_resources.ResourceRequest(
+                max(min(remaining.cpus, node_free.cpus), 0),
+                max(min(remaining.mem, node_free.mem), 0),
+                max(min(remaining.hugepage_mem, node_free.hugepage_mem), 0),
+            )
+            if not (part.cpus or part.mem or part.hugepage_mem):
+                continue
+            split[node_id] = part
+            remaining = utils_resources.ResourceRequest(
+                remaining.cpus - part.cpus,
+                remaining.mem - part.mem,
+                remaining.hugepage_mem - part.hugepage_mem,
+            )
+            if not (remaining.cpus or remaining.mem or remaining.hugepage_mem):
+                return split
+        if self.placements:
+            return None
+        # Oversized request on an idle host: put the excess on the first node
+        node_id = self.nodes[0].node_id
+        split[node_id] = split.get(node_id, utils_resources.ResourceRequest()) + (
+            remaining
+        )
+        return split
+
+    def place(self, owner, request):
+        """
+        Hand out the resources of the request if they are available.
+
+        :param owner: Unique name of the test
+        :param request: Resources of the test
+        :type request: :class:`virttest.utils_resources.ResourceRequest`
+        :return: :class:`Placement`, None when the request doesn't fit
+        """
+        if owner in self.placements:
+            return self.placements[owner]
+        if not self.fits(request):
+            return None
+        split = self._split(request)
+        if split is None:
+            return None
+        nodes = dict((node.node_id, node) for node in self.nodes)
+        cpu_ids = []
+        for node_id, part in split.items():
+            node = nodes[node_id]
+            node.used += part
+            taken = node.free_cpu_ids[: part.cpus]
+            del node.free_cpu_ids[: part.cpus]
+            cpu_ids.extend(taken)
+        placement = Placement(owner, request, split, sorted(cpu_ids))
+        self.placements[owner] = placement
+        LOG.debug("Placed %s: %s", request, placement)
+        return placement
+
+    def release(self, owner):
+        """
+        Give back the resources handed out to owner.
+
+        :param owner: Name of the test
+        """
+        placement = self.placements.pop(owner, None)
+        if placement is None:
+            return
+        nodes = dict((node.node_id, node) for node in self.nodes)
+        for node_id, part in placement.node_requests.items():
+            node = nodes[node_id]
+            node.used = utils_resources.ResourceRequest(
+                node.used.cpus - part.cpus,
+                node.used.mem - part.mem,
+                node.used.hugepage_mem - part.hugepage_mem,
+            )
+        for cpu_id in placement.cpu_ids:
+            for node in self.nodes:
+                if cpu_id in node.cpu_ids:
+                    node.free_cpu_ids.append(cpu_id)
+                    node.free_cpu_ids.sort()
+                    break
+
+    def utilization(self):
+        """
+        Get the share of the host resources handed out.
+
+        :return: Dict with the "cpus", "mem" and "hugepage_mem" ratios of
+                 the host, the same per node id under "nodes", and the
+                 "devices" in use
+        """
+
+        def _ratios(used, capacity):
+            return dict(
+                (
+                    (key, float(getattr(used, key)) / getattr(capacity, key))
+                    if getattr(capacity, key)
+                    else (key, 0.0)
+                )
+                for key in ("cpus", "mem", "hugepage_mem")
+            )
+
+        capacity = self.capacity()
+        used = utils_resources.ResourceRequest()
+        for node in self.nodes:
+            used += node.used
+        metrics = _ratios(used, capacity)
+        metrics["nodes"] = dict(
+            (node.node_id, _ratios(node.used, node.capacity)) for node in self.nodes
+        )
+        metrics["devices"] = self.used().devices
+        metrics["tests"] = len(self.placements)
+        return metrics
+
+
+def get_test_request(test):
+    """
+    Get the resources declared by a test dictionary.
+
+    The 'used_cpus' and 'used_mem' keys of the old scheduler are still
+    honoured, otherwise :meth:`ResourceRequest.from_params` is used.
+
+    :param test: Test dictionary
+    :rtype: :class:`virttest.utils_resources.ResourceRequest`
+    """
+    if "used_cpus" in test or "used_mem" in test:
+        return utils_resources.ResourceRequest(
+            test.get("used_cpus", 1), test.get("used_mem", 128)
+        )
+    return utils_resources.ResourceRequest.from_params(utils_params.Params(test))
 
 
 class scheduler:
@@ -12,7 +382,9 @@ class scheduler:
     single host.
     """
 
-    def __init__(self, tests, num_workers, total_cpus, total_mem, bindir):
+    def __init__(
+        self, tests, num_workers, total_cpus, total_mem, bindir, resources=None
+    ):
         """
         Initialize the class.
 
@@ -21,19 +393,26 @@ class scheduler:
         :param total_cpus: The total number of CPUs to dedicate to tests.
         :param total_mem: The total amount of memory to dedicate to tests.
         :param bindir: The directory where environment files reside.
+        :param resources: :class:`ResourceScheduler` of the host, one with a
+                          single node of total_cpus and total_mem, which can
+                          all back hugepages, by default.
         """
         self.tests = tests
         self.num_workers = num_workers
         self.total_cpus = total_cpus
         self.total_mem = total_mem
         self.bindir = bindir
+        if resources is None:
+            node = HostNode(0, range(total_cpus), total_mem, total_mem)
+            resources = ResourceScheduler([node])
+        self.resources = resources
         # Pipes -- s stands for scheduler, w stands for worker
         self.s2w = [os.pipe() for _ in range(num_workers)]
         self.w2s = [os.pipe() for _ in range(num_workers)]
-        self.s2w_r = [os.fdopen(r, "r", 0) for r, _ in self.s2w]
-        self.s2w_w = [os.fdopen(w, "w", 0) for _, w in self.s2w]
-        self.w2s_r = [os.fdopen(r, "r", 0) for r, _ in self.w2s]
-        self.w2s_w = [os.fdopen(w, "w", 0) for _, w in self.w2s]
+        self.s2w_r = [os.fdopen(r, "r", 1) for r, _ in self.s2w]
+        self.s2w_w = [os.fdopen(w, "w", 1) for _, w in self.s2w]
+        self.w2s_r = [os.fdopen(r, "r", 1) for r, _ in self.w2s]
+        self.w2s_w = [os.fdopen(w, "w", 1) for _, w in self.w2s]
         # "Personal" worker dicts contain modifications that are applied
         # specifically to each worker.  For example, each worker must use a
         # different environment file and a different MAC address pool.
@@ -66,6 +445,8 @@ class scheduler:
                 test_index = int(cmd[1])
                 test = self.tests[test_index].copy()
                 test.update(self_dict)
+                # The resources placed by the scheduler
+                test.update(param.split("=", 1) for param in cmd[2:])
                 test_iterations = int(test.get("iterations", 1))
                 status = run_test_func(
                     "kvm",
@@ -104,8 +485,6 @@ class scheduler:
         closing_workers = []
         test_status = ["waiting"] * len(self.tests)
         test_worker = [None] * len(self.tests)
-        used_cpus = [0] * self.num_workers
-        used_mem = [0] * self.num_workers
 
         while True:
             # Wait for a message from a worker
@@ -115,34 +494,37 @@ class scheduler:
 
             for pipe in r:
                 worker_index = self.w2s_r.index(pipe)
-                msg = pipe.readline().split()
-                if not msg:
-                    continue
-
-                # A worker is ready -- add it to the idle_workers list
-                if msg[0] == "ready":
-                    idle_workers.append(worker_index)
-                    someone_is_ready = True
-
-                # A worker completed a test
-                elif msg[0] == "done":
-                    test_index = int(msg[1])
-                    test = self.tests[test_index]
-                    status = int(eval(msg[2]))
-                    test_status[test_index] = ("fail", "pass")[status]
-                    # If the test failed, mark all dependent tests as "failed"
-                    # too
-                    if not status:
-                        for i, other_test in enumerate(self.tests):
-                            for dep in other_test.get("dep", []):
-                                if dep in test["name"]:
-                                    test_status[i] = "fail"
-
-                # A worker is done shutting down its VMs and other processes
-                elif msg[0] == "cleanup_done":
-                    used_cpus[worker_index] = 0
-                    used_mem[worker_index] = 0
-                    closing_workers.remove(worker_index)
+                # Read all the pending messages, a buffered readline() would
+                # leave some of them unseen by select()
+                data = os.read(pipe.fileno(), 4096).decode()
+                for line in data.splitlines():
+                    msg = line.split()
+                    if not msg:
+                        continue
+
+                    # A worker is ready -- add it to the idle_workers list
+                    if msg[0] == "ready":
+                        idle_workers.append(worker_index)
+                        someone_is_ready = True
+
+                    # A worker completed a test
+                    elif msg[0] == "done":
+                        test_index = int(msg[1])
+                        test = self.tests[test_index]
+                        status = int(eval(msg[2]))
+                        test_status[test_index] = ("fail", "pass")[status]
+                        # If the test failed, mark all dependent tests as "failed"
+                        # too
+                        if not status:
+                            for i, other_test in enumerate(self.tests):
+                                for dep in other_test.get("dep", []):
+                                    if dep in test["name"]:
+                                        test_status[i] = "fail"
+
+                    # A worker is done shutting down its VMs and other processes
+                    elif msg[0] == "cleanup_done":
+                        self.resources.release(worker_index)
+                        closing_workers.remove(worker_index)
 
             if not someone_is_ready:
                 continue
@@ -172,45 +554,37 @@ class scheduler:
                     if not dependencies_satisfied:
                         continue
                     # Make sure we have enough resources to run the test
-                    test_used_cpus = int(test.get("used_cpus", 1))
-                    test_used_mem = int(test.get("used_mem", 128))
-                    # First make sure the other workers aren't using too many
-                    # CPUs (not including the workers currently shutting down)
-                    uc = (
-                        sum(used_cpus)
-                        - used_cpus[worker]
-                        - sum(used_cpus[i] for i in closing_workers)
-                    )
-                    if uc and uc + test_used_cpus > self.total_cpus:
-                        continue
-                    # ... or too much memory
-                    um = (
-                        sum(used_mem)
-                        - used_mem[worker]
-                        - sum(used_mem[i] for i in closing_workers)
-                    )
-                    if um and um + test_used_mem > self.total_mem:
+                    request = get_test_request(test)
+                    # First make sure the other workers aren't using too
+                    # much (not including the workers currently shutting
+                    # down)
+                    if not self.resources.fits(
+                        request, ignore=[worker] + closing_workers
+                    ):
                         continue
                     # If we reached this point it means there are, or will
                     # soon be, enough resources to run the test
                     test_found = True
                     # Now check if the test can be run right now, i.e. if the
                     # other workers, including the ones currently shutting
-                    # down, aren't using too many CPUs
-                    uc = sum(used_cpus) - used_cpus[worker]
-                    if uc and uc + test_used_cpus > self.total_cpus:
-                        continue
-                    # ... or too much memory
-                    um = sum(used_mem) - used_mem[worker]
-                    if um and um + test_used_mem > self.total_mem:
+                    # down, leave enough room
+                    if not self.resources.fits(request, ignore=[worker]):
                         continue
                     # Everything is OK -- run the test
                     test_status[i] = "running"
                     test_worker[i] = worker
                     idle_workers.remove(worker)
-                    # Update used_cpus and used_mem
-                    used_cpus[worker] = test_used_cpus
-                    used_mem[worker] = test_used_mem
+                    # The resources of the previous test of the worker are
+                    # taken over by this one
+                    self.resources.release(worker)
+                    placement = self.resources.place(worker, request)
+                    LOG.debug(
+                        "Running %s on worker %s (%s), host utilization: %s",
+                        test.get("shortname"),
+                        worker,
+                        placement,
+                        self.resources.utilization(),
+                    )
                     # Assign all related tests to this worker
                     for j, other_test in enumerate(self.tests):
                         for other_dep in other_test["dep"]:
@@ -224,13 +598,16 @@ class scheduler:
                                 if dep in other_dep or other_dep in dep:
                                     test_worker[j] = worker
                                     break
-                    # Tell the worker to run the test
-                    self.s2w_w[worker].write("run %s\n" % i)
+                    # Tell the worker to run the test on its resources
+                    params = sorted(placement.get_params().items())
+                    self.s2w_w[worker].write(
+                        "run %s %s\n" % (i, " ".join("%s=%s" % p for p in params))
+                    )
                     break
 
                 # If there won't be any tests for this worker to run soon, tell
                 # the worker to free its used resources
-                if not test_found and (used_cpus[worker] or used_mem[worker]):
+                if not test_found and worker in self.resources.placements:
                     self.s2w_w[worker].write("cleanup\n")
                     idle_workers.remove(worker)
                     closing_workers.append(worker)
@@ -1,5 +1,8 @@
 import logging
+import os
 import re
+import socket
+import threading
 
 try:
     import SocketServer as socketserver
@@ -9,6 +12,7 @@ except ImportError:
 
 SYSLOG_PORT = 514
 DEFAULT_FORMAT = "[AutotestSyslog (%s.%s)] %s"
+MAX_MESSAGE_SIZE = 64 * 1024
 
 LOG = logging.getLogger("avocado." + __name__)
 
@@ -126,27 +130,196 @@ class RequestHandler(socketserver.BaseRequestHandler):
             self.PRIORITY_NAMES.get(p, "unknown"),
         )
 
+    def format_record(self, data, message_format=None):
+        """
+        Format a received message, None if it is not a syslog record
+
+        :param data: The message, bytes or string
+        :param message_format: Format of the message, the default one when None
+        """
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", "replace")
+        match = self.RECORD_RE.match(data.rstrip("\r\n\0"))
+        if not match:
+            return None
+        if message_format is None:
+            message_format = get_default_format()
+        pri = int(match.groups()[0])
+        msg = match.groups()[1]
+        facility_name, priority_name = self.decodeFacilityPriority(pri)
+        return message_format % (facility_name, priority_name, msg)
+
     def log(self, data, message_format=None):
         """
-        Logs the received message as a DEBUG message
+        Logs the received message as a DEBUG message, or batches it into the
+        log file of the client when the server has a writer
+        """
+        record = self.format_record(data, message_format)
+        if record is None:
+            return
+        writer = getattr(self.server, "writer", None)
+        if writer is not None:
+            writer.write(self.client_address[0], record)
+        else:
+            LOG.debug(record)
+
+
+class SyslogFramer(object):
+    """
+    Splits a syslog TCP stream into messages (RFC 6587)
+
+    Both the octet counting ("<length> <message>") and the non transparent
+    framing (messages terminated by LF or NUL) are supported, the framing is
+    detected for every message.
+    """
+
+    TRAILER_RE = re.compile(b"[\n\0]")
+
+    def __init__(self, max_size=MAX_MESSAGE_SIZE):
+        self.max_size = max_size
+        self._buffer = b""
+
+    def feed(self, data):
+        """
+        Parse a chunk of the stream
+
+        :param data: Bytes received
+        :return: List of the complete messages in the stream so far
+        """
+        buf = self._buffer + data
+        messages = []
+        start = 0
+        while start < len(buf):
+            if buf[start : start + 1].isdigit():
+                space = buf.find(b" ", start, start + 11)
+                if space < 0:
+                    if len(buf) - start < 11:
+                        break
+                elif buf[start:space].isdigit():
+                    length = int(buf[start:space])
+                    end = space + 1 + length
+                    if end > len(buf):
+                        break
+                    messages.append(buf[space + 1 : end])
+                    start = end
+                    continue
+            match = self.TRAILER_RE.search(buf, start)
+            if not match:
+                if len(buf) - start > self.max_size:
+                    # a message too big to be ever terminated
+                    messages.append(buf[start:])
+                    start = len(buf)
+                break
+            if match.start() > start:
+                messages.append(buf[start : match.start()])
+            start = match.end()
+        self._buffer = buf[start:]
+        return messages
+
+    def close(self):
+        """
+        :return: The last message, not terminated by the end of the stream
         """
-        match = self.RECORD_RE.match(data)
-        if match:
-            if message_format is None:
-                message_format = get_default_format()
-            pri = int(match.groups()[0])
-            msg = match.groups()[1]
-            (facility_name, priority_name) = self.decodeFacilityPriority(pri)
-            LOG.debug(message_format, facility_name, priority_name, msg)
+        rest, self._buffer = self._buffer.strip(), b""
+        return [rest] if rest else []
+
+
+class SyslogWriter(object):
+    """
+    Batches the received messages into one log file per client
+
+    The messages are queued in memory and written by a background thread
+    every flush interval, or as soon as a client queued batch_size of them,
+    so the request handlers never wait on the disk.
+    """
+
+    def __init__(self, log_dir, flush_interval=1.0, batch_size=1000):
+        """
+        :param log_dir: Directory of the syslog-<client address>.log files
+        :param flush_interval: Time between the writes in seconds
+        :param batch_size: Number of messages of a client to write at once
+        """
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._files = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="syslog-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_filename(self, client):
+        """
+        :return: The log file of the client
+        """
+        return os.path.join(self.log_dir, "syslog-%s.log" % client)
+
+    def write(self, client, record):
+        """
+        Queues a formatted message of the client
+        """
+        with self._lock:
+            records = self._pending.setdefault(client, [])
+            records.append(record)
+            full = len(records) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Writes all the queued messages
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for client, records in pending.items():
+                log_file = self._files.get(client)
+                if log_file is None:
+                    log_file = open(self.get_filename(client), "a")
+                    self._files[client] = log_file
+                log_file.write("\n".join(records) + "\n")
+                log_file.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except IOError as details:
+                LOG.error("Failed to write the syslog messages: %s", details)
+
+    def close(self):
+        """
+        Writes the queued messages and closes the log files
+        """
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        for log_file in self._files.values():
+            log_file.close()
+        self._files = {}
 
 
 class RequestHandlerTcp(RequestHandler):
     def handle(self):
         """
-        Handles a single request
+        Handles the messages of a client connection until it is closed
         """
-        data = self.request.recv(4096)
-        self.log(data)
+        framer = SyslogFramer()
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            for message in framer.feed(data):
+                self.log(message)
+        for message in framer.close():
+            self.log(message)
 
 
 class RequestHandlerUdp(RequestHandler):
@@ -159,30 +332,82 @@ class RequestHandlerUdp(RequestHandler):
 
 
 class SysLogServerUdp(socketserver.UDPServer):
-    def __init__(self, address):
+    allow_reuse_address = True
+
+    def __init__(self, address, writer=None):
         socketserver.UDPServer.__init__(self, address, RequestHandlerUdp)
+        self.writer = writer
 
 
-class SysLogServerTcp(socketserver.TCPServer):
-    def __init__(self, address):
-        socketserver.TCPServer.__init__(self, address, RequestHandlerTcp)
+class SysLogServerTcp(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    TCP syslog server handling every client connection in its own thread
+
+    server_close() disconnects the clients and waits for their threads, so
+    that no message is handled once the server is closed.
+    """
 
+    allow_reuse_address = True
+    daemon_threads = False
+    block_on_close = True
 
-def syslog_server(address="", port=SYSLOG_PORT, tcp=True, terminate_callable=None):
+    def __init__(self, address, writer=None):
+        socketserver.TCPServer.__init__(self, address, RequestHandlerTcp)
+        self.writer = writer
+        self._requests = set()
+        self._requests_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._requests_lock:
+            self._requests.add(request)
+        socketserver.ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        with self._requests_lock:
+            self._requests.discard(request)
+        socketserver.TCPServer.shutdown_request(self, request)
+
+    def server_close(self):
+        with self._requests_lock:
+            requests = list(self._requests)
+        for request in requests:
+            try:
+                # wakes up the handler blocked receiving from the client
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        socketserver.ThreadingMixIn.server_close(self)
+
+
+def syslog_server(
+    address="", port=SYSLOG_PORT, tcp=True, terminate_callable=None, log_dir=None
+):
+    """
+    Runs a syslog server until terminate_callable returns True
+
+    :param address: Address to listen on
+    :param port: Port to listen on
+    :param tcp: Whether to listen on TCP, on UDP otherwise
+    :param terminate_callable: Called between the requests, and at least
+                               once a second, to know when to stop
+    :param log_dir: Directory to write a log file per client in, the
+                    messages are logged as DEBUG messages when None
+    """
     if tcp:
         klass = SysLogServerTcp
     else:
         klass = SysLogServerUdp
-    syslog = klass((address, port))
-
-    while True:
-        if terminate_callable is not None:
-            terminate = terminate_callable()
-        else:
-            terminate = False
+    writer = SyslogWriter(log_dir) if log_dir else None
+    syslog = klass((address, port), writer)
+    syslog.timeout = 1
 
-        if not terminate:
+    try:
+        while terminate_callable is None or not terminate_callable():
             syslog.handle_request()
+    finally:
+        syslog.server_close()
+        if writer is not None:
+            writer.close()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 from __future__ import division
 
 import ipaddress
+import json
 import logging
 import math
 import os
@@ -31,6 +32,7 @@ from virttest import (
     utils_misc,
     utils_net,
     utils_package,
+    utils_resources,
     utils_split_daemons,
     versionable_class,
 )
@@ -677,6 +679,45 @@ class HugePageConfig(object):
                 return
         func(cmd)
 
+    def compact_memory(self):
+        """
+        Drop caches and compact the memory of the local host, to get more
+        continuous memory for the hugepages.
+        """
+        # Drop caches to clean some usable memory
+        with open("/proc/sys/vm/drop_caches", "w") as caches:
+            caches.write("3")
+        # Set hugepage may fail because of insufficient continual memory
+        # Compact memory to get more continual memory
+        if (
+            linux_modules.check_kernel_config("CONFIG_COMPACTION")
+            == linux_modules.ModuleConfig.BUILTIN
+        ):
+            with open("/proc/sys/vm/compact_memory", "w") as memory:
+                memory.write("1")
+            # Check the number of available page
+            with open("/proc/buddyinfo", "r") as buddyinfo:
+                info = buddyinfo.read()
+                LOG.debug("Kernel buddyinfo:\n{}".format(info))
+
+    def get_target_pages_files(self):
+        """
+        Get the files setting the number of hugepages and their target values.
+
+        :return: dict of the nr_hugepages file (of each target node, or the
+                 kernel_hp_file) to the target number of hugepages
+        """
+        if not self.target_nodes:
+            return {self.kernel_hp_file: self.target_hugepages}
+        pages_files = {}
+        for node, num in six.iteritems(self.target_node_num):
+            node_page_path = "%s/node%s" % (self.sys_node_path, node)
+            node_page_path += (
+                "/hugepages/hugepages-%skB/nr_hugepages" % self.hugepage_size
+            )
+            pages_files[node_page_path] = num
+        return pages_files
+
     def setup(self):
         """
         Setup the hugepage
@@ -697,21 +738,7 @@ class HugePageConfig(object):
             self.target_hugepages,
         )
         if not self.session:
-            # Drop caches to clean some usable memory
-            with open("/proc/sys/vm/drop_caches", "w") as caches:
-                caches.write("3")
-            # Set hugepage may fail because of insufficient continual memory
-            # Compact memory to get more continual memory
-            if (
-                linux_modules.check_kernel_config("CONFIG_COMPACTION")
-                == linux_modules.ModuleConfig.BUILTIN
-            ):
-                with open("/proc/sys/vm/compact_memory", "w") as memory:
-                    memory.write("1")
-                # Check the number of available page
-                with open("/proc/buddyinfo", "r") as buddyinfo:
-                    info = buddyinfo.read()
-                    LOG.debug("Kernel buddyinfo:\n{}".format(info))
+            self.compact_memory()
         else:
             # Skip the optimization on remote host/local vm for now as it is not a must
             pass
@@ -757,6 +784,197 @@ class HugePageConfig(object):
             LOG.debug("Hugepage memory successfully deallocated")
 
 
+class HugePagePool(object):
+    """
+    Hugepages kept allocated on the host across the tests of a job.
+
+    Instead of allocating the hugepages of every test and freeing them at its
+    end, the pool grows the number of hugepages (per NUMA node and page size)
+    only when a test needs more than the pool already holds, and restores
+    the original numbers at the end of the job, see :meth:`release`.
+
+    The tests running at the same time get the sum of their reservations,
+    the release is deferred until the last of them is gone.  Only the
+    hugepages of the local host are pooled.  The pool state is kept in a
+    file of the lock dir of :mod:`virttest.utils_resources`, the callers
+    must hold the ``utils_resources.host_lock("hugepages")`` lock.
+    """
+
+    STATE_FILENAME = "avocado-vt-hugepages.json"
+
+    def __init__(self, state_file=None):
+        """
+        :param state_file: Path of the file to keep the pool state in
+        """
+        if state_file is None:
+            state_file = os.path.join(
+                utils_resources.get_lock_dir(), self.STATE_FILENAME
+            )
+        self.state_file = state_file
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r") as state_fd:
+                state = json.load(state_fd)
+        except (IOError, ValueError):
+            state = {}
+        state.setdefault("pools", {})
+        state.setdefault("mounts", [])
+        state.setdefault("reservations", {})
+        state.setdefault("release_pending", False)
+        state.setdefault(
+            "stats",
+            {"reused": 0, "grown": 0, "grow_time": 0.0, "shortfalls": 0},
+        )
+        # forget the reservations of the tests which are gone
+        state["reservations"] = dict(
+            (owner, pages)
+            for owner, pages in state["reservations"].items()
+            if utils_misc.pid_exists(int(owner))
+        )
+        return state
+
+    def _save(self, state):
+        with open(self.state_file, "w") as state_fd:
+            json.dump(state, state_fd)
+
+    @staticmethod
+    def _read_pages(pages_file):
+        with open(pages_file, "r") as pages_fd:
+            return int(pages_fd.read().strip())
+
+    @staticmethod
+    def _write_pages(pages_file, pages):
+        with open(pages_file, "w") as pages_fd:
+            pages_fd.write(str(pages))
+
+    def _grow(self, config, pages_file, pages):
+        self._write_pages(pages_file, pages)
+        if self._read_pages(pages_file) < pages:
+            # retry with more continuous memory
+            config.compact_memory()
+            self._write_pages(pages_file, pages)
+        return self._read_pages(pages_file)
+
+    def reserve(self, config, owner=None):
+        """
+        Get the hugepages needed by a test, growing the pool if needed.
+
+        :param config: Hugepages configuration of the test
+        :type config: :class:`HugePageConfig`
+        :param owner: Pid of the test process, the current one by default
+        :return: The memory suggested for the VMs, as HugePageConfig.setup()
+        :raise exceptions.TestSetupFail: If the pool can't be grown enough
+        :raise ValueError: If the configuration is the one of a remote host
+        """
+        if getattr(config, "session", None) is not None:
+            raise ValueError("Only the hugepages of the local host can be pooled")
+        owner = str(owner or os.getpid())
+        state = self._load()
+        needed = config.get_target_pages_files()
+        for reserved in state["reservations"].values():
+            for pages_file, pages in reserved.items():
+                if pages_file in needed:
+                    needed[pages_file] += pages
+        state["reservations"][owner] = config.get_target_pages_files()
+
+        stats = state["stats"]
+        try:
+            for pages_file, pages in needed.items():
+                current = self._read_pages(pages_file)
+                state["pools"].setdefault(pages_file, {"original": current})
+                if current >= pages:
+                    LOG.debug(
+                        "Using %s hugepages of the pool of %s from %s",
+                        pages,
+                        current,
+                        pages_file,
+                    )
+                    stats["reused"] += 1
+                    continue
+                start_time = time.time()
+                allocated = self._grow(config, pages_file, pages)
+                grow_time = time.time() - start_time
+                stats["grown"] += 1
+                stats["grow_time"] += grow_time
+                LOG.debug(
+                    "Grew the hugepage pool of %s from %s to %s pages in %.2fs",
+                    pages_file,
+                    current,
+                    allocated,
+                    grow_time,
+                )
+                if allocated < pages:
+                    stats["shortfalls"] += 1
+                    del state["reservations"][owner]
+                    raise exceptions.TestSetupFail(
+                        "Only %s of the %s hugepages needed could be allocated "
+                        "in %s" % (allocated, pages, pages_file)
+                    )
+        finally:
+            self._save(state)
+
+        config.mount_hugepage_fs()
+        if config.hugepage_path not in state["mounts"]:
+            state["mounts"].append(config.hugepage_path)
+            self._save(state)
+        return config.suggest_mem
+
+    def unreserve(self, owner=None):
+        """
+        Give the hugepages of a test back to the pool.
+
+        The pool is released with the last reservation when its release
+        was deferred.
+
+        :param owner: Pid of the test process, the current one by default
+        """
+        state = self._load()
+        state["reservations"].pop(str(owner or os.getpid()), None)
+        self._save(state)
+        if state["release_pending"] and not state["reservations"]:
+            self.release()
+
+    def release(self):
+        """
+        Free the hugepages of the pool, restoring the original numbers.
+
+        The pool state is shared by the jobs of the host, while tests still
+        hold reservations the release is deferred to their :meth:`unreserve`.
+
+        :return: False when the release was deferred
+        """
+        if not os.path.exists(self.state_file):
+            return True
+        state = self._load()
+        if state["reservations"]:
+            LOG.info(
+                "Hugepage pool still used by the tests %s, deferring its release",
+                ", ".join(sorted(state["reservations"])),
+            )
+            state["release_pending"] = True
+            self._save(state)
+            return False
+        for mount in state["mounts"]:
+            if os.path.ismount(mount):
+                process.system("umount %s" % mount, ignore_status=True)
+        for pages_file, pool in state["pools"].items():
+            try:
+                self._write_pages(pages_file, pool["original"])
+            except IOError as details:
+                LOG.warning("Unable to restore %s: %s", pages_file, details)
+        stats = state["stats"]
+        LOG.info(
+            "Hugepage pool: reused %s times, grown %s times in %.2fs, %s shortfalls",
+            stats["reused"],
+            stats["grown"],
+            stats["grow_time"],
+            stats["shortfalls"],
+        )
+        os.unlink(self.state_file)
+        return True
+
+
 class KSMConfig(object):
     def __init__(self, params, env):
         """
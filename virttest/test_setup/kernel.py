@@ -1,4 +1,4 @@
-from virttest import arch, test_setup, utils_kernel_module
+from virttest import arch, test_setup, utils_kernel_module, utils_resources
 from virttest.test_setup.core import Setuper
 
 
@@ -31,10 +31,12 @@ class ReloadKVMModules(Setuper):
 class KSMSetup(Setuper):
     def setup(self):
         if self.params.get("setup_ksm") == "yes":
-            ksm = test_setup.KSMConfig(self.params, self.env)
-            ksm.setup(self.env)
+            with utils_resources.host_lock("ksm"):
+                ksm = test_setup.KSMConfig(self.params, self.env)
+                ksm.setup(self.env)
 
     def cleanup(self):
         if self.params.get("setup_ksm") == "yes":
-            ksm = test_setup.KSMConfig(self.params, self.env)
-            ksm.cleanup(self.env)
+            with utils_resources.host_lock("ksm"):
+                ksm = test_setup.KSMConfig(self.params, self.env)
+                ksm.cleanup(self.env)
@@ -1,4 +1,5 @@
-from virttest import test_setup, utils_libvirtd
+from virttest import test_setup, utils_libvirtd, utils_resources
+from virttest.staging import utils_memory
 from virttest.test_setup.core import Setuper
 
 
@@ -9,14 +10,32 @@ class HugePagesSetup(Setuper):
         # before and after the test when 'setup_hugepages = yes'
         self._pre_hugepages_surp = 0
 
+    def _use_pool(self):
+        # The hugepages are kept allocated until the end of the job
+        return self.params.get("hugepages_pool", "no") == "yes"
+
+    def _is_shared(self):
+        # The hugepages are accounted in the pool when kept allocated or
+        # when tests run in parallel (the runner gives them a resource slot)
+        return self._use_pool() or self.params.get("resource_slot") is not None
+
     def setup(self):
         # If guest is configured to be backed by hugepages, setup hugepages in host
         if self.params.get("hugepage") == "yes":
             self.params["setup_hugepages"] = "yes"
         if self.params.get("setup_hugepages") == "yes":
-            h = test_setup.HugePageConfig(self.params)
-            self._pre_hugepages_surp = h.ext_hugepages_surp
-            suggest_mem = h.setup()
+            if self._is_shared():
+                # The hugepages of the tests running in parallel are
+                # accounted in the pool, so they get the sum of their pages
+                # instead of overwriting the number of hugepages of each other
+                with utils_resources.host_lock("hugepages"):
+                    h = test_setup.HugePageConfig(self.params)
+                    self._pre_hugepages_surp = h.ext_hugepages_surp
+                    suggest_mem = test_setup.HugePagePool().reserve(h)
+            else:
+                h = test_setup.HugePageConfig(self.params)
+                self._pre_hugepages_surp = h.ext_hugepages_surp
+                suggest_mem = h.setup()
             if suggest_mem is not None:
                 self.params["mem"] = suggest_mem
             if not self.params.get("hugepage_path"):
@@ -26,8 +45,18 @@ class HugePagesSetup(Setuper):
 
     def cleanup(self):
         if self.params.get("setup_hugepages") == "yes":
-            h = test_setup.HugePageConfig(self.params)
-            h.cleanup()
+            if self._is_shared():
+                with utils_resources.host_lock("hugepages"):
+                    h = test_setup.HugePageConfig(self.params)
+                    pool = test_setup.HugePagePool()
+                    pool.unreserve()
+                    # The release is deferred while other tests use hugepages
+                    if not self._use_pool() and h.deallocate and pool.release():
+                        h.over_commit.proc_fs_value = 0
+                    h.ext_hugepages_surp = utils_memory.get_num_huge_pages_surp()
+            else:
+                h = test_setup.HugePageConfig(self.params)
+                h.cleanup()
             if self.params.get("vm_type") == "libvirt":
                 utils_libvirtd.Libvirtd().restart()
             post_hugepages_surp = h.ext_hugepages_surp
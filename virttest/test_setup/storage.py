@@ -1,28 +1,357 @@
 """ Define set/clean up procedures for storage devices
 """
 
+import hashlib
+import json
+import logging
 import os
+import time
 
-from avocado.utils import distro
+from avocado.core import exceptions
+from avocado.utils import distro, process
 
-from virttest import data_dir, test_setup
+from virttest import data_dir, test_setup, utils_misc, utils_resources
 from virttest.nfs import Nfs, NFSClient
 from virttest.qemu_storage import Iscsidev, LVMdev
 from virttest.test_setup.core import Setuper
 from virttest.utils_misc import SELinuxBoolean
 
+LOG = logging.getLogger("avocado." + __name__)
+
+# lvm.LVM.get_vol() volume types of the lvm volume classes
+_LVM_VOL_TYPES = {
+    "LogicalVolume": "lvs",
+    "VolumeGroup": "vgs",
+    "PhysicalVolume": "pvs",
+}
+
+
+class StorageFixtureCache(object):
+    """
+    iSCSI targets and LVM volumes kept set up across the tests of a job.
+
+    The backing storage of a test is identified by the params defining it,
+    the tests with the same definition reuse the targets, volume groups and
+    logical volumes set up by the first one, only the content of the device
+    is reset.  Everything set up is torn down at the end of the job, see
+    :meth:`release`.
+
+    A backing storage is used by a single test at a time, its users are
+    tracked by pid so that the device of a running test is never reset.
+
+    The state is kept in a file of the lock dir of
+    :mod:`virttest.utils_resources`, readable only by its owner as it holds
+    params of the tests, the callers must hold the
+    ``utils_resources.host_lock("storage")`` lock.
+    """
+
+    STATE_FILENAME = "avocado-vt-storage.json"
+
+    #: Params defining the backing storage, per storage_type
+    KEY_PARAMS = {
+        "iscsi": (
+            "target",
+            "portal_ip",
+            "initiator",
+            "emulated_image",
+            "image_size",
+            "iscsi_backend",
+            "iscsi_lun_attrs",
+            "chap_user",
+            "chap_passwd",
+            "device_id",
+        ),
+        "lvm": (
+            "emulational_device",
+            "emulated_image",
+            "image_name",
+            "image_size",
+            "lv_name",
+            "lv_size",
+            "vg_name",
+            "pv_name",
+            "lv_extra_options",
+        ),
+    }
+
+    #: Other params needed to tear the backing storage down
+    TEARDOWN_PARAMS = (
+        "storage_type",
+        "emulated_image_size",
+        "emulated_file_remove",
+        "pv_size",
+        "host_setup_flag",
+        "force_cleanup",
+    )
+
+    #: Bytes zeroed at the start of a reused device when discard is used
+    WIPE_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, state_file=None):
+        """
+        :param state_file: Path of the file to keep the cache state in
+        """
+        if state_file is None:
+            state_file = os.path.join(
+                utils_resources.get_lock_dir(), self.STATE_FILENAME
+            )
+        self.state_file = state_file
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r") as state_fd:
+                state = json.load(state_fd)
+        except (IOError, ValueError):
+            return {}
+        # forget the users of the tests which are gone
+        for fixture in state.values():
+            fixture["holders"] = [
+                pid for pid in fixture.get("holders", []) if process.pid_exists(pid)
+            ]
+        return state
+
+    def _save(self, state):
+        fd = os.open(self.state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        # the file may have been created by an older version
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w") as state_fd:
+            json.dump(state, state_fd)
+
+    @staticmethod
+    def _is_secret(name):
+        return "passw" in name or name.endswith("_pwd")
+
+    @classmethod
+    def _get_fixture_params(cls, params):
+        """
+        Get the params kept to tear the backing storage down, no secrets.
+        """
+        names = cls.KEY_PARAMS[params.get("storage_type")] + cls.TEARDOWN_PARAMS
+        return dict(
+            (name, params[name])
+            for name in names
+            if name in params and not cls._is_secret(name)
+        )
+
+    @classmethod
+    def get_key(cls, params):
+        """
+        Get the key identifying the backing storage defined by params.
+        """
+        storage_type = params.get("storage_type")
+        data = dict((name, params.get(name)) for name in cls.KEY_PARAMS[storage_type])
+        digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode())
+        return "%s-%s" % (storage_type, digest.hexdigest())
+
+    def lookup(self, key):
+        """
+        Whether the backing storage of key was set up by a previous test.
+        """
+        return key in self._load()
+
+    def get_holders(self, key):
+        """
+        Get the pids of the running tests using the backing storage of key.
+        """
+        return self._load().get(key, {}).get("holders", [])
+
+    def register(
+        self, key, params, setup_time, exported=False, trash=None, holder=None
+    ):
+        """
+        Record the backing storage set up (or reused) by a test.
+
+        :param key: Key returned by :meth:`get_key`
+        :param params: Params of the test, before the setup changed them
+        :param setup_time: Time spent setting the storage up
+        :param exported: Whether the test exported the iSCSI target
+        :param trash: (type, name) of the LVM volumes created by the test
+        :param holder: Pid of the test process, the current one by default
+        """
+        state = self._load()
+        fixture = state.setdefault(
+            key,
+            {
+                "params": self._get_fixture_params(params),
+                "exported": False,
+                "trash": [],
+                "uses": 0,
+                "holders": [],
+                "setup_time": 0.0,
+            },
+        )
+        fixture["holders"].append(holder or os.getpid())
+        fixture["exported"] = fixture["exported"] or exported
+        for vol in trash or []:
+            if list(vol) not in fixture["trash"]:
+                fixture["trash"].append(list(vol))
+        fixture["uses"] += 1
+        fixture["setup_time"] += setup_time
+        self._save(state)
+
+    def unregister(self, key, holder=None):
+        """
+        Record that a test doesn't use the backing storage of key anymore.
+
+        :param key: Key returned by :meth:`get_key`
+        :param holder: Pid of the test process, the current one by default
+        """
+        state = self._load()
+        holders = state.get(key, {}).get("holders", [])
+        if (holder or os.getpid()) in holders:
+            holders.remove(holder or os.getpid())
+            self._save(state)
+
+    def reset_device(self, device, mode):
+        """
+        Reset the content of a reused device.
+
+        :param device: Path of the block device
+        :param mode: "discard" discards the whole device and zeroes its
+                     start, "zero" zeroes it completely, "none" keeps it
+        """
+        if mode == "none":
+            return
+        LOG.debug("Resetting the content of %s (%s)", device, mode)
+        if mode == "zero":
+            process.run("blkdiscard -z %s" % device)
+            return
+        process.run("blkdiscard %s" % device, ignore_status=True)
+        process.run(
+            "dd if=/dev/zero of=%s bs=1M count=%d oflag=direct conv=fsync"
+            % (device, self.WIPE_SIZE // (1024 * 1024))
+        )
+
+    @staticmethod
+    def _teardown(fixture):
+        params = fixture["params"]
+        base_dir = data_dir.get_data_dir()
+        if params.get("storage_type") == "iscsi":
+            iscsidev = Iscsidev(params, base_dir, "iscsi")
+            iscsidev.iscsidevice.export_flag = fixture["exported"]
+            iscsidev.cleanup()
+        elif fixture["trash"]:
+            lvmdev = LVMdev(params, base_dir, "lvm")
+            lvm = lvmdev.lvmdevice
+            vols = [lvm.get_vol(name, vtype) for vtype, name in fixture["trash"]]
+            lvm.trash = [vol for vol in vols if vol is not None]
+            lvmdev.cleanup()
+
+    def release(self):
+        """
+        Tear down the backing storage of all the cached fixtures.
+        """
+        if not os.path.exists(self.state_file):
+            return
+        state = self._load()
+        uses = setup_time = 0
+        for key, fixture in state.items():
+            uses += fixture["uses"]
+            setup_time += fixture["setup_time"]
+            try:
+                self._teardown(fixture)
+            except Exception as details:
+                LOG.error("Failed to tear down storage fixture %s: %s", key, details)
+        LOG.info(
+            "Storage fixture cache: %s fixtures used by %s tests, %.2fs of setup",
+            len(state),
+            uses,
+            setup_time,
+        )
+        os.unlink(self.state_file)
+
 
 class StorageConfig(Setuper):
+    def __init__(self, test, params, env):
+        super().__init__(test, params, env)
+        # key of the cached backing storage used by the test
+        self._fixture_key = None
+
+    def _use_cache(self):
+        return self.params.get("storage_fixture_cache", "no") == "yes"
+
+    def _setup_fixture(self, cache, key, storage_dev, params):
+        cached = cache.lookup(key)
+        start_time = time.time()
+        device = storage_dev.setup()
+        if cached:
+            cache.reset_device(
+                device, self.params.get("storage_fixture_reset", "discard")
+            )
+        setup_time = time.time() - start_time
+        LOG.debug(
+            "%s storage fixture %s in %.2fs",
+            "Reused" if cached else "Set up",
+            key,
+            setup_time,
+        )
+        if isinstance(storage_dev, Iscsidev):
+            exported, trash = storage_dev.iscsidevice.export_flag, None
+        else:
+            exported = False
+            trash = [
+                (_LVM_VOL_TYPES[vol.__class__.__name__], vol.name)
+                for vol in storage_dev.lvmdevice.trash
+            ]
+        cache.register(key, params, setup_time, exported, trash)
+        return device
+
+    def _setup_cached(self, storage_dev):
+        """
+        Set the iSCSI/LVM backing storage up through the fixture cache.
+
+        The backing storage used by another running test is awaited, it's
+        neither reset nor shared.
+        """
+        cache = StorageFixtureCache()
+        key = cache.get_key(self.params)
+        params = dict(self.params)
+        timeout = float(self.params.get("storage_fixture_timeout", 600))
+        end_time = time.time() + timeout
+        while True:
+            with utils_resources.host_lock("storage"):
+                holders = cache.get_holders(key)
+                if not holders:
+                    device = self._setup_fixture(cache, key, storage_dev, params)
+                    self._fixture_key = key
+                    return device
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                raise exceptions.TestSetupFail(
+                    "Storage fixture %s still used by the tests %s after %ss"
+                    % (key, holders, timeout)
+                )
+            LOG.debug("Waiting for the tests %s to release storage %s", holders, key)
+            utils_misc.wait_for(
+                lambda: not cache.get_holders(key),
+                remaining,
+                step=5,
+                wake_on=[cache.state_file],
+            )
+
+    def _release_cached(self):
+        if self._fixture_key is None:
+            return
+        with utils_resources.host_lock("storage"):
+            StorageFixtureCache().unregister(self._fixture_key)
+        self._fixture_key = None
+
     def setup(self):
         base_dir = data_dir.get_data_dir()
         if self.params.get("storage_type") == "iscsi":
             iscsidev = Iscsidev(self.params, base_dir, "iscsi")
-            self.params["image_name"] = iscsidev.setup()
+            if self._use_cache():
+                self.params["image_name"] = self._setup_cached(iscsidev)
+            else:
+                self.params["image_name"] = iscsidev.setup()
             self.params["image_raw_device"] = "yes"
 
         if self.params.get("storage_type") == "lvm":
             lvmdev = LVMdev(self.params, base_dir, "lvm")
-            self.params["image_name"] = lvmdev.setup()
+            if self._use_cache():
+                self.params["image_name"] = self._setup_cached(lvmdev)
+            else:
+                self.params["image_name"] = lvmdev.setup()
             self.params["image_raw_device"] = "yes"
             self.env.register_lvmdev("lvm_%s" % self.params["main_vm"], lvmdev)
 
@@ -75,14 +404,17 @@ class StorageConfig(Setuper):
 
     def cleanup(self):
         base_dir = data_dir.get_data_dir()
-        if self.params.get("storage_type") == "iscsi":
+        # The cached backing storage is torn down at the end of the job
+        self._release_cached()
+        if self.params.get("storage_type") == "iscsi" and not self._use_cache():
             iscsidev = Iscsidev(self.params, base_dir, "iscsi")
             iscsidev.cleanup()
 
         if self.params.get("storage_type") == "lvm":
             try:
                 lvmdev = self.env.get_lvmdev("lvm_%s" % self.params["main_vm"])
-                lvmdev.cleanup()
+                if not self._use_cache():
+                    lvmdev.cleanup()
             except:
                 # Declare explicitly that the error will propagate
                 raise
@@ -1180,7 +1180,10 @@ class UnattendedInstallConfig(object):
 
         if self.syslog_server_enabled == "yes":
             start_syslog_server_thread(
-                self.syslog_server_ip, self.syslog_server_port, self.syslog_server_tcp
+                self.syslog_server_ip,
+                self.syslog_server_port,
+                self.syslog_server_tcp,
+                self.results_dir,
             )
 
         if self.medium in ["cdrom", "kernel_initrd"]:
@@ -1213,7 +1216,13 @@ class UnattendedInstallConfig(object):
             self.params[a] = getattr(self, a)
 
 
-def start_syslog_server_thread(address, port, tcp):
+def start_syslog_server_thread(address, port, tcp, log_dir=None):
+    """
+    Start the syslog server in a thread, if not running yet.
+
+    :param log_dir: Directory to write a log file per client in, e.g. the
+                    test debugdir, the messages are logged when None
+    """
     global _syslog_server_thread
     global _syslog_server_thread_event
 
@@ -1223,7 +1232,7 @@ def start_syslog_server_thread(address, port, tcp):
         _syslog_server_thread_event = threading.Event()
         _syslog_server_thread = threading.Thread(
             target=syslog_server.syslog_server,
-            args=(address, port, tcp, terminate_syslog_server_thread),
+            args=(address, port, tcp, terminate_syslog_server_thread, log_dir),
         )
         _syslog_server_thread.start()
 
@@ -1622,8 +1631,10 @@ def run(test, params, env):
 
         if migrate_background:
             vm.migrate(timeout=mig_timeout, protocol=mig_protocol)
-        else:
-            time.sleep(1)
+        elif test.background_errors.wait_any(1):
+            # Check again at once, the background errors are reported with
+            # the useful files and images at the start of the loop
+            continue
     else:
         LOG.warning("Timeout elapsed while waiting for install to finish ")
         attempt_to_log_useful_files(test, vm)
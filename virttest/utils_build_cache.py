@@ -0,0 +1,214 @@
+"""
+Host side cache of the tools built inside guests.
+
+Benchmark and stress tools (netperf, stress-ng, stressapptest, ...) are
+usually built from source in every guest of every test.  The binaries built
+by a guest are kept on the host, keyed on the hash of the tool source, the
+guest architecture and its distro/libc, so the next guests of the same kind
+just receive the prebuilt binaries.
+
+:copyright: 2024 Red Hat Inc.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from virttest import data_dir
+
+LOG = logging.getLogger("avocado." + __name__)
+
+MANIFEST_FILENAME = "manifest.json"
+
+# Prints the architecture, the distro and the libc of a (Linux) guest
+_GUEST_ID_CMD = (
+    "uname -m; (. /etc/os-release && echo $ID-$VERSION_ID); "
+    "ldd --version 2>&1 | head -n 1"
+)
+
+
+def hash_source(path):
+    """
+    Get the sha256 hash of a source tarball or a source directory.
+
+    The hash of a directory covers the relative path and the content of all
+    its files, VCS metadata excluded.
+
+    :param path: Path of the file or directory
+    :return: The hex digest
+    """
+    digest = hashlib.sha256()
+
+    def _update(filename):
+        with open(filename, "rb") as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+    if not os.path.isdir(path):
+        _update(path)
+        return digest.hexdigest()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in (".git", ".svn", ".hg"))
+        for name in sorted(files):
+            filename = os.path.join(root, name)
+            digest.update(os.path.relpath(filename, path).encode())
+            if os.path.isfile(filename):
+                _update(filename)
+    return digest.hexdigest()
+
+
+def get_guest_id(cmd_output):
+    """
+    Identify the binaries a guest can run.
+
+    :param cmd_output: Function running a command in the guest and returning
+                       its output, e.g. session.cmd_output
+    :return: String with the guest arch, distro id/version and libc version
+    """
+    lines = [line.strip() for line in cmd_output(_GUEST_ID_CMD).splitlines()]
+    return "-".join(line for line in lines if line)
+
+
+def find_tool(cmd_status_output, tool, version=None, version_cmd=None):
+    """
+    Find a tool already installed in the guest.
+
+    :param cmd_status_output: Function running a command in the guest and
+                              returning its status and output
+    :param tool: Name of the tool executable
+    :param version: Version the installed tool must report, any when None
+    :param version_cmd: Command printing the tool version,
+                        '<tool> --version' by default
+    :return: Path of the tool or None
+    """
+    status, output = cmd_status_output("which %s" % tool)
+    if status or not output.strip():
+        return None
+    path = output.strip().splitlines()[-1].strip()
+    if version:
+        version_cmd = version_cmd or "%s --version" % path
+        status, output = cmd_status_output("%s 2>&1" % version_cmd)
+        if version not in output:
+            LOG.debug("Found %s but not version %s: %s", path, version, output)
+            return None
+    return path
+
+
+class BuildCache(object):
+    """
+    Content addressed store of the binaries built inside guests.
+
+    Every entry is a directory named after its key holding the binaries and
+    a manifest mapping them to their path in the guest.  Entries are added
+    atomically, so concurrent tests can share the cache.
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        :param cache_dir: Directory of the cache, 'build_cache' in the
+                          download dir by default
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(data_dir.get_download_dir(), "build_cache")
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def get_key(tool, source_hash, guest_id, *extra):
+        """
+        Get the key of a build.
+
+        :param tool: Name of the tool
+        :param source_hash: Hash of the tool source, see :func:`hash_source`
+        :param guest_id: Guest identifier, see :func:`get_guest_id`
+        :param extra: Anything else the binaries depend on (build options)
+        """
+        data = json.dumps([tool, source_hash, guest_id] + [str(e) for e in extra])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def lookup(self, key):
+        """
+        Get the manifest of a cached build.
+
+        :return: Dict with the 'tool' and the 'files', mapping the file name
+                 in the entry to the guest path, or None if not cached
+        """
+        try:
+            with open(os.path.join(self._get_entry_dir(key), MANIFEST_FILENAME)) as fd:
+                return json.load(fd)
+        except (IOError, ValueError):
+            return None
+
+    def install(self, key, push, cmd_status):
+        """
+        Copy the binaries of a cached build into the guest.
+
+        :param key: Key of the build
+        :param push: Function copying a host file to a guest path
+        :param cmd_status: Function running a command in the guest and
+                           returning its exit status
+        :return: The guest paths of the binaries, None if not cached
+        """
+        manifest = self.lookup(key)
+        if manifest is None:
+            return None
+        entry_dir = self._get_entry_dir(key)
+        paths = []
+        for name, guest_path in sorted(manifest["files"].items()):
+            if cmd_status("mkdir -p %s" % os.path.dirname(guest_path)):
+                return None
+            push(os.path.join(entry_dir, name), guest_path)
+            if cmd_status("chmod 755 %s" % guest_path):
+                return None
+            paths.append(guest_path)
+        LOG.info("Installed prebuilt %s: %s", manifest["tool"], " ".join(paths))
+        return paths
+
+    def store(self, key, tool, pull, guest_paths):
+        """
+        Pull the binaries of a build out of the guest into the cache.
+
+        :param key: Key of the build
+        :param tool: Name of the tool
+        :param pull: Function copying a guest path to a host file
+        :param guest_paths: Guest paths of the built binaries
+        """
+        if self.lookup(key) is not None:
+            return
+        parent_dir = os.path.dirname(self._get_entry_dir(key))
+        if not os.path.isdir(parent_dir):
+            os.makedirs(parent_dir)
+        tmp_dir = tempfile.mkdtemp(prefix=".%s-" % key, dir=parent_dir)
+        try:
+            files = {}
+            for index, guest_path in enumerate(guest_paths):
+                name = "%d-%s" % (index, os.path.basename(guest_path))
+                pull(guest_path, os.path.join(tmp_dir, name))
+                files[name] = guest_path
+            with open(os.path.join(tmp_dir, MANIFEST_FILENAME), "w") as fd:
+                json.dump({"tool": tool, "files": files}, fd)
+            os.rename(tmp_dir, self._get_entry_dir(key))
+            LOG.info("Cached the %s binaries built in the guest", tool)
+        except Exception as details:
+            # another test stored it first, or the guest copy failed
+            LOG.warning("Could not cache the %s build: %s", tool, details)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_build_cache(params):
+    """
+    Get the build cache enabled by the test params.
+
+    :param params: Test params
+    :return: :class:`BuildCache` or None when 'guest_tool_build_cache' is
+             not enabled
+    """
+    if params.get("guest_tool_build_cache", "no") != "yes":
+        return None
+    return BuildCache(params.get("guest_tool_build_cache_dir") or None)
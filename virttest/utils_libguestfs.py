@@ -2,10 +2,13 @@
 libguestfs tools test utility functions.
 """
 
+import contextlib
 import logging
 import os
 import re
 import signal
+import threading
+import time
 
 import aexpect
 from avocado.utils import path, process
@@ -3966,6 +3969,228 @@ class GuestfishPersistent(Guestfish):
         return self.inner_cmd("aug-save")
 
 
+class GuestfishPool(object):
+    """
+    Keep launched guestfish appliances alive across operations.
+
+    Booting the libguestfs appliance takes seconds, so a test doing many
+    operations on the same images pays it once per disk set and mode
+    instead of once per operation.  A read-write appliance caches the image
+    content, so the session of an image has to be invalidated before the
+    image is used or changed outside of the pool (e.g. by a VM).  Read-only
+    appliances hold a shared lock on their images as well, which prevents
+    qemu from opening them for writing.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        # The pool is shared by the threads of the test
+        self._lock = threading.RLock()
+        self.stats = {"launches": 0, "hits": 0, "invalidations": 0, "launch_time": 0.0}
+
+    @staticmethod
+    def _get_key(disks, readonly):
+        if isinstance(disks, str):
+            disks = [disks]
+        return tuple(os.path.realpath(disk) for disk in disks), bool(readonly)
+
+    def _conflicts(self, key, other):
+        """
+        Whether the sessions of key and other can't be used together.
+        """
+        disks, readonly = key
+        other_disks, other_readonly = other
+        if readonly and other_readonly:
+            return False
+        return bool(set(disks).intersection(other_disks))
+
+    def _close(self, key):
+        gf = self._sessions.pop(key)
+        LOG.debug("Closing guestfish appliance of %s (readonly=%s)", *key)
+        try:
+            gf.close_session()
+        except Exception as details:
+            LOG.warning("Failed to close guestfish session: %s", details)
+
+    @staticmethod
+    def _is_alive(gf):
+        try:
+            return gf.ping_daemon().exit_status == 0
+        except Exception:
+            return False
+
+    @staticmethod
+    def _mount_inspected(gf, readonly):
+        """
+        Mount the filesystems of the first operating system found, if any.
+        """
+        roots = gf.inspect_os().stdout.split()
+        if not roots:
+            return
+        mountpoints = []
+        for line in gf.inspect_get_mountpoints(roots[0]).stdout.splitlines():
+            mountpoint, _, device = line.partition(":")
+            if device.strip():
+                mountpoints.append((mountpoint.strip(), device.strip()))
+        # Mount the parents first
+        for mountpoint, device in sorted(mountpoints, key=lambda m: len(m[0])):
+            if readonly:
+                gf.mount_ro(device, mountpoint)
+            else:
+                gf.mount(device, mountpoint)
+
+    def get(self, disks, readonly=False, inspector=True):
+        """
+        Get a launched guestfish session with disks added.
+
+        :param disks: Image path or list of image paths
+        :param readonly: Add the disks read-only
+        :param inspector: Mount the guest filesystems, like guestfish -i
+        :return: Launched session, with ignore_status disabled
+        :rtype: :class:`GuestfishPersistent`
+        """
+        key = self._get_key(disks, readonly)
+        with self._lock:
+            return self._get(key, readonly, inspector)
+
+    def _get(self, key, readonly, inspector):
+        gf = self._sessions.get(key)
+        if gf is not None:
+            if self._is_alive(gf):
+                self.stats["hits"] += 1
+                # whatever the previous user of the session set
+                gf.set_ignore_status(False)
+                return gf
+            LOG.debug("Guestfish appliance of %s died, relaunching", key[0])
+            self._close(key)
+        # Two appliances writing the same image, or reading it while another
+        # one writes it, would see inconsistent data.
+        for other in [k for k in self._sessions if self._conflicts(key, k)]:
+            self._close(other)
+        start = time.time()
+        gf = GuestfishPersistent()
+        gf.set_ignore_status(False)
+        try:
+            for disk in key[0]:
+                gf.add_drive_opts(disk, readonly=readonly)
+            gf.run()
+            if inspector:
+                self._mount_inspected(gf, readonly)
+        except Exception:
+            gf.close_session()
+            raise
+        elapsed = time.time() - start
+        self.stats["launches"] += 1
+        self.stats["launch_time"] += elapsed
+        LOG.debug("Launched guestfish appliance of %s in %.2fs", key[0], elapsed)
+        self._sessions[key] = gf
+        return gf
+
+    @contextlib.contextmanager
+    def session(self, disks, readonly=False, inspector=True, ignore_status=False):
+        """
+        Use a launched guestfish session with disks added, see :meth:`get`.
+
+        The ignore_status of the pooled session is restored afterwards, so
+        it doesn't leak to the next users of the session.
+
+        :param ignore_status: Whether the failed commands don't raise
+        """
+        gf = self.get(disks, readonly, inspector)
+        previous = gf.ignore_status
+        gf.set_ignore_status(ignore_status)
+        try:
+            yield gf
+        finally:
+            gf.set_ignore_status(previous)
+
+    def invalidate(self, disks=None):
+        """
+        Close the sessions using any of disks, so they are relaunched.
+
+        Needed whenever the images are changed or used outside of the pool.
+        The changes done by read-write sessions are flushed to the images.
+
+        :param disks: Image path or list of image paths, all when None
+        """
+        with self._lock:
+            if disks is None:
+                keys = list(self._sessions)
+            else:
+                disks = set(self._get_key(disks, True)[0])
+                keys = [key for key in self._sessions if disks.intersection(key[0])]
+            for key in keys:
+                self._close(key)
+                self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        """
+        Get the pool statistics.
+
+        :return: Dict with the launches, hits, invalidations, the total
+                 launch_time and the saved_time estimated from the average
+                 launch time.
+        """
+        stats = dict(self.stats)
+        launches = stats["launches"]
+        average = stats["launch_time"] / launches if launches else 0.0
+        stats["saved_time"] = stats["hits"] * average
+        return stats
+
+    def close(self):
+        """
+        Close all the sessions and log the statistics.
+        """
+        with self._lock:
+            for key in list(self._sessions):
+                self._close(key)
+        if self.stats["launches"]:
+            LOG.debug(
+                "Guestfish pool: %(launches)s launches in %(launch_time).2fs, "
+                "%(hits)s reuses saving about %(saved_time).2fs, "
+                "%(invalidations)s invalidations",
+                self.get_stats(),
+            )
+
+
+_guestfish_pool = None
+
+
+def get_guestfish_pool():
+    """
+    Get the guestfish appliance pool of this process.
+
+    :rtype: :class:`GuestfishPool`
+    """
+    global _guestfish_pool
+    if _guestfish_pool is None:
+        _guestfish_pool = GuestfishPool()
+    return _guestfish_pool
+
+
+def invalidate_guestfish_pool(disks=None):
+    """
+    Close the appliances of the pool of this process using disks, if any.
+
+    To be called before the images are opened by something else, e.g. qemu
+    starting a VM, see :meth:`GuestfishPool.invalidate`.
+
+    :param disks: Image path or list of image paths, all when None
+    """
+    if _guestfish_pool is not None:
+        _guestfish_pool.invalidate(disks)
+
+
+def close_guestfish_pool():
+    """
+    Close the appliances of the pool of this process, if any.
+    """
+    global _guestfish_pool
+    if _guestfish_pool is not None:
+        _guestfish_pool.close()
+        _guestfish_pool = None
+
+
 def libguest_test_tool_cmd(
     qemuarg=None,
     qemudirarg=None,
@@ -4359,7 +4584,13 @@ def virt_sysprep_cmd(
 
 
 def virt_cat_cmd(
-    disk_or_domain, file_path, options=None, ignore_status=True, debug=False, timeout=60
+    disk_or_domain,
+    file_path,
+    options=None,
+    ignore_status=True,
+    debug=False,
+    timeout=60,
+    use_pool=False,
 ):
     """
     Execute virt-cat command to print guest's file detail.
@@ -4367,8 +4598,15 @@ def virt_cat_cmd(
     :param disk_or_domain: a img path or a domain name.
     :param file_path: the file to print detail
     :param options: the options of virt-cat.
+    :param use_pool: read the file through a read-only appliance of the
+                     guestfish pool instead, only for images without options.
     :return: a CmdResult object.
     """
+    if use_pool and options is None and os.path.isfile(disk_or_domain):
+        with get_guestfish_pool().session(
+            disk_or_domain, readonly=True, ignore_status=ignore_status
+        ) as gf:
+            return gf.cat(file_path)
     # disk_or_domain and file_path are necessary parameters.
     if os.path.isfile(disk_or_domain):
         disk_or_domain = "-a " + disk_or_domain
@@ -4557,13 +4795,21 @@ def virt_ls_cmd(
     ignore_status=True,
     debug=False,
     timeout=60,
+    use_pool=False,
 ):
     """
     Execute virt-ls command to check whether file exists.
 
     :param disk_or_domain: a img path or a domain name.
     :param file_dir_path: the file or directory need to check.
+    :param use_pool: list the directory through a read-only appliance of the
+                     guestfish pool instead, only for images without options.
     """
+    if use_pool and is_disk and options is None and extra is None:
+        with get_guestfish_pool().session(
+            disk_or_domain, readonly=True, ignore_status=ignore_status
+        ) as gf:
+            return gf.ls(file_dir_path)
     # disk_or_domain and file_dir_path are necessary parameters.
     cmd = "virt-ls"
     if connect_uri is not None:
@@ -8,7 +8,11 @@ Naive module that keeps tacks of some opened files and somehow manages them.
 :copyright: 2020 Red Hat Inc.
 """
 
+import atexit
+import collections
+import functools
 import logging
+import multiprocessing.util
 import os
 import re
 import threading
@@ -29,10 +33,15 @@ _log_lock = threading.RLock()
 # File descriptor dictionary for all open log files
 _open_log_files = {}  # pylint: disable=C0103
 
+#: Maximal time in seconds a logged line stays in the buffers
+FLUSH_INTERVAL = 0.2
+#: Number of log file paths resolved by log_line() which are cached
+LOG_FILENAMES_CACHE_SIZE = 256
+
 
 def _acquire_lock(lock, timeout=10):
     """
-    Check if the lock is available
+    Acquire the lock, blocking until it is available or timeout expires
 
     :param lock: threading.RLock object
     :param timeout: time to Wait for the lock
@@ -40,22 +49,144 @@ def _acquire_lock(lock, timeout=10):
     :return: boolean. True if the lock is available
                       False if the lock is unavailable
     """
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        if lock.acquire(False):
-            return True
-        time.sleep(0.05)
-    return False
+    return lock.acquire(timeout=timeout)
 
 
 class LogLockError(Exception):
     pass
 
 
+class _LogWriter(object):
+    """
+    Thread writing the logged lines to their files.
+
+    The callers of log_line() only append the lines to a queue. The writer
+    thread is woken up by the first queued line, writes all the lines
+    queued meanwhile to the buffered files and flushes them, so the lines
+    of busy sources are written in batches while the files are kept up to
+    date for their readers.
+
+    The pending lines are written out before the process forks, so the
+    child doesn't inherit them in the buffers of the files, and when a
+    child process started by multiprocessing exits through os._exit().
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._queue = None
+        self._wakeup = None
+        self._start_lock = threading.Lock()
+        # Held while writing, and across fork() not to fork mid-write
+        self._write_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # A forked process (e.g. the test process) doesn't inherit the thread
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = collections.deque()
+            self._wakeup = threading.Event()
+            thread = threading.Thread(target=self._run, name="utils_logfile writer")
+            thread.daemon = True
+            thread.start()
+            self._pid = os.getpid()
+            # multiprocessing children skip atexit, but run its finalizers
+            multiprocessing.util.Finalize(None, self.sync, exitpriority=0)
+
+    def write(self, log_fd, data):
+        """
+        Queue data to be written to the file object log_fd.
+        """
+        self._ensure_started()
+        self._queue.append((log_fd, data))
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def sync(self):
+        """
+        Wait until all the lines queued so far are written and flushed.
+        """
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.append((None, done))
+        self._wakeup.set()
+        done.wait()
+
+    @staticmethod
+    def _write(log_fd, data):
+        try:
+            log_fd.write(data)
+        except ValueError:
+            # closed by close_log_file() while the line was queued
+            with open(log_fd.name, "a") as reopened_fd:
+                reopened_fd.write(data)
+
+    def _write_queued(self):
+        written = set()
+        synced = []
+        while self._queue:
+            log_fd, data = self._queue.popleft()
+            if log_fd is None:
+                synced.append(data)
+                continue
+            try:
+                self._write(log_fd, data)
+                written.add(log_fd)
+            except IOError as details:
+                LOG.warning("Unable to write to %s: %s", log_fd.name, details)
+        for log_fd in written:
+            try:
+                log_fd.flush()
+            except (IOError, ValueError):
+                pass
+        for done in synced:
+            done.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            with self._write_lock:
+                self._write_queued()
+
+    def before_fork(self):
+        self._write_lock.acquire()
+        if self._pid == os.getpid():
+            self._write_queued()
+
+    def after_fork(self):
+        self._write_lock.release()
+
+
+_log_writer = _LogWriter()
+os.register_at_fork(
+    before=_log_writer.before_fork,
+    after_in_parent=_log_writer.after_fork,
+    after_in_child=_log_writer.after_fork,
+)
+_last_timestamp = (None, "")
+
+
+def _get_timestamp():
+    global _last_timestamp
+    now = int(time.time())
+    last_time, timestr = _last_timestamp
+    if now != last_time:
+        timestr = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        _last_timestamp = (now, timestr)
+    return timestr
+
+
 def log_line(filename, line):
     """
     Write a line to a file.
 
+    The line is written asynchronously, use flush_log_file() to make sure
+    the file content is up to date before reading it.
+
     :param filename: Path of file to write to, either absolute or relative to
                      the dir set by set_log_file_dir().
     :param line: Line to write.
@@ -63,12 +194,23 @@ def log_line(filename, line):
     """
     global _open_log_files, _log_file_dir, _log_lock
 
+    timestr = _get_timestamp()
+    try:
+        line = string_safe_encode(line)
+    except UnicodeDecodeError:
+        line = line.decode("utf-8", "ignore").encode("utf-8")
+    log_file = _get_log_filename(_log_file_dir, filename)
+    base_file = os.path.basename(log_file)
+
+    log_fd = _open_log_files.get(base_file)
+    if log_fd is not None and log_fd.name == log_file:
+        _log_writer.write(log_fd, "%s: %s\n" % (timestr, line))
+        return
+
     if not _acquire_lock(_log_lock):
         raise LogLockError(
             "Could not acquire exclusive lock to access" " _open_log_files"
         )
-    log_file = get_log_filename(filename)
-    base_file = os.path.basename(log_file)
     try:
         if base_file not in _open_log_files:
             # First, let's close the log files opened in old directories
@@ -79,17 +221,18 @@ def log_line(filename, line):
             except OSError:
                 pass
             _open_log_files[base_file] = open(log_file, "a")
-        timestr = time.strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            line = string_safe_encode(line)
-        except UnicodeDecodeError:
-            line = line.decode("utf-8", "ignore").encode("utf-8")
-        _open_log_files[base_file].write("%s: %s\n" % (timestr, line))
-        _open_log_files[base_file].flush()
+        _log_writer.write(_open_log_files[base_file], "%s: %s\n" % (timestr, line))
     finally:
         _log_lock.release()
 
 
+def flush_log_file():
+    """
+    Write out the lines logged so far by log_line() to their files.
+    """
+    _log_writer.sync()
+
+
 def get_match_count(file_path, key_message, encoding="ISO-8859-1"):
     """
     Get expected messages count in path
@@ -100,6 +243,7 @@ def get_match_count(file_path, key_message, encoding="ISO-8859-1"):
     :return count: the count of key message
     """
     count = 0
+    flush_log_file()
     try:
         with open(file_path, "r", encoding=encoding) as fp:
             for line in fp.readlines():
@@ -140,10 +284,15 @@ def get_log_filename(filename):
     :param filename: Log file name
     :return: str. The full path of the log file
     """
+    return _get_log_filename(_log_file_dir, filename)
+
+
+@functools.lru_cache(maxsize=LOG_FILENAMES_CACHE_SIZE)
+def _get_log_filename(log_file_dir, filename):
     if aurl.is_url(filename):
         return filename
     return os.path.realpath(
-        os.path.abspath(utils_path.get_path(_log_file_dir, filename))
+        os.path.abspath(utils_path.get_path(log_file_dir, filename))
     )
 
 
@@ -161,6 +310,7 @@ def close_log_file(filename="*"):
             "Could not acquire exclusive lock to access" " _open_log_files"
         )
     try:
+        _log_writer.sync()
         for log_file, log_fd in _open_log_files.items():
             if filename == "*" or os.path.basename(log_file) == os.path.basename(
                 filename
@@ -215,3 +365,6 @@ def clear_log_file(log_file_name, log_dir=None):
             open(log_file, "w").close()
     finally:
         _log_lock.release()
+
+
+atexit.register(close_log_file)
@@ -9,6 +9,7 @@ from __future__ import division
 import ctypes
 import fcntl
 import getpass
+import hashlib
 import inspect
 import logging
 import math
@@ -22,6 +23,7 @@ import signal
 import socket
 import stat
 import string
+import struct
 import subprocess
 import sys
 import tarfile
@@ -315,7 +317,8 @@ def find_substring(string, pattern1, pattern2=None):
 
 
 def lock_file(filename, mode=fcntl.LOCK_EX):
-    lockfile = open(filename, "w")
+    # don't truncate it, that would wake up the ones watching the file
+    lockfile = open(filename, "a")
     fcntl.lockf(lockfile, mode)
     return lockfile
 
@@ -535,6 +538,120 @@ def generate_tmp_file_name(file_name, ext=None, directory=data_dir.get_tmp_dir()
     return file_name
 
 
+# Data files are built from slices of a pool of pseudo-random bytes
+_DATA_POOL_SIZE = 4 * 1024 * 1024
+_DATA_CHUNK_SIZE = 1024 * 1024
+_DATA_POOLS = {}
+
+
+def _data_chunks(size, seed, pattern="random"):
+    """
+    Yield the chunks of a deterministic data file of the given size.
+
+    Every chunk of the "random" pattern is its 8 bytes index followed by a
+    slice of a per seed pool, taken at a pseudo-random offset, so the data
+    neither repeats nor compresses and no data is copied to produce it.
+    The "zero" pattern yields slices of a single zero filled chunk.
+    """
+    if pattern == "zero":
+        view = memoryview(bytes(_DATA_CHUNK_SIZE))
+    elif pattern == "random":
+        if seed not in _DATA_POOLS:
+            pool = random.Random(seed).getrandbits(_DATA_POOL_SIZE * 8)
+            pool = pool.to_bytes(_DATA_POOL_SIZE, "little")
+            _DATA_POOLS.clear()
+            _DATA_POOLS[seed] = memoryview(pool + pool[:_DATA_CHUNK_SIZE])
+        view = _DATA_POOLS[seed]
+    else:
+        raise ValueError("Unknown data file pattern '%s'" % pattern)
+    index = 0
+    while size > 0:
+        length = min(size, _DATA_CHUNK_SIZE)
+        if pattern == "zero":
+            yield view[:length]
+        else:
+            header = struct.pack("<Q", index)[:length]
+            offset = (index * 2654435761 + seed) % _DATA_POOL_SIZE
+            yield header
+            if length > len(header):
+                yield view[offset : offset + length - len(header)]
+        size -= length
+        index += 1
+
+
+def generate_data_file(path, size, seed=None, pattern="random", algorithm="md5"):
+    """
+    Create a file with deterministic pseudo-random content.
+
+    The data is hashed while it's written, so the file is never read back.
+    The "zero" pattern creates a sparse file instead.
+
+    :param path: Path of the file to create.
+    :param size: Size of the file in bytes.
+    :param seed: Seed of the content, random when not given.
+    :param pattern: "random" or "zero".
+    :param algorithm: hashlib algorithm used for the digest.
+    :return: Tuple of (seed, hex digest of the content).
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(32)
+    digest = hashlib.new(algorithm)
+    with open(path, "wb") as data_file:
+        for chunk in _data_chunks(size, seed, pattern):
+            digest.update(chunk)
+            if pattern != "zero":
+                data_file.write(chunk)
+        data_file.truncate(size)
+    return seed, digest.hexdigest()
+
+
+def verify_data_file(path, size, seed, pattern="random", algorithm="md5"):
+    """
+    Check a file created by :func:`generate_data_file` in a single read.
+
+    The content is compared with the regenerated one while it's hashed.
+
+    :param path: Path of the file to check.
+    :param size: Expected size of the file in bytes.
+    :param seed: Seed the file was generated with.
+    :param pattern: Pattern the file was generated with.
+    :param algorithm: hashlib algorithm used for the digest.
+    :return: Tuple of (hex digest of the content, offset of the first
+             differing byte or None when the file is intact).
+    """
+    digest = hashlib.new(algorithm)
+    buf = bytearray(_DATA_CHUNK_SIZE)
+    bad_offset = None
+    offset = 0
+    with open(path, "rb") as data_file:
+        for chunk in _data_chunks(size, seed, pattern):
+            view = memoryview(buf)[: len(chunk)]
+            length = data_file.readinto(view)
+            digest.update(view[:length])
+            if bad_offset is None and buf[:length] != chunk:
+                bad_offset = offset
+                for index in range(length):
+                    if view[index] != chunk[index]:
+                        break
+                else:
+                    index = length
+                bad_offset += index
+            offset += length
+            if length < len(chunk):
+                break
+        else:
+            # Anything past the expected size is corruption too
+            while True:
+                length = data_file.readinto(buf)
+                if not length:
+                    break
+                digest.update(memoryview(buf)[:length])
+                if bad_offset is None:
+                    bad_offset = offset
+                offset += length
+    return digest.hexdigest(), bad_offset
+
+
 def format_str_for_message(msg):
     """
     Format str so that it can be appended to a message.
@@ -554,42 +671,279 @@ def format_str_for_message(msg):
         return "\n" + msg
 
 
-def wait_for(func, timeout, first=0.0, step=1.0, text=None, ignore_errors=False):
+# Wait statistics per wait_for() call site
+_wait_stats = {}
+_wait_stats_lock = threading.Lock()
+
+# inotify(7) events signalling a path was created, changed or removed
+_INOTIFY_MASK = (
+    0x00000002  # IN_MODIFY
+    | 0x00000004  # IN_ATTRIB
+    | 0x00000008  # IN_CLOSE_WRITE
+    | 0x00000080  # IN_MOVED_TO
+    | 0x00000100  # IN_CREATE
+    | 0x00000200  # IN_DELETE
+    | 0x00000040  # IN_MOVED_FROM
+)
+# struct inotify_event without its name: wd, mask, cookie and len
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class _PathWatcher(object):
+    """
+    Readable file descriptor becoming ready when watched paths change.
+
+    Uses inotify through libc, a path which is not a directory is watched
+    via its parent directory, so its creation is noticed as well.  The
+    events of the other entries of that directory are readable too, use
+    :meth:`drain` to tell whether a watched path changed.
+    """
+
+    def __init__(self, paths):
+        libc = ctypes.CDLL(None, use_errno=True)
+        # IN_NONBLOCK | IN_CLOEXEC
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watched names per watch descriptor, None for a whole directory
+        self._names = {}
+        for path in paths:
+            name = None
+            if not os.path.isdir(path):
+                path, name = os.path.split(os.path.abspath(path))
+            wd = libc.inotify_add_watch(self._fd, path.encode(), _INOTIFY_MASK)
+            if wd < 0:
+                continue
+            if name is None:
+                self._names[wd] = None
+            elif self._names.get(wd, set()) is not None:
+                self._names.setdefault(wd, set()).add(name.encode())
+
+    def fileno(self):
+        return self._fd
+
+    def drain(self):
+        """
+        Consume the pending events.
+
+        :return: True if one of them is about a watched path
+        """
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                # an unknown wd is a queue overflow, anything may have changed
+                names = self._names.get(wd)
+                if names is None or name in names:
+                    changed = True
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _split_wake_sources(wake_on):
+    """
+    Sort the wake sources by kind.
+
+    :return: tuple (events, readables, paths)
+    """
+    events, readables, paths = [], [], []
+    for source in wake_on:
+        if isinstance(source, six.string_types):
+            paths.append(source)
+        elif hasattr(source, "is_set") and hasattr(source, "wait"):
+            events.append(source)
+        else:
+            # file descriptor or object with fileno(), e.g. a QMP monitor
+            readables.append(source)
+    return events, readables, paths
+
+
+def _sleep_until_woken(delay, events, readables, watcher=None):
+    """
+    Sleep for delay seconds, or less if a wake source becomes ready.
+
+    :param watcher: :class:`_PathWatcher` among the readables, it only ends
+                    the sleep when a watched path changed
+    """
+    if not events and not readables:
+        time.sleep(delay)
+        return
+    if not readables and len(events) == 1:
+        events[0].wait(delay)
+        return
+    end_time = time.time() + delay
+    while not any(event.is_set() for event in events):
+        remaining = end_time - time.time()
+        if remaining <= 0:
+            break
+        if events:
+            # threading events can't be selected, check them in short slices
+            remaining = min(remaining, 0.05)
+        if not readables:
+            time.sleep(remaining)
+            continue
+        ready = select.select(readables, [], [], remaining)[0]
+        if ready and (ready != [watcher] or watcher.drain()):
+            break
+
+
+def _record_wait_stats(key, elapsed, attempts, passed):
+    with _wait_stats_lock:
+        stats = _wait_stats.setdefault(
+            key,
+            {"calls": 0, "attempts": 0, "timeouts": 0, "total": 0.0, "max": 0.0},
+        )
+        stats["calls"] += 1
+        stats["attempts"] += attempts
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        if not passed:
+            stats["timeouts"] += 1
+
+
+def get_wait_stats():
+    """
+    Get the statistics of the wait_for() calls done so far.
+
+    :return: dict of call site ('file:line function') to a dict with the
+             number of 'calls', predicate 'attempts', 'timeouts', and the
+             'total' and 'max' time waited in seconds
+    """
+    with _wait_stats_lock:
+        return dict((key, dict(value)) for key, value in _wait_stats.items())
+
+
+def clear_wait_stats():
+    """
+    Forget the statistics of the wait_for() calls done so far.
+    """
+    with _wait_stats_lock:
+        _wait_stats.clear()
+
+
+def log_wait_stats(limit=10, log=LOG.debug):
+    """
+    Log the call sites which spent the most time in wait_for().
+
+    :param limit: Number of call sites to report
+    :param log: Logging function
+    """
+    stats = sorted(
+        get_wait_stats().items(), key=lambda item: item[1]["total"], reverse=True
+    )
+    if not stats:
+        return
+    log("Slowest wait_for() call sites:")
+    for key, value in stats[:limit]:
+        log(
+            "  %.2fs total (%.2fs max) in %d calls, %d attempts, %d timeouts: %s",
+            value["total"],
+            value["max"],
+            value["calls"],
+            value["attempts"],
+            value["timeouts"],
+            key,
+        )
+
+
+def wait_for(
+    func,
+    timeout,
+    first=0.0,
+    step=1.0,
+    text=None,
+    ignore_errors=False,
+    wake_on=None,
+    max_step=None,
+):
     """
     Wait until func() evaluates to True.
 
     If func() evaluates to True before timeout expires, return the
     value of func(). Otherwise return None.
 
+    Between the attempts this sleeps for step seconds, unless one of the
+    wake_on sources becomes ready earlier.  File descriptors (or objects
+    with fileno(), like a QMP monitor which becomes readable on events)
+    should be consumed by func(), otherwise they keep waking it up.
+
     :param timeout: Timeout in seconds
     :param first: Time to sleep before first attempt
     :param steps: Time to sleep between attempts in seconds
     :param text: Text to print while waiting, for debug purposes
     :param ignore_errors: If True, log any error and retry
-    """
+    :param wake_on: List of sources ending the sleep between attempts:
+                    threading.Event objects, file descriptors or objects
+                    with fileno() becoming readable, and paths being
+                    created, modified or removed
+    :param max_step: If bigger than step, double the sleep time after each
+                     attempt up to max_step (exponential backoff)
+    """
+    caller = sys._getframe(1)
+    stats_key = "%s:%d %s" % (
+        caller.f_code.co_filename,
+        caller.f_lineno,
+        caller.f_code.co_name,
+    )
     start_time = time.time()
     end_time = time.time() + float(timeout)
+    attempts = 0
+    output = None
 
-    time.sleep(first)
+    events, readables, paths = _split_wake_sources(wake_on or [])
+    watcher = None
+    if paths:
+        try:
+            watcher = _PathWatcher(paths)
+            readables.append(watcher)
+        except (OSError, AttributeError) as details:
+            LOG.debug("Unable to watch %s, polling instead: %s", paths, details)
 
-    while time.time() < end_time:
-        if text:
-            LOG.debug("%s (%f secs)", text, (time.time() - start_time))
+    try:
+        time.sleep(first)
 
-        try:
-            output = func()
-        except:  # pylint: disable=W0702
-            if not ignore_errors:
-                raise
-            else:
-                LOG.debug("Ignoring error '%s'", sys.exc_info())
-                output = None
-        if output:
-            return output
+        while time.time() < end_time:
+            if text:
+                LOG.debug("%s (%f secs)", text, (time.time() - start_time))
 
-        time.sleep(step)
+            attempts += 1
+            if watcher is not None:
+                # forget the changes seen so far before checking, so that
+                # the ones done while func() runs still end the sleep
+                watcher.drain()
+            try:
+                output = func()
+            except:  # pylint: disable=W0702
+                if not ignore_errors:
+                    raise
+                else:
+                    LOG.debug("Ignoring error '%s'", sys.exc_info())
+                    output = None
+            if output:
+                return output
 
-    return None
+            delay = min(step, max(end_time - time.time(), 0))
+            _sleep_until_woken(delay, events, readables, watcher)
+            if max_step is not None and step < max_step:
+                step = min(step * 2, max_step)
+
+        return None
+    finally:
+        if watcher is not None:
+            watcher.close()
+        _record_wait_stats(stats_key, time.time() - start_time, attempts, output)
 
 
 def get_hash_from_file(hash_path, dvd_basename):
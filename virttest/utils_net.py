@@ -3354,9 +3354,14 @@ class VirtNet(DbNet, ParamsNet):
                 % (nic.mac, str(nic_index_or_name))
             )
         self.free_mac_address(nic_index_or_name)
+        mac_prefix = self.mac_prefix
+        slot = self.params.get("resource_slot")
+        if slot and len(nic.mac_str_to_int_list(mac_prefix)) < 5:
+            # Keep apart the MAC addresses of the tests running in parallel
+            mac_prefix = "%s:%02x" % (mac_prefix.rstrip(":"), int(slot) % 256)
         attempts_remaining = attempts
         while attempts_remaining > 0:
-            mac_attempt = nic.complete_mac_address(self.mac_prefix)
+            mac_attempt = nic.complete_mac_address(mac_prefix)
             self.lock_db()
             if mac_attempt not in self.mac_index():
                 nic.mac = mac_attempt.lower()
@@ -3424,6 +3429,11 @@ class VirtNet(DbNet, ParamsNet):
         nic_index = self.nic_name_index(self[nic_index_or_name].nic_name)
         prefix = "t%d-" % nic_index
         postfix = utils_misc.generate_random_string(6)
+        slot = self.params.get("resource_slot")
+        if slot:
+            # Keep apart the tap devices of the tests running in parallel
+            prefix += "%s-" % slot
+            postfix = postfix[: max(11 - len(prefix), 4)]
         # Ensure interface name doesn't exceed 11 characters
         self[nic_index_or_name].ifname = (prefix + postfix)[-11:]
         self.update_db()
@@ -1,7 +1,10 @@
+import bisect
 import logging
+import math
 import ntpath
 import os
 import re
+import time
 
 import aexpect
 from aexpect import remote
@@ -10,6 +13,7 @@ from six.moves import xrange
 
 from . import data_dir
 from . import remote as remote_old
+from . import utils_build_cache
 
 LOG = logging.getLogger("avocado." + __name__)
 
@@ -38,6 +42,10 @@ class NetserverError(NetperfError):
         return e_msg
 
 
+# Echoed after the streamed commands to find the end of their output
+STREAM_END_MARKER = "__NETPERF_DONE_"
+
+
 class NetperfTestError(NetperfError):
     def __init__(self, error_info):
         NetperfError.__init__(self)
@@ -48,6 +56,181 @@ class NetperfTestError(NetperfError):
         return e_msg
 
 
+def _to_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+class NetperfResult(object):
+    """
+    Incremental parser of the output of the netperf omni tests.
+
+    The output is fed as it is read from the session and split into the
+    records of the finished tests, one dict of output selector to value per
+    test, and the interim results printed meanwhile (-D, netperf built with
+    --enable-demo).  Both the keyval (-k) and the CSV (-o) output formats are
+    supported, the CSV one needs the list of selectors passed to -o.
+    """
+
+    INTERIM_RE = re.compile(
+        r"Interim result:\s*([\d.]+)\s+(\S+)\s+over\s+([\d.]+)\s+seconds"
+        r"(?:\s+ending at\s+([\d.]+))?"
+    )
+    KEYVAL_RE = re.compile(r"^([A-Z][A-Z0-9_]*)=(.*)$")
+
+    def __init__(self, selectors=None, interim_callback=None):
+        """
+        :param selectors: Output selectors of the CSV (-o) format, the keyval
+                          (-k) format is parsed when None
+        :param interim_callback: Called with every interim result, a tuple of
+                                 (value, units, interval, end time)
+        """
+        self.selectors = selectors
+        self.interim_callback = interim_callback
+        self.records = []
+        self.interims = []
+        self._buffer = ""
+        self._header = None
+        self._record = {}
+
+    def feed(self, data):
+        """
+        Parse a chunk of netperf output, which may end in the middle of a line.
+        """
+        lines = (self._buffer + data).split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self._parse_line(line.strip())
+
+    def close(self):
+        """
+        Parse the end of the output and finish the last record.
+        """
+        if self._buffer:
+            self._parse_line(self._buffer.strip())
+            self._buffer = ""
+        if self._record:
+            self.records.append(self._record)
+            self._record = {}
+
+    def _parse_line(self, line):
+        match = self.INTERIM_RE.search(line)
+        if match:
+            value, units, interval, end = match.groups()
+            interim = (float(value), units, float(interval), float(end or 0))
+            self.interims.append(interim)
+            if self.interim_callback:
+                self.interim_callback(interim)
+            return
+        if self.selectors:
+            fields = line.split(",")
+            if len(fields) != len(self.selectors):
+                return
+            if self._header is None:
+                self._header = fields
+            else:
+                record = zip(self.selectors, (f.strip() for f in fields))
+                self.records.append(dict((k, _to_number(v)) for k, v in record))
+            return
+        match = self.KEYVAL_RE.match(line)
+        if match:
+            key, value = match.groups()
+            # the keys are printed once per test, a known key starts a new one
+            if key in self._record:
+                self.records.append(self._record)
+                self._record = {}
+            self._record[key] = _to_number(value.strip())
+
+    def values(self, selector):
+        """
+        Get the numeric values of an output selector in the finished tests.
+        """
+        return [
+            record[selector]
+            for record in self.records
+            if isinstance(record.get(selector), (int, float))
+        ]
+
+
+class ResultStats(object):
+    """
+    Running statistics of netperf results aggregated over streams and VMs.
+
+    The mean and the variance are updated for every value, so the summary of
+    long runs is available at any time without keeping the raw outputs.
+    """
+
+    def __init__(self, values=()):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._sorted = []
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        """
+        Account one more value (e.g. the throughput of a stream).
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        bisect.insort(self._sorted, value)
+
+    @property
+    def stdev(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    @property
+    def cv(self):
+        """
+        Coefficient of variation, the stdev relative to the mean.
+        """
+        return self.stdev / self.mean if self.mean else 0.0
+
+    def percentile(self, percent):
+        """
+        Get a percentile of the values, interpolated between the closest ones.
+
+        :param percent: Percentile in [0, 100]
+        """
+        if not self._sorted:
+            return 0.0
+        rank = (len(self._sorted) - 1) * percent / 100.0
+        low = int(math.floor(rank))
+        high = min(low + 1, len(self._sorted) - 1)
+        return self._sorted[low] + (self._sorted[high] - self._sorted[low]) * (
+            rank - low
+        )
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        :return: Dict with the count, sum, mean, stdev, cv, min, max and the
+                 requested percentiles (as 'p<percent>')
+        """
+        summary = {
+            "count": self.count,
+            "sum": self.mean * self.count,
+            "mean": self.mean,
+            "stdev": self.stdev,
+            "cv": self.cv,
+            "min": self._sorted[0] if self._sorted else 0.0,
+            "max": self._sorted[-1] if self._sorted else 0.0,
+        }
+        for percent in percentiles:
+            summary["p%s" % percent] = self.percentile(percent)
+        return summary
+
+
 class NetperfPackage(remote_old.Remote_Package):
     def __init__(
         self,
@@ -62,6 +245,7 @@ class NetperfPackage(remote_old.Remote_Package):
         prompt="^root@.*[\#\$]\s*$|",
         linesep="\n",
         status_test_command="echo $?",
+        build_cache=None,
     ):
         """
         Class NetperfPackage just represent the netperf package
@@ -75,6 +259,10 @@ class NetperfPackage(remote_old.Remote_Package):
         :param port: Port to connect to
         :param username: Username (if required)
         :param password: Password (if required)
+        :param build_cache: Cache of the netperf builds, the binaries built
+                            from source are reused by the next guests of the
+                            same kind when set
+        :type build_cache: :class:`virttest.utils_build_cache.BuildCache`
         """
         super(NetperfPackage, self).__init__(
             address, client, username, password, port, netperf_path
@@ -85,6 +273,7 @@ class NetperfPackage(remote_old.Remote_Package):
         self.netperf_dir = None
         self.build_tool = False
         self.md5sum = md5sum
+        self.build_cache = build_cache
         self.netperf_base_dir = self.remote_path
         self.netperf_file = os.path.basename(self.netperf_source)
         # XXX: add this as a workaround to make it supports Windows
@@ -184,13 +373,12 @@ class NetperfPackage(remote_old.Remote_Package):
         )
         return max_cpus_fp, max_cpus
 
-    def _mod_max_cpus(self):
+    def _get_cpu_count(self):
         """
-        netperf is hardcoded to support up to 256 CPUS.
-        Modify the value from the source code previous to compilation to the
-        desired value.
+        Get the number of CPUs of the host/guest/vm/target running netperf.
+
+        :return: The number of CPUs, 0 if unknown
         """
-        # Obtain host/guest/vm/target netperf running system's number of CPUs
         try:
             n_cpus = int(
                 self.session.cmd_output('lscpu | grep -oP "^CPU\(s\)\: *\K[0-9]+"')
@@ -204,6 +392,15 @@ class NetperfPackage(remote_old.Remote_Package):
         except ValueError:
             LOG.warning("Couldn't parse the number of cpus in the system")
             n_cpus = 0
+        return n_cpus
+
+    def _mod_max_cpus(self):
+        """
+        netperf is hardcoded to support up to 256 CPUS.
+        Modify the value from the source code previous to compilation to the
+        desired value.
+        """
+        n_cpus = self._get_cpu_count()
         max_cpus_file_path, current_max_cpus = self._get_current_max_cpus()
         if current_max_cpus >= n_cpus:
             LOG.debug("Bypassing netperf's MAXCPUS value modification")
@@ -262,7 +459,47 @@ class NetperfPackage(remote_old.Remote_Package):
             self.netperf_source = netperf_source
         return self.netperf_source
 
+    def _copy_to(self, local_path, remote_path):
+        remote_old.copy_files_to(
+            self.address,
+            self.cp_client,
+            self.username,
+            self.password,
+            self.cp_port,
+            local_path,
+            remote_path,
+        )
+
+    def _copy_from(self, remote_path, local_path):
+        remote_old.copy_files_from(
+            self.address,
+            self.cp_client,
+            self.username,
+            self.password,
+            self.cp_port,
+            remote_path,
+            local_path,
+        )
+
+    def _get_build_key(self, compile_option):
+        """
+        Get the build cache key of the netperf binaries built in the remote.
+
+        The binaries depend on the source tarball, the remote system and the
+        compile option, as well as on MAXCPUS which is raised to the number
+        of CPUs of big systems before compiling.
+        """
+        guest_id = utils_build_cache.get_guest_id(self.session.cmd_output)
+        return self.build_cache.get_key(
+            "netperf",
+            utils_build_cache.hash_source(self.netperf_source),
+            guest_id,
+            compile_option,
+            max(self._get_cpu_count(), 256),
+        )
+
     def install(self, install, compile_option):
+        build_key = None
         cmd = "which netperf"
         try:
             status, netperf = self.session.cmd_status_output(cmd)
@@ -276,10 +513,24 @@ class NetperfPackage(remote_old.Remote_Package):
         if install:
             self.build_tool = True
             self.pull_file(self.netperf_source)
+            if self.pack_suffix and self.build_cache:
+                build_key = self._get_build_key(compile_option)
+                if self.build_cache.install(
+                    build_key, self._copy_to, self.session.cmd_status
+                ):
+                    install = False
+        if install:
             self.push_file(self.netperf_source)
             if self.pack_suffix:
                 LOG.debug("Compiling netserver from source")
                 self.pack_compile(compile_option)
+                if build_key:
+                    self.build_cache.store(
+                        build_key,
+                        "netperf",
+                        self._copy_from,
+                        [self.netperf_path, self.netserver_path],
+                    )
 
         msg = "Using local netperf: %s and %s" % (
             self.netperf_path,
@@ -305,6 +556,8 @@ class Netperf(object):
         status_test_command="echo $?",
         compile_option="--enable-demo=yes",
         install=True,
+        build_cache=None,
+        params=None,
     ):
         """
         Init Netperf class.
@@ -320,8 +573,14 @@ class Netperf(object):
         :param password: Password (if required)
         :param compile_option: Compile option for netperf
         :param install: Whether need install netperf or not.
+        :param build_cache: Cache of the netperf builds, see
+                            :class:`virttest.utils_build_cache.BuildCache`
+        :param params: Test params, the build cache is used when their
+                       'guest_tool_build_cache' is enabled
         """
         self.client = client
+        if build_cache is None and params is not None:
+            build_cache = utils_build_cache.get_build_cache(params)
 
         self.package = NetperfPackage(
             address,
@@ -335,6 +594,7 @@ class Netperf(object):
             prompt,
             linesep,
             status_test_command,
+            build_cache,
         )
         self.netserver_path, self.netperf_path = self.package.install(
             install, compile_option
@@ -404,6 +664,8 @@ class NetperfServer(Netperf):
         status_test_command="echo $?",
         compile_option="--enable-demo=yes",
         install=True,
+        build_cache=None,
+        params=None,
     ):
         """
         Init NetperfServer class.
@@ -419,6 +681,10 @@ class NetperfServer(Netperf):
         :param password: Password (if required)
         :param compile_option: Compile option for netperf
         :param install: Whether need install netperf or not.
+        :param build_cache: Cache of the netperf builds, see
+                            :class:`virttest.utils_build_cache.BuildCache`
+        :param params: Test params, the build cache is used when their
+                       'guest_tool_build_cache' is enabled
         """
         super(NetperfServer, self).__init__(
             address,
@@ -434,6 +700,8 @@ class NetperfServer(Netperf):
             status_test_command,
             compile_option,
             install,
+            build_cache,
+            params,
         )
 
     @property
@@ -490,6 +758,8 @@ class NetperfClient(Netperf):
         status_test_command="echo $?",
         compile_option="",
         install=True,
+        build_cache=None,
+        params=None,
     ):
         """
         Init NetperfClient class.
@@ -505,6 +775,10 @@ class NetperfClient(Netperf):
         :param password: Password (if required)
         :param compile_option: Compile option for netperf
         :param install: Whether need install netperf or not.
+        :param build_cache: Cache of the netperf builds, see
+                            :class:`virttest.utils_build_cache.BuildCache`
+        :param params: Test params, the build cache is used when their
+                       'guest_tool_build_cache' is enabled
         """
         super(NetperfClient, self).__init__(
             address,
@@ -520,6 +794,8 @@ class NetperfClient(Netperf):
             status_test_command,
             compile_option,
             install,
+            build_cache,
+            params,
         )
 
     @property
@@ -568,6 +844,95 @@ class NetperfClient(Netperf):
         self.result = output
         return self.result
 
+    def start_omni(
+        self,
+        server_address,
+        selectors,
+        test_option="",
+        timeout=1200,
+        cmd_prefix="",
+        interval=None,
+        interim_callback=None,
+    ):
+        """
+        Run a netperf omni test and parse its keyval output as it streams.
+
+        :param server_address: Remote netserver address
+        :param selectors: Omni output selectors, e.g. ['THROUGHPUT',
+                          'MEAN_LATENCY', 'P99_LATENCY']
+        :param test_option: Netperf test option (global/test option)
+        :param timeout: Netperf test timeout
+        :param cmd_prefix: Prefix in netperf command
+        :param interval: Interval of the interim results in seconds, needs
+                         netperf built with --enable-demo
+        :param interim_callback: Called with every interim result as soon as
+                                 it is printed, see :class:`NetperfResult`
+        :return: The parsed results
+        :rtype: :class:`NetperfResult`
+        """
+        global_option, _, test_specific = test_option.partition("--")
+        if interval:
+            global_option += " -D %s" % interval
+        netperf_cmd = "%s %s -H %s -P 0 %s -- -k %s %s" % (
+            cmd_prefix,
+            self.netperf_path,
+            server_address,
+            global_option,
+            ",".join(selectors),
+            test_specific,
+        )
+        result = NetperfResult(interim_callback=interim_callback)
+        LOG.info("Start netperf with cmd: '%s'" % netperf_cmd)
+        self.result = self._stream_cmd(netperf_cmd, result.feed, timeout)
+        result.close()
+        return result
+
+    def _stream_cmd(self, cmd, feed, timeout):
+        """
+        Run a command in the session handing its output to feed as it comes.
+
+        The end of the output is found by an end marker echoed after the
+        command, the prompt of the session may match any line.
+
+        :return: The whole output
+        """
+        if self.client == "nc":
+            cmd += " & echo %s%%errorlevel%%" % STREAM_END_MARKER
+        else:
+            cmd += "; echo %s$?" % STREAM_END_MARKER
+        end_re = re.compile(r"%s(\d+)" % STREAM_END_MARKER)
+        self.session.sendline(cmd)
+        end_time = time.time() + timeout
+        output = []
+        # Data held back as the marker may be split across reads
+        pending = ""
+        while True:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                raise NetperfTestError(
+                    "Timeout running '%s': %s" % (cmd, "".join(output) + pending)
+                )
+            try:
+                data = self.session.read_nonblocking(0.1, min(remaining, 1.0))
+            except aexpect.ExpectError as err:
+                raise NetperfTestError("Run netperf error. %s" % str(err))
+            if not data:
+                continue
+            pending += data
+            match = end_re.search(pending)
+            if match:
+                # Don't hand the marker line over
+                feed(pending[: match.start()])
+                output.append(pending[: match.start()])
+                if match.group(1) != "0":
+                    LOG.warning("'%s' exited with status %s", cmd, match.group(1))
+                return "".join(output)
+            keep = len(STREAM_END_MARKER) + 8
+            if len(pending) > keep:
+                feed(pending[:-keep])
+                output.append(pending[:-keep])
+                pending = pending[-keep:]
+
     def bg_start(
         self,
         server_address,
@@ -5,7 +5,7 @@ try:
 except ImportError:
     from UserDict import IterableUserDict
 
-from collections import OrderedDict
+from collections import ChainMap, OrderedDict
 
 from avocado.core import exceptions
 from six.moves import xrange
@@ -21,22 +21,56 @@ class Params(IterableUserDict):
     """
 
     lock = Lock()
+    # Set when object_params() views were built on top of self.data, which
+    # then must not be modified in place anymore (copy on write)
+    _shared = False
+    # Cache of the object_params() overrides per object name
+    _object_overrides = None
+
+    @classmethod
+    def _from_data(cls, data):
+        params = cls.__new__(cls)
+        params.data = data
+        return params
+
+    def _before_change(self, flatten=False):
+        """
+        Prepare self.data for an in place modification.
+
+        :param flatten: Replace a ChainMap of an object_params() view by a
+                        plain dict, needed to remove the keys of its parents
+        """
+        if self._shared or (flatten and isinstance(self.data, ChainMap)):
+            self.data = dict(self.data)
+            self._shared = False
+        self._object_overrides = None
+
+    def __setitem__(self, key, value):
+        self._before_change()
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        self._before_change(flatten=True)
+        del self.data[key]
 
     def __getitem__(self, key):
         """overrides the error messages of missing params[$key]"""
         try:
-            return IterableUserDict.__getitem__(self, key)
+            return self.data[key]
         except KeyError:
             raise ParamNotFound(
                 "Mandatory parameter '%s' is missing. "
                 "Check your cfg files for typos/mistakes" % key
             )
 
+    def __repr__(self):
+        return repr(dict(self.data))
+
     def get(self, key, default=None):
         """overrides the behavior to catch ParamNotFound error"""
         try:
-            return self[key]
-        except ParamNotFound:
+            return self.data[key]
+        except KeyError:
             return default
 
     def setdefault(self, key, failobj=None):
@@ -51,13 +85,8 @@ class Params(IterableUserDict):
         :param key: The name of the key whose value lists the objects
                 (e.g. 'nics').
         """
-        lst = self.get(key, "").split()
-        # remove duplicate elements
-        objs = list({}.fromkeys(lst).keys())
-        # sort list to keep origin order
-        objs.sort(key=lst.index)
-        del lst
-        return objs
+        # remove duplicate elements keeping the origin order
+        return list(OrderedDict.fromkeys(self.get(key, "").split()))
 
     def object_params(self, obj_name):
         """
@@ -69,18 +98,33 @@ class Params(IterableUserDict):
         The values of keys with the suffix overwrite the values of their
         suffixless versions.
 
+        The returned object doesn't copy the parameters, it is a view layering
+        the (cached) overwritten values over the parameters of this object.
+        Both objects can still be modified independently, a modification of
+        one is never seen by the other.
+
         :param obj_name: The name of the object (objects are listed by the
                 objects() method).
         """
-        suffix = "_" + obj_name
-        self.lock.acquire()
-        new_dict = self.copy()
-        self.lock.release()
-        for key in list(new_dict.keys()):
-            if key.endswith(suffix):
-                new_key = key.split(suffix)[0]
-                new_dict[new_key] = new_dict[key]
-        return new_dict
+        with self.lock:
+            if self._object_overrides is None:
+                self._object_overrides = {}
+            overrides = self._object_overrides.get(obj_name)
+            if overrides is None:
+                suffix = "_" + obj_name
+                overrides = {}
+                for key in self.data:
+                    if key.endswith(suffix):
+                        overrides[key.split(suffix)[0]] = self.data[key]
+                self._object_overrides[obj_name] = overrides
+            self._shared = True
+            if isinstance(self.data, ChainMap):
+                maps = self.data.maps
+            else:
+                maps = [self.data]
+        if overrides:
+            return self._from_data(ChainMap({}, overrides, *maps))
+        return self._from_data(ChainMap({}, *maps))
 
     def object_counts(self, count_key, base_name):
         """
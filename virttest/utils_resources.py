@@ -0,0 +1,368 @@
+"""
+Host resource accounting for tests sharing the same host.
+
+Tests declare what they need (vcpus, memory, hugepage memory and host
+devices) through their params, :class:`ResourcePool` hands out budgets from
+the host capacity across processes and :func:`host_lock` serializes the
+changes done to shared host state (hugepages, KSM, ...) by concurrently
+running tests.
+
+:copyright: 2024 Red Hat Inc.
+"""
+
+import collections
+import contextlib
+import json
+import logging
+import os
+
+from avocado.utils import cpu as cpu_utils
+from avocado.utils import memory as memory_utils
+from avocado.utils.process import pid_exists
+
+from virttest import utils_misc
+from virttest.compat import get_settings_value
+
+LOG = logging.getLogger("avocado." + __name__)
+
+#: Name of the state file kept in the lock directory by :class:`ResourcePool`
+POOL_STATE_FILENAME = "avocado-vt-resources.json"
+
+
+class ResourceError(Exception):
+    pass
+
+
+class ResourceUnavailableError(ResourceError):
+    def __init__(self, owner, request, timeout):
+        ResourceError.__init__(self)
+        self.owner = owner
+        self.request = request
+        self.timeout = timeout
+
+    def __str__(self):
+        return "Unable to get %s for '%s' within %ss" % (
+            self.request,
+            self.owner,
+            self.timeout,
+        )
+
+
+def get_lock_dir():
+    """
+    Get the directory holding the host wide lock and state files.
+
+    The same directory used by the Avocado-VT job lock is reused, so that
+    all the jobs running on the host agree on it.
+    """
+    lock_dir = get_settings_value(
+        "plugins.vtjoblock", "dir", key_type=str, default="/tmp"
+    )
+    lock_dir = os.path.expanduser(lock_dir)
+    if not os.path.isdir(lock_dir):
+        os.makedirs(lock_dir)
+    return lock_dir
+
+
+@contextlib.contextmanager
+def host_lock(name):
+    """
+    Hold an exclusive host wide lock while running the managed block.
+
+    The lock is a `lockf` lock on a file in :func:`get_lock_dir`, so it
+    serializes different test processes as well as different jobs.
+
+    :param name: Name of the shared host state, e.g. 'hugepages' or 'ksm'
+    """
+    filename = os.path.join(get_lock_dir(), "avocado-vt-%s.lock" % name)
+    lockfile = utils_misc.lock_file(filename)
+    try:
+        yield
+    finally:
+        utils_misc.unlock_file(lockfile)
+
+
+def get_port_range(params, start, end):
+    """
+    Get the part of a range of host ports reserved to a test.
+
+    The tests running in parallel get disjoint parts of the range, picked
+    by their 'resource_slot' out of 'resource_slots' (both set by the
+    runner), so they don't race for the same free ports.
+
+    :param params: Test or VM params
+    :param start: First port of the range
+    :param end: End of the range, excluded as in `find_free_port`
+    :return: tuple (start, end) of the part of the range
+    """
+    slots = int(params.get("resource_slots", 1))
+    size = (end - start) // max(slots, 1)
+    if slots <= 1 or size < 1:
+        return start, end
+    slot = int(params.get("resource_slot", 0)) % slots
+    return start + slot * size, start + (slot + 1) * size
+
+
+class ResourceRequest(object):
+    """
+    Amount of host resources used by a test.
+    """
+
+    def __init__(self, cpus=0, mem=0, hugepage_mem=0, devices=()):
+        """
+        :param cpus: Number of host cpus
+        :param mem: Memory in MB, including the hugepage backed one
+        :param hugepage_mem: Memory backed by hugepages in MB
+        :param devices: Host devices used exclusively, e.g. PCI addresses.
+                        None in a capacity means any device of the host.
+        """
+        self.cpus = int(cpus)
+        self.mem = int(mem)
+        self.hugepage_mem = int(hugepage_mem)
+        self.devices = None if devices is None else sorted(devices)
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Get the resources declared by the test params.
+
+        The explicit 'resource_cpus', 'resource_mem',
+        'resource_hugepage_mem' and 'resource_devices' params take
+        precedence, otherwise the resources are summed up from the 'smp',
+        'mem', 'hugepage' and 'vm_hostdevs' params of every VM of the test.
+
+        :param params: Test params
+        :type params: :class:`virttest.utils_params.Params`
+        """
+        cpus = mem = hugepage_mem = 0
+        devices = []
+        for vm_name in params.objects("vms"):
+            vm_params = params.object_params(vm_name)
+            vm_mem = int(vm_params.get("mem") or 0)
+            cpus += int(vm_params.get("smp") or 1)
+            mem += vm_mem
+            if vm_params.get("hugepage") == "yes":
+                hugepage_mem += vm_mem
+            for hostdev in vm_params.objects("vm_hostdevs"):
+                host = vm_params.object_params(hostdev).get("vm_hostdev_host")
+                if host:
+                    devices.append(host)
+        return cls(
+            params.get_numeric("resource_cpus", cpus),
+            params.get_numeric("resource_mem", mem),
+            params.get_numeric("resource_hugepage_mem", hugepage_mem),
+            params.objects("resource_devices") or devices,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get("cpus", 0),
+            data.get("mem", 0),
+            data.get("hugepage_mem", 0),
+            data.get("devices", ()),
+        )
+
+    def to_dict(self):
+        data = {"cpus": self.cpus, "mem": self.mem, "hugepage_mem": self.hugepage_mem}
+        if self.devices:
+            data["devices"] = self.devices
+        return data
+
+    def __add__(self, other):
+        if self.devices is None or other.devices is None:
+            devices = None
+        else:
+            devices = self.devices + other.devices
+        return ResourceRequest(
+            self.cpus + other.cpus,
+            self.mem + other.mem,
+            self.hugepage_mem + other.hugepage_mem,
+            devices,
+        )
+
+    def devices_fit(self, other):
+        """
+        Check the devices are available in other, each of them only once.
+        """
+        devices = collections.Counter(self.devices or ())
+        if any(count > 1 for count in devices.values()):
+            return False
+        if other.devices is None:
+            return True
+        return not devices - collections.Counter(other.devices)
+
+    def __le__(self, other):
+        return (
+            self.cpus <= other.cpus
+            and self.mem <= other.mem
+            and self.hugepage_mem <= other.hugepage_mem
+            and self.devices_fit(other)
+        )
+
+    def __eq__(self, other):
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        devices = " devices=%s" % ",".join(self.devices) if self.devices else ""
+        return "<ResourceRequest cpus=%s mem=%sM hugepage_mem=%sM%s>" % (
+            self.cpus,
+            self.mem,
+            self.hugepage_mem,
+            devices,
+        )
+
+
+def get_host_capacity(cpus=0, mem=0, hugepage_mem=0):
+    """
+    Get the host resources available to the tests.
+
+    :param cpus: Number of cpus, the online host cpus are used when 0
+    :param mem: Memory in MB, the total host memory is used when 0
+    :param hugepage_mem: Hugepage memory in MB, `mem` is used when 0
+    :rtype: :class:`ResourceRequest`, with any host device available
+    """
+    if not cpus:
+        cpus = (
+            cpu_utils.online_count()
+            if hasattr(cpu_utils, "online_count")
+            else cpu_utils.online_cpus_count()
+        )
+    if not mem:
+        mem = memory_utils.memtotal() // 1024
+    return ResourceRequest(cpus, mem, hugepage_mem or mem, None)
+
+
+class ResourcePool(object):
+    """
+    Host wide accounting of the resources handed out to the running tests.
+
+    The allocations are stored in a JSON file protected by :func:`host_lock`,
+    so any number of test processes can share one pool.  Allocations of
+    processes which are gone are dropped, so a crashed test can't leak its
+    budget.  Every allocation also gets the lowest slot number not used by
+    the others, to namespace the MAC addresses, tap devices and ports of
+    the test, see :meth:`get_slot`.
+    """
+
+    def __init__(self, capacity, state_file=None):
+        """
+        :param capacity: Host resources shared by the tests
+        :type capacity: :class:`ResourceRequest`
+        :param state_file: Path of the file to keep the allocations in
+        """
+        self.capacity = capacity
+        if state_file is None:
+            state_file = os.path.join(get_lock_dir(), POOL_STATE_FILENAME)
+        self.state_file = state_file
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r") as state:
+                allocations = json.load(state)
+        except (IOError, ValueError):
+            return {}
+        return dict(
+            (owner, data)
+            for owner, data in allocations.items()
+            if data.get("pid") and pid_exists(data["pid"])
+        )
+
+    def _save(self, allocations):
+        tmp_file = "%s.%s" % (self.state_file, os.getpid())
+        with open(tmp_file, "w") as state:
+            json.dump(allocations, state)
+        os.rename(tmp_file, self.state_file)
+
+    @staticmethod
+    def _used(allocations):
+        used = ResourceRequest()
+        for data in allocations.values():
+            used += ResourceRequest.from_dict(data)
+        return used
+
+    def used(self):
+        """
+        Get the resources currently handed out.
+
+        :rtype: :class:`ResourceRequest`
+        """
+        with host_lock("resources"):
+            return self._used(self._load())
+
+    def try_acquire(self, owner, request):
+        """
+        Hand out the requested resources if they are available.
+
+        A request bigger than the whole capacity is granted once the pool
+        is empty, otherwise it could never be scheduled.
+
+        :param owner: Unique name of the allocation
+        :param request: Resources to allocate
+        :type request: :class:`ResourceRequest`
+        :return: True when the resources were allocated
+        """
+        with host_lock("resources"):
+            allocations = self._load()
+            if owner not in allocations:
+                if allocations and not (
+                    self._used(allocations) + request <= self.capacity
+                ):
+                    return False
+                data = request.to_dict()
+                data["pid"] = os.getpid()
+                used_slots = set(alloc.get("slot") for alloc in allocations.values())
+                data["slot"] = min(
+                    slot
+                    for slot in range(len(allocations) + 1)
+                    if slot not in used_slots
+                )
+                allocations[owner] = data
+            self._save(allocations)
+        return True
+
+    def get_slot(self, owner):
+        """
+        Get the slot number of an allocation.
+
+        The numbers of the running allocations are different and as low as
+        possible, 0 up to the number of concurrent tests.
+
+        :param owner: Name of the allocation
+        :return: The slot number, None if owner has no allocation
+        """
+        with host_lock("resources"):
+            return self._load().get(owner, {}).get("slot")
+
+    def acquire(self, owner, request, timeout=3600, step=1.0):
+        """
+        Wait for the requested resources and hand them out.
+
+        :param owner: Unique name of the allocation
+        :param request: Resources to allocate
+        :type request: :class:`ResourceRequest`
+        :param timeout: Time to wait for the resources in seconds
+        :param step: Time between attempts in seconds
+        :raise ResourceUnavailableError: If not allocated within timeout
+        """
+        if self.try_acquire(owner, request):
+            return
+        LOG.debug("Waiting for %s to become available for '%s'", request, owner)
+        if not utils_misc.wait_for(
+            lambda: self.try_acquire(owner, request),
+            timeout,
+            step=step,
+            wake_on=[self.state_file],
+        ):
+            raise ResourceUnavailableError(owner, request, timeout)
+
+    def release(self, owner):
+        """
+        Give back the resources allocated to owner.
+
+        :param owner: Name of the allocation
+        """
+        with host_lock("resources"):
+            allocations = self._load()
+            if allocations.pop(owner, None) is not None:
+                self._save(allocations)
@@ -1,6 +1,7 @@
 import logging
 import os
 import random
+import sys
 import threading
 import time
 
@@ -8,7 +9,7 @@ from avocado.core import exceptions
 from avocado.utils import cpu
 
 from virttest import cpu as cpuutil
-from virttest import utils_net, utils_package, virsh
+from virttest import error_event, utils_build_cache, utils_net, utils_package, virsh
 from virttest.libvirt_xml.devices.disk import Disk
 from virttest.utils_test import libvirt
 
@@ -51,12 +52,15 @@ class VMStressEvents:
             for event in events:
                 self.threads.append(
                     threading.Thread(
-                        target=self.vm_stress_events, args=(event, vm, vm_params)
+                        target=self._run_event,
+                        args=(self.vm_stress_events, event, vm, vm_params),
                     )
                 )
         for event in self.host_events:
             self.threads.append(
-                threading.Thread(target=self.host_stress_event, args=(event,))
+                threading.Thread(
+                    target=self._run_event, args=(self.host_stress_event, event)
+                )
             )
         for thread in self.threads:
             thread.start()
@@ -65,6 +69,32 @@ class VMStressEvents:
         for thread in self.threads:
             thread.join()
 
+    @staticmethod
+    def _run_event(func, event, *args):
+        """
+        Run the stress event, reporting its failure as a background error
+
+        :param func: stress event function
+        :param event: event name
+        """
+        try:
+            func(event, *args)
+        except Exception:
+            LOG.error("Stress event '%s' failed", event)
+            error_event.error_events_bus.put(sys.exc_info())
+
+    def _wait_next_iteration(self):
+        """
+        Sleep between the iterations of a stress event
+
+        :return: True if a fatal background error was reported, then the
+                 stress event stops
+        """
+        if error_event.error_events_bus.wait_any(self.itr_sleep_time):
+            LOG.warning("Background error reported, stopping the stress event")
+            return True
+        return False
+
     def vm_stress_events(self, event, vm, params):
         """
         Stress events
@@ -204,7 +234,8 @@ class VMStressEvents:
                         libvirt.delete_local_disk(disk_type, disk_name)
             else:
                 raise NotImplementedError
-            time.sleep(self.itr_sleep_time)
+            if self._wait_next_iteration():
+                break
 
     def host_stress_event(self, event):
         """
@@ -258,16 +289,27 @@ class VMStressEvents:
                 cpu.online(processor)
             else:
                 raise NotImplementedError
-            time.sleep(self.itr_sleep_time)
+            if self._wait_next_iteration():
+                break
 
 
 def install_stressapptest(vm):
     """
     Install stressapptest cmd
 
+    With the guest tool build cache enabled in the vm params, an installed
+    stressapptest is used as is and the binary built from a given commit is
+    reused by the next guests of the same kind.
+
     :param vm: the vm to be installed with stressapptest
     """
     session = vm.wait_for_login(timeout=360)
+    build_cache = utils_build_cache.get_build_cache(vm.params)
+    if build_cache and utils_build_cache.find_tool(
+        session.cmd_status_output, "stressapptest"
+    ):
+        session.close()
+        return
     if utils_package.package_install("stressapptest", session, timeout=300):
         session.close()
         return
@@ -279,17 +321,34 @@ def install_stressapptest(vm):
         )
 
     app_repo = "git clone https://github.com/stressapptest/" "stressapptest.git"
+    s, o = session.cmd_status_output("rm -rf stressapptest && %s" % app_repo)
+    if s:
+        raise exceptions.TestError(
+            "Failed to install stressapptest " "in guest: '%s'" % o
+        )
+    build_key = None
+    if build_cache:
+        # the commit id identifies the source content
+        commit = session.cmd_output("git -C stressapptest rev-parse HEAD").strip()
+        guest_id = utils_build_cache.get_guest_id(session.cmd_output)
+        build_key = build_cache.get_key("stressapptest", commit, guest_id)
+        if build_cache.install(build_key, vm.copy_files_to, session.cmd_status):
+            session.close()
+            return
     stressapptest_install_cmd = (
-        "rm -rf stressapptest "
-        "&& %s"
-        " && cd stressapptest "
-        "&& ./configure "
-        "&& make "
-        "&& make install" % app_repo
+        "cd stressapptest && ./configure && make && make install"
     )
     s, o = session.cmd_status_output(stressapptest_install_cmd)
     if s:
         raise exceptions.TestError(
             "Failed to install stressapptest " "in guest: '%s'" % o
         )
+    if build_key:
+        tool_path = utils_build_cache.find_tool(
+            session.cmd_status_output, "stressapptest"
+        )
+        if tool_path:
+            build_cache.store(
+                build_key, "stressapptest", vm.copy_files_from, [tool_path]
+            )
     session.close()
@@ -31,12 +31,13 @@ import subprocess
 import tempfile
 import threading
 import time
+import weakref
 
 import aexpect
 from aexpect import remote
 from avocado.core import exceptions
 from avocado.utils import archive, aurl, crypto, download, path, process
-from six.moves import xrange
+from six.moves import queue, xrange
 
 # Import from the top level virttest namespace
 from virttest import asset, bootstrap, data_dir, error_context, qemu_virtio_port
@@ -44,6 +45,7 @@ from virttest import remote as remote_old
 from virttest import (
     scan_autotest_results,
     storage,
+    utils_build_cache,
     utils_misc,
     utils_net,
     utils_package,
@@ -730,7 +732,10 @@ def run_image_copy(test, params, env):
     try:
         error_context.context("Copy image '%s'" % image, LOG.info)
         if aurl.is_url(asset_info["url"]):
-            asset.download_file(asset_info, interactive=False, force=force)
+            connections = int(params.get("asset_download_connections", 1))
+            asset.download_file(
+                asset_info, interactive=False, force=force, connections=connections
+            )
         else:
             download.get_file(asset_info["url"], asset_info["destination"])
 
@@ -750,7 +755,7 @@ def run_file_transfer(test, params, env):
     Transfer a file back and forth between host and guest.
 
     1) Boot up a VM.
-    2) Create a large file by dd on host.
+    2) Create a large file of pseudo-random data on host.
     3) Copy this file from host to guest.
     4) Copy this file from guest to host.
     5) Check if file transfers ended good.
@@ -776,34 +781,45 @@ def run_file_transfer(test, params, env):
         tmp_dir = params.get("tmp_dir", "c:\\")
         guest_path = "\\".join([tmp_dir, utils_misc.generate_random_string(8)])
         guest_path = "\\".join(filter(None, re.split(r"\\+", guest_path)))
-    cmd = "dd if=/dev/zero of=%s bs=10M count=%d" % (host_path, count)
+    pattern = params.get("file_transfer_pattern", "random")
+    size = count * 10 * 1024 * 1024
     try:
         error_context.context("Creating %dMB file on host" % filesize, LOG.info)
-        process.run(cmd)
-        original_md5 = crypto.hash_file(host_path, algorithm="md5")
+        seed, original_md5 = utils_misc.generate_data_file(
+            host_path, size, pattern=pattern
+        )
         error_context.context(
             "Transferring file host -> guest, " "timeout: %ss" % transfer_timeout,
             LOG.info,
         )
+        start = time.time()
         vm.copy_files_to(
             host_path, guest_path, timeout=transfer_timeout, filesize=filesize
         )
+        elapsed = time.time() - start
+        LOG.info("Host -> guest: %.1f MB/s", size / 1024.0 / 1024 / max(elapsed, 0.001))
 
         error_context.context(
             "Transferring file guest -> host, " "timeout: %ss" % transfer_timeout,
             LOG.info,
         )
+        start = time.time()
         vm.copy_files_from(
             guest_path, host_path, timeout=transfer_timeout, filesize=filesize
         )
-        current_md5 = crypto.hash_file(host_path, algorithm="md5")
+        elapsed = time.time() - start
+        LOG.info("Guest -> host: %.1f MB/s", size / 1024.0 / 1024 / max(elapsed, 0.001))
 
         error_context.context(
             "Compare md5sum between original file and " "transferred file", LOG.info
         )
-        if original_md5 != current_md5:
+        current_md5, bad_offset = utils_misc.verify_data_file(
+            host_path, size, seed, pattern=pattern
+        )
+        if original_md5 != current_md5 or bad_offset is not None:
             raise exceptions.TestFail(
-                "File changed after transfer host -> guest " "and guest -> host"
+                "File changed after transfer host -> guest "
+                "and guest -> host, first changed byte at offset %s" % bad_offset
             )
     finally:
         try:
@@ -996,13 +1012,21 @@ def session_handler(func):
     """
 
     def manage_session(self):
+        broken = False
         try:
             if self.vm or self.remote_host:
                 self.session = self.get_session()
             return func(self)
+        except Exception:
+            # Don't give a session in an unknown state back to the pool
+            broken = True
+            raise
         finally:
             if (self.vm or self.remote_host) and self.session:
-                self.session.close()
+                if getattr(self, "session_pool", None):
+                    self.session_pool.release(self.session, broken=broken)
+                else:
+                    self.session.close()
 
     return manage_session
 
@@ -1021,6 +1045,7 @@ class AvocadoGuest(object):
         reinstall=False,
         add_args="",
         ignore_result=True,
+        session_pool=None,
     ):
         """
         Class to run Avocado/Avocado-VT tests inside guest
@@ -1036,6 +1061,10 @@ class AvocadoGuest(object):
         :param reinstall: flag to reinstall in case of avocado present inside guest
         :param add_args: additional arguments to be passed to the avocado cmdline
         :param ignore_result: True or False
+        :param session_pool: :class:`GuestSessionPool` of the VM, its sessions
+                             are used and the avocado installation and the
+                             test repository are kept in the guest for the
+                             next runs
         :return: Bool result status
         """
         self.vm = vm
@@ -1050,6 +1079,7 @@ class AvocadoGuest(object):
         self.add_args = add_args
         self.ignore_result = "yes" if ignore_result else "no"
         self.session = None
+        self.session_pool = session_pool
         self.test_path = self.params.get("vm_test_path", "/var/tmp/avocado/")
         self.kvm_module = self.params.get("nested_kvm_module", "kvm_hv")
         self.result_path = os.path.join(self.test_path, "results")
@@ -1096,6 +1126,12 @@ class AvocadoGuest(object):
                 self.avocado_vt_repo_branch = self.params.get(
                     "avocado_vt_repo_branch", ""
                 )
+        runtime = self._get_runtime()
+        if runtime is not None:
+            LOG.debug("Reusing avocado installed in %s", self.vm.name)
+            self.python = runtime["python"]
+            self.pip_bin = runtime["pip_bin"]
+            return
         if not self.env_check():
             raise exceptions.TestError(
                 "avocado env check failed, " "consult previous errors"
@@ -1104,6 +1140,23 @@ class AvocadoGuest(object):
             raise exceptions.TestError(
                 "avocado installation failed, " "consult previous errors"
             )
+        if self.session_pool:
+            self.session_pool.runtimes[self._runtime_key()] = {
+                "python": self.python,
+                "pip_bin": self.pip_bin,
+                "repos": set(),
+            }
+
+    def _runtime_key(self):
+        return ("avocado", self.installtype, self.avocado_vt, self.test_path)
+
+    def _get_runtime(self):
+        """
+        Get the avocado installation recorded in the session pool, if any
+        """
+        if not self.session_pool:
+            return None
+        return self.session_pool.runtimes.get(self._runtime_key())
 
     @session_handler
     def env_check(self):
@@ -1248,8 +1301,12 @@ class AvocadoGuest(object):
             if status != 0:
                 raise exceptions.TestError("Downloading test failed: %s" % output)
         else:
-            if not self.git_install(self.test_repo, install=False):
-                raise exceptions.TestError("Downloading test failed")
+            runtime = self._get_runtime()
+            if runtime is None or self.test_repo not in runtime["repos"]:
+                if not self.git_install(self.test_repo, install=False):
+                    raise exceptions.TestError("Downloading test failed")
+                if runtime is not None:
+                    runtime["repos"].add(self.test_repo)
 
         LOG.debug("Running Test")
         avocado_cmd = "avocado run"
@@ -1308,7 +1365,8 @@ class AvocadoGuest(object):
         """
         LOG.debug("Trying to copy avocado results from guest")
         guest_results_dir = utils_misc.get_path(self.test.debugdir, self.vm.name)
-        os.makedirs(guest_results_dir)
+        if not os.path.isdir(guest_results_dir):
+            os.makedirs(guest_results_dir)
         LOG.debug("Guest avocado test results placed " "under %s", guest_results_dir)
         # result info tarball to host result dir
         results_tarball = os.path.join(self.test_path, "results.tgz")
@@ -1334,6 +1392,8 @@ class AvocadoGuest(object):
         Method to get the session of the vm instance
         """
         try:
+            if self.session_pool:
+                return self.session_pool.acquire()
             return self.vm.wait_for_login()
         except aexpect.ShellError as detail:
             raise exceptions.TestError(
@@ -1353,8 +1413,9 @@ class AvocadoGuest(object):
             return test_status
         finally:
             self.get_results()
-            # Cleanup
-            self.session.cmd("rm -rf %s" % self.test_path, timeout=self.timeout)
+            # Cleanup, the pooled installation is kept for the next runs
+            if not self._get_runtime():
+                self.session.cmd("rm -rf %s" % self.test_path, timeout=self.timeout)
 
 
 def get_avocadotestlist(params):
@@ -2040,6 +2101,9 @@ def summary_up_result(result_file, ignore, row_head, column_mark):
     the average value for each item in the results. It fits to the records
     that are in matrix form.
 
+    The file is read in a single pass keeping running sums, so big result
+    files don't need to be held in memory.
+
     @result_file: files which need to calculate
     @ignore: pattern for the comment in results which need to through away
     @row_head: pattern for the items in row
@@ -2047,52 +2111,44 @@ def summary_up_result(result_file, ignore, row_head, column_mark):
     the items in column
     :return: A dictionary with the average value of results
     """
+    ignore_re = re.compile(ignore)
+    row_head_re = re.compile(row_head)
+    column_mark_re = re.compile(column_mark)
     head_flag = False
-    result_dict = {}
-    column_list = {}
+    column_list = []
     row_list = []
-    fd = open(result_file, "r")
-    for eachLine in fd:
-        if len(re.findall(ignore, eachLine)) == 0:
-            if len(re.findall(column_mark, eachLine)) != 0 and not head_flag:
-                column = 0
-                _, row, eachLine = re.split(row_head, eachLine)
-                for i in re.split("\s+", eachLine):
-                    if i:
-                        result_dict[i] = {}
-                        column_list[column] = i
-                        column += 1
-                head_flag = True
-            elif len(re.findall(column_mark, eachLine)) == 0:
-                column = 0
-                _, row, eachLine = re.split(row_head, eachLine)
-                row_flag = False
-                for i in row_list:
-                    if row == i:
-                        row_flag = True
-                if row_flag is False:
-                    row_list.append(row)
-                    for i in result_dict:
-                        result_dict[i][row] = []
-                for i in re.split("\s+", eachLine):
-                    if i:
-                        result_dict[column_list[column]][row].append(i)
-                        column += 1
-    fd.close()
+    # [sum, count, numeric] of the values of each column and row, the
+    # average is only computed when the first value is a number
+    sums = {}
+    with open(result_file, "r") as fd:
+        for eachLine in fd:
+            if ignore_re.search(eachLine):
+                continue
+            if column_mark_re.search(eachLine):
+                if not head_flag:
+                    _, row, eachLine = row_head_re.split(eachLine)
+                    column_list = [i for i in eachLine.split() if i]
+                    head_flag = True
+                continue
+            _, row, eachLine = row_head_re.split(eachLine)
+            if row not in row_list:
+                row_list.append(row)
+            for column, i in enumerate(eachLine.split()):
+                value = utils_misc.aton(i)
+                key = (column_list[column], row)
+                if key not in sums:
+                    sums[key] = [0, 0, value or value == 0.0]
+                sums[key][0] += value
+                sums[key][1] += 1
     # Calculate the average value
     average_list = {}
-    for i in column_list:
-        average_list[column_list[i]] = {}
-        for j in row_list:
-            average_list[column_list[i]][j] = {}
-            check = result_dict[column_list[i]][j][0]
-            if utils_misc.aton(check) or utils_misc.aton(check) == 0.0:
-                count = 0
-                for k in result_dict[column_list[i]][j]:
-                    count += utils_misc.aton(k)
-                average_list[column_list[i]][j] = "%.2f" % (
-                    count / len(result_dict[column_list[i]][j])
-                )
+    for column in column_list:
+        average_list[column] = {}
+        for row in row_list:
+            average_list[column][row] = {}
+            total, count, numeric = sums.get((column, row), (0, 0, False))
+            if numeric:
+                average_list[column][row] = "%.2f" % (total / count)
 
     return average_list
 
@@ -2182,6 +2238,257 @@ class BackgroundTest(object):
         return self.thread.is_alive()
 
 
+class GuestJob(object):
+    """
+    Job submitted to a :class:`GuestSessionPool`, with its structured result.
+
+    It can be waited for like a :class:`BackgroundTest`.
+    """
+
+    def __init__(self, func, args=(), kwargs=None, cmd=None, timeout=600):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.cmd = cmd
+        self.timeout = timeout
+        # Exit status of the command or return value of the function
+        self.status = None
+        self.output = None
+        self.exception = None
+        self.duration = None
+        self._done = threading.Event()
+
+    def join(self, timeout=600, ignore_status=False):
+        """
+        Wait for the job to finish and raise its exception if any.
+
+        :return: True when the job finished in time
+        """
+        done = self._done.wait(timeout)
+        # pylint: disable=E0702
+        if self.exception and (not ignore_status):
+            raise self.exception
+        return done
+
+    def is_alive(self):
+        """
+        Check whether the job is still queued or running.
+        """
+        return not self._done.is_set()
+
+
+class GuestSessionPool(object):
+    """
+    Logged in sessions of a VM kept open to run many short workloads.
+
+    The sessions are logged in by the worker threads of the pool as soon
+    as it's created. The submitted jobs are run by the same threads, so a
+    command costs a single round trip instead of a login and a thread.
+    Runtimes set up in the guest (e.g. avocado by :class:`AvocadoGuest`)
+    are recorded in :attr:`runtimes` to be reused by later jobs.
+
+    The pool only keeps a weak reference to the VM, so that it's closed
+    once the VM object is gone, see :func:`get_guest_session_pool`.
+    """
+
+    def __init__(self, vm, size=1, login_timeout=360):
+        """
+        :param vm: VM object
+        :param size: Number of sessions and worker threads
+        :param login_timeout: Time to wait for every login
+        """
+        self._vm = weakref.ref(vm)
+        self.vm_name = vm.name
+        self.size = size
+        self.login_timeout = login_timeout
+        self.runtimes = {}
+        self.closed = False
+        self._sessions = queue.Queue()
+        # Sessions taken out of the pool by acquire()
+        self._in_use = set()
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._workers = []
+        for index in xrange(size):
+            worker = threading.Thread(
+                target=self._work, name="GuestSessionPool-%s-%d" % (vm.name, index)
+            )
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def vm(self):
+        """The VM of the pool, None once the VM object is gone."""
+        return self._vm()
+
+    def _login(self):
+        vm = self.vm
+        if vm is None:
+            return None
+        try:
+            return vm.wait_for_login(timeout=self.login_timeout)
+        except Exception as details:
+            LOG.warning("Unable to log into %s: %s", self.vm_name, details)
+            return None
+
+    def _work(self):
+        self._sessions.put(self._login())
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            start = time.time()
+            try:
+                if job.cmd is None:
+                    job.status = job.func(*job.args, **job.kwargs)
+                else:
+                    session = self.acquire()
+                    try:
+                        job.status, job.output = session.cmd_status_output(
+                            job.cmd, timeout=job.timeout
+                        )
+                    except Exception:
+                        # e.g. a timeout, the session is in an unknown state
+                        self.release(session, broken=True)
+                        raise
+                    self.release(session)
+            except Exception as details:
+                job.exception = details
+            job.duration = time.time() - start
+            job._done.set()
+
+    def acquire(self, timeout=None):
+        """
+        Take a logged in session out of the pool.
+
+        A session which has been closed meanwhile is replaced by a new one.
+
+        :param timeout: Time to wait for a free session
+        :return: Shell session, to be given back by :meth:`release`
+        """
+        if self.closed:
+            raise exceptions.TestError("Session pool of %s is closed" % self.vm_name)
+        try:
+            session = self._sessions.get(timeout=timeout)
+        except queue.Empty:
+            raise exceptions.TestError(
+                "No free session of %s in %ss" % (self.vm_name, timeout)
+            )
+        if session is None or not session.is_alive():
+            if session is not None:
+                session.close()
+            session = self._login()
+            if session is None:
+                self._sessions.put(None)
+                raise exceptions.TestError("Unable to log into %s" % self.vm_name)
+        with self._lock:
+            self._in_use.add(session)
+        return session
+
+    def release(self, session, broken=False):
+        """
+        Give back a session taken by :meth:`acquire`.
+
+        :param broken: Whether a command of the session failed (e.g. timed
+                       out), then the session is closed and replaced by a
+                       new login on the next :meth:`acquire`.
+        """
+        with self._lock:
+            self._in_use.discard(session)
+        if self.closed or broken:
+            session.close()
+        if not self.closed:
+            self._sessions.put(None if broken else session)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) by a worker of the pool.
+
+        :return: :class:`GuestJob`, its status is the return value of func
+        """
+        job = GuestJob(func, args, kwargs)
+        self._jobs.put(job)
+        return job
+
+    def submit_cmd(self, cmd, timeout=600):
+        """
+        Run a shell command in one of the sessions of the pool.
+
+        :return: :class:`GuestJob` with the exit status and the output
+        """
+        job = GuestJob(None, cmd=cmd, timeout=timeout)
+        self._jobs.put(job)
+        return job
+
+    def run(self, cmd, timeout=600):
+        """
+        Run a shell command in one of the sessions and wait for it.
+
+        :return: Tuple of (exit status, output)
+        """
+        job = self.submit_cmd(cmd, timeout)
+        job.join(None)
+        return job.status, job.output
+
+    def close(self):
+        """
+        Stop the workers once the submitted jobs are done, close the sessions.
+
+        The sessions still taken out of the pool are closed as well.
+        """
+        if self.closed:
+            return
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join()
+        self.closed = True
+        while not self._sessions.empty():
+            session = self._sessions.get()
+            if session is not None:
+                session.close()
+        with self._lock:
+            in_use, self._in_use = self._in_use, set()
+        for session in in_use:
+            session.close()
+
+
+_SESSION_POOLS = weakref.WeakKeyDictionary()
+
+
+def get_guest_session_pool(vm, params=None):
+    """
+    Get the session pool of the VM, create it on the first use.
+
+    :param vm: VM object
+    :param params: Params with guest_session_pool_size and login_timeout
+    :return: :class:`GuestSessionPool` of the VM
+    """
+    pool = _SESSION_POOLS.get(vm)
+    if pool is None or pool.closed:
+        params = params or vm.params
+        pool = GuestSessionPool(
+            vm,
+            int(params.get("guest_session_pool_size", 1)),
+            int(params.get("login_timeout", 360)),
+        )
+        _SESSION_POOLS[vm] = pool
+        # Don't leave the sessions open when the VM object is dropped
+        weakref.finalize(vm, pool.close).atexit = False
+    return pool
+
+
+def close_guest_session_pools():
+    """
+    Close the session pools of all the VMs, e.g. at the end of the test.
+    """
+    for pool in list(_SESSION_POOLS.values()):
+        pool.close()
+    _SESSION_POOLS.clear()
+
+
 def get_image_info(image_file):
     return utils_misc.get_image_info(image_file)
 
@@ -2222,7 +2529,8 @@ def run_avocado_bg(vm, params, test, testlist=[], avocado_vt=False, ignore_statu
     :param vm: VM object
     :param params: VM param
     :param test: test object
-    :return: background test thread
+    :return: background test thread, or :class:`GuestJob` when the guest
+             sessions are pooled (guest_session_pool = yes)
     """
     avocado_testargs = params.get("avocado_testargs", "")
     avocado_timeout = int(params.get("avocado_timeout", 3600))
@@ -2230,6 +2538,9 @@ def run_avocado_bg(vm, params, test, testlist=[], avocado_vt=False, ignore_statu
         "avocado_testrepo",
         "https://github.com/avocado-framework-tests/avocado-misc-tests.git",
     )
+    session_pool = None
+    if params.get("guest_session_pool", "no") == "yes":
+        session_pool = get_guest_session_pool(vm, params)
     try:
         avocado_obj = AvocadoGuest(
             vm,
@@ -2243,7 +2554,10 @@ def run_avocado_bg(vm, params, test, testlist=[], avocado_vt=False, ignore_statu
             reinstall=True,
             add_args=avocado_testargs,
             ignore_result=ignore_status,
+            session_pool=session_pool,
         )
+        if session_pool:
+            return session_pool.submit(avocado_obj.run_avocado)
         bt = BackgroundTest(avocado_obj.run_avocado, ())
         bt.start()
         return bt
@@ -2362,6 +2676,11 @@ class Stress(object):
         self.check_cmd = "pidof -s %s" % check_cmd
         self.stop_cmd = "pkill -9 %s" % check_cmd
         self.dst_path = self.params.get("stress_dst_path", "/home")
+        self.source_path = None
+        self.build_cache = utils_build_cache.get_build_cache(self.params)
+        self.prebuilt_paths = []
+        # Whether the tool found installed is used, it's left in place
+        self.use_installed = False
         self.cmd_status_output = process.getstatusoutput
         self.cmd_output_safe = process.getoutput
         self.cmd_status = process.system
@@ -2483,6 +2802,7 @@ class Stress(object):
             else:
                 self.base_name = self.downloaded_file_path
         source = os.path.join(tmp_path, self.base_name)
+        self.source_path = source
         if self.remote_host:
             LOG.info("Copy stress tool to remote host")
             args = (
@@ -2502,9 +2822,76 @@ class Stress(object):
             else:
                 self.dst_path = os.path.abspath(os.path.join(source, os.pardir))
 
+    def _copy_from(self, remote_path, local_path):
+        """
+        Copy a file out of the guest or the remote host running the stress.
+        """
+        if self.vm:
+            self.vm.copy_files_from(remote_path, local_path)
+        else:
+            remote.copy_files_from(
+                self.remote_host["server_ip"],
+                "scp",
+                self.remote_host["server_user"],
+                self.remote_host["server_pwd"],
+                "22",
+                remote_path,
+                local_path,
+            )
+
+    def _copy_to(self, local_path, remote_path):
+        """
+        Copy a file into the guest or the remote host running the stress.
+        """
+        if self.vm:
+            self.vm.copy_files_to(local_path, remote_path)
+        else:
+            remote.copy_files_to(
+                self.remote_host["server_ip"],
+                "scp",
+                self.remote_host["server_user"],
+                self.remote_host["server_pwd"],
+                "22",
+                local_path,
+                remote_path,
+            )
+
+    def _find_installed(self):
+        """
+        Find the stress tool already installed, with the version requested
+        by the '<stress_type>_version' param if any.
+        """
+        return utils_build_cache.find_tool(
+            self.cmd_status_output,
+            self.stress_cmds.split(" ")[0],
+            self.params.get("%s_version" % self.stress_type),
+        )
+
+    def _get_build_key(self):
+        """
+        Get the build cache key of the stress tool, None if the builds in
+        this system can't be cached.
+        """
+        if not self.build_cache or not (self.vm or self.remote_host):
+            return None
+        guest_id = utils_build_cache.get_guest_id(
+            lambda cmd: self.cmd_status_output(cmd)[1]
+        )
+        return self.build_cache.get_key(
+            self.stress_type,
+            utils_build_cache.hash_source(self.source_path),
+            guest_id,
+            self.work_path,
+            self.make_cmds,
+        )
+
     def install(self):
         """
         To download, abstract, build and install the stress tool
+
+        When the guest tool build cache is enabled, a tool already installed
+        is used as is and the binaries built by the first guest of a kind are
+        copied into the next ones instead of building them again.
         """
         # Install the dependencies before the tool gets installed
         if self.dependency_packages:
@@ -2533,7 +2920,20 @@ class Stress(object):
                     LOG.debug("Successful to install stress tool via repo")
                     return
 
+        if self.build_cache and self._find_installed():
+            LOG.info("Using the %s already installed", self.stress_type)
+            self.use_installed = True
+            return
+
         self.download_stress()
+        build_key = self._get_build_key()
+        if build_key:
+            self.prebuilt_paths = (
+                self.build_cache.install(build_key, self._copy_to, self.cmd_status)
+                or []
+            )
+            if self.prebuilt_paths:
+                return
         install_path = os.path.join(self.dst_path, self.base_name, self.work_path)
         self.make_cmds = "cd %s;%s" % (install_path, self.make_cmds)
         LOG.info("installing the %s with %s", self.stress_type, self.make_cmds)
@@ -2542,6 +2942,16 @@ class Stress(object):
         )
         if status != 0:
             raise exceptions.TestError("Installation failed with output:\n %s" % output)
+        if build_key:
+            tool_path = self._find_installed()
+            if tool_path:
+                self.build_cache.store(
+                    build_key, self.stress_type, self._copy_from, [tool_path]
+                )
+            else:
+                LOG.debug(
+                    "%s is not installed in PATH, not caching it", self.stress_type
+                )
 
     @session_handler
     def clean(self):
@@ -2567,7 +2977,18 @@ class Stress(object):
                 if mgr.is_installed(self.stress_package):
                     return
 
+        if self.use_installed:
+            LOG.debug("Leaving the %s found installed in place", self.stress_type)
+            return
         install_path = os.path.join(self.dst_path, self.base_name)
+        if self.prebuilt_paths:
+            LOG.info("Remove the prebuilt %s and its source", self.stress_type)
+            self.cmd_output_safe(
+                "cd && rm -rf %s %s" % (" ".join(self.prebuilt_paths), install_path)
+            )
+            self.prebuilt_paths = []
+            return
+
         if self.cmd_status("cd %s" % install_path) != 0:
             LOG.error("No source files found in path %s", install_path)
             return
@@ -13,7 +13,7 @@ import os
 import re
 import time
 
-__all__ = ["get_video_maker_klass", "video_maker"]
+__all__ = ["get_video_maker_klass", "get_stream_encoder", "video_maker"]
 
 #
 # Check what kind of video libraries tools we have available
@@ -262,6 +262,174 @@ class GiEncoder(object):
             raise EncodingError(err, debug)
 
 
+class GiStreamEncoder(object):
+    """
+    Encodes a video from Virtual Machine screenshots as they are taken.
+
+    This is the gobject-introspection version.
+
+    Every frame is pushed to a pipeline which lives as long as the encoder,
+    so the video is ready as soon as the last frame is added, without
+    converting, normalizing and re-reading the screenshots afterwards. The
+    frames are scaled on the fly to the size of the first one. The pipeline
+    goes like (using gstreamer terminology):
+
+    appsrc -> videoconvert -> videoscale -> vp8enc -> webmmux -> filesink
+    """
+
+    CONTAINER_MAPPING = {"ogg": "oggmux", "webm": "webmmux"}
+
+    ENCODER_MAPPING = {"ogg": "theoraenc", "webm": "vp8enc"}
+
+    def __init__(self, output_file, framerate=4, verbose=False):
+        """
+        :param output_file: Path to the output video file, its extension
+                            (.webm or .ogg) selects the format.
+        :param framerate: Frames per second of the video.
+        """
+        if not GI_GSTREAMER_INSTALLED:
+            raise ValueError("pygobject library was not found")
+        if not PIL_INSTALLED:
+            raise ValueError("python-imaging library was not found")
+        self.output_file = output_file
+        self.framerate = framerate
+        self.verbose = verbose
+        self.frames = 0
+        self.size = None
+        self.pipeline = None
+        self.source = None
+        self._frame_size = None
+        Gst.init(None)
+
+    def has_element(self, kind):
+        """
+        Returns True if a gstreamer element is available
+        """
+        return Gst.ElementFactory.find(kind)
+
+    def get_element(self, name):
+        """
+        Makes and returns and element from the gst factory interface
+        """
+        return Gst.ElementFactory.make(name, name)
+
+    def _start(self, size):
+        """
+        Build and start the pipeline for frames of the given size.
+        """
+        # Same lower bound as GiEncoder.normalize_images()
+        self.size = (max(size[0], 640), max(size[1], 480))
+        extension = os.path.splitext(self.output_file)[1][1:]
+        if extension not in self.CONTAINER_MAPPING:
+            extension = "webm"
+        self.pipeline = Gst.Pipeline()
+        self.source = self.get_element("appsrc")
+        self.source.set_property("format", Gst.Format.TIME)
+        self.source.set_property("block", True)
+        self.source.set_property("max-bytes", size[0] * size[1] * 4 * 8)
+        scaled_caps = Gst.caps_from_string(
+            "video/x-raw, width=%d, height=%d" % self.size
+        )
+        elements = [
+            self.source,
+            self.get_element("videoconvert"),
+            self.get_element("videoscale"),
+            self.get_element("capsfilter"),
+            self.get_element(self.ENCODER_MAPPING[extension]),
+            self.get_element(self.CONTAINER_MAPPING[extension]),
+            self.get_element("filesink"),
+        ]
+        elements[3].set_property("caps", scaled_caps)
+        elements[-1].set_property("location", self.output_file)
+        for element in elements:
+            self.pipeline.add(element)
+        for element, next_element in zip(elements, elements[1:]):
+            element.link(next_element)
+        self.pipeline.set_state(Gst.State.PLAYING)
+        if self.verbose:
+            LOG.debug("Encoding video %s of size %s", self.output_file, self.size)
+
+    def _check_errors(self, timeout=0):
+        """
+        Raise the error reported by the pipeline, if any.
+
+        :return: The EOS or ERROR message, None if there's none.
+        """
+        message_types = Gst.MessageType.EOS | Gst.MessageType.ERROR
+        msg = self.pipeline.get_bus().timed_pop_filtered(timeout, message_types)
+        if msg is not None and msg.type == Gst.MessageType.ERROR:
+            err, debug = msg.parse_error()
+            raise EncodingError(err, debug)
+        return msg
+
+    def abort(self):
+        """
+        Stop the pipeline, leaving the video unfinished.
+        """
+        if self.pipeline is not None:
+            self.pipeline.set_state(Gst.State.NULL)
+            self.pipeline = None
+
+    def add_frame(self, image):
+        """
+        Encode a frame.
+
+        The pipeline is stopped on any failure.
+
+        :param image: PIL image of the screenshot.
+        """
+        if self.pipeline is None and self.frames:
+            raise ValueError("Video %s is already finished" % self.output_file)
+        try:
+            self._add_frame(image)
+        except Exception:
+            self.abort()
+            raise
+
+    def _add_frame(self, image):
+        if self.pipeline is None:
+            self._start(image.size)
+        if image.size != self._frame_size:
+            # The frames of a new size are scaled to the video size
+            self._frame_size = image.size
+            self.source.set_property(
+                "caps",
+                Gst.caps_from_string(
+                    "video/x-raw, format=RGBx, width=%d, height=%d, "
+                    "framerate=(fraction)%d/1" % (image.size + (self.framerate,))
+                ),
+            )
+        data = image.convert("RGBX").tobytes()
+        buf = Gst.Buffer.new_wrapped(data)
+        buf.pts = self.frames * Gst.SECOND // self.framerate
+        buf.duration = Gst.SECOND // self.framerate
+        self.source.emit("push-buffer", buf)
+        self.frames += 1
+        self._check_errors()
+
+    def finish(self, timeout=60):
+        """
+        Flush the last frames and close the video file.
+
+        :param timeout: Time to wait for the encoding of the queued frames.
+        """
+        if self.pipeline is None:
+            return
+        try:
+            self.source.emit("end-of-stream")
+            msg = self._check_errors(timeout * Gst.SECOND)
+        finally:
+            self.abort()
+        if msg is None:
+            raise EncodingError("Timeout", "Video %s not finished" % self.output_file)
+        if self.verbose:
+            LOG.debug(
+                "Video %s encoded successfully, %d frames",
+                self.output_file,
+                self.frames,
+            )
+
+
 class GstEncoder(object):
     """
     Encodes a video from Virtual Machine screenshots (jpg files).
@@ -442,6 +610,26 @@ def get_video_maker_klass():
         return GstEncoder()
 
 
+def get_stream_encoder(output_dir, framerate=4):
+    """
+    Instantiates the encoder of the frames of a screendump directory.
+
+    :param output_dir: Screendump directory, the video is created next to it.
+    :return: Tuple of (encoder, video file), encoder is None when
+             incremental encoding is not available.
+    """
+    try:
+        encoder = GiStreamEncoder("%s.webm" % output_dir, framerate)
+    except ValueError:
+        return None, None
+    if not (encoder.has_element("vp8enc") and encoder.has_element("webmmux")):
+        encoder.output_file = "%s.ogg" % output_dir
+    for element in ("appsrc", "videoconvert", "videoscale"):
+        if not encoder.has_element(element):
+            return None, None
+    return encoder, encoder.output_file
+
+
 def video_maker(input_dir, output_file):
     """
     Instantiates the encoder and encodes the input dir.
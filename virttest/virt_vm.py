@@ -1094,6 +1094,33 @@ class BaseVM(object):
         """
         return os.path.join(data_dir.get_tmp_dir(), "testlog-%s" % self.instance)
 
+    def get_ssh_mux_options(self):
+        """
+        Get the ssh options to share one connection for the guest sessions
+        and file transfers, when enabled by 'ssh_multiplexing = yes'.
+
+        :return: ssh command line options, empty when disabled
+        """
+        if self.params.get("ssh_multiplexing", "no") != "yes":
+            return ""
+        return remote_old.get_ssh_mux_options(
+            self._get_ssh_mux_dir(), self.params.get("ssh_multiplexing_persist", "60")
+        )
+
+    def _get_ssh_mux_dir(self):
+        # Per VM, with the random part of the instance only, the control
+        # socket paths must stay short
+        return os.path.join(data_dir.get_tmp_dir(), "ssh-mux", self.instance[-8:])
+
+    def close_ssh_mux(self):
+        """
+        Stop the shared ssh connections to the guest, if any.
+
+        To be called whenever the guest goes down, a master connection to the
+        former guest must not be reused.
+        """
+        remote_old.close_ssh_mux(self._get_ssh_mux_dir())
+
     @error_context.context_aware
     def login(self, nic_index=0, timeout=LOGIN_TIMEOUT, username=None, password=None):
         """
@@ -1130,6 +1157,9 @@ class BaseVM(object):
         )
         log_filename = utils_logfile.get_log_filename(log_filename)
         log_function = utils_logfile.log_line
+        extra_args = {}
+        if client == "ssh" and self.get_ssh_mux_options():
+            extra_args["extra_cmdline"] = self.get_ssh_mux_options()
         try:
             session = remote.remote_login(
                 client,
@@ -1143,6 +1173,7 @@ class BaseVM(object):
                 log_function,
                 timeout,
                 neigh_attach_if,
+                **extra_args,
             )
         except Exception:
             utils_logfile.close_log_file(log_filename)
@@ -1213,6 +1244,27 @@ class BaseVM(object):
         self.remote_sessions.append(cmd)
         return cmd
 
+    def _ssh_server_reachable(self, nic_index=0):
+        """
+        Cheap check whether the guest sshd accepts connections.
+
+        :return: False only when the guest uses ssh and its port can't be
+                 connected, True otherwise
+        """
+        if self.params.get("shell_client") != "ssh":
+            return True
+        try:
+            address = self.get_address(nic_index, self.ip_version)
+            port = self.get_port(int(self.params.get("shell_port")))
+            if self.ip_version == "ipv6" and address.lower().startswith("fe80"):
+                address = "%s%%%s" % (
+                    address,
+                    utils_net.get_neigh_attch_interface(address),
+                )
+        except Exception:
+            return True
+        return remote_old.probe_ssh_server(address, port) is not False
+
     def wait_for_login(
         self,
         nic_index=0,
@@ -1285,6 +1337,10 @@ class BaseVM(object):
         not_tried = True
         end_time = start_time + timeout
         while time.time() < end_time or not_tried:
+            if not not_tried and not self._ssh_server_reachable(nic_index):
+                # Skip the full login attempt while sshd can't be connected
+                time.sleep(0.5)
+                continue
             try:
                 return self.login(nic_index, internal_timeout, username, password)
             except (remote.LoginAuthenticationError, remote.LoginBadClientError):
@@ -1348,7 +1404,7 @@ class BaseVM(object):
             utils_misc.generate_random_string(4),
         )
         log_function = utils_logfile.log_line
-        remote.copy_files_to(
+        remote_old.copy_files_to(
             address,
             client,
             username,
@@ -1363,6 +1419,7 @@ class BaseVM(object):
             timeout=timeout,
             interface=neigh_attach_if,
             filesize=filesize,
+            ssh_options=self.get_ssh_mux_options(),
         )
         utils_logfile.close_log_file(log_filename)
 
@@ -1408,7 +1465,7 @@ class BaseVM(object):
             utils_misc.generate_random_string(4),
         )
         log_function = utils_logfile.log_line
-        remote.copy_files_from(
+        remote_old.copy_files_from(
             address,
             client,
             username,
@@ -1423,6 +1480,7 @@ class BaseVM(object):
             timeout=timeout,
             interface=neigh_attach_if,
             filesize=filesize,
+            ssh_options=self.get_ssh_mux_options(),
         )
         utils_logfile.close_log_file(log_filename)
 